@@ -0,0 +1,37 @@
+"""Add public lookup prefix to api_keys
+
+Revision ID: 005_api_key_prefix
+Revises: 004_add_demand_scenarios
+Create Date: 2026-10-18 09:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "005_api_key_prefix"
+down_revision = "004_add_demand_scenarios"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keys issued from now on look like sk_<prefix>_<secret>; the prefix is public
+    # and indexed so verification needs a single row (and a single PBKDF2 run).
+    op.execute(
+        """
+        ALTER TABLE api_keys
+        ADD COLUMN IF NOT EXISTS key_prefix text;
+    """
+    )
+    op.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_api_keys_key_prefix
+        ON api_keys(key_prefix) WHERE key_prefix IS NOT NULL;
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ux_api_keys_key_prefix;")
+    op.execute("ALTER TABLE api_keys DROP COLUMN IF EXISTS key_prefix;")
@@ -0,0 +1,50 @@
+"""Counter table for hi/lo order and customer ID allocation
+
+Revision ID: 006_order_id_seq
+Revises: 005_api_key_prefix
+Create Date: 2026-10-18 12:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "006_order_id_seq"
+down_revision = "005_api_key_prefix"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per ID prefix; id_allocator.py reserves blocks with UPDATE ... RETURNING
+    # instead of scanning orders/customers for the highest suffix on every create.
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS order_id_seq (
+            prefix text PRIMARY KEY,
+            last_suffix bigint NOT NULL DEFAULT 0
+        );
+    """
+    )
+    op.execute(
+        """
+        INSERT INTO order_id_seq (prefix, last_suffix)
+        SELECT 'ORD', COALESCE(MAX(TO_NUMBER(REGEXP_REPLACE(order_id, '\\D', '', 'g'), '999999999')), 0)
+        FROM orders
+        WHERE order_id ~ '^[A-Z0-9-]+$'
+        ON CONFLICT (prefix) DO NOTHING;
+    """
+    )
+    op.execute(
+        """
+        INSERT INTO order_id_seq (prefix, last_suffix)
+        SELECT 'CUST', COALESCE(MAX(TO_NUMBER(REGEXP_REPLACE(customer_id, '\\D', '', 'g'), '999999999')), 0)
+        FROM customers
+        WHERE customer_id ~ '^[A-Z0-9-]+$'
+        ON CONFLICT (prefix) DO NOTHING;
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS order_id_seq;")
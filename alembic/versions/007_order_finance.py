@@ -0,0 +1,198 @@
+"""Incrementally maintained order_finance table behind v_order_finance
+
+Revision ID: 007_order_finance
+Revises: 006_order_id_seq
+Create Date: 2026-10-18 14:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "007_order_finance"
+down_revision = "006_order_id_seq"
+branch_labels = None
+depends_on = None
+
+
+ORDER_FINANCE_COMPUTED = """
+SELECT o.order_id,
+  COALESCE((SELECT SUM(ol.qty * ol.unit_price * (1 - ol.discount_pct))
+            FROM order_lines ol WHERE ol.order_id = o.order_id), 0),
+  COALESCE((SELECT SUM(ol.qty * p.std_cost)
+            FROM order_lines ol JOIN products p ON p.product_id = ol.product_id
+            WHERE ol.order_id = o.order_id), 0),
+  COALESCE((SELECT SUM(t.hours * e.hourly_rate)
+            FROM timesheets t JOIN employees e ON e.emp_id = t.emp_id
+            WHERE t.order_id = o.order_id), 0)
+FROM orders o
+"""
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS order_finance (
+            order_id text PRIMARY KEY REFERENCES orders(order_id) ON DELETE CASCADE,
+            revenue numeric NOT NULL DEFAULT 0,
+            material_cost numeric NOT NULL DEFAULT 0,
+            labor_cost numeric NOT NULL DEFAULT 0,
+            gross_margin numeric GENERATED ALWAYS AS (revenue - material_cost - labor_cost) STORED
+        );
+    """
+    )
+
+    # Row-level triggers apply deltas, so a line or timesheet write touches one
+    # order_finance row instead of re-aggregating the order.
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION order_finance_order_trg() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO order_finance (order_id, revenue, material_cost, labor_cost)
+            {ORDER_FINANCE_COMPUTED} WHERE o.order_id = NEW.order_id
+            ON CONFLICT (order_id) DO NOTHING;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION order_finance_line_trg() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE order_finance
+                SET revenue = revenue - OLD.qty * OLD.unit_price * (1 - OLD.discount_pct),
+                    material_cost = material_cost - OLD.qty * COALESCE(
+                        (SELECT std_cost FROM products WHERE product_id = OLD.product_id), 0)
+                WHERE order_id = OLD.order_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE order_finance
+                SET revenue = revenue + NEW.qty * NEW.unit_price * (1 - NEW.discount_pct),
+                    material_cost = material_cost + NEW.qty * COALESCE(
+                        (SELECT std_cost FROM products WHERE product_id = NEW.product_id), 0)
+                WHERE order_id = NEW.order_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION order_finance_timesheet_trg() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE order_finance
+                SET labor_cost = labor_cost - OLD.hours * COALESCE(
+                    (SELECT hourly_rate FROM employees WHERE emp_id = OLD.emp_id), 0)
+                WHERE order_id = OLD.order_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE order_finance
+                SET labor_cost = labor_cost + NEW.hours * COALESCE(
+                    (SELECT hourly_rate FROM employees WHERE emp_id = NEW.emp_id), 0)
+                WHERE order_id = NEW.order_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION order_finance_product_trg() RETURNS trigger AS $$
+        DECLARE
+            pid text := COALESCE(NEW.product_id, OLD.product_id);
+            delta numeric := COALESCE(NEW.std_cost, 0) - COALESCE(OLD.std_cost, 0);
+        BEGIN
+            IF TG_OP = 'INSERT' THEN delta := NEW.std_cost; END IF;
+            IF TG_OP = 'DELETE' THEN delta := -OLD.std_cost; END IF;
+            IF delta <> 0 THEN
+                UPDATE order_finance f
+                SET material_cost = f.material_cost + delta * l.qty
+                FROM (SELECT order_id, SUM(qty) AS qty FROM order_lines
+                      WHERE product_id = pid GROUP BY order_id) l
+                WHERE f.order_id = l.order_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION order_finance_employee_trg() RETURNS trigger AS $$
+        DECLARE
+            eid text := COALESCE(NEW.emp_id, OLD.emp_id);
+            delta numeric := COALESCE(NEW.hourly_rate, 0) - COALESCE(OLD.hourly_rate, 0);
+        BEGIN
+            IF TG_OP = 'INSERT' THEN delta := NEW.hourly_rate; END IF;
+            IF TG_OP = 'DELETE' THEN delta := -OLD.hourly_rate; END IF;
+            IF delta <> 0 THEN
+                UPDATE order_finance f
+                SET labor_cost = f.labor_cost + delta * t.hours
+                FROM (SELECT order_id, SUM(hours) AS hours FROM timesheets
+                      WHERE emp_id = eid GROUP BY order_id) t
+                WHERE f.order_id = t.order_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """
+    )
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_order_finance_order ON orders;
+        CREATE TRIGGER trg_order_finance_order AFTER INSERT ON orders
+            FOR EACH ROW EXECUTE FUNCTION order_finance_order_trg();
+        DROP TRIGGER IF EXISTS trg_order_finance_line ON order_lines;
+        CREATE TRIGGER trg_order_finance_line
+            AFTER INSERT OR DELETE OR UPDATE OF order_id, product_id, qty, unit_price, discount_pct
+            ON order_lines FOR EACH ROW EXECUTE FUNCTION order_finance_line_trg();
+        DROP TRIGGER IF EXISTS trg_order_finance_timesheet ON timesheets;
+        CREATE TRIGGER trg_order_finance_timesheet
+            AFTER INSERT OR DELETE OR UPDATE OF emp_id, order_id, hours
+            ON timesheets FOR EACH ROW EXECUTE FUNCTION order_finance_timesheet_trg();
+        DROP TRIGGER IF EXISTS trg_order_finance_product ON products;
+        CREATE TRIGGER trg_order_finance_product
+            AFTER INSERT OR DELETE OR UPDATE OF std_cost
+            ON products FOR EACH ROW EXECUTE FUNCTION order_finance_product_trg();
+        DROP TRIGGER IF EXISTS trg_order_finance_employee ON employees;
+        CREATE TRIGGER trg_order_finance_employee
+            AFTER INSERT OR DELETE OR UPDATE OF hourly_rate
+            ON employees FOR EACH ROW EXECUTE FUNCTION order_finance_employee_trg();
+    """
+    )
+
+    op.execute(
+        f"""
+        INSERT INTO order_finance (order_id, revenue, material_cost, labor_cost)
+        {ORDER_FINANCE_COMPUTED}
+        ON CONFLICT (order_id) DO NOTHING;
+    """
+    )
+
+    # v_order_finance stays as a compatibility shim over the table
+    op.execute(
+        """
+        DROP VIEW IF EXISTS v_order_finance;
+        CREATE VIEW v_order_finance AS
+        SELECT f.order_id, o.customer_id, o.order_date,
+               f.revenue, f.material_cost, f.labor_cost, f.gross_margin
+        FROM order_finance f
+        JOIN orders o ON o.order_id = f.order_id;
+    """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP VIEW IF EXISTS v_order_finance;
+        CREATE VIEW v_order_finance AS
+        SELECT o.order_id,
+               o.customer_id,
+               o.order_date,
+               COALESCE(SUM(ol.qty*ol.unit_price*(1 - ol.discount_pct)),0) AS revenue,
+               COALESCE(SUM(ol.qty*p.std_cost),0) AS material_cost,
+               COALESCE((SELECT SUM(t.hours * e.hourly_rate) FROM timesheets t JOIN employees e ON t.emp_id = e.emp_id WHERE t.order_id = o.order_id),0) AS labor_cost,
+               COALESCE(SUM(ol.qty*ol.unit_price*(1 - ol.discount_pct)),0) - COALESCE(SUM(ol.qty*p.std_cost),0) - COALESCE((SELECT SUM(t.hours * e.hourly_rate) FROM timesheets t JOIN employees e ON t.emp_id = e.emp_id WHERE t.order_id = o.order_id),0) AS gross_margin
+        FROM orders o
+        LEFT JOIN order_lines ol ON o.order_id = ol.order_id
+        LEFT JOIN products p ON ol.product_id = p.product_id
+        GROUP BY o.order_id, o.customer_id, o.order_date;
+    """
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_order_finance_employee ON employees;")
+    op.execute("DROP TRIGGER IF EXISTS trg_order_finance_product ON products;")
+    op.execute("DROP TRIGGER IF EXISTS trg_order_finance_timesheet ON timesheets;")
+    op.execute("DROP TRIGGER IF EXISTS trg_order_finance_line ON order_lines;")
+    op.execute("DROP TRIGGER IF EXISTS trg_order_finance_order ON orders;")
+    for fn in ("employee", "product", "timesheet", "line", "order"):
+        op.execute(f"DROP FUNCTION IF EXISTS order_finance_{fn}_trg();")
+    op.execute("DROP TABLE IF EXISTS order_finance;")
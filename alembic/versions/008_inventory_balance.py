@@ -0,0 +1,102 @@
+"""On-hand inventory_balance table maintained from the inventory ledger
+
+Revision ID: 008_inventory_balance
+Revises: 007_order_finance
+Create Date: 2026-10-18 16:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "008_inventory_balance"
+down_revision = "007_order_finance"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS inventory_balance (
+            product_id text NOT NULL,
+            location text NOT NULL DEFAULT '',
+            lot text NOT NULL DEFAULT '',
+            qty_on_hand numeric(18,4) NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, location, lot)
+        );
+    """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION inventory_balance_trg() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE inventory_balance SET qty_on_hand = qty_on_hand - OLD.qty_change
+                WHERE product_id = OLD.product_id
+                  AND location = COALESCE(OLD.location, '') AND lot = COALESCE(OLD.lot, '');
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO inventory_balance (product_id, location, lot, qty_on_hand)
+                VALUES (NEW.product_id, COALESCE(NEW.location, ''), COALESCE(NEW.lot, ''), NEW.qty_change)
+                ON CONFLICT (product_id, location, lot)
+                DO UPDATE SET qty_on_hand = inventory_balance.qty_on_hand + EXCLUDED.qty_on_hand;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_inventory_balance ON inventory;
+        CREATE TRIGGER trg_inventory_balance
+            AFTER INSERT OR DELETE OR UPDATE OF product_id, qty_change, location, lot
+            ON inventory FOR EACH ROW EXECUTE FUNCTION inventory_balance_trg();
+    """
+    )
+    op.execute(
+        """
+        INSERT INTO inventory_balance (product_id, location, lot, qty_on_hand)
+        SELECT product_id, COALESCE(location, ''), COALESCE(lot, ''), SUM(qty_change)
+        FROM inventory
+        GROUP BY product_id, COALESCE(location, ''), COALESCE(lot, '')
+        ON CONFLICT (product_id, location, lot) DO NOTHING;
+    """
+    )
+    # one aggregate per product instead of three ledger scans per order line
+    op.execute(
+        """
+        CREATE OR REPLACE VIEW v_shortages AS
+        SELECT
+          ol.order_id,
+          ol.product_id AS component_id,
+          ol.qty AS required_qty,
+          COALESCE(b.qty_on_hand, 0) AS qty_on_hand,
+          CASE WHEN COALESCE(b.qty_on_hand, 0) < ol.qty
+               THEN ol.qty - COALESCE(b.qty_on_hand, 0)
+               ELSE 0 END AS shortage_qty
+        FROM order_lines ol
+        LEFT JOIN (
+          SELECT product_id, SUM(qty_on_hand) AS qty_on_hand
+          FROM inventory_balance
+          GROUP BY product_id
+        ) b ON b.product_id = ol.product_id;
+    """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE VIEW v_shortages AS
+        SELECT
+          ol.order_id,
+          ol.product_id AS component_id,
+          ol.qty AS required_qty,
+          COALESCE((SELECT SUM(i.qty_change) FROM inventory i WHERE i.product_id = ol.product_id),0) AS qty_on_hand,
+          CASE WHEN COALESCE((SELECT SUM(i.qty_change) FROM inventory i WHERE i.product_id = ol.product_id),0) < ol.qty
+               THEN ol.qty - COALESCE((SELECT SUM(i.qty_change) FROM inventory i WHERE i.product_id = ol.product_id),0)
+               ELSE 0 END AS shortage_qty
+        FROM order_lines ol;
+    """
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_inventory_balance ON inventory;")
+    op.execute("DROP FUNCTION IF EXISTS inventory_balance_trg();")
+    op.execute("DROP TABLE IF EXISTS inventory_balance;")
@@ -0,0 +1,62 @@
+"""Per-table write counters for in-process cache invalidation
+
+Revision ID: 009_table_versions
+Revises: 008_inventory_balance
+Create Date: 2026-10-18 18:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "009_table_versions"
+down_revision = "008_inventory_balance"
+branch_labels = None
+depends_on = None
+
+# table -> columns whose UPDATE matters (None: any)
+TRACKED = {
+    "inventory": None,
+    "order_lines": None,
+    "orders": "status, due_date, order_date",
+}
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name text PRIMARY KEY,
+            version bigint NOT NULL DEFAULT 0
+        );
+    """
+    )
+    # Statement-level, so a bulk import bumps the counter once; the new value
+    # becomes visible together with the data when the writer commits.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION table_versions_bump_trg() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """
+    )
+    for table, columns in TRACKED.items():
+        update = f"UPDATE OF {columns}" if columns else "UPDATE"
+        op.execute(
+            f"""
+            INSERT INTO table_versions (table_name) VALUES ('{table}') ON CONFLICT DO NOTHING;
+            DROP TRIGGER IF EXISTS trg_table_version ON {table};
+            CREATE TRIGGER trg_table_version
+                AFTER INSERT OR DELETE OR {update} ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION table_versions_bump_trg();
+        """
+        )
+
+
+def downgrade():
+    for table in TRACKED:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_table_version ON {table};")
+    op.execute("DROP FUNCTION IF EXISTS table_versions_bump_trg();")
+    op.execute("DROP TABLE IF EXISTS table_versions;")
@@ -0,0 +1,40 @@
+"""MRP requirements table and where-used index on bom
+
+Revision ID: 010_mrp_requirements
+Revises: 009_table_versions
+Create Date: 2026-10-18 19:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "010_mrp_requirements"
+down_revision = "009_table_versions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mrp_requirements (
+            run_id text NOT NULL,
+            product_id text NOT NULL,
+            llc integer NOT NULL,
+            independent_qty numeric(18,4) NOT NULL DEFAULT 0,
+            dependent_qty numeric(18,4) NOT NULL DEFAULT 0,
+            gross_qty numeric(18,4) NOT NULL DEFAULT 0,
+            on_hand numeric(18,4) NOT NULL DEFAULT 0,
+            net_qty numeric(18,4) NOT NULL DEFAULT 0,
+            generated_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (run_id, product_id)
+        );
+    """
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_bom_component ON bom(component_id);")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_bom_component;")
+    op.execute("DROP TABLE IF EXISTS mrp_requirements;")
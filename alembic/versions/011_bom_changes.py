@@ -0,0 +1,53 @@
+"""bom_changes log for where-used invalidation of cached BOM explosions
+
+Revision ID: 011_bom_changes
+Revises: 010_mrp_requirements
+Create Date: 2026-10-18 20:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "011_bom_changes"
+down_revision = "010_mrp_requirements"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bom_changes (
+            change_id bigserial PRIMARY KEY,
+            parent_product_id text NOT NULL,
+            changed_at timestamptz NOT NULL DEFAULT now()
+        );
+    """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bom_changes_trg() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO bom_changes (parent_product_id) VALUES (OLD.parent_product_id);
+            END IF;
+            IF TG_OP = 'INSERT'
+               OR (TG_OP = 'UPDATE' AND NEW.parent_product_id <> OLD.parent_product_id) THEN
+                INSERT INTO bom_changes (parent_product_id) VALUES (NEW.parent_product_id);
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_bom_changes ON bom;
+        CREATE TRIGGER trg_bom_changes
+            AFTER INSERT OR DELETE OR UPDATE ON bom
+            FOR EACH ROW EXECUTE FUNCTION bom_changes_trg();
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_bom_changes ON bom;")
+    op.execute("DROP FUNCTION IF EXISTS bom_changes_trg();")
+    op.execute("DROP TABLE IF EXISTS bom_changes;")
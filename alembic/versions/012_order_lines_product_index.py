@@ -0,0 +1,23 @@
+"""Index order_lines(product_id) for where-used impact lookups
+
+Revision ID: 012_order_lines_product_index
+Revises: 011_bom_changes
+Create Date: 2026-10-18 21:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "012_order_lines_product_index"
+down_revision = "011_bom_changes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS idx_order_lines_product ON order_lines(product_id);")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_order_lines_product;")
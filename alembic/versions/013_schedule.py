@@ -0,0 +1,43 @@
+"""Finite-capacity schedule table
+
+Revision ID: 013_schedule
+Revises: 012_order_lines_product_index
+Create Date: 2026-10-18 22:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "013_schedule"
+down_revision = "012_order_lines_product_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schedule (
+            order_id text NOT NULL,
+            line_no integer NOT NULL,
+            operation_no integer NOT NULL,
+            product_id text NOT NULL,
+            work_center text NOT NULL,
+            qty numeric(18,4) NOT NULL,
+            setup_min numeric(18,4) NOT NULL DEFAULT 0,
+            run_min numeric(18,4) NOT NULL DEFAULT 0,
+            start_ts timestamptz NOT NULL,
+            end_ts timestamptz NOT NULL,
+            due_date date,
+            late smallint NOT NULL DEFAULT 0,
+            PRIMARY KEY (order_id, line_no, operation_no)
+        );
+        CREATE INDEX IF NOT EXISTS idx_schedule_wc_start ON schedule(work_center, start_ts);
+        CREATE INDEX IF NOT EXISTS idx_schedule_start ON schedule(start_ts);
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS schedule;")
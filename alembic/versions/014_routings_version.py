@@ -0,0 +1,32 @@
+"""table_versions counter for routings (planned-time cache)
+
+Revision ID: 014_routings_version
+Revises: 013_schedule
+Create Date: 2026-10-18 23:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "014_routings_version"
+down_revision = "013_schedule"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        INSERT INTO table_versions (table_name) VALUES ('routings') ON CONFLICT DO NOTHING;
+        DROP TRIGGER IF EXISTS trg_table_version ON routings;
+        CREATE TRIGGER trg_table_version
+            AFTER INSERT OR DELETE OR UPDATE ON routings
+            FOR EACH STATEMENT EXECUTE FUNCTION table_versions_bump_trg();
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_table_version ON routings;")
+    op.execute("DELETE FROM table_versions WHERE table_name = 'routings';")
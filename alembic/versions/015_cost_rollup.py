@@ -0,0 +1,63 @@
+"""Work-center rates and versioned product cost roll-up tables
+
+Revision ID: 015_cost_rollup
+Revises: 014_routings_version
+Create Date: 2026-10-19 09:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "015_cost_rollup"
+down_revision = "014_routings_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS work_centers (
+            work_center text PRIMARY KEY,
+            hourly_rate numeric(18,4) NOT NULL DEFAULT 0
+        );
+        INSERT INTO work_centers (work_center, hourly_rate)
+        SELECT DISTINCT work_center, 0 FROM routings
+        ON CONFLICT DO NOTHING;
+
+        CREATE TABLE IF NOT EXISTS cost_rollups (
+            version bigserial PRIMARY KEY,
+            kind text NOT NULL,
+            products integer NOT NULL DEFAULT 0,
+            created_at timestamptz NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS product_costs (
+            product_id text NOT NULL,
+            version bigint NOT NULL REFERENCES cost_rollups(version) ON DELETE CASCADE,
+            llc integer NOT NULL DEFAULT 0,
+            material_cost numeric(18,6) NOT NULL DEFAULT 0,
+            labor_cost numeric(18,6) NOT NULL DEFAULT 0,
+            total_cost numeric(18,6) NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, version)
+        );
+    """
+    )
+    # latest version per product: one backward index scan on the primary key
+    op.execute(
+        """
+        CREATE OR REPLACE VIEW v_product_costs AS
+        SELECT DISTINCT ON (product_id)
+               product_id, version, llc, material_cost, labor_cost, total_cost
+        FROM product_costs
+        ORDER BY product_id, version DESC;
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP VIEW IF EXISTS v_product_costs;")
+    op.execute("DROP TABLE IF EXISTS product_costs;")
+    op.execute("DROP TABLE IF EXISTS cost_rollups;")
+    op.execute("DROP TABLE IF EXISTS work_centers;")
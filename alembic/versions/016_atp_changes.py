@@ -0,0 +1,84 @@
+"""atp_changes log for incremental available-to-promise buckets
+
+Revision ID: 016_atp_changes
+Revises: 015_cost_rollup
+Create Date: 2026-10-19 11:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "016_atp_changes"
+down_revision = "015_cost_rollup"
+branch_labels = None
+depends_on = None
+
+# Statement-level with transition tables, so a bulk import logs each product once.
+EVENTS = {
+    "ins": ("INSERT", "NEW TABLE AS new_rows", "SELECT product_id FROM new_rows"),
+    "del": ("DELETE", "OLD TABLE AS old_rows", "SELECT product_id FROM old_rows"),
+    "upd": (
+        "UPDATE",
+        "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        "SELECT product_id FROM old_rows UNION SELECT product_id FROM new_rows",
+    ),
+}
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS atp_changes (
+            change_id bigserial PRIMARY KEY,
+            product_id text NOT NULL,
+            changed_at timestamptz NOT NULL DEFAULT now()
+        );
+    """
+    )
+    for suffix, (event, referencing, select) in EVENTS.items():
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION atp_changes_{suffix}_trg() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO atp_changes (product_id) SELECT DISTINCT product_id FROM ({select}) c;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql;
+        """
+        )
+        for table in ("inventory", "order_lines"):
+            op.execute(
+                f"""
+                DROP TRIGGER IF EXISTS trg_atp_changes_{suffix} ON {table};
+                CREATE TRIGGER trg_atp_changes_{suffix}
+                    AFTER {event} ON {table}
+                    REFERENCING {referencing}
+                    FOR EACH STATEMENT EXECUTE FUNCTION atp_changes_{suffix}_trg();
+            """
+            )
+    # a status or due-date change moves (or releases) the demand of every line of the order
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION atp_changes_orders_trg() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO atp_changes (product_id)
+            SELECT DISTINCT product_id FROM order_lines WHERE order_id = OLD.order_id;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_atp_changes ON orders;
+        CREATE TRIGGER trg_atp_changes
+            AFTER DELETE OR UPDATE OF status, due_date ON orders
+            FOR EACH ROW EXECUTE FUNCTION atp_changes_orders_trg();
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_atp_changes ON orders;")
+    op.execute("DROP FUNCTION IF EXISTS atp_changes_orders_trg();")
+    for suffix in EVENTS:
+        for table in ("inventory", "order_lines"):
+            op.execute(f"DROP TRIGGER IF EXISTS trg_atp_changes_{suffix} ON {table};")
+        op.execute(f"DROP FUNCTION IF EXISTS atp_changes_{suffix}_trg();")
+    op.execute("DROP TABLE IF EXISTS atp_changes;")
@@ -0,0 +1,49 @@
+"""import_jobs table for background CSV imports
+
+Revision ID: 017_import_jobs
+Revises: 016_atp_changes
+Create Date: 2026-10-19 13:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "017_import_jobs"
+down_revision = "016_atp_changes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            job_id text PRIMARY KEY,
+            entity_type text NOT NULL,
+            filename text,
+            spool_path text NOT NULL,
+            batch_size integer NOT NULL,
+            status text NOT NULL DEFAULT 'queued',
+            cancel_requested integer NOT NULL DEFAULT 0,
+            batches_done integer NOT NULL DEFAULT 0,
+            rows_processed bigint NOT NULL DEFAULT 0,
+            rows_imported bigint NOT NULL DEFAULT 0,
+            error_count bigint NOT NULL DEFAULT 0,
+            errors text,
+            last_error text,
+            worker_id text,
+            created_by text,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            started_ts double precision,
+            heartbeat_ts double precision,
+            finished_ts double precision,
+            active_seconds double precision NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs (status, created_at);
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS import_jobs;")
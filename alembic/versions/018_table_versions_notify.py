@@ -0,0 +1,45 @@
+"""table_versions triggers notify instead of updating a shared counter row
+
+Revision ID: 018_table_versions_notify
+Revises: 017_import_jobs
+Create Date: 2026-10-19 15:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "018_table_versions_notify"
+down_revision = "017_import_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The UPDATE of the per-table row held its lock until commit, so every
+    # writer to a tracked table queued behind the previous one (and writers
+    # touching two tracked tables in opposite order could deadlock).
+    # pg_notify() takes no row lock and is delivered once the writer commits;
+    # db.TABLE_VERSIONS turns the notifications into per-process counters.
+    # The existing statement-level triggers keep calling this function.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION table_versions_bump_trg() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('table_versions', TG_TABLE_NAME);
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION table_versions_bump_trg() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """
+    )
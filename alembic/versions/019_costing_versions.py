@@ -0,0 +1,41 @@
+"""table_versions counters for bom, work_centers and products.std_cost (cost roll-up)
+
+Revision ID: 019_costing_versions
+Revises: 018_table_versions_notify
+Create Date: 2026-10-19 17:00:00
+
+"""
+
+from alembic import op
+
+
+revision = "019_costing_versions"
+down_revision = "018_table_versions_notify"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        INSERT INTO table_versions (table_name) VALUES ('bom'), ('work_centers'), ('products') ON CONFLICT DO NOTHING;
+        DROP TRIGGER IF EXISTS trg_table_version ON bom;
+        CREATE TRIGGER trg_table_version
+            AFTER INSERT OR DELETE OR UPDATE ON bom
+            FOR EACH STATEMENT EXECUTE FUNCTION table_versions_bump_trg();
+        DROP TRIGGER IF EXISTS trg_table_version ON work_centers;
+        CREATE TRIGGER trg_table_version
+            AFTER INSERT OR DELETE OR UPDATE ON work_centers
+            FOR EACH STATEMENT EXECUTE FUNCTION table_versions_bump_trg();
+        DROP TRIGGER IF EXISTS trg_table_version ON products;
+        CREATE TRIGGER trg_table_version
+            AFTER INSERT OR DELETE OR UPDATE OF std_cost ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION table_versions_bump_trg();
+    """
+    )
+
+
+def downgrade():
+    for table in ("products", "work_centers", "bom"):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_table_version ON {table};")
+    op.execute("DELETE FROM table_versions WHERE table_name IN ('bom', 'work_centers', 'products');")
@@ -0,0 +1,225 @@
+"""
+Write-behind buffer for API key usage tracking.
+
+Successful DB-key authentications used to do two synchronous writes per request
+(`auth.mark_last_used` + a "used" audit row). The buffer coalesces last_used per
+key and batches "used" events into multi-row inserts, flushed:
+  - every APIKEY_USAGE_FLUSH_INTERVAL seconds by a background thread,
+  - as soon as APIKEY_USAGE_BUFFER_MAX events are pending,
+  - at application shutdown.
+
+Events of keys deleted before the flush are dropped by the insert itself, so
+they cannot hold back the rest of the batch (api_key_audit.api_key_id is a
+foreign key on Postgres).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from db import execute, transaction, _get_pool
+from logging_utils import logger
+from metrics import Histogram, gauge_lines, counter_lines, register_collector
+
+# rows per multi-row INSERT (keeps sqlite well under its bound-variable limit)
+INSERT_CHUNK = 200
+
+# rows whose key no longer exists are filtered out instead of violating the FK
+SQL_INSERT_AUDIT = (
+    "INSERT INTO api_key_audit (api_key_id, event_type, event_by, event_time) "
+    "SELECT v.column1, v.column2, v.column3, v.column4 FROM (VALUES {values}) AS v "
+    "WHERE EXISTS (SELECT 1 FROM api_keys k WHERE k.id = v.column1)"
+)
+
+
+def _is_integrity_error(exc: Exception) -> bool:
+    # sqlite3, psycopg and psycopg2 all name the DB-API class IntegrityError
+    return any(cls.__name__ == "IntegrityError" for cls in type(exc).__mro__)
+
+
+class ApiKeyUsageBuffer:
+    def __init__(
+        self,
+        flush_interval: float = settings.APIKEY_USAGE_FLUSH_INTERVAL,
+        max_pending: int = settings.APIKEY_USAGE_BUFFER_MAX,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._last_used: Dict[Any, datetime] = {}
+        self._events: List[Tuple[Any, str, Optional[str], datetime]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flush_seconds = Histogram(
+            "api_key_usage_flush_seconds", "Latency of API key usage buffer flushes"
+        )
+        self.flushed_events = 0
+        self.dropped_events = 0
+        self.failed_flushes = 0
+
+    # ---- producer side ----
+
+    def record(self, api_key_id: Any, event_by: Optional[str] = "api") -> None:
+        """Record one successful authentication. Never touches the database."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._last_used[api_key_id] = now
+            self._events.append((api_key_id, "used", event_by, now))
+            full = len(self._events) >= self.max_pending
+        if full:
+            if self.running:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            return {"events": len(self._events), "keys": len(self._last_used)}
+
+    # ---- consumer side ----
+
+    def flush(self) -> int:
+        """Write pending usage to the database. Returns the number of events written."""
+        with self._flush_lock:
+            with self._lock:
+                last_used, self._last_used = self._last_used, {}
+                events, self._events = self._events, []
+            if not last_used and not events:
+                return 0
+            start = time.perf_counter()
+            try:
+                self._write(last_used, events)
+            except Exception as exc:
+                self.failed_flushes += 1
+                if _is_integrity_error(exc):
+                    # retrying the same rows fails the same way and would block every later flush
+                    logger.error(f"API key usage flush rejected, dropping {len(events)} events: {exc}")
+                    self.dropped_events += len(events)
+                    self._requeue(last_used, [])
+                    return 0
+                logger.warning(f"API key usage flush failed, re-queueing: {exc}")
+                self._requeue(last_used, events)
+                return 0
+            finally:
+                self.flush_seconds.observe(time.perf_counter() - start)
+            self.flushed_events += len(events)
+            return len(events)
+
+    def _requeue(self, last_used: Dict[Any, datetime], events: List[Tuple]) -> None:
+        with self._lock:
+            for key_id, ts in last_used.items():
+                if key_id not in self._last_used or self._last_used[key_id] < ts:
+                    self._last_used[key_id] = ts
+            merged = events + self._events
+            # bound memory while the DB is unavailable: keep the newest events
+            cap = self.max_pending * 10
+            if len(merged) > cap:
+                self.dropped_events += len(merged) - cap
+                merged = merged[-cap:]
+            self._events = merged
+
+    def _write(self, last_used: Dict[Any, datetime], events: List[Tuple]) -> None:
+        sqlite = _get_pool() is None
+
+        def _ts(value: datetime):
+            # sqlite stores UTC timestamps as text in the datetime('now') format;
+            # Postgres gets the aware value, so timestamptz does not depend on the session TimeZone
+            return value.strftime("%Y-%m-%d %H:%M:%S") if sqlite else value
+
+        # one transaction: a failed flush is re-queued whole, so nothing may
+        # have been committed by then (a partial write would duplicate audit rows)
+        with transaction() as conn:
+            if last_used:
+                cases = " ".join("WHEN %s THEN %s" for _ in last_used)
+                params: List[Any] = []
+                for key_id, ts in last_used.items():
+                    params.extend((key_id, _ts(ts)))
+                placeholders = ", ".join("%s" for _ in last_used)
+                params.extend(last_used.keys())
+                execute(
+                    f"UPDATE api_keys SET last_used = CASE id {cases} END "
+                    f"WHERE id IN ({placeholders})",
+                    tuple(params),
+                    conn=conn,
+                )
+
+            for i in range(0, len(events), INSERT_CHUNK):
+                chunk = events[i : i + INSERT_CHUNK]
+                values = ", ".join("(%s, %s, %s, %s)" for _ in chunk)
+                params = []
+                for key_id, event_type, event_by, ts in chunk:
+                    params.extend((key_id, event_type, event_by, _ts(ts)))
+                execute(SQL_INSERT_AUDIT.format(values=values), tuple(params), conn=conn)
+
+    # ---- lifecycle ----
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="api-key-usage-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher thread and write whatever is still pending."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.flush_interval, 1.0) * 2)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.error("API key usage flusher crashed", exc_info=True)
+
+
+USAGE_BUFFER = ApiKeyUsageBuffer()
+
+
+def record_api_key_use(api_key_id: Any, event_by: Optional[str] = "api") -> None:
+    USAGE_BUFFER.record(api_key_id, event_by)
+
+
+@register_collector
+def _usage_metrics() -> List[str]:
+    depth = USAGE_BUFFER.depth()
+    lines = gauge_lines(
+        "api_key_usage_buffer_events",
+        "Pending 'used' audit events in the write-behind buffer",
+        depth["events"],
+    )
+    lines += gauge_lines(
+        "api_key_usage_buffer_keys",
+        "Keys with a pending last_used update",
+        depth["keys"],
+    )
+    lines += counter_lines(
+        "api_key_usage_flushed_events_total",
+        "Usage events written by the write-behind buffer",
+        USAGE_BUFFER.flushed_events,
+    )
+    lines += counter_lines(
+        "api_key_usage_dropped_events_total",
+        "Usage events dropped while the database was unavailable",
+        USAGE_BUFFER.dropped_events,
+    )
+    lines += USAGE_BUFFER.flush_seconds.render()
+    return lines
@@ -0,0 +1,269 @@
+"""
+Available-to-promise from time-phased supply and demand buckets kept in memory.
+
+Per product the engine holds two day-bucket arrays over ATP_HORIZON_DAYS
+starting today (the database's CURRENT_DATE), plus one extra bucket for
+everything past the horizon:
+
+    supply[d]  receipts due on day d: future-dated `inventory` txns (e.g. PO
+               receipts booked ahead with their expected date)
+    demand[d]  open order_lines due on day d; overdue lines and lines without
+               a due date are due today
+
+and on_hand = inventory_balance - all future-dated txns. Then
+
+    projected[d] = on_hand + cumsum(supply - demand)[d]
+    atp[d]       = min(projected[d:])
+
+i.e. what can still be promised on day d without uncovering a later
+commitment. `check()` is O(buckets) and reads only memory.
+
+Triggers append the product of every changed inventory/order_lines row (and
+all products of an order whose status or due date changed) to `atp_changes`.
+The engine polls that log at most every ATP_SYNC_INTERVAL seconds and
+rebuilds the buckets of just those products (ids skipped by out-of-order
+commits are re-read, see change_log.py). A new day, a pruned log or a very
+large change set triggers a full reload.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from change_log import ChangeLogCursor
+from config import settings
+from db import execute, fetch_all, fetch_one
+from metrics import counter_lines, gauge_lines, register_collector
+from netting import CLOSED_STATUSES
+
+# changed products above this count are cheaper to reload in one pass
+MAX_INCREMENTAL_PRODUCTS = 500
+
+SQL_ATP_LOG_STATE = (
+    "SELECT CURRENT_DATE AS today, MIN(change_id) AS first_id, MAX(change_id) AS last_id FROM atp_changes"
+)
+SQL_ATP_BALANCE = """
+SELECT product_id, SUM(qty_on_hand) AS qty
+FROM inventory_balance
+WHERE {products}
+GROUP BY product_id
+"""
+SQL_ATP_RECEIPTS = """
+SELECT product_id, txn_date AS day, SUM(qty_change) AS qty
+FROM inventory
+WHERE txn_date > CURRENT_DATE AND {products}
+GROUP BY product_id, txn_date
+"""
+SQL_ATP_DEMAND = f"""
+SELECT ol.product_id, o.due_date AS day, SUM(ol.qty) AS qty
+FROM order_lines ol
+JOIN orders o ON o.order_id = ol.order_id
+WHERE o.status NOT IN ({", ".join(f"'{s}'" for s in CLOSED_STATUSES)}) AND {{products}}
+GROUP BY ol.product_id, o.due_date
+"""
+
+
+def _as_date(value: Any) -> Optional[date]:
+    # sqlite returns ISO strings, Postgres date objects
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _product_filter(column: str, product_ids: Optional[List[str]]) -> str:
+    if product_ids is None:
+        return "1 = 1"
+    return f"{column} IN ({', '.join('%s' for _ in product_ids)})"
+
+
+class ProductBuckets:
+    __slots__ = ("on_hand", "supply", "demand")
+
+    def __init__(self, buckets: int):
+        self.on_hand = 0.0
+        self.supply = np.zeros(buckets, dtype=np.float64)
+        self.demand = np.zeros(buckets, dtype=np.float64)
+
+    def available(self) -> np.ndarray:
+        """ATP per bucket: the minimum projected balance from that day on."""
+        projected = self.on_hand + np.cumsum(self.supply - self.demand)
+        return np.minimum.accumulate(projected[::-1])[::-1]
+
+
+class AtpEngine:
+    def __init__(self, horizon_days: Optional[int] = None, sync_interval: Optional[float] = None):
+        self.horizon = max(int(settings.ATP_HORIZON_DAYS if horizon_days is None else horizon_days), 1)
+        self.sync_interval = settings.ATP_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self.today: Optional[date] = None
+        self._buckets: Dict[str, ProductBuckets] = {}
+        self._changes = ChangeLogCursor("atp_changes", "product_id")
+        self._next_sync = 0.0
+        self._lock = threading.RLock()
+        self.checks = 0
+        self.full_reloads = 0
+        self.product_reloads = 0
+
+    # ------------------------------------------------------------------ reads
+    def check(self, product_id: str, qty: float, on_date: Optional[date] = None) -> Dict[str, Any]:
+        """Can `qty` of `product_id` be promised for `on_date` (default today)?"""
+        self.sync()
+        with self._lock:
+            today = self.today
+            buckets = self._buckets.get(product_id) or ProductBuckets(self.horizon + 1)
+            available = buckets.available()
+            supply, demand, on_hand = buckets.supply.copy(), buckets.demand.copy(), buckets.on_hand
+        self.checks += 1
+        on_date = on_date or today
+        day = min(max((on_date - today).days, 0), self.horizon)
+        atp_qty = max(float(available[day]), 0.0)
+        # available is non-decreasing, so the first bucket that covers qty is the earliest date
+        covering = np.flatnonzero(available >= qty - 1e-9)
+        earliest = None
+        if len(covering) and covering[0] < self.horizon:
+            earliest = today + timedelta(days=int(covering[0]))
+        return {
+            "product_id": product_id,
+            "date": on_date.isoformat(),
+            "qty": qty,
+            "available": round(atp_qty, 6),
+            "can_promise": atp_qty >= qty - 1e-9,
+            "earliest_date": None if earliest is None else earliest.isoformat(),
+            "on_hand": round(on_hand, 6),
+            "receipts_to_date": round(float(supply[: day + 1].sum()), 6),
+            "allocated_to_date": round(float(demand[: day + 1].sum()), 6),
+            "horizon_end": (today + timedelta(days=self.horizon - 1)).isoformat(),
+        }
+
+    def buckets(self, product_id: str) -> List[Dict[str, Any]]:
+        """Non-empty day buckets of one product with the ATP on each of those days."""
+        self.sync()
+        with self._lock:
+            today = self.today
+            buckets = self._buckets.get(product_id) or ProductBuckets(self.horizon + 1)
+            available = buckets.available()
+            days = np.flatnonzero((buckets.supply != 0) | (buckets.demand != 0))
+            return [
+                {
+                    "date": None if d == self.horizon else (today + timedelta(days=int(d))).isoformat(),
+                    "receipts": float(buckets.supply[d]),
+                    "allocated": float(buckets.demand[d]),
+                    "available": max(float(available[d]), 0.0),
+                }
+                for d in days.tolist()
+            ]
+
+    # ----------------------------------------------------------- invalidation
+    def sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and self.today is not None and now < self._next_sync:
+            return
+        with self._lock:
+            state = fetch_one(SQL_ATP_LOG_STATE) or {}
+            today = _as_date(state.get("today"))
+            first_id, last_id = int(state.get("first_id") or 0), int(state.get("last_id") or 0)
+            rows = None if self.today != today else self._changes.poll((first_id, last_id))
+            if rows is None:
+                # new day (every bucket shifts) or log pruned past rows we have not seen
+                self._reload(today, (first_id, last_id))
+            elif rows:
+                self._apply_changes(today, rows)
+            if first_id and last_id - first_id >= settings.ATP_CHANGES_RETAIN:
+                prune_changes()
+            self._next_sync = time.monotonic() + self.sync_interval
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.today = None
+            self._buckets = {}
+
+    def _reload(self, today: date, bounds: Optional[Tuple[int, int]] = None) -> None:
+        # the log position is taken before the rows: changes racing with the load are replayed later
+        self._changes.reset(bounds)
+        self._buckets = self._load(today, None)
+        self.today = today
+        self.full_reloads += 1
+
+    def _apply_changes(self, today: date, rows: List[Dict[str, Any]]) -> None:
+        changed = list(dict.fromkeys(r["product_id"] for r in rows))
+        if len(changed) > MAX_INCREMENTAL_PRODUCTS:
+            self._reload(today)
+            return
+        if changed:
+            fresh = self._load(today, changed)
+            for product_id in changed:
+                if product_id in fresh:
+                    self._buckets[product_id] = fresh[product_id]
+                else:
+                    self._buckets.pop(product_id, None)
+            self.product_reloads += len(changed)
+
+    def _load(self, today: date, product_ids: Optional[List[str]]) -> Dict[str, ProductBuckets]:
+        params: Tuple = tuple(product_ids or ())
+        balances = fetch_all(SQL_ATP_BALANCE.format(products=_product_filter("product_id", product_ids)), params) or []
+        receipts = fetch_all(SQL_ATP_RECEIPTS.format(products=_product_filter("product_id", product_ids)), params) or []
+        demand = fetch_all(SQL_ATP_DEMAND.format(products=_product_filter("ol.product_id", product_ids)), params) or []
+        out: Dict[str, ProductBuckets] = {}
+
+        def get(product_id: str) -> ProductBuckets:
+            buckets = out.get(product_id)
+            if buckets is None:
+                buckets = out[product_id] = ProductBuckets(self.horizon + 1)
+            return buckets
+
+        for r in balances:
+            get(r["product_id"]).on_hand += float(r["qty"] or 0)
+        for r in receipts:
+            qty = float(r["qty"] or 0)
+            buckets = get(r["product_id"])
+            # the balance already counts receipts booked ahead; on_hand is what is in stock today
+            buckets.on_hand -= qty
+            buckets.supply[self._bucket(today, r["day"])] += qty
+        for r in demand:
+            get(r["product_id"]).demand[self._bucket(today, r["day"])] += float(r["qty"] or 0)
+        return out
+
+    def _bucket(self, today: date, value: Any) -> int:
+        day = _as_date(value)
+        if day is None:
+            return 0
+        return min(max((day - today).days, 0), self.horizon)
+
+    @property
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+ATP = AtpEngine()
+
+
+def check(product_id: str, qty: float, on_date: Optional[date] = None) -> Dict[str, Any]:
+    return ATP.check(product_id, qty, on_date)
+
+
+def prune_changes(retain: Optional[int] = None, conn: Any = None) -> None:
+    """Keep only the newest `retain` atp_changes rows."""
+    retain = settings.ATP_CHANGES_RETAIN if retain is None else retain
+    execute(
+        "DELETE FROM atp_changes WHERE change_id <= (SELECT MAX(change_id) FROM atp_changes) - %s",
+        (retain,),
+        conn=conn,
+    )
+
+
+@register_collector
+def _atp_metrics() -> List[str]:
+    lines: List[str] = []
+    lines += counter_lines("atp_checks_total", "Available-to-promise checks answered from memory", ATP.checks)
+    lines += counter_lines("atp_full_reloads_total", "Full reloads of the ATP buckets", ATP.full_reloads)
+    lines += counter_lines("atp_product_reloads_total", "Per-product ATP bucket reloads", ATP.product_reloads)
+    lines += gauge_lines("atp_products", "Products with ATP buckets in memory", ATP.size)
+    return lines
@@ -1,17 +1,23 @@
 import os
 import binascii
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
 import hashlib
+import hmac
 import secrets
 import json
 
 from db import fetch_all, fetch_one, execute
+from statements import register
 
 SQL_CREATE_API_KEYS_TABLE = """
 CREATE TABLE IF NOT EXISTS api_keys (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   key_text text,
+  key_prefix text,
   key_hash text,
   salt text,
   label text,
@@ -37,6 +43,7 @@ SQL_CREATE_API_KEYS_TABLE_PG = """
 CREATE TABLE IF NOT EXISTS api_keys (
   id SERIAL PRIMARY KEY,
   key_text text,
+  key_prefix text,
   key_hash text,
   salt text,
   label text,
@@ -57,10 +64,20 @@ CREATE TABLE IF NOT EXISTS api_key_audit (
 );
 """
 
+# Lookup prefix column + index for prefixed keys (existing databases)
+SQL_ADD_KEY_PREFIX_COLUMN = "ALTER TABLE api_keys ADD COLUMN key_prefix text;"
+SQL_ADD_KEY_PREFIX_COLUMN_PG = (
+    "ALTER TABLE api_keys ADD COLUMN IF NOT EXISTS key_prefix text;"
+)
+SQL_CREATE_KEY_PREFIX_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS ux_api_keys_key_prefix
+ON api_keys(key_prefix) WHERE key_prefix IS NOT NULL;
+"""
+
 SQL_INSERT_API_KEY = """
-INSERT INTO api_keys (key_text, key_hash, salt, label, created_at, active)
-VALUES (%s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), COALESCE(%s, 1))
-RETURNING id, key_text, label, created_at, active;
+INSERT INTO api_keys (key_text, key_prefix, key_hash, salt, label, created_at, active)
+VALUES (%s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), COALESCE(%s, 1))
+RETURNING id, key_text, key_prefix, label, created_at, active;
 """
 
 # For audit inserts do not rely on RETURNING to keep sqlite compatible
@@ -69,15 +86,20 @@ INSERT INTO api_key_audit (api_key_id, event_type, event_by, details) VALUES (%s
 """
 
 SQL_LIST_API_KEYS = """
-SELECT id, key_text, label, created_at, active, last_used FROM api_keys ORDER BY created_at DESC;
+SELECT id, key_text, key_prefix, label, created_at, active, last_used FROM api_keys ORDER BY created_at DESC;
 """
 
 SQL_GET_API_KEY_BY_KEYTEXT = """
 SELECT id, key_text, key_hash, salt, label, created_at, active, last_used FROM api_keys WHERE key_text = %s AND active = 1 LIMIT 1;
 """
 
+SQL_GET_API_KEY_BY_PREFIX = register("get_api_key_by_prefix", """
+SELECT id, key_text, key_prefix, key_hash, salt, label, created_at, active, last_used FROM api_keys WHERE key_prefix = %s AND active = 1 LIMIT 1;
+""", arity=1)
+
+# Legacy keys issued before lookup prefixes existed: scan only those rows
 SQL_GET_API_KEY_BY_HASH = """
-SELECT id, key_text, key_hash, salt, label, created_at, active, last_used FROM api_keys WHERE active = 1;
+SELECT id, key_text, key_hash, salt, label, created_at, active, last_used FROM api_keys WHERE active = 1 AND key_prefix IS NULL;
 """
 
 SQL_DELETE_API_KEY_BY_ID = """
@@ -103,6 +125,86 @@ HASH_NAME = "sha256"
 SALT_BYTES = 16
 KEY_BYTES = 32
 
+# key format: sk_<public lookup prefix>_<secret>
+KEY_SCHEME = "sk"
+PREFIX_BYTES = 6
+
+# verified-key cache (bounded LRU with TTL)
+KEY_CACHE_SIZE = int(os.getenv("APIKEY_CACHE_SIZE", "256"))
+KEY_CACHE_TTL = float(os.getenv("APIKEY_CACHE_TTL", "300"))
+
+
+class VerifiedKeyCache:
+    """Bounded LRU of recently verified API keys with a per-entry TTL.
+
+    Entries are keyed by a SHA-256 digest of the presented key so the plaintext
+    never sits in memory; values are the api_keys row that matched.
+    """
+
+    def __init__(self, max_size: int = KEY_CACHE_SIZE, ttl: float = KEY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(plaintext: str) -> str:
+        return hashlib.sha256(plaintext.encode("utf-8")).hexdigest()
+
+    def get(self, plaintext: str) -> Optional[Dict[str, Any]]:
+        if self.max_size <= 0:
+            return None
+        digest = self._digest(plaintext)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, row = entry
+            if expires_at < time.monotonic():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return dict(row)
+
+    def put(self, plaintext: str, row: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        digest = self._digest(plaintext)
+        with self._lock:
+            self._entries[digest] = (time.monotonic() + self.ttl, dict(row))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key_id: Any) -> None:
+        """Drop every cached entry that resolved to the given api_keys.id."""
+        with self._lock:
+            stale = [d for d, (_, row) in self._entries.items() if row.get("id") == key_id]
+            for digest in stale:
+                del self._entries[digest]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+KEY_CACHE = VerifiedKeyCache()
+
 
 def ensure_table():
     """Ensure the required API keys and audit tables exist in the database (Postgres path).
@@ -117,10 +219,17 @@ def ensure_table():
             # sqlite fallback (also created during DB init, but keep idempotent)
             execute(SQL_CREATE_API_KEYS_TABLE)
             execute(SQL_CREATE_API_KEY_AUDIT_TABLE)
+            try:
+                # sqlite has no ADD COLUMN IF NOT EXISTS; fails harmlessly when present
+                execute(SQL_ADD_KEY_PREFIX_COLUMN)
+            except Exception:
+                pass
         else:
             # Postgres DDL
             execute(SQL_CREATE_API_KEYS_TABLE_PG)
             execute(SQL_CREATE_API_KEY_AUDIT_TABLE_PG)
+            execute(SQL_ADD_KEY_PREFIX_COLUMN_PG)
+        execute(SQL_CREATE_KEY_PREFIX_INDEX)
     except Exception:
         # If DB is not available or SQL dialect mismatch, ignore and rely on sqlite init
         pass
@@ -140,7 +249,24 @@ def _verify_key(plaintext: str, stored_hash_hex: str, salt_hex: str) -> bool:
     dk = hashlib.pbkdf2_hmac(
         HASH_NAME, plaintext.encode("utf-8"), salt, PBKDF2_ITERATIONS, dklen=KEY_BYTES
     )
-    return binascii.hexlify(dk).decode("ascii") == stored_hash_hex
+    return hmac.compare_digest(binascii.hexlify(dk).decode("ascii"), stored_hash_hex)
+
+
+def _new_plaintext_key() -> Tuple[str, str]:
+    """Generate a new key in the prefixed format. Returns (plaintext, prefix)."""
+    prefix = secrets.token_hex(PREFIX_BYTES)
+    return f"{KEY_SCHEME}_{prefix}_{secrets.token_urlsafe(32)}", prefix
+
+
+def _parse_key_prefix(plaintext: str) -> Optional[str]:
+    """Return the public lookup prefix of a prefixed key, or None for legacy keys."""
+    parts = plaintext.split("_", 2)
+    if len(parts) != 3 or parts[0] != KEY_SCHEME:
+        return None
+    prefix = parts[1]
+    if len(prefix) != PREFIX_BYTES * 2 or not all(c in "0123456789abcdef" for c in prefix):
+        return None
+    return prefix
 
 
 def create_api_key(
@@ -153,24 +279,28 @@ def create_api_key(
     """
     from db import _get_pool
 
-    plaintext = secrets.token_urlsafe(32)
+    plaintext, prefix = _new_plaintext_key()
     key_hash, salt = _hash_key(plaintext)
 
     if _get_pool() is None:
         # sqlite: use ? placeholders and datetime('now') instead of now()
         sql = """
-        INSERT INTO api_keys (key_text, key_hash, salt, label, created_at, active)
-        VALUES (?, ?, ?, ?, COALESCE(?, datetime('now')), COALESCE(?, 1));
+        INSERT INTO api_keys (key_text, key_prefix, key_hash, salt, label, created_at, active)
+        VALUES (?, ?, ?, ?, ?, COALESCE(?, datetime('now')), COALESCE(?, 1));
         """
         try:
-            execute(sql, (None, key_hash, salt, label, created_at, 1), returning=False)
+            execute(
+                sql,
+                (None, prefix, key_hash, salt, label, created_at, 1),
+                returning=False,
+            )
         except Exception:
             # best-effort insert; continue
             pass
         # fetch the inserted row by hash+salt
         try:
             row = fetch_one(
-                "SELECT id, key_text, label, created_at, active FROM api_keys WHERE key_hash = ? AND salt = ? LIMIT 1",
+                "SELECT id, key_text, key_prefix, label, created_at, active FROM api_keys WHERE key_hash = ? AND salt = ? LIMIT 1",
                 (key_hash, salt),
             )
         except Exception:
@@ -179,7 +309,7 @@ def create_api_key(
         # Postgres path: use parametrized SQL with RETURNING
         rows = execute(
             SQL_INSERT_API_KEY,
-            (None, key_hash, salt, label, created_at, active),
+            (None, prefix, key_hash, salt, label, created_at, active),
             returning=True,
         )
         row = rows[0] if rows else None
@@ -195,6 +325,27 @@ def list_api_keys():
 
 
 def get_api_key(key_text_or_plain: str):
+    cached = KEY_CACHE.get(key_text_or_plain)
+    if cached:
+        return cached
+
+    # Prefixed keys: one indexed lookup and at most one PBKDF2 verification
+    prefix = _parse_key_prefix(key_text_or_plain)
+    if prefix:
+        try:
+            row = fetch_one(SQL_GET_API_KEY_BY_PREFIX, (prefix,))
+            if (
+                row
+                and row.get("key_hash")
+                and row.get("salt")
+                and _verify_key(key_text_or_plain, row["key_hash"], row["salt"])
+            ):
+                KEY_CACHE.put(key_text_or_plain, row)
+                return row
+        except Exception:
+            pass
+        return None
+
     # First try to find by literal key_text (legacy or stored)
     row = None
     try:
@@ -204,12 +355,13 @@ def get_api_key(key_text_or_plain: str):
     except Exception:
         pass
 
-    # Otherwise, fetch all active keys with salt/hash and verify
+    # Otherwise, verify against the legacy (unprefixed) hashed keys
     try:
         rows = fetch_all(SQL_GET_API_KEY_BY_HASH)
         for r in rows:
             if r.get("key_hash") and r.get("salt"):
                 if _verify_key(key_text_or_plain, r["key_hash"], r["salt"]):
+                    KEY_CACHE.put(key_text_or_plain, r)
                     return r
     except Exception:
         pass
@@ -234,6 +386,8 @@ def delete_api_key_by_id(key_id: int):
             return rows[0] if rows else None
     except Exception:
         return None
+    finally:
+        KEY_CACHE.invalidate(key_id)
 
 
 def delete_api_key_by_keytext(key_text: str):
@@ -269,6 +423,7 @@ def rotate_api_key(key_id: int, by: Optional[str] = None) -> Dict[str, Any]:
         execute("UPDATE api_keys SET active = 0 WHERE id = %s", (key_id,))
     except Exception:
         pass
+    KEY_CACHE.invalidate(key_id)
     return new_key_row
 
 
@@ -0,0 +1,266 @@
+"""
+Memoized per-product BOM explosions for quoting and shortage checks.
+
+`explode("P-100", 50)` answers "how much of each component goes into 50 x
+P-100" from a flattened map {component: extended qty per parent unit}, where
+scrap is applied on every level (qty_per * (1 + scrap_pct)). Flattened maps
+are built recursively and memoized per product, so sub-assemblies are
+flattened once and shared by every parent that uses them.
+
+Invalidation is by ancestry. Triggers append the parent of every changed
+`bom` row to `bom_changes`, and the cache polls that log at most every
+BOM_CACHE_SYNC_INTERVAL seconds (and immediately after writes made through
+the API). For each changed parent it reloads the parent's direct edges and
+walks the reverse where-used index upwards, dropping only the product and its
+ancestors. Ids skipped by out-of-order commits are re-read for a grace
+period (see change_log.py); if the log was pruned past rows the cache has
+not seen, everything is reloaded.
+
+The same reverse index answers where-used questions: `where_used_levels()`
+memoizes every ancestor of a component with its level and extended qty, and
+`impacted_orders()` turns that into one indexed order_lines lookup for the
+component and all of its ancestors.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from change_log import ChangeLogCursor
+from config import settings
+from db import execute, fetch_all
+from metrics import counter_lines, gauge_lines, register_collector
+from mrp import BomCycleError
+from netting import CLOSED_STATUSES
+
+SQL_BOM_EDGES = "SELECT parent_product_id, component_id, qty_per, scrap_pct FROM bom"
+SQL_IMPACTED_LINES = f"""
+SELECT ol.order_id, ol.line_no, ol.product_id, ol.qty, o.customer_id, o.status, o.due_date
+FROM order_lines ol
+JOIN orders o ON o.order_id = ol.order_id
+WHERE ol.product_id IN ({{products}})
+  AND o.status NOT IN ({", ".join(f"'{s}'" for s in CLOSED_STATUSES)})
+ORDER BY o.due_date, ol.order_id, ol.line_no
+"""
+
+Edges = Dict[str, float]
+
+
+def _factor(qty_per: Any, scrap_pct: Any) -> float:
+    return float(qty_per or 0) * (1.0 + float(scrap_pct or 0))
+
+
+class BomExplosionCache:
+    def __init__(self, sync_interval: Optional[float] = None):
+        self.sync_interval = settings.BOM_CACHE_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self._edges: Dict[str, Edges] = {}
+        self._where_used: Dict[str, Set[str]] = {}
+        self._flat: Dict[str, Edges] = {}
+        self._used_in: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._changes = ChangeLogCursor("bom_changes", "parent_product_id")
+        self._loaded = False
+        self._next_sync = 0.0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.full_reloads = 0
+
+    # ------------------------------------------------------------------ reads
+    def explode(self, product_id: str, qty: float = 1.0) -> Dict[str, float]:
+        """Extended component quantities for `qty` units of `product_id` (all levels)."""
+        self.sync()
+        flat = self._flat.get(product_id)
+        if flat is None:
+            with self._lock:
+                self.misses += 1
+                flat = self._flatten(product_id, ())
+        else:
+            self.hits += 1
+        if qty == 1:
+            return dict(flat)
+        return {component: per_unit * qty for component, per_unit in flat.items()}
+
+    def where_used(self, product_id: str) -> Set[str]:
+        """All products that contain `product_id` on any level."""
+        return set(self.where_used_levels(product_id))
+
+    def where_used_levels(self, product_id: str) -> Dict[str, Dict[str, float]]:
+        """Ancestors of `product_id` -> {level, qty}: the shallowest level at which it
+        appears below the ancestor and the extended qty per ancestor unit."""
+        self.sync()
+        cached = self._used_in.get(product_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        with self._lock:
+            self.misses += 1
+            levels: Dict[str, int] = {}
+            frontier, level = [product_id], 0
+            while frontier:
+                level += 1
+                nxt = []
+                for component in frontier:
+                    for parent in self._where_used.get(component, ()):
+                        if parent not in levels:
+                            levels[parent] = level
+                            nxt.append(parent)
+                frontier = nxt
+            result = {
+                parent: {"level": lvl, "qty": self._flatten(parent, ()).get(product_id, 0.0)}
+                for parent, lvl in levels.items()
+            }
+            self._used_in[product_id] = result
+            return result
+
+    def components(self, product_id: str) -> Edges:
+        self.sync()
+        return dict(self._edges.get(product_id, {}))
+
+    def _flatten(self, product_id: str, path: Tuple[str, ...]) -> Edges:
+        cached = self._flat.get(product_id)
+        if cached is not None:
+            return cached
+        if product_id in path:
+            raise BomCycleError(f"BOM contains a cycle: {' -> '.join(path + (product_id,))}")
+        flat: Edges = {}
+        for component, factor in self._edges.get(product_id, {}).items():
+            flat[component] = flat.get(component, 0.0) + factor
+            for sub, sub_qty in self._flatten(component, path + (product_id,)).items():
+                flat[sub] = flat.get(sub, 0.0) + factor * sub_qty
+        self._flat[product_id] = flat
+        return flat
+
+    # ----------------------------------------------------------- invalidation
+    def sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and self._loaded and now < self._next_sync:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._reload()
+            else:
+                self._apply_changes()
+            self._next_sync = time.monotonic() + self.sync_interval
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._flat.clear()
+            self._used_in.clear()
+
+    def _reload(self) -> None:
+        # take the log position first: changes racing with the load are replayed later
+        self._changes.reset()
+        edges: Dict[str, Edges] = {}
+        where_used: Dict[str, Set[str]] = {}
+        for r in fetch_all(SQL_BOM_EDGES) or []:
+            parent, component = r["parent_product_id"], r["component_id"]
+            edges.setdefault(parent, {})[component] = _factor(r["qty_per"], r["scrap_pct"])
+            where_used.setdefault(component, set()).add(parent)
+        self._edges, self._where_used = edges, where_used
+        self._flat.clear()
+        self._used_in.clear()
+        self._loaded = True
+        self.full_reloads += 1
+
+    def _apply_changes(self) -> None:
+        rows = self._changes.poll()
+        if rows is None:
+            # we cannot tell what changed
+            self._reload()
+            return
+        if not rows:
+            return
+        changed = {r["parent_product_id"] for r in rows}
+        self._reload_parents(changed)
+        for product_id in self._ancestors(changed):
+            if self._flat.pop(product_id, None) is not None:
+                self.invalidations += 1
+        # a changed edge can move any descendant's ancestor set; these are cheap to rebuild
+        self._used_in.clear()
+
+    def _reload_parents(self, parents: Iterable[str]) -> None:
+        parents = list(parents)
+        placeholders = ", ".join("%s" for _ in parents)
+        rows = fetch_all(
+            f"{SQL_BOM_EDGES} WHERE parent_product_id IN ({placeholders})", tuple(parents)
+        ) or []
+        for parent in parents:
+            for component in self._edges.pop(parent, {}):
+                users = self._where_used.get(component)
+                if users is not None:
+                    users.discard(parent)
+        for r in rows:
+            parent, component = r["parent_product_id"], r["component_id"]
+            self._edges.setdefault(parent, {})[component] = _factor(r["qty_per"], r["scrap_pct"])
+            self._where_used.setdefault(component, set()).add(parent)
+
+    def _ancestors(self, products: Iterable[str]) -> Set[str]:
+        seen: Set[str] = set()
+        stack = list(products)
+        while stack:
+            product_id = stack.pop()
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            stack.extend(self._where_used.get(product_id, ()))
+        return seen
+
+    @property
+    def size(self) -> int:
+        return len(self._flat)
+
+
+BOM_CACHE = BomExplosionCache()
+
+
+def impacted_orders(product_id: str) -> List[Dict[str, Any]]:
+    """Open order lines that need `product_id`, directly or through any assembly."""
+    used_in = BOM_CACHE.where_used_levels(product_id)
+    products = [product_id, *used_in]
+    placeholders = ", ".join("%s" for _ in products)
+    rows = fetch_all(SQL_IMPACTED_LINES.format(products=placeholders), tuple(products)) or []
+    out: List[Dict[str, Any]] = []
+    for r in rows:
+        direct = r["product_id"] == product_id
+        per_unit = 1.0 if direct else used_in[r["product_id"]]["qty"]
+        out.append(
+            {
+                "order_id": r["order_id"],
+                "line_no": r["line_no"],
+                "customer_id": r["customer_id"],
+                "status": r["status"],
+                "due_date": r["due_date"],
+                "product_id": r["product_id"],
+                "level": 0 if direct else used_in[r["product_id"]]["level"],
+                "line_qty": float(r["qty"] or 0),
+                "component_qty": float(r["qty"] or 0) * per_unit,
+            }
+        )
+    return out
+
+
+def prune_changes(retain: Optional[int] = None, conn: Any = None) -> None:
+    """Keep only the newest `retain` bom_changes rows."""
+    retain = settings.BOM_CHANGES_RETAIN if retain is None else retain
+    execute(
+        "DELETE FROM bom_changes WHERE change_id <= (SELECT MAX(change_id) FROM bom_changes) - %s",
+        (retain,),
+        conn=conn,
+    )
+
+
+@register_collector
+def _bom_cache_metrics() -> List[str]:
+    lines: List[str] = []
+    lines += counter_lines("bom_explosion_cache_hits_total", "Single-product explosions served from cache", BOM_CACHE.hits)
+    lines += counter_lines("bom_explosion_cache_misses_total", "Single-product explosions flattened from the BOM", BOM_CACHE.misses)
+    lines += counter_lines(
+        "bom_explosion_cache_invalidations_total", "Cached explosions dropped after a BOM change",
+        BOM_CACHE.invalidations,
+    )
+    lines += gauge_lines("bom_explosion_cache_entries", "Products with a cached flattened explosion", BOM_CACHE.size)
+    return lines
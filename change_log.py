@@ -0,0 +1,94 @@
+"""
+Incremental reader for the trigger-filled change logs (bom_changes, atp_changes).
+
+change_id comes from a sequence: it is taken when the trigger inserts the row
+but only becomes visible when the writer commits, so a transaction holding id
+41 can commit after the one holding 42. A reader that just remembers the
+highest id it has seen would skip 41 forever. The cursor remembers every id it
+jumped over as a gap and keeps asking for those ids for CHANGE_LOG_GAP_GRACE
+seconds (longer than any writer transaction should stay open); ids of
+rolled-back transactions never show up and simply expire.
+
+`poll()` returns None whenever it cannot vouch for the result (the log was
+pruned past an id it still needed, or there are too many gaps to track): the
+caller then reloads everything and calls `reset()` before reading the data.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from db import fetch_all, fetch_one
+
+# more unexplained ids than this and a full reload is cheaper than tracking them
+MAX_TRACKED_GAPS = 1000
+
+
+class ChangeLogCursor:
+    def __init__(self, table: str, columns: str, grace: Optional[float] = None, max_gaps: int = MAX_TRACKED_GAPS):
+        self.grace = settings.CHANGE_LOG_GAP_GRACE if grace is None else grace
+        self.max_gaps = max_gaps
+        self.position = 0
+        self._gaps: Dict[int, float] = {}  # change_id -> monotonic deadline
+        self._sql_since = f"SELECT change_id, {columns} FROM {table} WHERE change_id > %s ORDER BY change_id"
+        self._sql_ids_since = f"SELECT change_id FROM {table} WHERE change_id >= %s"
+        self._sql_bounds = f"SELECT MIN(change_id) AS first_id, MAX(change_id) AS last_id FROM {table}"
+        self.gaps_filled = 0
+        self.gaps_expired = 0
+
+    def bounds(self) -> Tuple[int, int]:
+        row = fetch_one(self._sql_bounds) or {}
+        return int(row.get("first_id") or 0), int(row.get("last_id") or 0)
+
+    @property
+    def gaps(self) -> List[int]:
+        return sorted(self._gaps)
+
+    def reset(self, bounds: Optional[Tuple[int, int]] = None) -> None:
+        """Move to the end of the log. Call before loading the data the log describes:
+        ids missing below the end may belong to writers still in flight, whose rows
+        show up after the load and are replayed by the next poll()."""
+        first, last = bounds or self.bounds()
+        self._gaps = {}
+        if last:
+            low = max(first, last - self.max_gaps + 1)
+            present = {int(r["change_id"]) for r in fetch_all(self._sql_ids_since, (low,)) or []}
+            deadline = time.monotonic() + self.grace
+            self._gaps = {cid: deadline for cid in range(low, last) if cid not in present}
+        self.position = last
+
+    def poll(self, bounds: Optional[Tuple[int, int]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Rows committed since the last poll, including late commits into earlier gaps."""
+        first, last = bounds or self.bounds()
+        lowest = min(self._gaps, default=self.position + 1)
+        if last < self.position or (first > lowest and last >= lowest):
+            # pruned (or emptied) past rows we have not seen
+            return None
+        now = time.monotonic()
+        rows: List[Dict[str, Any]] = []
+        if last > self.position or self._gaps:
+            for r in fetch_all(self._sql_since, (lowest - 1,)) or []:
+                change_id = int(r["change_id"])
+                if change_id > self.position:
+                    rows.append(r)
+                elif self._gaps.pop(change_id, None) is not None:
+                    rows.append(r)
+                    self.gaps_filled += 1
+        new_ids = [int(r["change_id"]) for r in rows if int(r["change_id"]) > self.position]
+        if new_ids:
+            top = new_ids[-1]
+            if top - self.position - len(new_ids) + len(self._gaps) > self.max_gaps:
+                return None
+            seen = set(new_ids)
+            deadline = now + self.grace
+            for change_id in range(self.position + 1, top):
+                if change_id not in seen:
+                    self._gaps[change_id] = deadline
+            self.position = top
+        for change_id, deadline in list(self._gaps.items()):
+            if deadline <= now:
+                del self._gaps[change_id]
+                self.gaps_expired += 1
+        return rows
@@ -21,11 +21,75 @@ class Settings(BaseSettings):
     PG_SSLMODE: Optional[str] = None
     DB_POOL_MIN: int = 1
     DB_POOL_MAX: int = 10
+    DB_ASYNC_POOL_MAX: int = 50
+    DB_POOL_WARMUP: bool = True
+    DB_POOL_WAIT_THRESHOLD_MS: float = 5.0
+    # grow/shrink the pool cap between DB_POOL_MIN and DB_POOL_MAX from observed waits
+    DB_POOL_ADAPTIVE: bool = False
+    DB_POOL_ADAPT_INTERVAL: float = 30.0
+    DB_POOL_GROW_STEP: int = 2
     DB_CONNECT_TIMEOUT: int = 10
+    DB_STREAM_CHUNK_SIZE: int = 1000
+    DB_BULK_BATCH_SIZE: int = 1000
+    # CSV import rows staged and committed per batch; bytes per read of an upload
+    IMPORT_BATCH_SIZE: int = 5000
+    # error lines returned by the CSV import endpoints (the rest are only counted)
+    IMPORT_MAX_ERRORS: int = 1000
+    UPLOAD_READ_CHUNK_SIZE: int = 65536
+    # background import jobs: spooled uploads (relative to the app directory; must be shared
+    # storage for workers on other hosts to resume a job), worker threads per process, and
+    # how long a running job may go without a heartbeat before another worker resumes it
+    IMPORT_SPOOL_DIR: str = "spool/imports"
+    IMPORT_JOB_WORKERS: int = 2
+    IMPORT_JOB_POLL_INTERVAL: float = 2.0
+    IMPORT_JOB_STALE_SECONDS: float = 120.0
+    IMPORT_JOB_MAX_ERRORS: int = 200
+    # server-side prepare for registered statements (disable behind pgbouncer transaction pooling)
+    DB_PREPARE_STATEMENTS: bool = True
+    # order/customer IDs reserved per round-trip to order_id_seq (hi/lo)
+    ID_BLOCK_SIZE: int = 20
+
+    # order_finance drift check (0 disables the periodic run)
+    ORDER_FINANCE_RECONCILE_INTERVAL: float = 3600.0
+    ORDER_FINANCE_RECONCILE_FIX: bool = False
+    ORDER_FINANCE_TOLERANCE: float = 0.005
+    INVENTORY_BALANCE_TOLERANCE: float = 0.0001
+    # change logs (bom_changes, atp_changes): seconds an id skipped by an out-of-order
+    # commit is re-read before it counts as rolled back
+    CHANGE_LOG_GAP_GRACE: float = 60.0
+    # seconds between bom_changes polls of the per-product explosion cache
+    BOM_CACHE_SYNC_INTERVAL: float = 1.0
+    BOM_CHANGES_RETAIN: int = 10000
+    # cost roll-up: setup minutes are spread over this many units; rate for work
+    # centers missing from work_centers
+    COST_STD_LOT_SIZE: float = 1.0
+    COST_DEFAULT_LABOR_RATE: float = 0.0
+    # available-to-promise: day buckets kept per product, seconds between atp_changes polls
+    ATP_HORIZON_DAYS: int = 365
+    ATP_SYNC_INTERVAL: float = 1.0
+    ATP_CHANGES_RETAIN: int = 10000
+
+    # Query timing / slow-query log
+    QUERY_STATS_ENABLED: bool = True
+    QUERY_STATS_MAX_FINGERPRINTS: int = 500
+    SLOW_QUERY_MS: float = 200.0
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = 60.0
+
+    # SQLite fallback (connection manager + pragmas)
+    SQLITE_POOL_SIZE: int = 8
+    SQLITE_PERSISTENT: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE: int = -20000  # negative = KiB
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_BUSY_TIMEOUT: float = 5.0
 
     # API keys / admin
     API_KEYS: str = ""
     ADMIN_KEY: Optional[str] = None
+    APIKEY_USAGE_FLUSH_INTERVAL: float = 5.0
+    APIKEY_USAGE_BUFFER_MAX: int = 500
 
     # Auth / JWT - CRITICAL: Set JWT_SECRET in Railway environment!
     JWT_SECRET: str = Field(..., min_length=64)  # Required, no default - prevents token invalidation on restart
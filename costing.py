@@ -0,0 +1,314 @@
+"""
+Standard cost roll-up over `bom`, `routings` and `work_centers`.
+
+For every product
+
+    material = std_cost                                  (no BOM: purchased)
+             = sum(qty_per * (1 + scrap_pct) * material[component])
+    labor    = own routing labor + sum(qty_per * (1 + scrap_pct) * labor[component])
+    own routing labor = sum((std_setup_min / COST_STD_LOT_SIZE + std_run_min_per_unit)
+                            / 60 * hourly_rate of the work center)
+
+The pass runs bottom-up by low-level code over the array-backed BomGraph
+from mrp.py: for each level from the deepest up, one `np.add.at` per vector
+folds every component into its parents.
+
+Each roll-up is a version in `cost_rollups`. `product_costs` keeps one row per
+(product, version) and `v_product_costs` exposes the latest row per product,
+so finance reads precomputed values. `CostRollup.update()` recomputes only
+the changed products and their ancestors (found through the where-used
+arrays) and writes those rows as a new, incremental version. With
+apply=True, rolled-up totals of assemblies are written back to
+products.std_cost, which the order_finance triggers fan out to open orders.
+
+The loaded state is keyed on table_versions, so writes made by other
+processes (or straight in the database) are not missed: a changed bom or
+work_centers rebuilds the graph, a changed routings or products.std_cost
+re-reads the base costs and rolls up whatever moved. Writers pass the key
+they read before their own write (`seen`), so the counters their write
+moved do not count as a change made elsewhere.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import settings
+from db import copy_rows, execute_many, fetch_all, fetch_one, table_versions, transaction
+from logging_utils import logger
+from mrp import BomGraph
+
+SQL_PRODUCT_STD_COST = "SELECT product_id, std_cost FROM products"
+
+# graph tables first: a change there means a rebuild, in the other two only a base re-read
+VERSION_TABLES = ("bom", "work_centers", "routings", "products")
+
+SQL_ROUTING_LABOR = """
+SELECT r.product_id,
+       SUM((r.std_setup_min / %s + r.std_run_min_per_unit) / 60.0 * COALESCE(w.hourly_rate, %s)) AS labor
+FROM routings r
+LEFT JOIN work_centers w ON w.work_center = r.work_center
+{where}
+GROUP BY r.product_id
+"""
+
+SQL_CURRENT_COSTS = """
+SELECT product_id, version, llc, material_cost, labor_cost, total_cost
+FROM v_product_costs
+"""
+
+COST_COLUMNS = ["product_id", "version", "llc", "material_cost", "labor_cost", "total_cost"]
+
+
+def _labor_sql(product_ids: Optional[List[str]]) -> str:
+    if not product_ids:
+        return SQL_ROUTING_LABOR.format(where="")
+    placeholders = ", ".join("%s" for _ in product_ids)
+    return SQL_ROUTING_LABOR.format(where=f"WHERE r.product_id IN ({placeholders})")
+
+
+class CostRollup:
+    def __init__(self):
+        self.graph: Optional[BomGraph] = None
+        self.base_material: Optional[np.ndarray] = None
+        self.own_labor: Optional[np.ndarray] = None
+        self.material: Optional[np.ndarray] = None
+        self.labor: Optional[np.ndarray] = None
+        self.version = 0
+        self._key: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.graph is not None
+
+    # ------------------------------------------------------------- loading
+    def _load(self) -> None:
+        # read before the data: a write landing in between makes the next update() reload
+        self._key = table_versions(*VERSION_TABLES)
+        products = fetch_all(SQL_PRODUCT_STD_COST) or []
+        graph = BomGraph.load(extra_products=[r["product_id"] for r in products])
+        self.graph = graph
+        n = len(graph.products)
+        self.base_material = np.zeros(n, dtype=np.float64)
+        self.own_labor = np.zeros(n, dtype=np.float64)
+        self._load_base(products, fetch_all(_labor_sql(None), self._labor_params(None)) or [], np.arange(n))
+
+    def _labor_params(self, product_ids: Optional[List[str]]) -> tuple:
+        lot = max(float(settings.COST_STD_LOT_SIZE), 1e-9)
+        return (lot, float(settings.COST_DEFAULT_LABOR_RATE), *(product_ids or ()))
+
+    def _load_base(self, products: List[Dict[str, Any]], labor: List[Dict[str, Any]], reset: np.ndarray) -> None:
+        graph = self.graph
+        self.own_labor[reset] = 0.0
+        self.base_material[reset] = 0.0
+        # assemblies take their material from the components, not from the hand-entered std_cost
+        purchased = graph.indptr[1:] == graph.indptr[:-1]
+        for r in products:
+            i = graph.index.get(r["product_id"])
+            if i is not None and purchased[i]:
+                self.base_material[i] = float(r["std_cost"] or 0)
+        for r in labor:
+            i = graph.index.get(r["product_id"])
+            if i is not None:
+                self.own_labor[i] = float(r["labor"] or 0)
+
+    # ------------------------------------------------------------- roll-up
+    def _roll(self, affected: Optional[np.ndarray] = None) -> None:
+        graph = self.graph
+        if affected is None:
+            self.material = self.base_material.copy()
+            self.labor = self.own_labor.copy()
+        else:
+            self.material[affected] = self.base_material[affected]
+            self.labor[affected] = self.own_labor[affected]
+        for level in range(graph.max_llc, -1, -1):
+            parent, child, factor = graph.level_edges(level)
+            if affected is not None and len(parent):
+                keep = affected[parent]
+                parent, child, factor = parent[keep], child[keep], factor[keep]
+            if len(parent):
+                np.add.at(self.material, parent, factor * self.material[child])
+                np.add.at(self.labor, parent, factor * self.labor[child])
+
+    def full(self, apply: bool = False) -> Dict[str, Any]:
+        """Reload everything and roll up all products into a new version."""
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                self._load()
+                self._roll()
+                return self._persist("full", np.arange(len(self.graph.products)), apply, start)
+            except Exception:
+                self._key = None
+                raise
+
+    def update(
+        self,
+        product_ids: Iterable[str],
+        structure_changed: bool = False,
+        apply: bool = False,
+        seen: Optional[tuple] = None,
+    ) -> Dict[str, Any]:
+        """Recompute `product_ids` (new std_cost or routing) and their ancestors only.
+
+        After a BOM change (`structure_changed`) or for products the loaded
+        graph does not know, the graph is rebuilt and everything is rolled up
+        in memory, but only rows whose cost moved are written. `seen` is the
+        table_versions key of VERSION_TABLES the caller read before writing
+        `product_ids`.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            ids = list(dict.fromkeys(product_ids))
+            try:
+                return self._update(ids, structure_changed, apply, start, seen)
+            except Exception:
+                # memory may be ahead of product_costs now: the next call rebuilds and writes everything
+                self._key = None
+                raise
+
+    def _update(
+        self, ids: List[str], structure_changed: bool, apply: bool, start: float, seen: Optional[tuple]
+    ) -> Dict[str, Any]:
+        key = table_versions(*VERSION_TABLES)
+        if seen is not None and self._key is not None and tuple(seen) == self._key:
+            # current before the caller's write: the routings/products counters moved by that
+            # write only, which re-reading `ids` covers (bom/work_centers still force a rebuild)
+            self._key = self._key[:2] + key[2:]
+        if (
+            not self.loaded
+            or self._key is None
+            or structure_changed
+            or key[:2] != self._key[:2]
+            or any(p not in self.graph.index for p in ids)
+        ):
+            return self._rebuild(apply, start)
+        if key[2:] != self._key[2:]:
+            # routings or std_cost written elsewhere: re-read all base costs, keep what moved
+            moved = self._reload_base()
+            if moved is None:
+                return self._rebuild(apply, start)
+            indices = np.asarray(sorted({*moved, *(self.graph.index[p] for p in ids)}), dtype=np.int64)
+        else:
+            indices = np.asarray([self.graph.index[p] for p in ids], dtype=np.int64)
+            if len(indices):
+                placeholders = ", ".join("%s" for _ in ids)
+                products = fetch_all(f"{SQL_PRODUCT_STD_COST} WHERE product_id IN ({placeholders})", tuple(ids)) or []
+                labor = fetch_all(_labor_sql(ids), self._labor_params(ids)) or []
+                self._load_base(products, labor, indices)
+        affected = self.graph.ancestors(indices)
+        self._roll(affected)
+        return self._persist("incremental", np.flatnonzero(affected), apply, start)
+
+    def _reload_base(self) -> Optional[List[int]]:
+        """Re-read every std_cost and routing labor; indices whose base moved, None for unknown products."""
+        self._key = table_versions(*VERSION_TABLES)
+        products = fetch_all(SQL_PRODUCT_STD_COST) or []
+        if any(r["product_id"] not in self.graph.index for r in products):
+            return None
+        old_material, old_labor = self.base_material.copy(), self.own_labor.copy()
+        self._load_base(products, fetch_all(_labor_sql(None), self._labor_params(None)) or [], np.arange(len(self.graph.products)))
+        moved = (np.abs(old_material - self.base_material) > 1e-9) | (np.abs(old_labor - self.own_labor) > 1e-9)
+        return np.flatnonzero(moved).tolist()
+
+    def _rebuild(self, apply: bool, start: float) -> Dict[str, Any]:
+        previous = None
+        if self.loaded and self._key is not None:
+            previous = dict(zip(self.graph.products, zip(self.material.tolist(), self.labor.tolist())))
+        self._load()
+        self._roll()
+        if previous is None:
+            return self._persist("full", np.arange(len(self.graph.products)), apply, start)
+        moved = [
+            i for i, product_id in enumerate(self.graph.products)
+            if product_id not in previous
+            or abs(previous[product_id][0] - self.material[i]) > 1e-9
+            or abs(previous[product_id][1] - self.labor[i]) > 1e-9
+        ]
+        return self._persist("incremental", np.asarray(moved, dtype=np.int64), apply, start)
+
+    def _persist(self, kind: str, indices: np.ndarray, apply: bool, start: float) -> Dict[str, Any]:
+        graph = self.graph
+        before = table_versions(*VERSION_TABLES) if apply else None
+        with transaction() as conn:
+            row = fetch_one(
+                "INSERT INTO cost_rollups (kind, products) VALUES (%s, %s) RETURNING version",
+                (kind, int(len(indices))),
+                conn=conn,
+            )
+            version = int(row["version"])
+            rows = [
+                (
+                    graph.products[i],
+                    version,
+                    int(graph.llc[i]),
+                    round(float(self.material[i]), 6),
+                    round(float(self.labor[i]), 6),
+                    round(float(self.material[i] + self.labor[i]), 6),
+                )
+                for i in indices.tolist()
+            ]
+            copy_rows("product_costs", COST_COLUMNS, rows, conn=conn)
+            applied = 0
+            if apply:
+                assemblies = [r for r in rows if graph.indptr[graph.index[r[0]] + 1] > graph.indptr[graph.index[r[0]]]]
+                applied = execute_many(
+                    "UPDATE products SET std_cost = %s WHERE product_id = %s",
+                    [(r[5], r[0]) for r in assemblies],
+                    conn=conn,
+                )
+        self.version = version
+        if applied and before == self._key:
+            # our own std_cost write-back, not a change to re-read on the next update()
+            self._key = table_versions(*VERSION_TABLES)
+        return {
+            "version": version,
+            "kind": kind,
+            "products": len(rows),
+            "max_llc": graph.max_llc,
+            "applied": applied,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+
+ROLLUP = CostRollup()
+
+
+def current_costs(product_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    if product_id:
+        return fetch_all(SQL_CURRENT_COSTS + " WHERE product_id = %s", (product_id,)) or []
+    return fetch_all(SQL_CURRENT_COSTS + " ORDER BY product_id") or []
+
+
+def cost_history(product_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    return fetch_all(
+        "SELECT pc.version, r.kind, r.created_at, pc.material_cost, pc.labor_cost, pc.total_cost "
+        "FROM product_costs pc JOIN cost_rollups r ON r.version = pc.version "
+        "WHERE pc.product_id = %s ORDER BY pc.version DESC LIMIT %s",
+        (product_id, limit),
+    ) or []
+
+
+def notify_changed(
+    product_ids: Iterable[str], structure_changed: bool = False, seen: Optional[tuple] = None
+) -> Optional[Dict[str, Any]]:
+    """Hook for writers: incrementally roll up if a roll-up is loaded in this process.
+
+    Routers run it as a background task after the response, so the write has
+    already succeeded; a failed roll-up is logged and picked up by the next
+    update() through table_versions. `seen` is `table_versions(*VERSION_TABLES)`
+    read before the write, see CostRollup.update().
+    """
+    if not ROLLUP.loaded:
+        return None
+    ids = list(product_ids)
+    try:
+        return ROLLUP.update(ids, structure_changed=structure_changed, seen=seen)
+    except Exception as exc:
+        logger.error(f"cost roll-up after change of {ids} failed: {exc}")
+        return None
@@ -0,0 +1,61 @@
+"""
+Streaming CSV responses for the export endpoints.
+
+Rows are pulled from `db.stream` in batches and written to the client as they
+arrive, so peak memory stays at one batch regardless of table size.
+"""
+
+import csv
+import io
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.responses import StreamingResponse
+
+from db import stream
+
+
+def _csv_chunks(
+    first: List[dict], batches: Iterator[List[dict]], header: Sequence[str]
+) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    try:
+        # BOM first so Excel detects UTF-8 (same bytes as encoding with utf-8-sig)
+        buf.write("\ufeff")
+        writer.writerow(header)
+        for batch in _prepend(first, batches):
+            for r in batch:
+                writer.writerow(
+                    [r.get(col) if r.get(col) is not None else "" for col in header]
+                )
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+        tail = buf.getvalue()
+        if tail:
+            yield tail.encode("utf-8")
+    finally:
+        # release the DB connection even if the client disconnects mid-download
+        batches.close()
+
+
+def _prepend(first: List[dict], batches: Iterator[List[dict]]) -> Iterator[List[dict]]:
+    yield first
+    yield from batches
+
+
+def stream_csv(
+    sql: str,
+    params: Optional[Tuple],
+    header: Sequence[str],
+    filename: str,
+    chunk_size: Optional[int] = None,
+) -> StreamingResponse:
+    """Build a CSV download for `sql`; query errors surface before the response starts."""
+    batches = stream(sql, params, chunk_size)
+    first = next(batches, [])
+    return StreamingResponse(
+        _csv_chunks(first, batches, header),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -0,0 +1,96 @@
+"""
+Incremental CSV parsing for the upload endpoints.
+
+The spooled upload is read UPLOAD_READ_CHUNK_SIZE bytes at a time through an
+incremental UTF-8 decoder (a leading BOM is dropped, multi-byte characters
+split across chunks are handled by the decoder), cut into lines and fed to
+csv.DictReader. Rows come out in batches of `batch_size`, so peak memory is
+one read chunk plus one batch regardless of the file size.
+
+`LineErrors` collects the per-line report of an import endpoint, capped at
+IMPORT_MAX_ERRORS messages so a broken file cannot grow the response
+without bound.
+"""
+
+import codecs
+import csv
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import settings
+
+# (line number as reported to the user, row); the header is line 1
+Row = Tuple[int, Dict[str, str]]
+
+
+def iter_text(fileobj: BinaryIO, errors: str = "strict", chunk_size: Optional[int] = None) -> Iterator[str]:
+    """Decode `fileobj` chunk by chunk (UTF-8, optional BOM)."""
+    size = max(1, chunk_size or settings.UPLOAD_READ_CHUNK_SIZE)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors)
+    while True:
+        chunk = fileobj.read(size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(fileobj: BinaryIO, errors: str = "strict", chunk_size: Optional[int] = None) -> Iterator[str]:
+    """Lines with their line endings, as csv.reader expects from a newline='' file."""
+    pending = ""
+    for text in iter_text(fileobj, errors, chunk_size):
+        pending += text
+        start = 0
+        while True:
+            end = pending.find("\n", start)
+            if end < 0:
+                break
+            yield pending[start : end + 1]
+            start = end + 1
+        pending = pending[start:]
+    if pending:
+        yield pending
+
+
+def iter_rows(fileobj: BinaryIO, errors: str = "strict", chunk_size: Optional[int] = None) -> Iterator[Row]:
+    reader = csv.DictReader(iter_lines(fileobj, errors, chunk_size))
+    return enumerate(reader, start=2)
+
+
+def iter_batches(
+    fileobj: BinaryIO,
+    batch_size: Optional[int] = None,
+    errors: str = "strict",
+    chunk_size: Optional[int] = None,
+) -> Iterator[List[Row]]:
+    """Yield the rows of a CSV upload in lists of at most `batch_size` (line, row) pairs."""
+    size = max(1, batch_size or settings.IMPORT_BATCH_SIZE)
+    rows = iter_rows(fileobj, errors, chunk_size)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class LineErrors:
+    """(line, message) errors of one upload, kept in line order within each batch."""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = settings.IMPORT_MAX_ERRORS if limit is None else limit
+        self.count = 0
+        self._lines: List[str] = []
+
+    def add_batch(self, errors: Iterable[Tuple[int, str]]) -> None:
+        for idx, msg in sorted(errors, key=lambda e: e[0]):
+            self.count += 1
+            if len(self._lines) < self.limit:
+                self._lines.append(f"Line {idx}: {msg}")
+
+    def report(self) -> List[str]:
+        hidden = self.count - len(self._lines)
+        return self._lines + ([f"... and {hidden} more errors"] if hidden else [])
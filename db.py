@@ -1,10 +1,23 @@
+import csv
+import io
 import os
+import re
+import sys
+import threading
+import time
+import uuid
 from decimal import Decimal
 from contextlib import contextmanager
-from typing import Optional, Tuple, Iterator, Any, List
+from itertools import islice
+from typing import Optional, Tuple, Iterator, Iterable, Any, Dict, List, Sequence, Set
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 from typing import TYPE_CHECKING
 from config import settings
+from statements import Statement
+from query_stats import QUERY_STATS, explain_sql, format_plan
+from pool_monitor import PoolMonitor, PoolSizer
+from table_version_listener import TableVersionListener
+from metrics import gauge_lines, counter_lines, register_collector
 
 # Optional Postgres drivers (prefer psycopg v3; fallback to psycopg2 if present)
 PSYCOPG3_AVAILABLE = False
@@ -33,6 +46,7 @@ except Exception:
 
 # sqlite fallback
 import sqlite3
+from sqlite_pool import SQLiteConnectionManager
 
 MINCONN = settings.DB_POOL_MIN
 MAXCONN = settings.DB_POOL_MAX
@@ -44,11 +58,63 @@ POOL = None  # type: ignore  # For PG: psycopg3 pool / DSN / psycopg2 pool; for
 SQLITE_INIT_DONE = False
 SQLITE_DB_PATH = os.path.join(os.getcwd(), "_dev_db.sqlite")
 
+_SQLITE_INIT_LOCK = threading.Lock()
+POOL_MONITOR = PoolMonitor(wait_threshold=settings.DB_POOL_WAIT_THRESHOLD_MS / 1000.0)
+SQLITE_MANAGER = SQLiteConnectionManager(
+    max_size=settings.SQLITE_POOL_SIZE,
+    journal_mode=settings.SQLITE_JOURNAL_MODE,
+    synchronous=settings.SQLITE_SYNCHRONOUS,
+    cache_size=settings.SQLITE_CACHE_SIZE,
+    mmap_size=settings.SQLITE_MMAP_SIZE,
+    busy_timeout=settings.SQLITE_BUSY_TIMEOUT,
+    persistent=settings.SQLITE_PERSISTENT,
+)
+
 
 def reset_sqlite_init():
-    """Reset the sqlite init flag, used for testing."""
+    """Reset the sqlite init flag and pooled connections, used for testing."""
     global SQLITE_INIT_DONE
     SQLITE_INIT_DONE = False
+    SQLITE_MANAGER.close_all()
+
+
+@contextmanager
+def _monitored(checkout) -> Iterator[Any]:
+    """Enter a connection-checkout context manager, recording wait and in-use time."""
+    start = POOL_MONITOR.begin()
+    try:
+        conn = checkout.__enter__()
+    except BaseException:
+        POOL_MONITOR.failed(start)
+        raise
+    POOL_MONITOR.acquired(start)
+    try:
+        yield conn
+    except BaseException:
+        POOL_MONITOR.released()
+        if not checkout.__exit__(*sys.exc_info()):
+            raise
+    else:
+        POOL_MONITOR.released()
+        checkout.__exit__(None, None, None)
+
+
+@contextmanager
+def _sqlite_conn() -> Iterator[sqlite3.Connection]:
+    """Check out a pooled sqlite connection, creating the dev schema on first use."""
+    global SQLITE_INIT_DONE
+    with _monitored(SQLITE_MANAGER.connection(SQLITE_DB_PATH)) as conn:
+        if not SQLITE_INIT_DONE:
+            # separate lock: the caller may already hold the writer lock
+            with _SQLITE_INIT_LOCK:
+                if not SQLITE_INIT_DONE:
+                    _init_sqlite_schema(conn)
+                    SQLITE_INIT_DONE = True
+        yield conn
+
+
+def sqlite_pool_stats() -> dict:
+    return SQLITE_MANAGER.stats()
 
 
 def _append_sslmode_to_url(dsn: str, sslmode: str) -> str:
@@ -63,50 +129,54 @@ def _append_sslmode_to_url(dsn: str, sslmode: str) -> str:
     return urlunparse(parsed._replace(query=new_query))
 
 
-def _create_pool() -> Any:
+def _pg_dsn() -> Optional[str]:
+    """Return the Postgres DSN (sslmode + connect_timeout applied), or None for sqlite."""
     # Test/dev override: force sqlite path regardless of DATABASE_URL
     if os.getenv("FORCE_SQLITE") == "1":
         return None
     # If DATABASE_URL or PG_* configured, require psycopg2/psycopg
-    if (
+    if not (
         DATABASE_URL
         or os.getenv("PG_HOST")
         or os.getenv("PG_DB")
         or os.getenv("PG_USER")
     ):
-        dsn = DATABASE_URL
+        return None
+    dsn = DATABASE_URL
 
-        if not dsn:
-            raise RuntimeError(
-                "DATABASE_URL is empty but PG_* environment variables are set. Please set DATABASE_URL."
-            )
+    if not dsn:
+        raise RuntimeError(
+            "DATABASE_URL is empty but PG_* environment variables are set. Please set DATABASE_URL."
+        )
 
-        if PG_SSLMODE and "sslmode=" not in dsn:
-            dsn = _append_sslmode_to_url(dsn, PG_SSLMODE)
-        elif "sslmode=" not in dsn:
-            dsn = _append_sslmode_to_url(dsn, "require")
+    if PG_SSLMODE and "sslmode=" not in dsn:
+        dsn = _append_sslmode_to_url(dsn, PG_SSLMODE)
+    elif "sslmode=" not in dsn:
+        dsn = _append_sslmode_to_url(dsn, "require")
 
-        connect_timeout = settings.DB_CONNECT_TIMEOUT
-        dsn_with_timeout = (
-            f"{dsn}?connect_timeout={connect_timeout}"
-            if "?" not in dsn
-            else f"{dsn}&connect_timeout={connect_timeout}"
-        )
+    connect_timeout = settings.DB_CONNECT_TIMEOUT
+    return (
+        f"{dsn}?connect_timeout={connect_timeout}"
+        if "?" not in dsn
+        else f"{dsn}&connect_timeout={connect_timeout}"
+    )
 
-        if PSYCOPG3_AVAILABLE:
-            # psycopg v3: prefer pool when available, else return DSN to connect per-use
-            if PSYCOPG3_POOL:
-                return ConnectionPool(
-                    dsn_with_timeout, min_size=MINCONN, max_size=MAXCONN
-                )
-            return {"driver": "psycopg3", "dsn": dsn_with_timeout}
-        if PSYCOPG2_AVAILABLE:
-            return SimpleConnectionPool(MINCONN, MAXCONN, dsn=dsn_with_timeout)
-        raise RuntimeError(
-            "No Postgres driver available. Install psycopg[binary] or psycopg2-binary."
-        )
 
-    return None
+def _create_pool() -> Any:
+    dsn_with_timeout = _pg_dsn()
+    if dsn_with_timeout is None:
+        return None
+
+    if PSYCOPG3_AVAILABLE:
+        # psycopg v3: prefer pool when available, else return DSN to connect per-use
+        if PSYCOPG3_POOL:
+            return ConnectionPool(dsn_with_timeout, min_size=MINCONN, max_size=MAXCONN)
+        return {"driver": "psycopg3", "dsn": dsn_with_timeout}
+    if PSYCOPG2_AVAILABLE:
+        return SimpleConnectionPool(MINCONN, MAXCONN, dsn=dsn_with_timeout)
+    raise RuntimeError(
+        "No Postgres driver available. Install psycopg[binary] or psycopg2-binary."
+    )
 
 
 def _get_pool() -> Any:
@@ -121,6 +191,97 @@ def _get_pool() -> Any:
     return POOL
 
 
+# ---------- pool observability / sizing ----------
+
+def pool_stats() -> Dict[str, Any]:
+    """Current pool occupancy for whichever backend is active."""
+    pool = _get_pool()
+    stats: Dict[str, Any] = {
+        "waiting": POOL_MONITOR.waiting,
+        "checkouts_total": POOL_MONITOR.checkouts,
+        "checkout_failures_total": POOL_MONITOR.failures,
+    }
+    if pool is None:
+        s = SQLITE_MANAGER.stats()
+        stats.update(backend="sqlite", size=s["open"], idle=s["idle"], in_use=s["in_use"],
+                     min=0, max=s["max_size"])
+    elif isinstance(pool, dict):
+        # connect-per-use: nothing pooled, only what is checked out right now
+        stats.update(backend="postgres", size=POOL_MONITOR.in_use, idle=0,
+                     in_use=POOL_MONITOR.in_use, min=0, max=0)
+    elif hasattr(pool, "get_stats"):
+        s = pool.get_stats()
+        size = s.get("pool_size", 0)
+        idle = s.get("pool_available", 0)
+        stats.update(backend="postgres", size=size, idle=idle, in_use=size - idle,
+                     min=pool.min_size, max=pool.max_size)
+        stats["waiting"] = max(stats["waiting"], s.get("requests_waiting", 0))
+    else:
+        used, idle = len(pool._used), len(pool._pool)
+        stats.update(backend="postgres", size=used + idle, idle=idle, in_use=used,
+                     min=pool.minconn, max=pool.maxconn)
+    return stats
+
+
+def warm_pool() -> int:
+    """Open DB_POOL_MIN connections up front so the first requests don't pay for them."""
+    pool = _get_pool()
+    if pool is None:
+        opened = SQLITE_MANAGER.warm(SQLITE_DB_PATH, MINCONN)
+        with _sqlite_conn():
+            pass  # creates the dev schema
+        return opened
+    if hasattr(pool, "wait"):
+        # psycopg3 ConnectionPool fills min_size in the background; block until done
+        pool.wait(timeout=30.0)
+        return pool.min_size
+    # psycopg2 SimpleConnectionPool opens minconn eagerly; connect-per-use has nothing to warm
+    return MINCONN if not isinstance(pool, dict) else 0
+
+
+def _apply_pool_size(size: int) -> bool:
+    pool = _get_pool()
+    if pool is None:
+        SQLITE_MANAGER.resize(size)
+        return True
+    if hasattr(pool, "resize"):
+        pool.resize(min_size=min(MINCONN, size), max_size=size)
+        return True
+    return False  # psycopg2 pools cannot be resized in place
+
+
+POOL_SIZER = PoolSizer(
+    POOL_MONITOR,
+    _apply_pool_size,
+    min_size=MINCONN,
+    max_size=MAXCONN,
+    interval=settings.DB_POOL_ADAPT_INTERVAL,
+    grow_step=settings.DB_POOL_GROW_STEP,
+    initial=MAXCONN,
+)
+
+
+@register_collector
+def _pool_metrics() -> List[str]:
+    try:
+        stats = pool_stats()
+    except Exception:
+        return []
+    labels = {"backend": stats["backend"]}
+    lines: List[str] = []
+    lines += gauge_lines("db_pool_size", "Open pooled DB connections", stats["size"], labels)
+    lines += gauge_lines("db_pool_idle", "Idle pooled DB connections", stats["idle"], labels)
+    lines += gauge_lines("db_pool_in_use", "Checked-out DB connections", stats["in_use"], labels)
+    lines += gauge_lines("db_pool_waiting", "Callers waiting for a DB connection", stats["waiting"], labels)
+    lines += gauge_lines("db_pool_max", "Current pool size cap", stats["max"], labels)
+    lines += counter_lines(
+        "db_pool_checkout_failures_total", "DB connection checkouts that failed or timed out",
+        stats["checkout_failures_total"], labels,
+    )
+    lines += POOL_MONITOR.wait_seconds.render(labels=labels)
+    return lines
+
+
 @contextmanager
 def transaction():
     """
@@ -135,52 +296,25 @@ def transaction():
     """
     pool = _get_pool()
     if pool is None:
-        # SQLite
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.close()
-    else:
-        # Postgres
-        if (
-            PSYCOPG3_AVAILABLE
-            and isinstance(pool, dict)
-            and pool.get("driver") == "psycopg3"
-        ):
-            conn = psycopg.connect(pool.get("dsn"))  # type: ignore
+        # SQLite: single serialized writer on a pooled connection
+        with SQLITE_MANAGER.write_lock(), _sqlite_conn() as conn:
             try:
                 yield conn
                 conn.commit()
             except Exception:
                 conn.rollback()
                 raise
-            finally:
-                conn.close()
-        elif PSYCOPG3_AVAILABLE and hasattr(pool, "connection"):
-            with pool.connection() as conn:
-                try:
-                    yield conn
-                    conn.commit()
-                except Exception:
-                    conn.rollback()
-                    raise
-        else:
-            # psycopg2
-            conn = pool.getconn()
+    else:
+        # Postgres
+        with _monitored(_pg_checkout(pool)) as conn:
             try:
                 yield conn
                 conn.commit()
             except Exception:
+                _written_tables(conn)
                 conn.rollback()
                 raise
-            finally:
-                pool.putconn(conn)
+            _committed_writes(conn)
 
 
 @contextmanager
@@ -190,41 +324,39 @@ def get_conn() -> Iterator[Any]:
     """
     pool = _get_pool()
     if pool is None:
-        # sqlite fallback: ensure DB file and basic schema
-        global SQLITE_INIT_DONE
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
+        # sqlite fallback: pooled long-lived connection, schema ensured on first use
+        with _sqlite_conn() as conn:
+            yield conn
+    else:
+        # Postgres
+        with _monitored(_pg_checkout(pool)) as conn:
+            yield conn
+
+
+@contextmanager
+def _pg_checkout(pool: Any) -> Iterator[Any]:
+    if (
+        PSYCOPG3_AVAILABLE
+        and isinstance(pool, dict)
+        and pool.get("driver") == "psycopg3"
+    ):
+        # No pool available: connect on demand
+        conn = psycopg.connect(pool.get("dsn"))  # type: ignore
         try:
-            if not SQLITE_INIT_DONE:
-                _init_sqlite_schema(conn)
-                SQLITE_INIT_DONE = True
             yield conn
         finally:
             conn.close()
+    elif PSYCOPG3_AVAILABLE and hasattr(pool, "connection"):
+        # psycopg3 ConnectionPool
+        with pool.connection() as conn:
+            yield conn
     else:
-        # Postgres
-        if (
-            PSYCOPG3_AVAILABLE
-            and isinstance(pool, dict)
-            and pool.get("driver") == "psycopg3"
-        ):
-            # No pool available: connect on demand
-            conn = psycopg.connect(pool.get("dsn"))  # type: ignore
-            try:
-                yield conn
-            finally:
-                conn.close()
-        elif PSYCOPG3_AVAILABLE and hasattr(pool, "connection"):
-            # psycopg3 ConnectionPool
-            with pool.connection() as conn:
-                yield conn
-        else:
-            # psycopg2 SimpleConnectionPool
-            conn = pool.getconn()
-            try:
-                yield conn
-            finally:
-                pool.putconn(conn)
+        # psycopg2 SimpleConnectionPool
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            pool.putconn(conn)
 
 
 def _init_sqlite_schema(conn: sqlite3.Connection):
@@ -302,6 +434,7 @@ def _init_sqlite_schema(conn: sqlite3.Connection):
     CREATE TABLE IF NOT EXISTS api_keys (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
       key_text TEXT,
+      key_prefix TEXT,
       key_hash TEXT,
       salt TEXT,
       label TEXT,
@@ -377,60 +510,518 @@ def _init_sqlite_schema(conn: sqlite3.Connection):
     )
     conn.commit()
 
+    # dev databases created before key_prefix existed keep their old api_keys
+    # table (CREATE TABLE IF NOT EXISTS is a no-op), so add the column first
+    api_key_columns = {r[1] for r in cur.execute("PRAGMA table_info(api_keys)").fetchall()}
+    if "key_prefix" not in api_key_columns:
+        cur.execute("ALTER TABLE api_keys ADD COLUMN key_prefix TEXT")
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_api_keys_key_prefix ON api_keys(key_prefix) WHERE key_prefix IS NOT NULL"
+    )
+    conn.commit()
+
+    # order_finance: one row per order, kept current by the triggers below
+    # (deltas for line/timesheet writes, fan-out for std_cost/hourly_rate changes).
+    # v_order_finance remains as a thin shim over it; order_finance.py reconciles drift.
     cur.executescript(
         """
-    CREATE VIEW IF NOT EXISTS v_order_finance AS
-    SELECT
-      o.order_id,
-      o.customer_id,
-      o.order_date,
-      COALESCE(SUM(ol.qty * ol.unit_price * (1 - ol.discount_pct)), 0) AS revenue,
-      COALESCE(SUM(ol.qty * p.std_cost), 0) AS material_cost,
-      COALESCE(
-        (SELECT SUM(t.hours * e.hourly_rate)
-         FROM timesheets t
-         JOIN employees e ON t.emp_id = e.emp_id
-         WHERE t.order_id = o.order_id),
-        0
-      ) AS labor_cost,
-      COALESCE(SUM(ol.qty * ol.unit_price * (1 - ol.discount_pct)), 0)
-      - COALESCE(SUM(ol.qty * p.std_cost), 0)
-      - COALESCE(
-        (SELECT SUM(t.hours * e.hourly_rate)
-         FROM timesheets t
-         JOIN employees e ON t.emp_id = e.emp_id
-         WHERE t.order_id = o.order_id),
-        0
-      ) AS gross_margin
+    CREATE TABLE IF NOT EXISTS order_finance (
+      order_id TEXT PRIMARY KEY,
+      revenue REAL NOT NULL DEFAULT 0,
+      material_cost REAL NOT NULL DEFAULT 0,
+      labor_cost REAL NOT NULL DEFAULT 0,
+      gross_margin REAL GENERATED ALWAYS AS (revenue - material_cost - labor_cost) VIRTUAL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_order_ins AFTER INSERT ON orders
+    BEGIN
+      INSERT OR REPLACE INTO order_finance (order_id, revenue, material_cost, labor_cost)
+      SELECT NEW.order_id,
+        COALESCE((SELECT SUM(ol.qty * ol.unit_price * (1 - ol.discount_pct))
+                  FROM order_lines ol WHERE ol.order_id = NEW.order_id), 0),
+        COALESCE((SELECT SUM(ol.qty * p.std_cost)
+                  FROM order_lines ol JOIN products p ON p.product_id = ol.product_id
+                  WHERE ol.order_id = NEW.order_id), 0),
+        COALESCE((SELECT SUM(t.hours * e.hourly_rate)
+                  FROM timesheets t JOIN employees e ON e.emp_id = t.emp_id
+                  WHERE t.order_id = NEW.order_id), 0);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_order_del AFTER DELETE ON orders
+    BEGIN
+      DELETE FROM order_finance WHERE order_id = OLD.order_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_line_ins AFTER INSERT ON order_lines
+    BEGIN
+      UPDATE order_finance
+      SET revenue = revenue + NEW.qty * NEW.unit_price * (1 - NEW.discount_pct),
+          material_cost = material_cost
+            + NEW.qty * COALESCE((SELECT std_cost FROM products WHERE product_id = NEW.product_id), 0)
+      WHERE order_id = NEW.order_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_line_del AFTER DELETE ON order_lines
+    BEGIN
+      UPDATE order_finance
+      SET revenue = revenue - OLD.qty * OLD.unit_price * (1 - OLD.discount_pct),
+          material_cost = material_cost
+            - OLD.qty * COALESCE((SELECT std_cost FROM products WHERE product_id = OLD.product_id), 0)
+      WHERE order_id = OLD.order_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_line_upd
+    AFTER UPDATE OF order_id, product_id, qty, unit_price, discount_pct ON order_lines
+    BEGIN
+      UPDATE order_finance
+      SET revenue = revenue - OLD.qty * OLD.unit_price * (1 - OLD.discount_pct),
+          material_cost = material_cost
+            - OLD.qty * COALESCE((SELECT std_cost FROM products WHERE product_id = OLD.product_id), 0)
+      WHERE order_id = OLD.order_id;
+      UPDATE order_finance
+      SET revenue = revenue + NEW.qty * NEW.unit_price * (1 - NEW.discount_pct),
+          material_cost = material_cost
+            + NEW.qty * COALESCE((SELECT std_cost FROM products WHERE product_id = NEW.product_id), 0)
+      WHERE order_id = NEW.order_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_ts_ins AFTER INSERT ON timesheets
+    BEGIN
+      UPDATE order_finance
+      SET labor_cost = labor_cost
+        + NEW.hours * COALESCE((SELECT hourly_rate FROM employees WHERE emp_id = NEW.emp_id), 0)
+      WHERE order_id = NEW.order_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_ts_del AFTER DELETE ON timesheets
+    BEGIN
+      UPDATE order_finance
+      SET labor_cost = labor_cost
+        - OLD.hours * COALESCE((SELECT hourly_rate FROM employees WHERE emp_id = OLD.emp_id), 0)
+      WHERE order_id = OLD.order_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_ts_upd
+    AFTER UPDATE OF emp_id, order_id, hours ON timesheets
+    BEGIN
+      UPDATE order_finance
+      SET labor_cost = labor_cost
+        - OLD.hours * COALESCE((SELECT hourly_rate FROM employees WHERE emp_id = OLD.emp_id), 0)
+      WHERE order_id = OLD.order_id;
+      UPDATE order_finance
+      SET labor_cost = labor_cost
+        + NEW.hours * COALESCE((SELECT hourly_rate FROM employees WHERE emp_id = NEW.emp_id), 0)
+      WHERE order_id = NEW.order_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_std_cost
+    AFTER UPDATE OF std_cost ON products WHEN OLD.std_cost IS NOT NEW.std_cost
+    BEGIN
+      UPDATE order_finance
+      SET material_cost = material_cost + (NEW.std_cost - OLD.std_cost) * (
+        SELECT SUM(ol.qty) FROM order_lines ol
+        WHERE ol.order_id = order_finance.order_id AND ol.product_id = NEW.product_id)
+      WHERE order_id IN (SELECT order_id FROM order_lines WHERE product_id = NEW.product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_product_ins AFTER INSERT ON products
+    BEGIN
+      UPDATE order_finance
+      SET material_cost = material_cost + NEW.std_cost * (
+        SELECT SUM(ol.qty) FROM order_lines ol
+        WHERE ol.order_id = order_finance.order_id AND ol.product_id = NEW.product_id)
+      WHERE order_id IN (SELECT order_id FROM order_lines WHERE product_id = NEW.product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_product_del AFTER DELETE ON products
+    BEGIN
+      UPDATE order_finance
+      SET material_cost = material_cost - OLD.std_cost * (
+        SELECT SUM(ol.qty) FROM order_lines ol
+        WHERE ol.order_id = order_finance.order_id AND ol.product_id = OLD.product_id)
+      WHERE order_id IN (SELECT order_id FROM order_lines WHERE product_id = OLD.product_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_rate
+    AFTER UPDATE OF hourly_rate ON employees WHEN OLD.hourly_rate IS NOT NEW.hourly_rate
+    BEGIN
+      UPDATE order_finance
+      SET labor_cost = labor_cost + (NEW.hourly_rate - OLD.hourly_rate) * (
+        SELECT SUM(t.hours) FROM timesheets t
+        WHERE t.order_id = order_finance.order_id AND t.emp_id = NEW.emp_id)
+      WHERE order_id IN (SELECT order_id FROM timesheets WHERE emp_id = NEW.emp_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_employee_ins AFTER INSERT ON employees
+    BEGIN
+      UPDATE order_finance
+      SET labor_cost = labor_cost + NEW.hourly_rate * (
+        SELECT SUM(t.hours) FROM timesheets t
+        WHERE t.order_id = order_finance.order_id AND t.emp_id = NEW.emp_id)
+      WHERE order_id IN (SELECT order_id FROM timesheets WHERE emp_id = NEW.emp_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_order_finance_employee_del AFTER DELETE ON employees
+    BEGIN
+      UPDATE order_finance
+      SET labor_cost = labor_cost - OLD.hourly_rate * (
+        SELECT SUM(t.hours) FROM timesheets t
+        WHERE t.order_id = order_finance.order_id AND t.emp_id = OLD.emp_id)
+      WHERE order_id IN (SELECT order_id FROM timesheets WHERE emp_id = OLD.emp_id);
+    END;
+
+    -- backfill orders that predate the table (no-op once populated)
+    INSERT INTO order_finance (order_id, revenue, material_cost, labor_cost)
+    SELECT o.order_id,
+      COALESCE((SELECT SUM(ol.qty * ol.unit_price * (1 - ol.discount_pct))
+                FROM order_lines ol WHERE ol.order_id = o.order_id), 0),
+      COALESCE((SELECT SUM(ol.qty * p.std_cost)
+                FROM order_lines ol JOIN products p ON p.product_id = ol.product_id
+                WHERE ol.order_id = o.order_id), 0),
+      COALESCE((SELECT SUM(t.hours * e.hourly_rate)
+                FROM timesheets t JOIN employees e ON e.emp_id = t.emp_id
+                WHERE t.order_id = o.order_id), 0)
     FROM orders o
-    LEFT JOIN order_lines ol ON o.order_id = ol.order_id
-    LEFT JOIN products p ON ol.product_id = p.product_id
-    GROUP BY o.order_id, o.customer_id, o.order_date;
+    WHERE NOT EXISTS (SELECT 1 FROM order_finance f WHERE f.order_id = o.order_id);
+
+    -- compatibility shim for readers of the old aggregate view
+    DROP VIEW IF EXISTS v_order_finance;
+    CREATE VIEW v_order_finance AS
+    SELECT f.order_id, o.customer_id, o.order_date,
+           f.revenue, f.material_cost, f.labor_cost, f.gross_margin
+    FROM order_finance f
+    JOIN orders o ON o.order_id = f.order_id;
+    """
+    )
+    # manufacturing master data (mirrors 001_initial_schema), MRP output, schedule and costs
+    cur.executescript(
+        """
+    CREATE TABLE IF NOT EXISTS bom (
+      parent_product_id TEXT NOT NULL,
+      component_id TEXT NOT NULL,
+      qty_per REAL NOT NULL,
+      scrap_pct REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY (parent_product_id, component_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_bom_component ON bom(component_id);
+    CREATE INDEX IF NOT EXISTS idx_order_lines_product ON order_lines(product_id);
+    CREATE TABLE IF NOT EXISTS routings (
+      product_id TEXT NOT NULL,
+      operation_no INTEGER NOT NULL,
+      work_center TEXT NOT NULL,
+      std_setup_min REAL NOT NULL DEFAULT 0,
+      std_run_min_per_unit REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY (product_id, operation_no)
+    );
+    CREATE TABLE IF NOT EXISTS mrp_requirements (
+      run_id TEXT NOT NULL,
+      product_id TEXT NOT NULL,
+      llc INTEGER NOT NULL,
+      independent_qty REAL NOT NULL DEFAULT 0,
+      dependent_qty REAL NOT NULL DEFAULT 0,
+      gross_qty REAL NOT NULL DEFAULT 0,
+      on_hand REAL NOT NULL DEFAULT 0,
+      net_qty REAL NOT NULL DEFAULT 0,
+      generated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (run_id, product_id)
+    );
+    CREATE TABLE IF NOT EXISTS schedule (
+      order_id TEXT NOT NULL,
+      line_no INTEGER NOT NULL,
+      operation_no INTEGER NOT NULL,
+      product_id TEXT NOT NULL,
+      work_center TEXT NOT NULL,
+      qty REAL NOT NULL,
+      setup_min REAL NOT NULL DEFAULT 0,
+      run_min REAL NOT NULL DEFAULT 0,
+      start_ts TEXT NOT NULL,
+      end_ts TEXT NOT NULL,
+      due_date TEXT,
+      late INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (order_id, line_no, operation_no)
+    );
+    CREATE INDEX IF NOT EXISTS idx_schedule_wc_start ON schedule(work_center, start_ts);
+    CREATE INDEX IF NOT EXISTS idx_schedule_start ON schedule(start_ts);
+    CREATE TABLE IF NOT EXISTS work_centers (
+      work_center TEXT PRIMARY KEY,
+      hourly_rate REAL NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS cost_rollups (
+      version INTEGER PRIMARY KEY AUTOINCREMENT,
+      kind TEXT NOT NULL,
+      products INTEGER NOT NULL DEFAULT 0,
+      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS product_costs (
+      product_id TEXT NOT NULL,
+      version INTEGER NOT NULL,
+      llc INTEGER NOT NULL DEFAULT 0,
+      material_cost REAL NOT NULL DEFAULT 0,
+      labor_cost REAL NOT NULL DEFAULT 0,
+      total_cost REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY (product_id, version)
+    );
+    CREATE VIEW IF NOT EXISTS v_product_costs AS
+    SELECT pc.product_id, pc.version, pc.llc, pc.material_cost, pc.labor_cost, pc.total_cost
+    FROM product_costs pc
+    WHERE pc.version = (SELECT MAX(version) FROM product_costs x WHERE x.product_id = pc.product_id);
+    INSERT OR IGNORE INTO bom (parent_product_id, component_id, qty_per, scrap_pct)
+      VALUES ('P-100', 'P-101', 2, 0.05);
+    INSERT OR IGNORE INTO routings (product_id, operation_no, work_center, std_setup_min, std_run_min_per_unit)
+      VALUES ('P-100', 10, 'Montaż', 15, 2.5);
+    INSERT OR IGNORE INTO work_centers (work_center, hourly_rate)
+      VALUES ('Montaż', 60), ('Testy', 50), ('Magazyn', 35);
     """
     )
+    # bom_changes: append-only log of parents whose BOM rows changed, so the
+    # per-product explosion cache (bom_cache.py) can drop just their ancestors.
     cur.executescript(
         """
-    CREATE VIEW IF NOT EXISTS v_shortages AS
+    CREATE TABLE IF NOT EXISTS bom_changes (
+      change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+      parent_product_id TEXT NOT NULL,
+      changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_bom_changes_ins AFTER INSERT ON bom
+    BEGIN
+      INSERT INTO bom_changes (parent_product_id) VALUES (NEW.parent_product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_bom_changes_del AFTER DELETE ON bom
+    BEGIN
+      INSERT INTO bom_changes (parent_product_id) VALUES (OLD.parent_product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_bom_changes_upd AFTER UPDATE ON bom
+    BEGIN
+      INSERT INTO bom_changes (parent_product_id) VALUES (OLD.parent_product_id);
+      INSERT INTO bom_changes (parent_product_id)
+        SELECT NEW.parent_product_id WHERE NEW.parent_product_id <> OLD.parent_product_id;
+    END;
+    """
+    )
+    # table_versions: per-table write counters bumped by triggers, so in-process caches
+    # (shortage netting, planned time) can tell whether their inputs changed with one PK lookup.
+    # sqlite only: writes are serialized anyway; Postgres uses NOTIFY, see TABLE_VERSIONS.
+    cur.executescript(
+        """
+    CREATE TABLE IF NOT EXISTS table_versions (
+      table_name TEXT PRIMARY KEY,
+      version INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO table_versions (table_name) VALUES ('inventory'), ('order_lines'), ('orders'), ('routings');
+    INSERT OR IGNORE INTO table_versions (table_name) VALUES ('bom'), ('work_centers'), ('products');
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_inventory_ins AFTER INSERT ON inventory
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'inventory';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_inventory_del AFTER DELETE ON inventory
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'inventory';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_inventory_upd AFTER UPDATE ON inventory
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'inventory';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_order_lines_ins AFTER INSERT ON order_lines
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'order_lines';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_order_lines_del AFTER DELETE ON order_lines
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'order_lines';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_order_lines_upd AFTER UPDATE ON order_lines
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'order_lines';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_orders_ins AFTER INSERT ON orders
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'orders';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_orders_del AFTER DELETE ON orders
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'orders';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_orders_upd AFTER UPDATE OF status, due_date, order_date ON orders
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'orders';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_routings_ins AFTER INSERT ON routings
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'routings';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_routings_del AFTER DELETE ON routings
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'routings';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_routings_upd AFTER UPDATE ON routings
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'routings';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_bom_ins AFTER INSERT ON bom
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'bom';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_bom_del AFTER DELETE ON bom
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'bom';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_bom_upd AFTER UPDATE ON bom
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'bom';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_work_centers_ins AFTER INSERT ON work_centers
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'work_centers';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_work_centers_del AFTER DELETE ON work_centers
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'work_centers';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_work_centers_upd AFTER UPDATE ON work_centers
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'work_centers';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_products_ins AFTER INSERT ON products
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'products';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_products_del AFTER DELETE ON products
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'products';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_table_version_products_upd AFTER UPDATE OF std_cost ON products
+    BEGIN
+      UPDATE table_versions SET version = version + 1 WHERE table_name = 'products';
+    END;
+    """
+    )
+    # atp_changes: append-only log of products whose supply or demand changed, so the
+    # available-to-promise buckets (atp.py) are rebuilt just for those products.
+    cur.executescript(
+        """
+    CREATE TABLE IF NOT EXISTS atp_changes (
+      change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+      product_id TEXT NOT NULL,
+      changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_inventory_ins AFTER INSERT ON inventory
+    BEGIN
+      INSERT INTO atp_changes (product_id) VALUES (NEW.product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_inventory_del AFTER DELETE ON inventory
+    BEGIN
+      INSERT INTO atp_changes (product_id) VALUES (OLD.product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_inventory_upd AFTER UPDATE ON inventory
+    BEGIN
+      INSERT INTO atp_changes (product_id) VALUES (OLD.product_id);
+      INSERT INTO atp_changes (product_id) SELECT NEW.product_id WHERE NEW.product_id <> OLD.product_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_order_lines_ins AFTER INSERT ON order_lines
+    BEGIN
+      INSERT INTO atp_changes (product_id) VALUES (NEW.product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_order_lines_del AFTER DELETE ON order_lines
+    BEGIN
+      INSERT INTO atp_changes (product_id) VALUES (OLD.product_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_order_lines_upd AFTER UPDATE ON order_lines
+    BEGIN
+      INSERT INTO atp_changes (product_id) VALUES (OLD.product_id);
+      INSERT INTO atp_changes (product_id) SELECT NEW.product_id WHERE NEW.product_id <> OLD.product_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_orders_upd AFTER UPDATE OF status, due_date ON orders
+    BEGIN
+      INSERT INTO atp_changes (product_id)
+        SELECT DISTINCT product_id FROM order_lines WHERE order_id = NEW.order_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_atp_changes_orders_del AFTER DELETE ON orders
+    BEGIN
+      INSERT INTO atp_changes (product_id)
+        SELECT DISTINCT product_id FROM order_lines WHERE order_id = OLD.order_id;
+    END;
+    """
+    )
+    # import_jobs: background CSV imports (import_jobs.py); progress commits with each batch
+    cur.executescript(
+        """
+    CREATE TABLE IF NOT EXISTS import_jobs (
+      job_id TEXT PRIMARY KEY,
+      entity_type TEXT NOT NULL,
+      filename TEXT,
+      spool_path TEXT NOT NULL,
+      batch_size INTEGER NOT NULL,
+      status TEXT NOT NULL DEFAULT 'queued',
+      cancel_requested INTEGER NOT NULL DEFAULT 0,
+      batches_done INTEGER NOT NULL DEFAULT 0,
+      rows_processed INTEGER NOT NULL DEFAULT 0,
+      rows_imported INTEGER NOT NULL DEFAULT 0,
+      error_count INTEGER NOT NULL DEFAULT 0,
+      errors TEXT,
+      last_error TEXT,
+      worker_id TEXT,
+      created_by TEXT,
+      created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      started_ts REAL,
+      heartbeat_ts REAL,
+      finished_ts REAL,
+      active_seconds REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status, created_at);
+    """
+    )
+    # inventory_balance: on-hand per (product, location, lot), kept current from the
+    # inventory ledger by triggers; see inventory_balance.py for rebuild/verify.
+    cur.executescript(
+        """
+    CREATE TABLE IF NOT EXISTS inventory_balance (
+      product_id TEXT NOT NULL,
+      location TEXT NOT NULL DEFAULT '',
+      lot TEXT NOT NULL DEFAULT '',
+      qty_on_hand REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY (product_id, location, lot)
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_balance_ins AFTER INSERT ON inventory
+    BEGIN
+      INSERT INTO inventory_balance (product_id, location, lot, qty_on_hand)
+      VALUES (NEW.product_id, COALESCE(NEW.location, ''), COALESCE(NEW.lot, ''), NEW.qty_change)
+      ON CONFLICT (product_id, location, lot)
+      DO UPDATE SET qty_on_hand = qty_on_hand + excluded.qty_on_hand;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_balance_del AFTER DELETE ON inventory
+    BEGIN
+      UPDATE inventory_balance SET qty_on_hand = qty_on_hand - OLD.qty_change
+      WHERE product_id = OLD.product_id
+        AND location = COALESCE(OLD.location, '') AND lot = COALESCE(OLD.lot, '');
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_balance_upd
+    AFTER UPDATE OF product_id, qty_change, location, lot ON inventory
+    BEGIN
+      UPDATE inventory_balance SET qty_on_hand = qty_on_hand - OLD.qty_change
+      WHERE product_id = OLD.product_id
+        AND location = COALESCE(OLD.location, '') AND lot = COALESCE(OLD.lot, '');
+      INSERT INTO inventory_balance (product_id, location, lot, qty_on_hand)
+      VALUES (NEW.product_id, COALESCE(NEW.location, ''), COALESCE(NEW.lot, ''), NEW.qty_change)
+      ON CONFLICT (product_id, location, lot)
+      DO UPDATE SET qty_on_hand = qty_on_hand + excluded.qty_on_hand;
+    END;
+
+    -- first run against an existing ledger: build the balances once
+    INSERT INTO inventory_balance (product_id, location, lot, qty_on_hand)
+    SELECT product_id, COALESCE(location, ''), COALESCE(lot, ''), SUM(qty_change)
+    FROM inventory
+    WHERE NOT EXISTS (SELECT 1 FROM inventory_balance)
+    GROUP BY product_id, COALESCE(location, ''), COALESCE(lot, '');
+
+    DROP VIEW IF EXISTS v_shortages;
+    CREATE VIEW v_shortages AS
     SELECT
       ol.order_id,
       ol.product_id AS component_id,
       ol.qty AS required_qty,
-      COALESCE(
-        (SELECT SUM(i.qty_change) FROM inventory i WHERE i.product_id = ol.product_id),
-        0
-      ) AS qty_on_hand,
+      COALESCE(b.qty_on_hand, 0) AS qty_on_hand,
       CASE
-        WHEN COALESCE(
-          (SELECT SUM(i.qty_change) FROM inventory i WHERE i.product_id = ol.product_id),
-          0
-        ) < ol.qty
-        THEN ol.qty - COALESCE(
-          (SELECT SUM(i.qty_change) FROM inventory i WHERE i.product_id = ol.product_id),
-          0
-        )
+        WHEN COALESCE(b.qty_on_hand, 0) < ol.qty THEN ol.qty - COALESCE(b.qty_on_hand, 0)
         ELSE 0
       END AS shortage_qty
-    FROM order_lines ol;
+    FROM order_lines ol
+    LEFT JOIN (
+      SELECT product_id, SUM(qty_on_hand) AS qty_on_hand
+      FROM inventory_balance
+      GROUP BY product_id
+    ) b ON b.product_id = ol.product_id;
     """
     )
     cur.executescript(
@@ -498,60 +1089,223 @@ def _init_sqlite_schema(conn: sqlite3.Connection):
     )
 
 
-def fetch_all(sql: str, params: Optional[Tuple] = None) -> List[dict]:
-    pool = _get_pool()
-    if pool is None:
-        # sqlite path
-        with get_conn() as conn:
+def _is_sqlite_conn(conn: Any) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def _sqlite_params(params: Optional[Tuple]) -> Tuple:
+    # Convert Decimal params to float for sqlite binding (only rebuild when needed)
+    if not params:
+        return ()
+    if not any(isinstance(p, Decimal) for p in params):
+        return params if isinstance(params, tuple) else tuple(params)
+    return tuple(float(p) if isinstance(p, Decimal) else p for p in params)
+
+
+def _sqlite_sql(sql: str, params: Optional[Tuple]) -> str:
+    # registered statements carry their ? form, translated once at import
+    if isinstance(sql, Statement):
+        return sql.sqlite_sql
+    # translate %s placeholders (Postgres style) to ? for sqlite
+    return sql.replace("%s", "?") if params else sql
+
+
+def _pg_exec_kwargs(sql: str) -> dict:
+    """psycopg 3 execute() options: prepare registered statements server-side."""
+    if isinstance(sql, Statement) and sql.prepare and settings.DB_PREPARE_STATEMENTS:
+        return {"prepare": True}
+    return {}
+
+
+class _Probe:
+    """Set by _observe when a slow call still needs its plan captured (async callers)."""
+
+    __slots__ = ("slow_fingerprint", "seconds")
+
+    def __init__(self):
+        self.slow_fingerprint: Optional[str] = None
+        self.seconds = 0.0
+
+
+@contextmanager
+def _observe(sql: str, params: Optional[Tuple], conn: Any = None) -> Iterator[_Probe]:
+    """Time one statement: registered-statement counters, fingerprint histograms, slow log.
+
+    With a sync `conn` the plan of a slow call is captured right away on that
+    connection; otherwise the yielded probe tells the caller to do it.
+    """
+    if isinstance(sql, Statement):
+        sql.check_params(params)
+    probe = _Probe()
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield probe
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if isinstance(sql, Statement):
+            sql.record(elapsed, failed)
+        fp = QUERY_STATS.record(sql, elapsed, failed)
+        if fp is not None:
+            probe.seconds = elapsed
+            if conn is not None:
+                _capture_plan(conn, fp, sql, params, elapsed)
+            else:
+                probe.slow_fingerprint = fp
+
+
+def _capture_plan(conn: Any, fp: str, sql: str, params: Optional[Tuple], seconds: float) -> None:
+    plan = None
+    explain = explain_sql(sql, _is_sqlite_conn(conn))
+    if explain is not None:
+        try:
+            if _is_sqlite_conn(conn):
+                cur = conn.cursor()
+                cur.execute(_sqlite_sql(explain, params), _sqlite_params(params))
+                rows = cur.fetchall()
+                cur.close()
+            else:
+                with conn.cursor() as cur:
+                    cur.execute(explain, params or ())
+                    rows = cur.fetchall()
+            plan = format_plan(rows)
+        except Exception as exc:
+            plan = f"<plan unavailable: {exc}>"
+    QUERY_STATS.add_slow(fp, seconds, plan)
+
+
+def _fetch_all_on(conn: Any, sql: str, params: Optional[Tuple]) -> List[dict]:
+    with _observe(sql, params, conn):
+        if _is_sqlite_conn(conn):
             cur = conn.cursor()
-            # translate %s placeholders (Postgres style) to ? for sqlite
-            sql_exec = sql.replace("%s", "?") if params else sql
-            # Convert Decimal params to float for sqlite binding
-            bind_params = params
-            if params:
-                bind_params = tuple(
-                    float(p) if isinstance(p, Decimal) else p for p in params
-                )
-            cur.execute(sql_exec, bind_params or ())
+            cur.execute(_sqlite_sql(sql, params), _sqlite_params(params))
             rows = cur.fetchall()
             cur.close()
             # convert sqlite3.Row to dict
             return [dict(r) for r in rows]
-    else:
-        with get_conn() as conn:
-            if PSYCOPG3_AVAILABLE:
-                with conn.cursor(row_factory=dict_row) as cur:  # type: ignore
-                    cur.execute(sql, params or ())
-                    return cur.fetchall()
-            else:
-                from psycopg2.extras import RealDictCursor  # type: ignore
+        if PSYCOPG3_AVAILABLE:
+            with conn.cursor(row_factory=dict_row) as cur:  # type: ignore
+                cur.execute(sql, params or (), **_pg_exec_kwargs(sql))
+                return cur.fetchall()
+        from psycopg2.extras import RealDictCursor  # type: ignore
 
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:  # type: ignore
-                    cur.execute(sql, params or ())
-                    return cur.fetchall()
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:  # type: ignore
+            cur.execute(sql, params or ())
+            return cur.fetchall()
 
 
-def fetch_one(sql: str, params: Optional[Tuple] = None) -> Optional[dict]:
-    pool = _get_pool()
-    if pool is None:
-        with get_conn() as conn:
+def _fetch_one_on(conn: Any, sql: str, params: Optional[Tuple]) -> Optional[dict]:
+    with _observe(sql, params, conn):
+        if _is_sqlite_conn(conn):
             cur = conn.cursor()
-            sql_exec = sql.replace("%s", "?") if params else sql
-            cur.execute(sql_exec, params or ())
+            cur.execute(_sqlite_sql(sql, params), _sqlite_params(params))
             row = cur.fetchone()
+            cur.close()
             return dict(row) if row is not None else None
+        if PSYCOPG3_AVAILABLE:
+            with conn.cursor(row_factory=dict_row) as cur:  # type: ignore
+                cur.execute(sql, params or (), **_pg_exec_kwargs(sql))
+                return cur.fetchone()
+        from psycopg2.extras import RealDictCursor  # type: ignore
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:  # type: ignore
+            cur.execute(sql, params or ())
+            return cur.fetchone()
+
+
+def _execute_on(conn: Any, sql: str, params: Optional[Tuple], returning: bool):
+    with _observe(sql, params, conn):
+        if _is_sqlite_conn(conn):
+            cur = conn.cursor()
+            cur.execute(_sqlite_sql(sql, params), _sqlite_params(params))
+            rows = _fetch_returning_rows(cur) if returning else None
+            cur.close()
+            return rows
+        _note_write(conn, sql)
+        if PSYCOPG3_AVAILABLE:
+            with conn.cursor() as cur:  # type: ignore
+                cur.execute(sql, params or (), **_pg_exec_kwargs(sql))
+                return _fetch_returning_rows(cur) if returning else None
+        from psycopg2.extras import RealDictCursor  # type: ignore
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:  # type: ignore
+            cur.execute(sql, params or ())
+            if returning:
+                rows = cur.fetchall()
+                return rows if isinstance(rows, list) else list(rows)
+            return None
+
+
+def fetch_all(sql: str, params: Optional[Tuple] = None, conn: Any = None) -> List[dict]:
+    """Run a query and return all rows as dicts.
+    Pass `conn` (e.g. from the `unit_of_work` dependency) to reuse a request's connection.
+    """
+    if conn is not None:
+        return _fetch_all_on(conn, sql, params)
+    with get_conn() as own:
+        return _fetch_all_on(own, sql, params)
+
+
+def fetch_one(sql: str, params: Optional[Tuple] = None, conn: Any = None) -> Optional[dict]:
+    if conn is not None:
+        return _fetch_one_on(conn, sql, params)
+    with get_conn() as own:
+        return _fetch_one_on(own, sql, params)
+
+
+def _stream_on(conn: Any, sql: str, params: Optional[Tuple], chunk_size: int) -> Iterator[List[dict]]:
+    if _is_sqlite_conn(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute(_sqlite_sql(sql, params), _sqlite_params(params))
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
+        finally:
+            cur.close()
+        return
+    # Named (server-side) cursor: Postgres keeps the result, we pull chunk_size rows at a time
+    name = f"stream_{uuid.uuid4().hex[:12]}"
+    if PSYCOPG3_AVAILABLE:
+        cur = conn.cursor(name=name, row_factory=dict_row)  # type: ignore
     else:
-        with get_conn() as conn:
-            if PSYCOPG3_AVAILABLE:
-                with conn.cursor(row_factory=dict_row) as cur:  # type: ignore
-                    cur.execute(sql, params or ())
-                    return cur.fetchone()
-            else:
-                from psycopg2.extras import RealDictCursor  # type: ignore
+        from psycopg2.extras import RealDictCursor  # type: ignore
+
+        cur = conn.cursor(name=name, cursor_factory=RealDictCursor)  # type: ignore
+    with cur:
+        cur.itersize = chunk_size
+        cur.execute(sql, params or ())
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(r) for r in rows]
+
 
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:  # type: ignore
-                    cur.execute(sql, params or ())
-                    return cur.fetchone()
+def stream(
+    sql: str,
+    params: Optional[Tuple] = None,
+    chunk_size: Optional[int] = None,
+    conn: Any = None,
+) -> Iterator[List[dict]]:
+    """Run a query and yield its rows in batches of at most `chunk_size` dicts.
+
+    Unlike fetch_all the result is never fully materialized: Postgres uses a named
+    server-side cursor, sqlite uses fetchmany. The connection stays checked out
+    until the generator is exhausted or closed, so always consume it fully or
+    close() it (a `for` loop / StreamingResponse does this).
+    """
+    size = max(1, chunk_size or settings.DB_STREAM_CHUNK_SIZE)
+    if conn is not None:
+        yield from _stream_on(conn, sql, params, size)
+        return
+    with get_conn() as own:
+        yield from _stream_on(own, sql, params, size)
 
 
 def _fetch_returning_rows(cur):
@@ -571,39 +1325,381 @@ def _fetch_returning_rows(cur):
     return normalized
 
 
-def execute(sql: str, params: Optional[Tuple] = None, returning: bool = False):
+def execute(
+    sql: str,
+    params: Optional[Tuple] = None,
+    returning: bool = False,
+    conn: Any = None,
+):
     """Execute SQL (INSERT, UPDATE, DELETE).
     For INSERT/UPDATE with `returning=True`, return list[dict] rows just like fetch_* helpers.
+    With `conn` the statement joins that connection's transaction and is not committed here.
     """
+    if conn is not None:
+        return _execute_on(conn, sql, params, returning)
     pool = _get_pool()
     if pool is None:
-        with get_conn() as conn:
-            cur = conn.cursor()
-            sql_exec = sql.replace("%s", "?") if params else sql
-            bind_params = params
-            if params:
-                bind_params = tuple(
-                    float(p) if isinstance(p, Decimal) else p for p in params
-                )
-            cur.execute(sql_exec, bind_params or ())
-            rows = _fetch_returning_rows(cur) if returning else None
-            conn.commit()
+        with SQLITE_MANAGER.write_lock(), get_conn() as own:
+            rows = _execute_on(own, sql, params, returning)
+            own.commit()
             return rows
+    with get_conn() as own:
+        try:
+            rows = _execute_on(own, sql, params, returning)
+            own.commit()
+        except Exception:
+            _written_tables(own)
+            raise
+        _committed_writes(own)
+        return rows
+
+
+# ---- bulk writes ----
+
+_IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _ident(name: str) -> str:
+    # table/column names are interpolated into SQL, so only plain identifiers pass
+    if not _IDENT_RE.match(name or ""):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+def _chunked(rows: Iterable[Sequence], size: int) -> Iterator[List[Sequence]]:
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _execute_many_on(conn: Any, sql: str, rows: Iterable[Sequence], batch_size: int) -> int:
+    count = 0
+    if _is_sqlite_conn(conn):
+        cur = conn.cursor()
+        sqlite_sql = sql.sqlite_sql if isinstance(sql, Statement) else sql.replace("%s", "?")
+        for batch in _chunked(rows, batch_size):
+            cur.executemany(sqlite_sql, [_sqlite_params(r) for r in batch])
+            count += len(batch)
+        cur.close()
+        return count
+    _note_write(conn, sql)
+    if PSYCOPG3_AVAILABLE:
+        # pipeline mode: statements are sent without waiting for each result
+        with conn.cursor() as cur, conn.pipeline():  # type: ignore
+            for batch in _chunked(rows, batch_size):
+                cur.executemany(sql, batch)
+                count += len(batch)
+        return count
+    from psycopg2.extras import execute_batch  # type: ignore
+
+    with conn.cursor() as cur:  # type: ignore
+        for batch in _chunked(rows, batch_size):
+            execute_batch(cur, sql, batch, page_size=len(batch))
+            count += len(batch)
+    return count
+
+
+def _copy_rows_on(
+    conn: Any, table: str, columns: Sequence[str], rows: Iterable[Sequence], batch_size: int
+) -> int:
+    cols = ", ".join(_ident(c) for c in columns)
+    if _is_sqlite_conn(conn):
+        # no COPY in sqlite: a single prepared INSERT through executemany
+        placeholders = ", ".join("%s" for _ in columns)
+        return _execute_many_on(
+            conn, f"INSERT INTO {_ident(table)} ({cols}) VALUES ({placeholders})", rows, batch_size
+        )
+    copy_sql = f"COPY {_ident(table)} ({cols}) FROM STDIN"
+    _note_write(conn, copy_sql)
+    count = 0
+    if PSYCOPG3_AVAILABLE:
+        with conn.cursor() as cur:  # type: ignore
+            with cur.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        return count
+    with conn.cursor() as cur:  # type: ignore
+        for batch in _chunked(rows, batch_size):
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for row in batch:
+                writer.writerow(["\\N" if v is None else v for v in row])
+            buf.seek(0)
+            cur.copy_expert(copy_sql + " WITH (FORMAT csv, NULL '\\N')", buf)
+            count += len(batch)
+    return count
+
+
+def _upsert_many_on(
+    conn: Any,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]],
+    batch_size: int,
+) -> int:
+    table = _ident(table)
+    cols = ", ".join(_ident(c) for c in columns)
+    keys = ", ".join(_ident(c) for c in conflict_columns)
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in conflict_columns]
+    if update_columns:
+        action = "DO UPDATE SET " + ", ".join(
+            f"{_ident(c)} = excluded.{_ident(c)}" for c in update_columns
+        )
     else:
-        with get_conn() as conn:
-            if PSYCOPG3_AVAILABLE:
-                with conn.cursor() as cur:  # type: ignore
-                    cur.execute(sql, params or ())
-                    return _fetch_returning_rows(cur) if returning else None
-            else:
-                from psycopg2.extras import RealDictCursor  # type: ignore
+        action = "DO NOTHING"
+    stage = f"_stage_{table}_{uuid.uuid4().hex[:8]}"
+    cur = conn.cursor()
+    try:
+        if _is_sqlite_conn(conn):
+            cur.execute(f"CREATE TEMP TABLE {stage} AS SELECT {cols} FROM {table} WHERE 0")
+            _copy_rows_on(conn, stage, columns, rows, batch_size)
+            # "WHERE true" keeps sqlite from parsing ON CONFLICT as a join constraint
+            cur.execute(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} WHERE true "
+                f"ON CONFLICT ({keys}) {action}"
+            )
+        else:
+            cur.execute(
+                f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA"
+            )
+            cur.execute(f"ALTER TABLE {stage} ADD COLUMN _stage_row BIGSERIAL")
+            _copy_rows_on(conn, stage, columns, rows, batch_size)
+            # one row per key, otherwise ON CONFLICT DO UPDATE refuses to touch a row twice;
+            # the last occurrence wins for updates, the first for DO NOTHING
+            order = "DESC" if update_columns else "ASC"
+            cur.execute(
+                f"INSERT INTO {table} ({cols}) "
+                f"SELECT DISTINCT ON ({keys}) {cols} FROM {stage} ORDER BY {keys}, _stage_row {order} "
+                f"ON CONFLICT ({keys}) {action}"
+            )
+        affected = cur.rowcount
+        if not _is_sqlite_conn(conn):
+            cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        return affected
+    finally:
+        if _is_sqlite_conn(conn):
+            # sqlite DDL runs outside the implicit transaction, so drop it even on error
+            cur.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+        cur.close()
+
+
+def _insert_new_on(
+    conn: Any,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    key_column: str,
+    batch_size: int,
+) -> List[Any]:
+    table = _ident(table)
+    cols = ", ".join(_ident(c) for c in columns)
+    key = _ident(key_column)
+    stage = f"_stage_{table}_{uuid.uuid4().hex[:8]}"
+    cur = conn.cursor()
+    try:
+        if _is_sqlite_conn(conn):
+            cur.execute(f"CREATE TEMP TABLE {stage} AS SELECT {cols} FROM {table} WHERE 0")
+            _copy_rows_on(conn, stage, columns, rows, batch_size)
+            cur.execute(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} WHERE true "
+                f"ON CONFLICT ({key}) DO NOTHING RETURNING {key}"
+            )
+        else:
+            cur.execute(
+                f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA"
+            )
+            _copy_rows_on(conn, stage, columns, rows, batch_size)
+            cur.execute(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} "
+                f"ON CONFLICT ({key}) DO NOTHING RETURNING {key}"
+            )
+        inserted = [r[0] for r in cur.fetchall()]
+        if not _is_sqlite_conn(conn):
+            cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        return inserted
+    finally:
+        if _is_sqlite_conn(conn):
+            cur.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+        cur.close()
+
+
+@contextmanager
+def _bulk_conn(conn: Any) -> Iterator[Any]:
+    """Reuse `conn` as-is, or run on an own connection committed as one transaction."""
+    if conn is not None:
+        yield conn
+        return
+    with transaction() as own:
+        yield own
+
+
+def execute_many(
+    sql: str,
+    rows: Iterable[Sequence],
+    conn: Any = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """Execute one statement for every parameter tuple in `rows`; returns the row count.
+
+    sqlite uses executemany, psycopg 3 runs executemany in pipeline mode and
+    psycopg2 uses execute_batch. Without `conn` all rows commit (or roll back)
+    together.
+    """
+    size = max(1, batch_size or settings.DB_BULK_BATCH_SIZE)
+    with _bulk_conn(conn) as c:
+        return _execute_many_on(c, sql, rows, size)
+
+
+def copy_rows(
+    table: str,
+    columns: Sequence[str],
+    rows_iter: Iterable[Sequence],
+    conn: Any = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """Bulk-load rows into `table` with COPY FROM STDIN; returns the row count.
+
+    `rows_iter` may be any iterable (e.g. a generator over a CSV upload). On
+    sqlite this falls back to an executemany INSERT.
+    """
+    size = max(1, batch_size or settings.DB_BULK_BATCH_SIZE)
+    with _bulk_conn(conn) as c:
+        return _copy_rows_on(c, table, columns, rows_iter, size)
+
+
+def upsert_many(
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+    conn: Any = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """Bulk INSERT ... ON CONFLICT through a temporary staging table.
+
+    Rows are COPY'd into the staging table and merged with one statement.
+    `update_columns=None` updates every non-key column, an empty list means
+    DO NOTHING. Returns the number of rows inserted or updated.
+    """
+    size = max(1, batch_size or settings.DB_BULK_BATCH_SIZE)
+    with _bulk_conn(conn) as c:
+        return _upsert_many_on(c, table, columns, rows, conflict_columns, update_columns, size)
+
+
+def insert_new(
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    key_column: str,
+    conn: Any = None,
+    batch_size: Optional[int] = None,
+) -> List[Any]:
+    """Bulk INSERT ... ON CONFLICT DO NOTHING through a temporary staging table.
+
+    Returns the `key_column` values of the rows actually inserted, so callers
+    can tell which rows were duplicates without a lookup per row.
+    """
+    size = max(1, batch_size or settings.DB_BULK_BATCH_SIZE)
+    with _bulk_conn(conn) as c:
+        return _insert_new_on(c, table, columns, rows, key_column, size)
+
+
+def _listen_conn() -> Any:
+    if not PSYCOPG3_AVAILABLE:
+        raise RuntimeError("table version notifications need psycopg 3")
+    return psycopg.connect(_pg_dsn(), autocommit=True)
+
+
+# Postgres: counters fed by the pg_notify() version triggers (alembic 018)
+TABLE_VERSIONS = TableVersionListener(_listen_conn)
+
+# target table of a plain INSERT/UPDATE/DELETE/COPY (CTE-wrapped writes are left to the NOTIFY)
+_WRITE_TARGET_RE = re.compile(r"^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|COPY)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+# id(Postgres connection) -> tables written in its open transaction
+_PENDING_WRITES: Dict[int, Set[str]] = {}
+_PENDING_WRITES_LOCK = threading.Lock()
 
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:  # type: ignore
-                    cur.execute(sql, params or ())
-                    if returning:
-                        rows = cur.fetchall()
-                        return rows if isinstance(rows, list) else list(rows)
-                    return None
+
+def _note_write(conn: Any, sql: str) -> None:
+    match = _WRITE_TARGET_RE.match(sql)
+    if match:
+        with _PENDING_WRITES_LOCK:
+            _PENDING_WRITES.setdefault(id(conn), set()).add(match.group(1).lower())
+
+
+def _written_tables(conn: Any) -> Set[str]:
+    with _PENDING_WRITES_LOCK:
+        return _PENDING_WRITES.pop(id(conn), set())
+
+
+def _committed_writes(conn: Any) -> None:
+    """Bump this process's counters for what `conn` just committed (read-your-writes)."""
+    tables = _written_tables(conn)
+    if tables:
+        # psycopg 3 and psycopg2 both expose the server pid the NOTIFY will carry
+        pid = getattr(getattr(conn, "info", None), "backend_pid", None)
+        TABLE_VERSIONS.committed(tables, pid)
+
+
+@register_collector
+def _table_version_metrics() -> List[str]:
+    if not TABLE_VERSIONS.running:
+        return []
+    lines = gauge_lines(
+        "table_versions_listener_connected",
+        "1 while table version notifications are being received",
+        int(TABLE_VERSIONS.connected),
+    )
+    lines += counter_lines(
+        "table_versions_notifications_total", "Table write notifications received", TABLE_VERSIONS.notifications
+    )
+    return lines
+
+
+def table_versions(*tables: str, conn: Any = None) -> Tuple[int, ...]:
+    """Current write counters for `tables` (see table_versions), in argument order.
+
+    Callers compare keys: one that differs from the cached one means some of
+    `tables` changed; the values say nothing about how many writes happened.
+    On Postgres the counters live in this process (TABLE_VERSIONS, started on
+    first use) and `conn` is not needed: this process's own commits show up
+    at once, other processes' once their NOTIFY arrives.
+    """
+    if _get_pool() is not None:
+        TABLE_VERSIONS.start()
+        return TABLE_VERSIONS.versions(tables)
+    placeholders = ", ".join("%s" for _ in tables)
+    rows = fetch_all(
+        f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})",
+        tuple(tables),
+        conn=conn,
+    )
+    found = {r["table_name"]: int(r["version"]) for r in rows or []}
+    return tuple(found.get(t, 0) for t in tables)
+
+
+def unit_of_work() -> Iterator[Any]:
+    """FastAPI dependency: one connection and one transaction for the whole request.
+
+    Pass the yielded connection to fetch_*/execute via `conn=`. The transaction
+    commits when the handler returns and rolls back if it raises (including
+    HTTPException), so check-then-insert sequences are atomic.
+
+    Example:
+        def create_x(payload, conn=Depends(unit_of_work)):
+            if fetch_one(SQL_FIND_X, (payload.id,), conn=conn): ...
+            execute(SQL_INSERT_X, (...), conn=conn)
+    """
+    with transaction() as conn:
+        yield conn
 
 
 def init_db():
@@ -685,25 +1781,47 @@ def init_db():
         # ... existing code
 
 
-def next_order_id(prefix: str = "ORD") -> str:
+def next_id(prefix: str, conn: Any = None, peek: bool = False) -> str:
+    """Allocate the next `<prefix>-NNNN` business key, or just preview it with peek=True.
+
+    sqlite bumps order_id_seq inside the caller's transaction (writes are already
+    serialized there). Postgres hands out IDs from an in-process hi/lo block, see
+    id_allocator.py.
+    """
     pool = _get_pool()
     if pool is None:
-        with get_conn() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT last_suffix FROM order_id_seq WHERE prefix = ?", (prefix,)
-            )
-            row = cur.fetchone()
-            suffix = (row[0] if row else 0) + 1
-            cur.execute(
-                "INSERT INTO order_id_seq(prefix, last_suffix) VALUES(?, ?) ON CONFLICT(prefix) DO UPDATE SET last_suffix=excluded.last_suffix",
-                (prefix, suffix),
-            )
-            conn.commit()
-            return f"{prefix}-{suffix:04d}"
-    # Postgres path - rely on SQL_NEXT_ORDER_ID
-    from queries import SQL_NEXT_ORDER_ID
-
-    row = fetch_one(SQL_NEXT_ORDER_ID)
-    suffix = row.get("next_suffix") if row else "0001"
-    return f"{prefix}-{suffix}"
+        if peek:
+            row = fetch_one("SELECT last_suffix FROM order_id_seq WHERE prefix = %s", (prefix,), conn=conn)
+            return f"{prefix}-{(row['last_suffix'] if row else 0) + 1:04d}"
+        if conn is not None:
+            return _next_order_id_sqlite(conn, prefix)
+        with SQLITE_MANAGER.write_lock(), get_conn() as own:
+            order_id = _next_order_id_sqlite(own, prefix)
+            own.commit()
+            return order_id
+    from id_allocator import allocator
+
+    alloc = allocator(prefix)
+    return alloc.peek() if peek else alloc.next()
+
+
+def next_order_id(prefix: str = "ORD", conn: Any = None, peek: bool = False) -> str:
+    return next_id(prefix, conn=conn, peek=peek)
+
+
+def next_customer_id(conn: Any = None, peek: bool = False) -> str:
+    return next_id("CUST", conn=conn, peek=peek)
+
+
+def _next_order_id_sqlite(conn: sqlite3.Connection, prefix: str) -> str:
+    """Bump the sqlite order_id_seq counter on `conn`; the caller commits."""
+    cur = conn.cursor()
+    cur.execute("SELECT last_suffix FROM order_id_seq WHERE prefix = ?", (prefix,))
+    row = cur.fetchone()
+    suffix = (row[0] if row else 0) + 1
+    cur.execute(
+        "INSERT INTO order_id_seq(prefix, last_suffix) VALUES(?, ?) ON CONFLICT(prefix) DO UPDATE SET last_suffix=excluded.last_suffix",
+        (prefix, suffix),
+    )
+    cur.close()
+    return f"{prefix}-{suffix:04d}"
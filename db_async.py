@@ -0,0 +1,187 @@
+"""
+Async counterparts of the db.py helpers for `async def` routers.
+
+- Postgres (psycopg v3 + psycopg_pool): native `AsyncConnectionPool`, so waiting
+  on the database no longer occupies a Starlette worker thread.
+- SQLite fallback (and psycopg2-only installs): aiosqlite-style, i.e. the
+  blocking call runs on a worker thread against the pooled sync connection
+  while the event loop stays free.
+
+The API mirrors db.py: fetch_all / fetch_one / execute accept an optional
+`conn` obtained from `transaction()`.
+"""
+
+from __future__ import annotations
+
+import sys
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from anyio import to_thread
+
+import db
+from config import settings
+from query_stats import QUERY_STATS, explain_sql, format_plan
+
+try:
+    from psycopg.rows import dict_row  # type: ignore
+    from psycopg_pool import AsyncConnectionPool  # type: ignore
+
+    ASYNC_PG_AVAILABLE = True
+except Exception:
+    ASYNC_PG_AVAILABLE = False
+
+ASYNC_POOL = None  # type: ignore
+
+
+def _use_async_pg() -> bool:
+    return ASYNC_PG_AVAILABLE and db.PSYCOPG3_AVAILABLE and db._get_pool() is not None
+
+
+async def _get_async_pool():
+    global ASYNC_POOL
+    if ASYNC_POOL is None:
+        dsn = db._pg_dsn()
+        pool = AsyncConnectionPool(
+            dsn,
+            min_size=settings.DB_POOL_MIN,
+            max_size=settings.DB_ASYNC_POOL_MAX,
+            open=False,
+        )
+        await pool.open()
+        ASYNC_POOL = pool
+    return ASYNC_POOL
+
+
+async def close_pool() -> None:
+    global ASYNC_POOL
+    if ASYNC_POOL is not None:
+        pool, ASYNC_POOL = ASYNC_POOL, None
+        await pool.close()
+
+
+def _run_sync(fn, *args, **kwargs):
+    return to_thread.run_sync(partial(fn, *args, **kwargs))
+
+
+# ---- Postgres (native async) ----
+
+
+async def _capture_plan(conn, probe, sql: str, params: Optional[Tuple]) -> None:
+    """Async counterpart of db._capture_plan for slow calls flagged by db._observe."""
+    if probe.slow_fingerprint is None:
+        return
+    plan = None
+    explain = explain_sql(sql, sqlite=False)
+    if explain is not None:
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(explain, params or ())
+                plan = format_plan(await cur.fetchall())
+        except Exception as exc:
+            plan = f"<plan unavailable: {exc}>"
+    QUERY_STATS.add_slow(probe.slow_fingerprint, probe.seconds, plan)
+
+
+async def _pg_fetch_all(conn, sql: str, params: Optional[Tuple]) -> List[dict]:
+    with db._observe(sql, params) as probe:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql, params or (), **db._pg_exec_kwargs(sql))
+            rows = await cur.fetchall()
+    await _capture_plan(conn, probe, sql, params)
+    return rows
+
+
+async def _pg_fetch_one(conn, sql: str, params: Optional[Tuple]) -> Optional[dict]:
+    with db._observe(sql, params) as probe:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql, params or (), **db._pg_exec_kwargs(sql))
+            row = await cur.fetchone()
+    await _capture_plan(conn, probe, sql, params)
+    return row
+
+
+async def _pg_execute(conn, sql: str, params: Optional[Tuple], returning: bool):
+    db._note_write(conn, sql)
+    with db._observe(sql, params) as probe:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql, params or (), **db._pg_exec_kwargs(sql))
+            if returning and cur.description is not None:
+                rows = await cur.fetchall()
+            else:
+                rows = [] if returning else None
+    await _capture_plan(conn, probe, sql, params)
+    return rows
+
+
+# ---- public API ----
+
+
+async def fetch_all(sql: str, params: Optional[Tuple] = None, conn: Any = None) -> List[dict]:
+    if not _use_async_pg():
+        return await _run_sync(db.fetch_all, sql, params, conn=conn)
+    if conn is not None:
+        return await _pg_fetch_all(conn, sql, params)
+    pool = await _get_async_pool()
+    async with pool.connection() as own:
+        return await _pg_fetch_all(own, sql, params)
+
+
+async def fetch_one(sql: str, params: Optional[Tuple] = None, conn: Any = None) -> Optional[dict]:
+    if not _use_async_pg():
+        return await _run_sync(db.fetch_one, sql, params, conn=conn)
+    if conn is not None:
+        return await _pg_fetch_one(conn, sql, params)
+    pool = await _get_async_pool()
+    async with pool.connection() as own:
+        return await _pg_fetch_one(own, sql, params)
+
+
+async def execute(
+    sql: str,
+    params: Optional[Tuple] = None,
+    returning: bool = False,
+    conn: Any = None,
+):
+    if not _use_async_pg():
+        return await _run_sync(db.execute, sql, params, returning, conn=conn)
+    if conn is not None:
+        return await _pg_execute(conn, sql, params, returning)
+    pool = await _get_async_pool()
+    # pool.connection() commits on clean exit
+    async with pool.connection() as own:
+        try:
+            rows = await _pg_execute(own, sql, params, returning)
+        except BaseException:
+            db._written_tables(own)
+            raise
+    db._committed_writes(own)
+    return rows
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[Any]:
+    """Async counterpart of db.transaction(): commit on success, rollback on error."""
+    if _use_async_pg():
+        pool = await _get_async_pool()
+        async with pool.connection() as conn:
+            try:
+                async with conn.transaction():
+                    yield conn
+            except BaseException:
+                db._written_tables(conn)
+                raise
+            db._committed_writes(conn)
+        return
+
+    cm = db.transaction()
+    conn = await _run_sync(cm.__enter__)
+    try:
+        yield conn
+    except BaseException:
+        exc_info = sys.exc_info()
+        if not await _run_sync(cm.__exit__, *exc_info):
+            raise
+    else:
+        await _run_sync(cm.__exit__, None, None, None)
@@ -0,0 +1,140 @@
+"""
+Hi/lo ID allocation for human-readable business keys (ORD-0042, CUST-0007).
+
+Each prefix owns a row in `order_id_seq(prefix, last_suffix)`. A process
+reserves a block of `ID_BLOCK_SIZE` suffixes with one atomic
+`UPDATE ... RETURNING` in its own short transaction and then hands them out
+from memory, so allocation is O(1) and two workers can never receive the same
+ID. Suffixes left in a block when the process exits are skipped (gaps are
+expected; uniqueness is what matters).
+
+The counter row is seeded once from the highest suffix already in the table
+(the former per-call MAX(REGEXP_REPLACE(...)) scan) the first time a prefix
+is used. Clients may still send explicit IDs (imports, `POST /api/orders`
+with order_id), which the counter knows nothing about: `sync_all()` runs at
+startup and moves every counter past the highest suffix in use, and
+create_order draws another ID when a generated one is already taken.
+`peek()` serves "suggested next" hints without consuming anything.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional
+
+import db
+from config import settings
+
+SQL_ID_SEQ_BUMP = "UPDATE order_id_seq SET last_suffix = last_suffix + %s WHERE prefix = %s RETURNING last_suffix"
+SQL_ID_SEQ_CURRENT = "SELECT last_suffix FROM order_id_seq WHERE prefix = %s"
+SQL_ID_SEQ_SEED = "INSERT INTO order_id_seq (prefix, last_suffix) VALUES (%s, %s) ON CONFLICT (prefix) DO NOTHING"
+SQL_ID_SEQ_RAISE = "UPDATE order_id_seq SET last_suffix = %s WHERE prefix = %s AND last_suffix < %s"
+
+
+class IdAllocator:
+    def __init__(
+        self,
+        prefix: str,
+        seed_sql: Optional[str] = None,
+        seed_sql_sqlite: Optional[str] = None,
+        block_size: Optional[int] = None,
+        width: int = 4,
+    ):
+        self.prefix = prefix
+        # scans returning max_seq (Postgres / sqlite); without one a prefix starts from 0
+        self.seed_sql = seed_sql
+        self.seed_sql_sqlite = seed_sql_sqlite
+        self.block_size = max(1, block_size or settings.ID_BLOCK_SIZE)
+        self.width = width
+        self._next = 0
+        self._hi = 0  # last suffix of the reserved block; _next > _hi means exhausted
+        self.blocks_reserved = 0
+        self._lock = threading.Lock()
+
+    def format(self, suffix: int) -> str:
+        return f"{self.prefix}-{suffix:0{self.width}d}"
+
+    def next(self) -> str:
+        with self._lock:
+            if self._next == 0 or self._next > self._hi:
+                self._hi = self._reserve_block()
+                self._next = self._hi - self.block_size + 1
+                self.blocks_reserved += 1
+            suffix = self._next
+            self._next += 1
+        return self.format(suffix)
+
+    def peek(self) -> str:
+        """The ID `next()` would most likely return, without consuming it."""
+        with self._lock:
+            if self._next and self._next <= self._hi:
+                return self.format(self._next)
+        row = db.fetch_one(SQL_ID_SEQ_CURRENT, (self.prefix,))
+        last = row["last_suffix"] if row else self._seed_value(None)
+        return self.format(int(last) + 1)
+
+    def reset(self) -> None:
+        """Drop the cached block (tests, or after the counter was edited by hand)."""
+        with self._lock:
+            self._next = self._hi = 0
+
+    def sync(self) -> int:
+        """Move the counter past the highest suffix already in the table.
+
+        Returns the counter value afterwards. The cached block is dropped, as
+        it may overlap IDs that were inserted explicitly.
+        """
+        with db.transaction() as conn:
+            high = self._seed_value(conn)
+            if db.fetch_one(SQL_ID_SEQ_CURRENT, (self.prefix,), conn=conn) is None:
+                db.execute(SQL_ID_SEQ_SEED, (self.prefix, high), conn=conn)
+            else:
+                db.execute(SQL_ID_SEQ_RAISE, (high, self.prefix, high), conn=conn)
+            row = db.fetch_one(SQL_ID_SEQ_CURRENT, (self.prefix,), conn=conn)
+        self.reset()
+        return int(row["last_suffix"])
+
+    def _reserve_block(self) -> int:
+        # own transaction: a rolled-back order must not hand its block to someone else
+        with db.transaction() as conn:
+            row = db.fetch_one(SQL_ID_SEQ_BUMP, (self.block_size, self.prefix), conn=conn)
+            if row is None:
+                db.execute(SQL_ID_SEQ_SEED, (self.prefix, self._seed_value(conn)), conn=conn)
+                row = db.fetch_one(SQL_ID_SEQ_BUMP, (self.block_size, self.prefix), conn=conn)
+        return int(row["last_suffix"])
+
+    def _seed_value(self, conn: Any) -> int:
+        sql = self.seed_sql if db._get_pool() is not None else self.seed_sql_sqlite
+        if not sql:
+            return 0
+        row = db.fetch_one(sql, conn=conn)
+        return int(row["max_seq"] or 0) if row else 0
+
+
+_ALLOCATORS: Dict[str, IdAllocator] = {}
+_ALLOCATORS_LOCK = threading.Lock()
+
+
+def allocator(prefix: str) -> IdAllocator:
+    with _ALLOCATORS_LOCK:
+        alloc = _ALLOCATORS.get(prefix)
+        if alloc is None:
+            import queries
+
+            if prefix == "CUST":
+                seed, seed_sqlite = queries.SQL_MAX_CUSTOMER_SUFFIX, queries.SQL_MAX_CUSTOMER_SUFFIX_SQLITE
+            else:
+                seed, seed_sqlite = queries.SQL_MAX_ORDER_SUFFIX, queries.SQL_MAX_ORDER_SUFFIX_SQLITE
+            alloc = _ALLOCATORS[prefix] = IdAllocator(prefix, seed_sql=seed, seed_sql_sqlite=seed_sqlite)
+        return alloc
+
+
+def sync_all(prefixes=("ORD", "CUST")) -> Dict[str, int]:
+    """Startup hook: move each prefix's counter past the IDs already in use."""
+    return {prefix: allocator(prefix).sync() for prefix in prefixes}
+
+
+def reset_all() -> None:
+    with _ALLOCATORS_LOCK:
+        for alloc in _ALLOCATORS.values():
+            alloc.reset()
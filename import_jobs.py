@@ -0,0 +1,355 @@
+"""
+Background CSV import jobs.
+
+`create_job()` spools the upload to IMPORT_SPOOL_DIR and records a queued
+row in `import_jobs`; the HTTP request returns the job id immediately. A pool
+of IMPORT_JOB_WORKERS threads claims queued jobs with one conditional UPDATE
+and feeds the spooled file through csv_import.iter_batches to the registered
+importer (admin._do_import).
+
+Every batch commits in one transaction together with the job's progress
+(batches_done, rows, errors), so the table is the single source of truth: a
+worker that dies mid-import leaves a `running` job whose heartbeat goes
+stale, and after IMPORT_JOB_STALE_SECONDS any worker (in this or another
+process) reclaims it and resumes after the last committed batch. The spool
+is a local directory, so out of the box only workers on the same host can
+resume a job; with several app hosts IMPORT_SPOOL_DIR must point at a volume
+they all mount (a worker that cannot open the file fails the job). A failing
+batch is retried row by row under savepoints so one bad line costs only
+that line.
+
+Cancellation sets `cancel_requested`; a queued job is cancelled at once, a
+running one stops after the batch in flight.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+from config import settings
+from csv_import import iter_batches
+from db import _get_pool, execute, fetch_all, fetch_one, transaction
+from logging_utils import logger
+from metrics import counter_lines, gauge_lines, register_collector
+
+# a relative IMPORT_SPOOL_DIR is taken from here, not from the working directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+JOB_COLUMNS = """
+job_id, entity_type, filename, status, cancel_requested, batch_size, batches_done,
+rows_processed, rows_imported, error_count, errors, last_error, worker_id, created_by,
+created_at, started_ts, heartbeat_ts, finished_ts, active_seconds, spool_path
+"""
+
+# {lock}: FOR UPDATE SKIP LOCKED on Postgres, so concurrent workers pick different jobs
+# instead of racing for the same one (sqlite writers are serialized anyway)
+SQL_CLAIM_JOB = f"""
+UPDATE import_jobs
+SET status = 'running', worker_id = %s, heartbeat_ts = %s, started_ts = COALESCE(started_ts, %s)
+WHERE job_id = (
+    SELECT job_id FROM import_jobs
+    WHERE status = 'queued' OR (status = 'running' AND heartbeat_ts < %s)
+    ORDER BY created_at, job_id
+    LIMIT 1{{lock}}
+)
+  AND (status = 'queued' OR (status = 'running' AND heartbeat_ts < %s))
+RETURNING {JOB_COLUMNS}
+"""
+
+# joins the batch's transaction; matching worker_id makes a reclaimed job's old worker roll back
+SQL_JOB_PROGRESS = """
+UPDATE import_jobs
+SET batches_done = %s, rows_processed = rows_processed + %s, rows_imported = rows_imported + %s,
+    error_count = error_count + %s, errors = %s, heartbeat_ts = %s, active_seconds = active_seconds + %s
+WHERE job_id = %s AND worker_id = %s AND status = 'running'
+RETURNING cancel_requested
+"""
+
+Importer = Callable[..., int]
+_IMPORTER: Optional[Importer] = None
+
+# per-process identity, so a reclaimed job's previous worker notices it lost the job
+WORKER_PREFIX = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobLost(Exception):
+    """The job was reclaimed by another worker (our heartbeat went stale)."""
+
+
+def register_importer(fn: Importer) -> Importer:
+    """Register `fn(entity_type, rows, conn=...) -> imported` as the batch importer."""
+    global _IMPORTER
+    _IMPORTER = fn
+    return fn
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return None if ts is None else datetime.fromtimestamp(float(ts), tz=timezone.utc).isoformat()
+
+
+# ---------------------------------------------------------------- job rows
+def spool_dir() -> str:
+    return os.path.join(APP_DIR, settings.IMPORT_SPOOL_DIR)
+
+
+def create_job(entity_type: str, fileobj: BinaryIO, filename: Optional[str] = None, created_by: Optional[str] = None) -> Dict[str, Any]:
+    """Spool the upload to disk and queue a job for it."""
+    job_id = uuid.uuid4().hex
+    directory = spool_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{job_id}.csv")
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, settings.UPLOAD_READ_CHUNK_SIZE)
+    try:
+        execute(
+            "INSERT INTO import_jobs (job_id, entity_type, filename, spool_path, batch_size, created_by) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (job_id, entity_type.lower(), filename, path, int(settings.IMPORT_BATCH_SIZE), created_by),
+        )
+    except Exception:
+        _remove_spool(path)
+        raise
+    RUNNER.wake()
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    row = fetch_one(f"SELECT {JOB_COLUMNS} FROM import_jobs WHERE job_id = %s", (job_id,))
+    return None if row is None else _describe(row)
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    if status:
+        rows = fetch_all(
+            f"SELECT {JOB_COLUMNS} FROM import_jobs WHERE status = %s ORDER BY created_at DESC, job_id LIMIT %s",
+            (status, limit),
+        )
+    else:
+        rows = fetch_all(f"SELECT {JOB_COLUMNS} FROM import_jobs ORDER BY created_at DESC, job_id LIMIT %s", (limit,))
+    return [_describe(r) for r in rows or []]
+
+
+def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Cancel a queued job now, or ask a running one to stop after its current batch."""
+    # guarded by status: a worker may claim the job between our read and our write
+    with transaction() as conn:
+        cancelled = execute(
+            "UPDATE import_jobs SET status = 'cancelled', cancel_requested = 1, finished_ts = %s "
+            "WHERE job_id = %s AND status = 'queued' RETURNING spool_path",
+            (_now(), job_id),
+            returning=True,
+            conn=conn,
+        )
+        if not cancelled:
+            execute(
+                "UPDATE import_jobs SET cancel_requested = 1 WHERE job_id = %s AND status = 'running'",
+                (job_id,),
+                conn=conn,
+            )
+    if cancelled:
+        # nobody can claim a cancelled job, so the spool is ours to remove
+        _remove_spool(cancelled[0]["spool_path"])
+    return get_job(job_id)
+
+
+def _describe(row: Dict[str, Any]) -> Dict[str, Any]:
+    active = float(row.get("active_seconds") or 0)
+    processed = int(row.get("rows_processed") or 0)
+    return {
+        "job_id": row["job_id"],
+        "entity_type": row["entity_type"],
+        "filename": row.get("filename"),
+        "status": row["status"],
+        "cancel_requested": bool(row.get("cancel_requested")),
+        "batch_size": int(row["batch_size"]),
+        "batches_done": int(row.get("batches_done") or 0),
+        "rows_processed": processed,
+        "rows_imported": int(row.get("rows_imported") or 0),
+        "error_count": int(row.get("error_count") or 0),
+        "errors": json.loads(row["errors"]) if row.get("errors") else [],
+        "last_error": row.get("last_error"),
+        "created_by": row.get("created_by"),
+        "created_at": None if row.get("created_at") is None else str(row["created_at"]),
+        "started_at": _iso(row.get("started_ts")),
+        "finished_at": _iso(row.get("finished_ts")),
+        "active_seconds": round(active, 3),
+        "rows_per_second": round(processed / active, 1) if active > 0 else None,
+    }
+
+
+def _remove_spool(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning(f"could not remove import spool file {path}", exc_info=True)
+
+
+# ---------------------------------------------------------------- workers
+class ImportJobRunner:
+    def __init__(self, workers: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.workers = settings.IMPORT_JOB_WORKERS if workers is None else workers
+        self.poll_interval = settings.IMPORT_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> None:
+        if self.running or self.workers <= 0:
+            return
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._run, args=(f"{WORKER_PREFIX}:{i}",), name=f"import-job-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self) -> None:
+        # jobs in flight stay `running`; their heartbeat goes stale and they resume after a restart
+        self._stopping.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                if self.run_once(worker_id):
+                    continue
+            except Exception:
+                self.failures += 1
+                logger.error("import job worker failed", exc_info=True)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def run_once(self, worker_id: Optional[str] = None) -> Optional[str]:
+        """Claim and process one job; returns its id, or None when nothing is runnable."""
+        worker_id = worker_id or f"{WORKER_PREFIX}:inline"
+        now = _now()
+        stale = now - settings.IMPORT_JOB_STALE_SECONDS
+        lock = "" if _get_pool() is None else " FOR UPDATE SKIP LOCKED"
+        rows = execute(SQL_CLAIM_JOB.format(lock=lock), (worker_id, now, now, stale, stale), returning=True)
+        if not rows:
+            return None
+        job = rows[0]
+        try:
+            self._process(job, worker_id)
+        except JobLost:
+            logger.warning(f"import job {job['job_id']} was reclaimed by another worker")
+        except Exception as exc:
+            self.failures += 1
+            logger.error(f"import job {job['job_id']} failed", exc_info=True)
+            execute(
+                "UPDATE import_jobs SET status = 'failed', last_error = %s, finished_ts = %s "
+                "WHERE job_id = %s AND worker_id = %s",
+                (str(exc), _now(), job["job_id"], worker_id),
+            )
+        return job["job_id"]
+
+    def _process(self, job: Dict[str, Any], worker_id: str) -> None:
+        if _IMPORTER is None:
+            raise RuntimeError("no importer registered")
+        job_id, entity_type = job["job_id"], job["entity_type"]
+        errors: List[str] = json.loads(job["errors"]) if job.get("errors") else []
+        done = int(job.get("batches_done") or 0)
+        with open(job["spool_path"], "rb") as fh:
+            # the stored batch size keeps batch boundaries identical across resumes
+            for n, batch in enumerate(iter_batches(fh, int(job["batch_size"]), errors="replace")):
+                if n < done:
+                    continue
+                if self._stopping.is_set():
+                    return
+                start = time.perf_counter()
+                with transaction() as conn:
+                    imported, failed = self._import_batch(entity_type, batch, errors, conn)
+                    row = fetch_one(
+                        SQL_JOB_PROGRESS,
+                        (
+                            n + 1, len(batch), imported, failed,
+                            json.dumps(errors),
+                            _now(), time.perf_counter() - start, job_id, worker_id,
+                        ),
+                        conn=conn,
+                    )
+                    if row is None:
+                        raise JobLost(job_id)
+                self.batches += 1
+                self.rows += len(batch)
+                if row["cancel_requested"]:
+                    self._finish(job, worker_id, CANCELLED)
+                    return
+        self._finish(job, worker_id, DONE)
+
+    def _import_batch(self, entity_type: str, batch: List[Any], errors: List[str], conn: Any):
+        rows = [row for _, row in batch]
+        execute("SAVEPOINT import_batch", conn=conn)
+        try:
+            imported = _IMPORTER(entity_type, rows, conn=conn)
+            execute("RELEASE SAVEPOINT import_batch", conn=conn)
+            return imported, 0
+        except Exception:
+            execute("ROLLBACK TO SAVEPOINT import_batch", conn=conn)
+            execute("RELEASE SAVEPOINT import_batch", conn=conn)
+        # one savepoint per row so each bad line is reported and the rest still lands
+        imported = failed = 0
+        for line, row in batch:
+            execute("SAVEPOINT import_row", conn=conn)
+            try:
+                imported += _IMPORTER(entity_type, [row], conn=conn)
+                execute("RELEASE SAVEPOINT import_row", conn=conn)
+            except Exception as exc:
+                execute("ROLLBACK TO SAVEPOINT import_row", conn=conn)
+                execute("RELEASE SAVEPOINT import_row", conn=conn)
+                failed += 1
+                if len(errors) < settings.IMPORT_JOB_MAX_ERRORS:
+                    errors.append(f"Line {line}: {exc}")
+        return imported, failed
+
+    def _finish(self, job: Dict[str, Any], worker_id: str, status: str) -> None:
+        execute(
+            "UPDATE import_jobs SET status = %s, finished_ts = %s WHERE job_id = %s AND worker_id = %s",
+            (status, _now(), job["job_id"], worker_id),
+        )
+        _remove_spool(job["spool_path"])
+
+
+RUNNER = ImportJobRunner()
+
+
+@register_collector
+def _import_job_metrics() -> List[str]:
+    lines: List[str] = []
+    lines += counter_lines("import_job_batches_total", "Import job batches committed", RUNNER.batches)
+    lines += counter_lines("import_job_rows_total", "Rows processed by import jobs", RUNNER.rows)
+    lines += counter_lines("import_job_failures_total", "Import jobs (or workers) that failed", RUNNER.failures)
+    lines += gauge_lines("import_job_workers", "Running import job worker threads", sum(t.is_alive() for t in RUNNER._threads))
+    return lines
@@ -17,7 +17,14 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from db import execute, fetch_one, _get_pool
+import db
 import auth
+import metrics as app_metrics
+import db_async
+import order_finance
+import import_jobs
+import id_allocator
+from api_key_usage import USAGE_BUFFER
 from user_mgmt import ensure_user_tables
 from logging_utils import setup_logging, logger as app_logger
 from config import settings
@@ -31,6 +38,10 @@ from routers.customers import router as customers_router
 from routers.employees import router as employees_router
 from routers.timesheets import router as timesheets_router
 from routers.inventory import router as inventory_router
+from routers.mrp import router as mrp_router
+from routers.bom import router as bom_router
+from routers.schedule import router as schedule_router
+from routers.costs import router as costs_router
 
 
 # Initialize logging early
@@ -188,6 +199,50 @@ except Exception:
     pass
 
 
+@app.on_event("startup")
+def start_background_writers():
+    USAGE_BUFFER.start()
+    order_finance.RECONCILER.start()
+    # also picks up jobs left queued or running by a previous process
+    import_jobs.RUNNER.start()
+
+
+@app.on_event("startup")
+def sync_id_counters():
+    # IDs inserted explicitly (imports, client-chosen order_id) bypass the
+    # hi/lo counters; start past them so generated IDs do not collide
+    try:
+        id_allocator.sync_all()
+    except Exception as exc:
+        app_logger.warning(f"ID counter sync failed: {exc}")
+
+
+@app.on_event("startup")
+def warm_db_pool():
+    if settings.DB_POOL_WARMUP:
+        try:
+            db.warm_pool()
+        except Exception as exc:
+            app_logger.warning(f"DB pool warm-up failed: {exc}")
+    if settings.DB_POOL_ADAPTIVE:
+        db.POOL_SIZER.start()
+
+
+@app.on_event("shutdown")
+def stop_background_writers():
+    # flush buffered API key usage before the process exits
+    USAGE_BUFFER.stop()
+    db.POOL_SIZER.stop()
+    order_finance.RECONCILER.stop()
+    import_jobs.RUNNER.stop()
+    db.TABLE_VERSIONS.stop()
+
+
+@app.on_event("shutdown")
+async def close_async_pool():
+    await db_async.close_pool()
+
+
 # ---- HEALTH ----
 @app.get("/healthz", tags=["Health"], summary="Liveness probe")
 def health():
@@ -240,7 +295,8 @@ def readyz():
 def metrics():
     """
     Export metrics in Prometheus text format for monitoring.
-    Includes: total requests, errors, per-endpoint counters.
+    Includes: total requests, errors, per-endpoint counters and registered
+    subsystem collectors (see metrics.register_collector).
     """
     lines = [
         "# HELP http_requests_total Total HTTP requests",
@@ -268,6 +324,10 @@ def metrics():
         safe_endpoint = endpoint.replace('"', '\\"')
         lines.append(f'http_errors_by_endpoint{{endpoint="{safe_endpoint}"}} {count}')
 
+    # Subsystem collectors (API key usage buffer, ...)
+    lines.append("")
+    lines.extend(app_metrics.collect())
+
     return PlainTextResponse("\n".join(lines))
 
 
@@ -281,6 +341,10 @@ app.include_router(customers_router)
 app.include_router(employees_router)
 app.include_router(timesheets_router)
 app.include_router(inventory_router)
+app.include_router(mrp_router)
+app.include_router(bom_router)
+app.include_router(schedule_router)
+app.include_router(costs_router)
 
 
 # ---- Apply Route-Specific Rate Limits ----
@@ -0,0 +1,112 @@
+"""
+Small in-process metric primitives rendered in Prometheus text format.
+
+`main.metrics` renders the HTTP counters itself and then appends the lines of
+every collector registered here, so subsystems (DB, buffers, caches) can expose
+their own gauges and histograms without main.py knowing their internals.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        safe = str(v).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{k}="{safe}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram (seconds) compatible with Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def total(self) -> float:
+        return self._sum
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"count": self._count, "sum": self._sum}
+
+    def render(self, labels: Optional[Dict[str, str]] = None, header: bool = True) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        lines = []
+        if header:
+            lines.append(f"# HELP {self.name} {self.help_text}")
+            lines.append(f"# TYPE {self.name} histogram")
+        cumulative = 0
+        for bound, c in zip(self.buckets, counts):
+            cumulative += c
+            bucket_labels = dict(labels or {}, le=repr(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        cumulative += counts[-1]
+        lines.append(f"{self.name}_bucket{_format_labels(dict(labels or {}, le='+Inf'))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def gauge_lines(name: str, help_text: str, value: float, labels: Optional[Dict[str, str]] = None) -> List[str]:
+    return [
+        f"# HELP {name} {help_text}",
+        f"# TYPE {name} gauge",
+        f"{name}{_format_labels(labels)} {value}",
+    ]
+
+
+def counter_lines(name: str, help_text: str, value: float, labels: Optional[Dict[str, str]] = None) -> List[str]:
+    return [
+        f"# HELP {name} {help_text}",
+        f"# TYPE {name} counter",
+        f"{name}{_format_labels(labels)} {value}",
+    ]
+
+
+def register_collector(fn: Callable[[], List[str]]) -> Callable[[], List[str]]:
+    """Register a function returning Prometheus lines; usable as a decorator."""
+    if fn not in _collectors:
+        _collectors.append(fn)
+    return fn
+
+
+def collect() -> List[str]:
+    lines: List[str] = []
+    for fn in list(_collectors):
+        try:
+            lines.extend(fn())
+        except Exception:
+            # a broken collector must never take /metrics down
+            continue
+    return lines
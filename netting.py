@@ -0,0 +1,160 @@
+"""
+Shortage netting: allocate on-hand stock across open order lines by due date.
+
+The line-level `v_shortages` compares every line with the full on-hand
+quantity, so ten orders for one part each "see" all of it. Netting instead
+walks the open lines of each product in due-date order (no due date last,
+then order date, order id, line no) and lets earlier lines consume stock
+first:
+
+    allocated = clip(on_hand - qty of earlier lines for the product, 0, qty)
+    shortage  = qty - allocated
+
+Everything after loading is vectorised with NumPy: one lexsort, one cumulative
+sum, and per-product offsets from the group starts.
+
+The result is cached in process and keyed by the table_versions counters of
+inventory, order_lines and orders, so any write through any path (handlers,
+imports, raw SQL) invalidates it on the next call.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db import fetch_all, table_versions
+from metrics import counter_lines, gauge_lines, register_collector
+
+CLOSED_STATUSES = ("Done", "Invoiced")
+VERSION_TABLES = ("inventory", "order_lines", "orders")
+NO_DUE_DATE = "9999-12-31"
+
+SQL_OPEN_LINES = f"""
+SELECT ol.order_id, ol.line_no, ol.product_id, ol.qty, o.due_date, o.order_date
+FROM order_lines ol
+JOIN orders o ON o.order_id = ol.order_id
+WHERE o.status NOT IN ({", ".join(f"'{s}'" for s in CLOSED_STATUSES)})
+"""
+
+SQL_ON_HAND = """
+SELECT product_id, SUM(qty_on_hand) AS qty_on_hand
+FROM inventory_balance
+GROUP BY product_id
+"""
+
+
+def _date_key(value: Any, default: str) -> str:
+    # sqlite returns ISO strings, Postgres date objects; both sort the same as text
+    return default if value is None else str(value)[:10]
+
+
+def net_shortages(lines: List[Dict[str, Any]], on_hand: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Allocate `on_hand` per product across `lines`; returns one dict per line, in netting order."""
+    n = len(lines)
+    if n == 0:
+        return []
+    products = np.array([r["product_id"] for r in lines], dtype=object)
+    qty = np.fromiter((float(r["qty"] or 0) for r in lines), dtype=np.float64, count=n)
+    due = np.array([_date_key(r.get("due_date"), NO_DUE_DATE) for r in lines])
+    ordered = np.array([_date_key(r.get("order_date"), NO_DUE_DATE) for r in lines])
+    order_ids = np.array([str(r["order_id"]) for r in lines])
+    line_nos = np.fromiter((int(r["line_no"]) for r in lines), dtype=np.int64, count=n)
+
+    product_keys, product_idx = np.unique(products.astype(str), return_inverse=True)
+    # np.lexsort: last key is the primary one
+    order = np.lexsort((line_nos, order_ids, ordered, due, product_idx))
+
+    p_sorted = product_idx[order]
+    q_sorted = qty[order]
+    cumulative = np.cumsum(q_sorted)
+    group_start = np.ones(n, dtype=bool)
+    group_start[1:] = p_sorted[1:] != p_sorted[:-1]
+    # qty of the product's earlier lines = running total minus the total before its group
+    group_id = np.cumsum(group_start) - 1
+    before_group = (cumulative - q_sorted)[np.flatnonzero(group_start)][group_id]
+    consumed_before = cumulative - q_sorted - before_group
+
+    stock = np.fromiter(
+        (max(float(on_hand.get(str(p), 0) or 0), 0.0) for p in product_keys),
+        dtype=np.float64,
+        count=len(product_keys),
+    )
+    available = stock[p_sorted]
+    allocated = np.clip(available - consumed_before, 0.0, q_sorted)
+    shortage = q_sorted - allocated
+
+    result: List[Dict[str, Any]] = []
+    for pos, i in enumerate(order.tolist()):
+        row = lines[i]
+        result.append(
+            {
+                "order_id": row["order_id"],
+                "line_no": row["line_no"],
+                "component_id": row["product_id"],
+                "due_date": row.get("due_date"),
+                "required_qty": float(q_sorted[pos]),
+                "qty_on_hand": float(available[pos]),
+                "allocated_qty": float(allocated[pos]),
+                "shortage_qty": float(shortage[pos]),
+            }
+        )
+    return result
+
+
+class NettingCache:
+    def __init__(self):
+        self._key: Optional[Tuple[int, ...]] = None
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_compute_seconds = 0.0
+
+    def get(self) -> List[Dict[str, Any]]:
+        key = table_versions(*VERSION_TABLES)
+        if key == self._key:
+            self.hits += 1
+            return self._rows
+        with self._lock:
+            # another request may have recomputed while we waited
+            if key == self._key:
+                self.hits += 1
+                return self._rows
+            start = time.perf_counter()
+            on_hand = {r["product_id"]: r["qty_on_hand"] for r in fetch_all(SQL_ON_HAND) or []}
+            rows = net_shortages(fetch_all(SQL_OPEN_LINES) or [], on_hand)
+            self.last_compute_seconds = time.perf_counter() - start
+            self._rows, self._key = rows, key
+            self.misses += 1
+            return rows
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._key = None
+            self._rows = []
+
+
+NETTING_CACHE = NettingCache()
+
+
+def netted_shortages(include_covered: bool = False) -> List[Dict[str, Any]]:
+    rows = NETTING_CACHE.get()
+    if include_covered:
+        return rows
+    return [r for r in rows if r["shortage_qty"] > 0]
+
+
+@register_collector
+def _netting_metrics() -> List[str]:
+    lines: List[str] = []
+    lines += counter_lines("shortage_netting_cache_hits_total", "Netted shortage requests served from cache", NETTING_CACHE.hits)
+    lines += counter_lines("shortage_netting_cache_misses_total", "Netted shortage recomputations", NETTING_CACHE.misses)
+    lines += gauge_lines(
+        "shortage_netting_compute_seconds", "Duration of the last netting recomputation",
+        round(NETTING_CACHE.last_compute_seconds, 6),
+    )
+    return lines
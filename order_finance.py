@@ -0,0 +1,167 @@
+"""
+Drift detection for the incrementally maintained `order_finance` table.
+
+`order_finance` (one row per order: revenue, material_cost, labor_cost and a
+generated gross_margin) is kept current by database triggers on orders,
+order_lines, timesheets, products.std_cost and employees.hourly_rate, so
+analytics read it instead of re-aggregating every order on each request.
+
+`reconcile()` recomputes the figures from the source tables the way the old
+v_order_finance view did and reports orders whose stored values are missing,
+orphaned or off by more than `tolerance`; with fix=True it rewrites them.
+`FinanceReconciler` runs it periodically (ORDER_FINANCE_RECONCILE_INTERVAL).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from db import execute, fetch_all, fetch_one, transaction, upsert_many
+from logging_utils import logger
+from metrics import counter_lines, gauge_lines, register_collector
+
+# Source-of-truth aggregation, one correlated subquery per measure and order.
+SQL_ORDER_FINANCE_COMPUTED = """
+SELECT o.order_id,
+  COALESCE((SELECT SUM(ol.qty * ol.unit_price * (1 - ol.discount_pct))
+            FROM order_lines ol WHERE ol.order_id = o.order_id), 0) AS revenue,
+  COALESCE((SELECT SUM(ol.qty * p.std_cost)
+            FROM order_lines ol JOIN products p ON p.product_id = ol.product_id
+            WHERE ol.order_id = o.order_id), 0) AS material_cost,
+  COALESCE((SELECT SUM(t.hours * e.hourly_rate)
+            FROM timesheets t JOIN employees e ON e.emp_id = t.emp_id
+            WHERE t.order_id = o.order_id), 0) AS labor_cost
+FROM orders o
+"""
+
+SQL_ORDER_FINANCE_DRIFT = f"""
+SELECT c.order_id,
+       c.revenue, c.material_cost, c.labor_cost,
+       f.revenue AS stored_revenue,
+       f.material_cost AS stored_material_cost,
+       f.labor_cost AS stored_labor_cost
+FROM ({SQL_ORDER_FINANCE_COMPUTED}) c
+LEFT JOIN order_finance f ON f.order_id = c.order_id
+WHERE f.order_id IS NULL
+   OR ABS(f.revenue - c.revenue) > %s
+   OR ABS(f.material_cost - c.material_cost) > %s
+   OR ABS(f.labor_cost - c.labor_cost) > %s
+ORDER BY c.order_id
+"""
+
+SQL_ORDER_FINANCE_ORPHANS = """
+SELECT f.order_id FROM order_finance f
+WHERE NOT EXISTS (SELECT 1 FROM orders o WHERE o.order_id = f.order_id)
+"""
+
+FINANCE_COLUMNS = ["order_id", "revenue", "material_cost", "labor_cost"]
+
+
+def reconcile(fix: bool = False, tolerance: Optional[float] = None, limit: int = 100) -> Dict[str, Any]:
+    """Compare order_finance with a full recomputation; optionally repair drifting rows."""
+    tolerance = settings.ORDER_FINANCE_TOLERANCE if tolerance is None else tolerance
+    start = time.perf_counter()
+    drift = fetch_all(SQL_ORDER_FINANCE_DRIFT, (tolerance, tolerance, tolerance)) or []
+    orphans = [r["order_id"] for r in fetch_all(SQL_ORDER_FINANCE_ORPHANS) or []]
+    checked = (fetch_one("SELECT COUNT(*) AS n FROM orders") or {}).get("n", 0)
+
+    fixed = 0
+    if fix and (drift or orphans):
+        with transaction() as conn:
+            if drift:
+                fixed += upsert_many(
+                    "order_finance",
+                    FINANCE_COLUMNS,
+                    [tuple(r[c] for c in FINANCE_COLUMNS) for r in drift],
+                    ["order_id"],
+                    conn=conn,
+                )
+            for order_id in orphans:
+                execute("DELETE FROM order_finance WHERE order_id = %s", (order_id,), conn=conn)
+                fixed += 1
+
+    result = {
+        "checked": int(checked or 0),
+        "drift_count": len(drift),
+        "orphan_count": len(orphans),
+        "fixed": fixed,
+        "drift": [_describe(r) for r in drift[:limit]],
+        "orphans": orphans[:limit],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    RECONCILER.last_result = result
+    if drift or orphans:
+        logger.warning(
+            f"order_finance drift: {len(drift)} rows off, {len(orphans)} orphaned"
+            + (f", {fixed} fixed" if fix else "")
+        )
+    return result
+
+
+def _describe(row: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"order_id": row["order_id"]}
+    for col in ("revenue", "material_cost", "labor_cost"):
+        stored = row.get(f"stored_{col}")
+        out[col] = float(row[col] or 0)
+        out[f"stored_{col}"] = None if stored is None else float(stored)
+    return out
+
+
+class FinanceReconciler:
+    def __init__(self, interval: float = settings.ORDER_FINANCE_RECONCILE_INTERVAL, fix: bool = False):
+        self.interval = interval
+        self.fix = fix
+        self.runs = 0
+        self.failures = 0
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or self.interval <= 0:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="order-finance-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                reconcile(fix=self.fix)
+                self.runs += 1
+            except Exception:
+                self.failures += 1
+                logger.error("order_finance reconcile failed", exc_info=True)
+
+
+RECONCILER = FinanceReconciler(fix=settings.ORDER_FINANCE_RECONCILE_FIX)
+
+
+@register_collector
+def _finance_metrics() -> List[str]:
+    last = RECONCILER.last_result
+    if last is None:
+        return []
+    lines: List[str] = []
+    lines += gauge_lines(
+        "order_finance_drift_rows", "Orders whose order_finance row disagreed with the source tables",
+        last["drift_count"] + last["orphan_count"],
+    )
+    lines += counter_lines(
+        "order_finance_reconcile_failures_total", "Failed periodic order_finance reconciliations",
+        RECONCILER.failures,
+    )
+    return lines
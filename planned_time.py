@@ -0,0 +1,120 @@
+"""
+Planned hours per order from `routings`, computed in batches and cached.
+
+For every order line each routing operation of its product contributes
+
+    std_setup_min + qty * std_run_min_per_unit   minutes
+
+(the same durations the scheduler uses). `planned_times(order_ids)` computes
+all requested orders that are not cached with one grouped query, and caches
+the result per order. The cache is keyed by the table_versions counters of
+order_lines, routings and orders, so a write to any of them through any path
+invalidates it on the next call. Lines whose product has no routing add
+nothing and are counted in `unrouted_lines`.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db import fetch_all, table_versions
+from metrics import counter_lines, register_collector
+
+VERSION_TABLES = ("order_lines", "routings", "orders")
+# ids per batch query (well under sqlite's bound-variable limit)
+BATCH_SIZE = 500
+
+SQL_PLANNED_TIME_BATCH = """
+SELECT o.order_id,
+       COALESCE(SUM(r.std_setup_min), 0) / 60.0 AS setup_hours,
+       COALESCE(SUM(ol.qty * r.std_run_min_per_unit), 0) / 60.0 AS run_hours,
+       COUNT(r.operation_no) AS operations,
+       SUM(CASE WHEN ol.line_no IS NOT NULL AND r.product_id IS NULL THEN 1 ELSE 0 END) AS unrouted_lines
+FROM orders o
+LEFT JOIN order_lines ol ON ol.order_id = o.order_id
+LEFT JOIN routings r ON r.product_id = ol.product_id
+WHERE o.order_id IN ({placeholders})
+GROUP BY o.order_id
+"""
+
+
+def _compute(order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(order_ids), BATCH_SIZE):
+        chunk = order_ids[i:i + BATCH_SIZE]
+        sql = SQL_PLANNED_TIME_BATCH.format(placeholders=", ".join("%s" for _ in chunk))
+        for r in fetch_all(sql, tuple(chunk)) or []:
+            setup = float(r["setup_hours"] or 0)
+            run = float(r["run_hours"] or 0)
+            out[r["order_id"]] = {
+                "order_id": r["order_id"],
+                "planned_hours": round(setup + run, 4),
+                "setup_hours": round(setup, 4),
+                "run_hours": round(run, 4),
+                "operations": int(r["operations"] or 0),
+                "unrouted_lines": int(r["unrouted_lines"] or 0),
+            }
+    return out
+
+
+class PlannedTimeCache:
+    def __init__(self):
+        self._key: Optional[Tuple[int, ...]] = None
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, order_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        wanted = list(dict.fromkeys(order_ids))
+        key = table_versions(*VERSION_TABLES)
+        with self._lock:
+            if key != self._key:
+                self._rows, self._key = {}, key
+            rows = self._rows
+            missing = [o for o in wanted if o not in rows]
+        self.hits += len(wanted) - len(missing)
+        computed: Dict[str, Dict[str, Any]] = {}
+        if missing:
+            self.misses += len(missing)
+            computed = _compute(missing)
+            with self._lock:
+                # keep the result only if no write landed while we computed
+                if self._key == key:
+                    rows.update(computed)
+        out: Dict[str, Dict[str, Any]] = {}
+        for o in wanted:
+            row = computed.get(o) or rows.get(o)
+            if row is not None:
+                out[o] = row
+        return out
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._key = None
+            self._rows = {}
+
+    @property
+    def size(self) -> int:
+        return len(self._rows)
+
+
+PLANNED_TIME_CACHE = PlannedTimeCache()
+
+
+def planned_times(order_ids: Iterable[str]) -> List[Dict[str, Any]]:
+    """Planned time for each existing order in `order_ids`, in request order."""
+    return list(PLANNED_TIME_CACHE.get_many(order_ids).values())
+
+
+def planned_time(order_id: str) -> Optional[Dict[str, Any]]:
+    return PLANNED_TIME_CACHE.get_many([order_id]).get(order_id)
+
+
+@register_collector
+def _planned_time_metrics() -> List[str]:
+    lines: List[str] = []
+    lines += counter_lines("planned_time_cache_hits_total", "Planned-time lookups served from cache", PLANNED_TIME_CACHE.hits)
+    lines += counter_lines("planned_time_cache_misses_total", "Planned-time lookups computed from routings", PLANNED_TIME_CACHE.misses)
+    return lines
@@ -0,0 +1,142 @@
+"""
+Connection-pool instrumentation and optional adaptive sizing.
+
+`PoolMonitor` wraps every connection checkout in db.py (Postgres pools and the
+sqlite manager alike): it tracks waiting / in-use counts and records how long
+each checkout waited, so pool exhaustion shows up on /metrics instead of as
+unexplained request latency.
+
+`PoolSizer` (DB_POOL_ADAPTIVE=1) periodically looks at the waits observed in
+the last interval and grows the pool cap by DB_POOL_GROW_STEP when checkouts
+had to wait, or shrinks it by one when the peak usage left it idle, always
+staying within [min_size, max_size].
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from logging_utils import logger
+from metrics import Histogram
+
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolMonitor:
+    def __init__(self, wait_threshold: float = 0.005):
+        # a checkout slower than this counts as a "wait" for the sizer
+        self.wait_threshold = wait_threshold
+        self.wait_seconds = Histogram(
+            "db_pool_checkout_wait_seconds",
+            "Time spent waiting for a pooled DB connection",
+            WAIT_BUCKETS,
+        )
+        self.waiting = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.failures = 0
+        self._interval_waits = 0
+        self._interval_peak = 0
+        self._lock = threading.Lock()
+
+    def begin(self) -> float:
+        with self._lock:
+            self.waiting += 1
+        return time.perf_counter()
+
+    def acquired(self, start: float) -> None:
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.checkouts += 1
+            if self.in_use > self._interval_peak:
+                self._interval_peak = self.in_use
+            if waited >= self.wait_threshold:
+                self._interval_waits += 1
+        self.wait_seconds.observe(waited)
+
+    def failed(self, start: float) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.failures += 1
+            # a timed-out checkout is the strongest signal the pool is too small
+            self._interval_waits += 1
+
+    def released(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def take_interval(self) -> Tuple[int, int]:
+        """Return (waits, peak in-use) since the previous call and start a new interval."""
+        with self._lock:
+            waits, peak = self._interval_waits, self._interval_peak
+            self._interval_waits = 0
+            self._interval_peak = self.in_use
+            return waits, peak
+
+
+class PoolSizer:
+    def __init__(
+        self,
+        monitor: PoolMonitor,
+        apply_size: Callable[[int], bool],
+        min_size: int,
+        max_size: int,
+        interval: float = 30.0,
+        grow_step: int = 2,
+        initial: Optional[int] = None,
+    ):
+        self.monitor = monitor
+        self.apply_size = apply_size
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.interval = interval
+        self.grow_step = max(1, grow_step)
+        self.current = min(self.max_size, max(self.min_size, initial or self.min_size))
+        self.resizes = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def step(self) -> int:
+        """One sizing decision; returns the (possibly unchanged) pool cap."""
+        waits, peak = self.monitor.take_interval()
+        target = self.current
+        if waits > 0 and self.current < self.max_size:
+            target = min(self.max_size, self.current + self.grow_step)
+        elif waits == 0 and peak < self.current - 1 and self.current > self.min_size:
+            target = self.current - 1
+        if target != self.current and self.apply_size(target):
+            logger.info(
+                f"db pool resized {self.current} -> {target} (waits={waits}, peak_in_use={peak})"
+            )
+            self.current = target
+            self.resizes += 1
+        return self.current
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self.apply_size(self.current)
+        self._thread = threading.Thread(target=self._run, name="db-pool-sizer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.step()
+            except Exception:
+                logger.error("db pool sizer failed", exc_info=True)
@@ -1,18 +1,26 @@
 # python
 # file: `queries.py`
 
+from statements import register
+
+# Hot single-row lookups and inserts are registered statements (see statements.py):
+# prepared server-side on psycopg 3, pre-translated for sqlite, arity-checked here.
+
 # READS
-SQL_ORDERS = """
+SQL_ORDERS_SELECT = """
 SELECT order_id, customer_id, status, due_date, order_date, contact_person
 FROM orders
-ORDER BY order_date DESC, order_id;
 """
 
-SQL_FINANCE_ONE = """
+SQL_ORDERS_ORDER_BY = "ORDER BY order_date DESC, order_id"
+
+SQL_ORDERS = SQL_ORDERS_SELECT + SQL_ORDERS_ORDER_BY + ";\n"
+
+SQL_FINANCE_ONE = register("finance_one", """
 SELECT order_id, revenue, material_cost, labor_cost, gross_margin
-FROM v_order_finance
+FROM order_finance
 WHERE order_id = %s;
-"""
+""", arity=1)
 
 SQL_SHORTAGES = """
 SELECT order_id, component_id, required_qty, qty_on_hand, shortage_qty
@@ -20,12 +28,6 @@ FROM v_shortages
 ORDER BY order_id, component_id;
 """
 
-SQL_PLANNED_ONE = """
-SELECT order_id, planned_hours
-FROM v_planned_time
-WHERE order_id = %s;
-"""
-
 SQL_PRODUCTS = """
 SELECT product_id, name, unit, std_cost, price, vat_rate 
 FROM products 
@@ -39,19 +41,19 @@ ORDER BY customer_id;
 """
 
 # WRITES with proper constraints
-SQL_INSERT_ORDER = """
+SQL_INSERT_ORDER = register("insert_order", """
 INSERT INTO orders (order_id, order_date, customer_id, status, due_date, contact_person)
 VALUES (%s, CURRENT_DATE, %s, %s, %s, %s)
 ON CONFLICT (order_id) DO NOTHING
 RETURNING order_id, customer_id, status, order_date, due_date, contact_person;
-"""
+""", arity=5)
 
-SQL_INSERT_ORDER_LINE = """
+SQL_INSERT_ORDER_LINE = register("insert_order_line", """
 INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price, discount_pct, graphic_id)
 VALUES (%s, %s, %s, %s, %s, %s, %s)
 ON CONFLICT (order_id, line_no) DO NOTHING
 RETURNING order_id, line_no, product_id, qty, unit_price, discount_pct, graphic_id;
-"""
+""", arity=7)
 
 SQL_INSERT_TIMESHEET = """
 INSERT INTO timesheets (emp_id, ts_date, order_id, operation_no, hours, notes)
@@ -59,11 +61,11 @@ VALUES (%s, COALESCE(%s, CURRENT_DATE), %s, %s, %s, %s)
 RETURNING ts_id, emp_id, ts_date, order_id, operation_no, hours, notes;
 """
 
-SQL_INSERT_INVENTORY = """
+SQL_INSERT_INVENTORY = register("insert_inventory", """
 INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason, lot, location)
 VALUES (%s, COALESCE(%s, CURRENT_DATE), %s, %s, %s, %s, %s)
 RETURNING txn_id, txn_date, product_id, qty_change, reason, lot, location;
-"""
+""", arity=7)
 
 # Indexes for performance - Comprehensive coverage for all frequent queries
 SQL_CREATE_INDEXES = """
@@ -95,7 +97,7 @@ SELECT
   DATE_TRUNC('month', o.order_date)::date AS month,
   SUM(f.revenue) AS revenue,
   SUM(f.gross_margin) AS margin
-FROM v_order_finance f
+FROM order_finance f
 JOIN orders o ON o.order_id = f.order_id
 GROUP BY DATE_TRUNC('month', o.order_date)
 ORDER BY DATE_TRUNC('month', o.order_date);
@@ -108,7 +110,7 @@ SELECT
   SUM(f.revenue) AS revenue,
   SUM(f.gross_margin) AS margin,
   COUNT(DISTINCT f.order_id) AS orders_count
-FROM v_order_finance f
+FROM order_finance f
 JOIN orders o ON o.order_id = f.order_id
 JOIN customers c ON c.customer_id = o.customer_id
 WHERE (%s IS NULL OR o.order_date >= %s)
@@ -125,7 +127,7 @@ SELECT
   c.name AS customer_name,
   f.revenue,
   f.gross_margin AS margin
-FROM v_order_finance f
+FROM order_finance f
 JOIN orders o ON o.order_id = f.order_id
 LEFT JOIN customers c ON c.customer_id = o.customer_id
 WHERE (%s IS NULL OR o.order_date >= %s)
@@ -144,7 +146,7 @@ current_period AS (
   SELECT
     SUM(revenue) AS revenue,
     SUM(gross_margin) AS margin
-  FROM v_order_finance f
+  FROM order_finance f
   JOIN orders o ON o.order_id = f.order_id,
        period p
   WHERE o.order_date BETWEEN p.date_from AND p.date_to
@@ -152,7 +154,7 @@ current_period AS (
 prev_period AS (
   SELECT
     SUM(revenue) AS revenue
-  FROM v_order_finance f
+  FROM order_finance f
   JOIN orders o ON o.order_id = f.order_id,
        period p
   WHERE o.order_date BETWEEN (p.date_from - (p.date_to - p.date_from)) AND (p.date_from - INTERVAL '1 day')
@@ -164,7 +166,7 @@ prev_period AS (
     SUM(f.revenue) AS revenue,
     SUM(f.gross_margin) AS margin,
     COUNT(DISTINCT f.order_id) AS orders_count
-  FROM v_order_finance f
+  FROM order_finance f
   JOIN orders o ON o.order_id = f.order_id
   JOIN customers c ON c.customer_id = o.customer_id,
        period p
@@ -188,23 +190,30 @@ LEFT JOIN prev_period pp ON TRUE
 LEFT JOIN top_customer tc ON TRUE;
 """
 
-SQL_FIND_ORDER = "SELECT 1 FROM orders WHERE order_id = %s"
-SQL_FIND_CUSTOMER = "SELECT 1 FROM customers WHERE customer_id = %s"
-SQL_NEXT_ORDER_ID = """\
-WITH max_suffix AS (
-    SELECT COALESCE(MAX(TO_NUMBER(REGEXP_REPLACE(order_id, '\\D', '', 'g'), '999999999')), 0) AS max_seq
-    FROM orders
-    WHERE order_id ~ '^[A-Z0-9-]+$'
-)
-SELECT LPAD((max_seq + 1)::text, 4, '0') AS next_suffix FROM max_suffix;
+SQL_FIND_ORDER = register("find_order", "SELECT 1 FROM orders WHERE order_id = %s", arity=1)
+SQL_FIND_CUSTOMER = register("find_customer", "SELECT 1 FROM customers WHERE customer_id = %s", arity=1)
+# Highest numeric suffix in use; only run once per prefix to seed order_id_seq
+# (see id_allocator.py), never on the request path.
+SQL_MAX_ORDER_SUFFIX = """\
+SELECT COALESCE(MAX(TO_NUMBER(REGEXP_REPLACE(order_id, '\\D', '', 'g'), '999999999')), 0) AS max_seq
+FROM orders
+WHERE order_id ~ '^[A-Z0-9-]+$'
 """
-SQL_NEXT_CUSTOMER_ID = """\
-WITH max_suffix AS (
-    SELECT COALESCE(MAX(TO_NUMBER(REGEXP_REPLACE(customer_id, '\\D', '', 'g'), '999999999')), 0) AS max_seq
-    FROM customers
-    WHERE customer_id ~ '^[A-Z0-9-]+$'
-)
-SELECT 'CUST-' || LPAD((max_seq + 1)::text, 4, '0') AS next_id FROM max_suffix;
+SQL_MAX_CUSTOMER_SUFFIX = """\
+SELECT COALESCE(MAX(TO_NUMBER(REGEXP_REPLACE(customer_id, '\\D', '', 'g'), '999999999')), 0) AS max_seq
+FROM customers
+WHERE customer_id ~ '^[A-Z0-9-]+$'
+"""
+# sqlite has no REGEXP_REPLACE: same scan for "<PREFIX>-<digits>" keys
+SQL_MAX_ORDER_SUFFIX_SQLITE = """\
+SELECT COALESCE(MAX(CAST(SUBSTR(order_id, INSTR(order_id, '-') + 1) AS INTEGER)), 0) AS max_seq
+FROM orders
+WHERE order_id GLOB '[A-Z]*-[0-9]*'
+"""
+SQL_MAX_CUSTOMER_SUFFIX_SQLITE = """\
+SELECT COALESCE(MAX(CAST(SUBSTR(customer_id, INSTR(customer_id, '-') + 1) AS INTEGER)), 0) AS max_seq
+FROM customers
+WHERE customer_id GLOB '[A-Z]*-[0-9]*'
 """
 
 SQL_CREATE_DEMAND_SCENARIOS = """
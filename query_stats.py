@@ -0,0 +1,203 @@
+"""
+Per-statement query timing and slow-query log.
+
+Every fetch_all / fetch_one / execute goes through `db._observe`, which reports
+its latency here keyed by a normalized fingerprint of the SQL (literals and
+placeholders collapsed to `?`, whitespace squeezed), so `WHERE id = 1` and
+`WHERE id = 2` aggregate together.
+
+- Each fingerprint gets a latency histogram, exported on /metrics labelled by a
+  short fingerprint id (the admin endpoint maps ids back to the SQL).
+- A call slower than SLOW_QUERY_MS is written to the slow-query log together
+  with its plan (EXPLAIN on Postgres, EXPLAIN QUERY PLAN on sqlite). Plans are
+  captured at most once per SLOW_QUERY_EXPLAIN_INTERVAL per fingerprint.
+- `QUERY_STATS.top()` backs GET /api/admin/query-stats.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional
+
+from config import settings
+from logging_utils import logger
+from metrics import Histogram, register_collector
+
+OVERFLOW_FINGERPRINT = "<other>"
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?|\$\d+")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Normalize SQL so calls differing only in literals/parameters group together."""
+    text = _STRING_RE.sub("?", str(sql))
+    text = _NUMBER_RE.sub("?", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _SPACE_RE.sub(" ", text).strip().rstrip(";").strip()
+    # variable-length IN (...) lists and multi-row VALUES would otherwise fan out
+    text = _VALUES_LIST_RE.sub("(...), ...", text)
+    text = _IN_LIST_RE.sub("(...)", text)
+    return text
+
+
+def fingerprint_id(fp: str) -> str:
+    return hashlib.sha1(fp.encode("utf-8")).hexdigest()[:12]
+
+
+def explain_sql(sql: str, sqlite: bool) -> Optional[str]:
+    """EXPLAIN variant of `sql`, or None for statements that cannot be explained."""
+    head = str(sql).lstrip().split(None, 1)
+    if not head or head[0].lower() not in _EXPLAINABLE:
+        return None
+    return ("EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN ") + str(sql).strip().rstrip(";")
+
+
+def format_plan(rows: List[Any]) -> str:
+    lines = []
+    for row in rows:
+        values = list(row.values()) if isinstance(row, dict) else list(row)
+        # sqlite: (id, parent, notused, detail); postgres: one "QUERY PLAN" column
+        lines.append(str(values[-1]))
+    return "\n".join(lines)
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "id", "calls", "errors", "total", "max", "histogram", "last_explain")
+
+    def __init__(self, fp: str):
+        self.fingerprint = fp
+        self.id = fingerprint_id(fp)
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = Histogram("db_query_duration_seconds", "SQL statement latency by fingerprint")
+        self.last_explain = 0.0
+
+
+class QueryStats:
+    def __init__(
+        self,
+        slow_ms: float = settings.SLOW_QUERY_MS,
+        max_fingerprints: int = settings.QUERY_STATS_MAX_FINGERPRINTS,
+        slow_log_size: int = settings.SLOW_QUERY_LOG_SIZE,
+        explain_interval: float = settings.SLOW_QUERY_EXPLAIN_INTERVAL,
+    ):
+        self.slow_ms = slow_ms
+        self.max_fingerprints = max_fingerprints
+        self.explain_interval = explain_interval
+        self.enabled = settings.QUERY_STATS_ENABLED
+        self._entries: Dict[str, _Entry] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, seconds: float, failed: bool = False) -> Optional[str]:
+        """Account one execution. Returns the fingerprint when a plan should be captured."""
+        if not self.enabled:
+            return None
+        fp = fingerprint(sql)
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    fp = OVERFLOW_FINGERPRINT
+                    entry = self._entries.get(fp)
+                if entry is None:
+                    entry = self._entries[fp] = _Entry(fp)
+            entry.calls += 1
+            entry.total += seconds
+            if seconds > entry.max:
+                entry.max = seconds
+            if failed:
+                entry.errors += 1
+        entry.histogram.observe(seconds)
+
+        if failed or seconds * 1000 < self.slow_ms:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            explain = now - entry.last_explain >= self.explain_interval
+            if explain:
+                entry.last_explain = now
+        if not explain:
+            self.add_slow(fp, seconds, None)
+            return None
+        return fp
+
+    def add_slow(self, fp: str, seconds: float, plan: Optional[str]) -> None:
+        item = {
+            "fingerprint_id": fingerprint_id(fp),
+            "fingerprint": fp,
+            "duration_ms": round(seconds * 1000, 3),
+            "at": time.time(),
+            "plan": plan,
+        }
+        with self._lock:
+            self._slow.append(item)
+        logger.warning(
+            f"slow query {item['duration_ms']:.1f}ms [{item['fingerprint_id']}] {fp}"
+            + (f"\n{plan}" if plan else "")
+        )
+
+    def top(self, limit: int = 20, order_by: str = "total") -> List[Dict[str, Any]]:
+        keys = {
+            "total": lambda e: e.total,
+            "calls": lambda e: e.calls,
+            "mean": lambda e: e.total / e.calls if e.calls else 0.0,
+            "max": lambda e: e.max,
+        }
+        key = keys.get(order_by, keys["total"])
+        with self._lock:
+            entries = sorted(self._entries.values(), key=key, reverse=True)[:limit]
+            return [
+                {
+                    "fingerprint_id": e.id,
+                    "fingerprint": e.fingerprint,
+                    "calls": e.calls,
+                    "errors": e.errors,
+                    "total_ms": round(e.total * 1000, 3),
+                    "mean_ms": round(e.total / e.calls * 1000, 3) if e.calls else None,
+                    "max_ms": round(e.max * 1000, 3),
+                }
+                for e in entries
+            ]
+
+    def slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._slow)[-limit:][::-1]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._slow.clear()
+
+    def render(self) -> List[str]:
+        with self._lock:
+            entries = list(self._entries.values())
+        if not entries:
+            return []
+        lines: List[str] = []
+        for i, e in enumerate(entries):
+            lines += e.histogram.render(labels={"fingerprint": e.id}, header=(i == 0))
+        return lines
+
+
+QUERY_STATS = QueryStats()
+
+
+@register_collector
+def _query_metrics() -> List[str]:
+    return QUERY_STATS.render()
@@ -1,18 +1,23 @@
 from __future__ import annotations
 
-import csv
-import io
-from typing import Dict, List, Optional
+from datetime import date
+from typing import BinaryIO, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query
+from starlette.concurrency import run_in_threadpool
 
 import auth as api_keys
 from admin_audit import log_admin_event, ensure_table as ensure_admin_audit
-from db import fetch_all, execute
+from csv_import import iter_batches
+from db import fetch_all, execute, execute_many, upsert_many
 from schemas import UserCreateAdmin, SubscriptionPlanCreate
 from security import check_admin_key
 from user_mgmt import create_user, list_users, create_plan, list_plans, require_admin
 from logging_utils import logger as app_logger
+from query_stats import QUERY_STATS
+import order_finance
+import inventory_balance
+import import_jobs
 
 
 router = APIRouter(tags=["Admin", "Admin/API Keys"])
@@ -209,6 +214,91 @@ def admin_purge_audit(days: int = 30, _ok: bool = Depends(check_admin_key)):
         raise HTTPException(status_code=500, detail={"detail": "Failed to purge API key audit", "code": "api_key_audit_purge_failed"}) from exc
 
 
+# ---- Statystyki zapytań SQL (x-admin-key) ----
+
+
+@router.get("/api/admin/query-stats", summary="Top SQL statements by time + slow-query log")
+def admin_query_stats(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: str = Query("total", pattern="^(total|calls|mean|max)$"),
+    _ok: bool = Depends(check_admin_key),
+):
+    """
+    Najdroższe zapytania (wg odcisku SQL) oraz ostatnie wolne zapytania z planem.
+    """
+    return {
+        "slow_query_ms": QUERY_STATS.slow_ms,
+        "statements": QUERY_STATS.top(limit, order_by),
+        "slow": QUERY_STATS.slow_queries(limit),
+    }
+
+
+@router.delete("/api/admin/query-stats", summary="Reset SQL statement statistics")
+def admin_reset_query_stats(_ok: bool = Depends(check_admin_key)):
+    QUERY_STATS.reset()
+    return {"reset": True}
+
+
+# ---- Spójność order_finance (x-admin-key) ----
+
+
+@router.post("/api/admin/order-finance/reconcile", summary="Check order_finance against source tables")
+def admin_reconcile_order_finance(
+    fix: bool = Query(False),
+    limit: int = Query(100, ge=1, le=1000),
+    _ok: bool = Depends(check_admin_key),
+):
+    """
+    Porównuje order_finance z przeliczeniem z order_lines/timesheets; fix=true naprawia rozbieżności.
+    """
+    try:
+        result = order_finance.reconcile(fix=fix, limit=limit)
+    except Exception as exc:
+        app_logger.error("order_finance reconcile failed", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail={"detail": "Reconcile failed", "code": "reconcile_failed"}
+        ) from exc
+    if fix and result["fixed"]:
+        log_admin_event("order_finance_reconcile", details={"fixed": result["fixed"]})
+    return result
+
+
+# ---- Stany magazynowe: inventory_balance (x-admin-key) ----
+
+
+@router.post("/api/admin/inventory-balance/rebuild", summary="Rebuild inventory_balance from the ledger")
+def admin_rebuild_inventory_balance(_ok: bool = Depends(check_admin_key)):
+    """
+    Przelicza inventory_balance od zera z tabeli inventory.
+    """
+    try:
+        result = inventory_balance.rebuild()
+    except Exception as exc:
+        app_logger.error("inventory_balance rebuild failed", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail={"detail": "Rebuild failed", "code": "rebuild_failed"}
+        ) from exc
+    log_admin_event("inventory_balance_rebuild", details={"rows": result["rows"]})
+    return result
+
+
+@router.get("/api/admin/inventory-balance/verify", summary="Compare inventory_balance with the ledger")
+def admin_verify_inventory_balance(
+    limit: int = Query(100, ge=1, le=1000),
+    _ok: bool = Depends(check_admin_key),
+):
+    """
+    Porównuje inventory_balance z sumami z tabeli inventory (bez zmian w danych).
+    """
+    try:
+        return inventory_balance.verify(limit=limit)
+    except Exception as exc:
+        app_logger.error("inventory_balance verify failed", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail={"detail": "Verify failed", "code": "verify_failed"}
+        ) from exc
+
+
 # ---- Legacy ścieżki bez prefiksu /api dla admin-key ----
 # Zostawione dla kompatybilności wstecznej.
 
@@ -280,11 +370,8 @@ async def import_csv(
 
         # CSV mode
         if file is not None and entity_type:
-            content = await file.read()
-            text = content.decode("utf-8", errors="replace")
-            reader = csv.DictReader(io.StringIO(text))
-            parsed = list(reader)
-            rows_imported = _do_import(entity_type, parsed)
+            _import_spec(entity_type)
+            rows_imported = await run_in_threadpool(_import_csv_stream, entity_type, file.file)
             log_admin_event(
                 "import_csv",
                 event_by=_admin.get("email"),
@@ -311,119 +398,171 @@ async def import_csv(
         raise HTTPException(status_code=500, detail={"detail": "Import failed", "code": "import_failed"}) from exc
 
 
-def _do_import(entity_type: str, data_rows: List[Dict]) -> int:
-    """
-    Właściwa logika importu – per encja.
-    """
-    entity_type = entity_type.lower()
-    imported = 0
-
-    if entity_type == "orders":
-        for row in data_rows:
-            execute(
-                "INSERT INTO orders (order_id, order_date, customer_id, status, due_date) "
-                "VALUES (%s, CURRENT_DATE, %s, %s, %s) "
-                "ON CONFLICT (order_id) DO NOTHING",
-                (
-                    row.get("order_id"),
-                    row.get("customer_id"),
-                    row.get("status", "Planned"),
-                    row.get("due_date"),
-                ),
-                returning=False,
-            )
-            imported += 1
-
-    elif entity_type == "products":
-        for row in data_rows:
-            execute(
-                "INSERT INTO products (product_id, name, unit, std_cost, price, vat_rate) "
-                "VALUES (%s, %s, %s, %s, %s, %s) "
-                "ON CONFLICT (product_id) DO NOTHING",
-                (
-                    row.get("product_id"),
-                    row.get("name"),
-                    row.get("unit", "pcs"),
-                    row.get("std_cost", 0),
-                    row.get("price", 0),
-                    row.get("vat_rate", 23),
-                ),
-                returning=False,
-            )
-            imported += 1
-
-    elif entity_type == "customers":
-        for row in data_rows:
-            execute(
-                "INSERT INTO customers (customer_id, name, nip, address, email) "
-                "VALUES (%s, %s, %s, %s, %s) "
-                "ON CONFLICT (customer_id) DO NOTHING",
-                (
-                    row.get("customer_id"),
-                    row.get("name"),
-                    row.get("nip"),
-                    row.get("address"),
-                    row.get("email"),
-                ),
-                returning=False,
-            )
-            imported += 1
+@router.post("/api/import/jobs", status_code=202, summary="Start a background CSV import")
+async def import_job_create(
+    entity_type: str = Form(...),
+    file: UploadFile = File(...),
+    _admin=Depends(require_admin),
+):
+    """Zapisuje plik na dysk i zwraca od razu id zadania; import wykonują workery w tle."""
+    _import_spec(entity_type)
+    try:
+        job = await run_in_threadpool(
+            import_jobs.create_job, entity_type, file.file, file.filename, _admin.get("email")
+        )
+    except Exception as exc:
+        app_logger.error("import job create failed", exc_info=True)
+        raise HTTPException(status_code=500, detail={"detail": "Import failed", "code": "import_failed"}) from exc
+    log_admin_event(
+        "import_job",
+        event_by=_admin.get("email"),
+        details={"entity_type": entity_type, "job_id": job["job_id"]},
+    )
+    return job
+
+
+@router.get("/api/import/jobs", summary="List import jobs")
+def import_jobs_list(
+    status: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    _admin=Depends(require_admin),
+):
+    return import_jobs.list_jobs(status, limit)
+
+
+@router.get("/api/import/jobs/{job_id}", summary="Import job progress")
+def import_job_get(job_id: str, _admin=Depends(require_admin)):
+    """Postęp zadania: przetworzone wiersze, błędy i przepustowość."""
+    job = import_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.post("/api/import/jobs/{job_id}/cancel", summary="Cancel an import job")
+def import_job_cancel(job_id: str, _admin=Depends(require_admin)):
+    """Zadanie w kolejce jest anulowane od razu, uruchomione kończy się po bieżącej partii."""
+    job = import_jobs.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+# entity_type -> (table, conflict key or None for plain inserts, [(column, row key, default)])
+_IMPORT_SPECS = {
+    "orders": (
+        "orders",
+        "order_id",
+        [
+            ("order_id", "order_id", None),
+            ("order_date", None, None),
+            ("customer_id", "customer_id", None),
+            ("status", "status", "Planned"),
+            ("due_date", "due_date", None),
+        ],
+    ),
+    "products": (
+        "products",
+        "product_id",
+        [
+            ("product_id", "product_id", None),
+            ("name", "name", None),
+            ("unit", "unit", "pcs"),
+            ("std_cost", "std_cost", 0),
+            ("price", "price", 0),
+            ("vat_rate", "vat_rate", 23),
+        ],
+    ),
+    "customers": (
+        "customers",
+        "customer_id",
+        [
+            ("customer_id", "customer_id", None),
+            ("name", "name", None),
+            ("nip", "nip", None),
+            ("address", "address", None),
+            ("email", "email", None),
+        ],
+    ),
+    "employees": (
+        "employees",
+        "emp_id",
+        [
+            ("emp_id", "emp_id", None),
+            ("name", "name", None),
+            ("role", "role", None),
+            ("hourly_rate", "hourly_rate", 0),
+        ],
+    ),
+    "timesheets": (
+        "timesheets",
+        None,
+        [
+            ("emp_id", "emp_id", None),
+            ("ts_date", "ts_date", None),
+            ("order_id", "order_id", None),
+            ("operation_no", "operation_no", None),
+            ("hours", "hours", None),
+            ("notes", "notes", None),
+        ],
+    ),
+    "inventory": (
+        "inventory",
+        "txn_id",
+        [
+            ("txn_id", "txn_id", None),
+            ("txn_date", "txn_date", None),
+            ("product_id", "product_id", None),
+            ("qty_change", "qty_change", None),
+            ("reason", "reason", None),
+            ("lot", "lot", None),
+            ("location", "location", None),
+        ],
+    ),
+}
+
+
+def _import_spec(entity_type: str):
+    spec = _IMPORT_SPECS.get(entity_type.lower())
+    if spec is None:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown entity_type: {entity_type.lower()}"
+        )
+    return spec
 
-    elif entity_type == "employees":
-        for row in data_rows:
-            execute(
-                "INSERT INTO employees (emp_id, name, role, hourly_rate) "
-                "VALUES (%s, %s, %s, %s) "
-                "ON CONFLICT (emp_id) DO NOTHING",
-                (
-                    row.get("emp_id"),
-                    row.get("name"),
-                    row.get("role"),
-                    row.get("hourly_rate", 0),
-                ),
-                returning=False,
-            )
-            imported += 1
 
-    elif entity_type == "timesheets":
-        for row in data_rows:
-            execute(
-                "INSERT INTO timesheets (emp_id, ts_date, order_id, operation_no, hours, notes) "
-                "VALUES (%s, %s, %s, %s, %s, %s)",
-                (
-                    row.get("emp_id"),
-                    row.get("ts_date"),
-                    row.get("order_id"),
-                    row.get("operation_no"),
-                    row.get("hours"),
-                    row.get("notes"),
-                ),
-                returning=False,
-            )
-            imported += 1
+def _import_csv_stream(entity_type: str, fileobj: BinaryIO) -> int:
+    """CSV upload -> _do_import, one batch of rows at a time (never the whole file)."""
+    imported = 0
+    for batch in iter_batches(fileobj, errors="replace"):
+        imported += _do_import(entity_type, [row for _, row in batch])
+    return imported
 
-    elif entity_type == "inventory":
-        for row in data_rows:
-            execute(
-                "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason, lot, location) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s) "
-                "ON CONFLICT (txn_id) DO NOTHING",
-                (
-                    row.get("txn_id"),
-                    row.get("txn_date"),
-                    row.get("product_id"),
-                    row.get("qty_change"),
-                    row.get("reason"),
-                    row.get("lot"),
-                    row.get("location"),
-                ),
-                returning=False,
-            )
-            imported += 1
 
-    else:
-        raise HTTPException(
-            status_code=400, detail=f"Unknown entity_type: {entity_type}"
+@import_jobs.register_importer
+def _do_import(entity_type: str, data_rows: List[Dict], conn=None) -> int:
+    """
+    Właściwa logika importu – per encja, jednym zapisem wsadowym
+    (istniejące klucze są pomijane, jak ON CONFLICT DO NOTHING).
+    Z `conn` zapis dołącza do transakcji wywołującego (zadania importu).
+    """
+    table, conflict_key, fields = _import_spec(entity_type)
+    today = date.today()
+    columns = [column for column, _, _ in fields]
+    rows = [
+        tuple(
+            row.get(key, default) if key is not None else today
+            for _, key, default in fields
         )
-
-    return imported
+        for row in data_rows
+    ]
+    if conflict_key is None:
+        execute_many(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('%s' for _ in columns)})",
+            rows,
+            conn=conn,
+        )
+    else:
+        upsert_many(table, columns, rows, [conflict_key], update_columns=[], conn=conn)
+    return len(data_rows)
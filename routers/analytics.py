@@ -8,8 +8,12 @@ from datetime import date, datetime, timedelta
 import sqlite3
 
 from fastapi import APIRouter, HTTPException, Depends, Query, Header, Response, status
+from starlette.concurrency import run_in_threadpool
 
-from db import fetch_all, fetch_one, execute
+from db import fetch_all, fetch_one, execute, stream
+import db_async
+from netting import netted_shortages
+from planned_time import planned_time as compute_planned_time, planned_times
 from schemas import (
     Finance,
     RevenueByMonth,
@@ -25,7 +29,6 @@ from schemas import (
 from queries import (
     SQL_FINANCE_ONE,
     SQL_SHORTAGES,
-    SQL_PLANNED_ONE,
     SQL_REVENUE_BY_MONTH,
     SQL_TOP_CUSTOMERS,
     SQL_TOP_ORDERS,
@@ -39,6 +42,8 @@ SQLITE_ERRORS = (sqlite3.OperationalError,) if sqlite3 else ()
 
 router = APIRouter(tags=["Finance", "Analytics"])
 
+PLANNED_TIME_MAX_IDS = 2000
+
 
 def _readonly_ok(
     authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
@@ -91,15 +96,16 @@ def _sqlite_summary_fallback(date_from: Optional[str], date_to: Optional[str]):
     prev_to = from_date - timedelta(days=1)
     prev_from = prev_to - period_delta
 
-    rows = fetch_all(
+    # streamed in batches: only the per-customer totals are kept in memory
+    batches = stream(
         """
-        SELECT f.order_id, o.customer_id, c.name AS customer_name, f.order_date, f.revenue, f.gross_margin
-        FROM v_order_finance f
-        LEFT JOIN orders o ON o.order_id = f.order_id
+        SELECT f.order_id, o.customer_id, c.name AS customer_name, o.order_date, f.revenue, f.gross_margin
+        FROM order_finance f
+        JOIN orders o ON o.order_id = f.order_id
         LEFT JOIN customers c ON c.customer_id = o.customer_id
         """,
         (),
-    ) or []
+    )
 
     def _within(window_from: date, window_to: date, row_date: date) -> bool:
         return window_from <= row_date <= window_to
@@ -108,7 +114,7 @@ def _sqlite_summary_fallback(date_from: Optional[str], date_to: Optional[str]):
     prev_rev = 0.0
     customer_stats = defaultdict(lambda: {"revenue": 0.0, "margin": 0.0, "orders_count": 0, "name": None})
 
-    for row in rows:
+    for row in (r for batch in batches for r in batch):
         try:
             order_date = datetime.fromisoformat(str(row.get("order_date"))).date()
         except (TypeError, ValueError):
@@ -156,10 +162,10 @@ def _sqlite_summary_fallback(date_from: Optional[str], date_to: Optional[str]):
     response_model=Optional[Finance],
     summary="Finance by order",
 )
-def finance_one(order_id: str, _ok: bool = Depends(_readonly_ok)):
+async def finance_one(order_id: str, _ok: bool = Depends(_readonly_ok)):
     """Szczegóły finansowe dla zlecenia (read-only)."""
     try:
-        row = fetch_one(SQL_FINANCE_ONE, (order_id,))
+        row = await db_async.fetch_one(SQL_FINANCE_ONE, (order_id,))
         if not row:
             return None
         return row
@@ -168,24 +174,45 @@ def finance_one(order_id: str, _ok: bool = Depends(_readonly_ok)):
 
 
 @router.get("/api/shortages", summary="Material shortages", response_model=List[dict])
-def shortages(_ok: bool = Depends(_readonly_ok)):
-    """Lista braków materiałowych bez wymogu logowania."""
+async def shortages(
+    mode: str = Query("line", pattern="^(line|netted)$"),
+    include_covered: bool = Query(False, description="netted: also return fully allocated lines"),
+    _ok: bool = Depends(_readonly_ok),
+):
+    """Lista braków materiałowych bez wymogu logowania.
+
+    mode=netted rozdziela stan magazynowy między otwarte zlecenia wg terminu (netting.py).
+    """
     try:
-        return fetch_all(SQL_SHORTAGES, None) or []
+        if mode == "netted":
+            return await run_in_threadpool(netted_shortages, include_covered)
+        return await db_async.fetch_all(SQL_SHORTAGES, None) or []
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/planned-time", summary="Planned time for a set of orders")
+async def planned_time_bulk(
+    order_ids: str = Query(..., min_length=1, description="comma-separated order ids"),
+    _ok: bool = Depends(_readonly_ok),
+):
+    """Planowany czas z marszrut dla wielu zleceń naraz (dashboard, GetPlannedTime.pq)."""
+    ids = [o.strip() for o in order_ids.split(",") if o.strip()]
+    if len(ids) > PLANNED_TIME_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {PLANNED_TIME_MAX_IDS} order ids per request")
+    try:
+        return await run_in_threadpool(planned_times, ids)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
 @router.get("/api/planned-time/{order_id}", summary="Planned time for order")
-def planned_time(order_id: str, _ok: bool = Depends(_readonly_ok)):
-    """Planowany czas dla zlecenia (read-only)."""
+async def planned_time(order_id: str, _ok: bool = Depends(_readonly_ok)):
+    """Planowany czas dla zlecenia z marszrut (read-only)."""
     try:
-        row = fetch_one(SQL_PLANNED_ONE, (order_id,))
+        row = await run_in_threadpool(compute_planned_time, order_id)
         if not row:
-            raise HTTPException(
-                status_code=404,
-                detail="Order not found in v_planned_time",
-            )
+            raise HTTPException(status_code=404, detail="Order not found")
         return row
     except HTTPException:
         raise
@@ -194,9 +221,9 @@ def planned_time(order_id: str, _ok: bool = Depends(_readonly_ok)):
 
 
 @router.get("/api/analytics/revenue-by-month", response_model=List[RevenueByMonth])
-def revenue_by_month(_ok: bool = Depends(check_api_key)):
+async def revenue_by_month(_ok: bool = Depends(check_api_key)):
     try:
-        rows = fetch_all(SQL_REVENUE_BY_MONTH, None) or []
+        rows = await db_async.fetch_all(SQL_REVENUE_BY_MONTH, None) or []
         for r in rows:
             rev = r.get("revenue") or 0
             mar = r.get("margin") or 0
@@ -207,7 +234,7 @@ def revenue_by_month(_ok: bool = Depends(check_api_key)):
 
 
 @router.get("/api/analytics/top-customers", response_model=List[TopCustomer])
-def top_customers(
+async def top_customers(
     limit: int = Query(10, ge=1, le=100),
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
@@ -215,7 +242,7 @@ def top_customers(
 ):
     try:
         rows = (
-            fetch_all(
+            await db_async.fetch_all(
                 SQL_TOP_CUSTOMERS, (date_from, date_from, date_to, date_to, limit)
             )
             or []
@@ -226,7 +253,7 @@ def top_customers(
 
 
 @router.get("/api/analytics/top-orders", response_model=List[TopOrder])
-def top_orders(
+async def top_orders(
     limit: int = Query(10, ge=1, le=100),
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
@@ -234,7 +261,7 @@ def top_orders(
 ):
     try:
         rows = (
-            fetch_all(SQL_TOP_ORDERS, (date_from, date_from, date_to, date_to, limit))
+            await db_async.fetch_all(SQL_TOP_ORDERS, (date_from, date_from, date_to, date_to, limit))
             or []
         )
         return rows
@@ -243,13 +270,13 @@ def top_orders(
 
 
 @router.get("/api/analytics/summary", response_model=AnalyticsSummary)
-def analytics_summary(
+async def analytics_summary(
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
     _ok: bool = Depends(_readonly_ok),
 ):
     try:
-        row = fetch_one(SQL_ANALYTICS_SUMMARY, (date_from, date_to)) or {}
+        row = await db_async.fetch_one(SQL_ANALYTICS_SUMMARY, (date_from, date_to)) or {}
         summary = {
             "total_revenue": row.get("total_revenue") or 0,
             "total_margin": row.get("total_margin") or 0,
@@ -269,7 +296,7 @@ def analytics_summary(
         app_logger.error(f"Analytics summary SQL error: {exc}", exc_info=True)
         if _is_sqlite_error(exc):
             app_logger.warning("analytics summary falling back to python aggregation", exc_info=True)
-            return _sqlite_summary_fallback(date_from, date_to)
+            return await run_in_threadpool(_sqlite_summary_fallback, date_from, date_to)
         raise HTTPException(status_code=500, detail=str(exc))
 
 
@@ -357,7 +384,7 @@ def run_demand_forecast(payload: DemandForecastRequest, _user=Depends(require_au
                 "created_by": None,
                 "created_at": None,
             }
-        base_revenue = _as_decimal(fetch_one("SELECT COALESCE(SUM(revenue),0) AS rev FROM v_order_finance", ()).get("rev"))
+        base_revenue = _as_decimal(fetch_one("SELECT COALESCE(SUM(revenue),0) AS rev FROM order_finance", ()).get("rev"))
         revenue = float(base_revenue * Decimal(multiplier))
         capacity_usage = min(100.0, float(Decimal(multiplier) * Decimal("65")))
         metrics = [round(revenue / max(float(backlog), 1.0), 2), float(backlog) * 40, float(backlog) * 35]
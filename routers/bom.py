@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query
+
+from bom_cache import BOM_CACHE, prune_changes
+import costing
+from db import execute, fetch_all, fetch_one, transaction
+from mrp import BomCycleError
+from schemas import BomLine, BomLineUpsert
+from security import check_api_key
+
+
+router = APIRouter(tags=["BOM"])
+
+SQL_BOM_COMPONENTS = (
+    "SELECT parent_product_id, component_id, qty_per, scrap_pct FROM bom "
+    "WHERE parent_product_id = %s ORDER BY component_id"
+)
+
+
+def _readonly_dep(
+    authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
+):
+    return check_api_key(
+        authorization=authorization,
+        x_api_key=x_api_key,
+        api_key=api_key,
+        allow_readonly=True,
+    )
+
+
+@router.get("/api/bom/{product_id}", response_model=List[BomLine], summary="Direct BOM components")
+def bom_components(product_id: str, _ok: bool = Depends(_readonly_dep)):
+    try:
+        return fetch_all(SQL_BOM_COMPONENTS, (product_id,)) or []
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/bom/{product_id}/explode", summary="Flattened multi-level explosion")
+def bom_explode(
+    product_id: str,
+    qty: float = Query(1.0, gt=0),
+    _ok: bool = Depends(_readonly_dep),
+):
+    """Ilość każdego komponentu (wszystkie poziomy, z odpadem) na `qty` sztuk wyrobu."""
+    try:
+        components = BOM_CACHE.explode(product_id, qty)
+        return {
+            "product_id": product_id,
+            "qty": qty,
+            "components": [
+                {"component_id": c, "qty": q} for c, q in sorted(components.items())
+            ],
+        }
+    except BomCycleError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.put(
+    "/api/bom/{product_id}/{component_id}", response_model=BomLine, summary="Create or update BOM line"
+)
+def upsert_bom_line(
+    product_id: str,
+    component_id: str,
+    payload: BomLineUpsert,
+    background_tasks: BackgroundTasks,
+    _ok: bool = Depends(check_api_key),
+):
+    try:
+        if product_id == component_id or product_id in BOM_CACHE.explode(component_id):
+            raise HTTPException(
+                status_code=409,
+                detail=f"{component_id} already contains {product_id}; the BOM would become cyclic",
+            )
+        with transaction() as conn:
+            row = fetch_one(
+                "INSERT INTO bom (parent_product_id, component_id, qty_per, scrap_pct) "
+                "VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (parent_product_id, component_id) "
+                "DO UPDATE SET qty_per = EXCLUDED.qty_per, scrap_pct = EXCLUDED.scrap_pct "
+                "RETURNING parent_product_id, component_id, qty_per, scrap_pct",
+                (product_id, component_id, payload.qty_per, payload.scrap_pct),
+                conn=conn,
+            )
+            prune_changes(conn=conn)
+        BOM_CACHE.sync(force=True)
+        background_tasks.add_task(costing.notify_changed, [product_id], structure_changed=True)
+        return row
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.delete("/api/bom/{product_id}/{component_id}", summary="Delete BOM line")
+def delete_bom_line(
+    product_id: str,
+    component_id: str,
+    background_tasks: BackgroundTasks,
+    _ok: bool = Depends(check_api_key),
+):
+    try:
+        with transaction() as conn:
+            execute(
+                "DELETE FROM bom WHERE parent_product_id = %s AND component_id = %s",
+                (product_id, component_id),
+                conn=conn,
+            )
+            prune_changes(conn=conn)
+        BOM_CACHE.sync(force=True)
+        background_tasks.add_task(costing.notify_changed, [product_id], structure_changed=True)
+        return {"deleted": True}
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+import costing
+from mrp import BomCycleError
+from security import check_api_key
+
+
+router = APIRouter(tags=["Costing"])
+
+
+def _readonly_dep(
+    authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
+):
+    return check_api_key(
+        authorization=authorization,
+        x_api_key=x_api_key,
+        api_key=api_key,
+        allow_readonly=True,
+    )
+
+
+@router.post("/api/costs/rollup", summary="Roll up standard costs")
+async def rollup_costs(
+    product_ids: Optional[List[str]] = Body(None, embed=True),
+    apply: bool = Query(False, description="write rolled-up assembly totals to products.std_cost"),
+    _ok: bool = Depends(check_api_key),
+):
+    """Kalkulacja kosztu standardowego (materiał z BOM + robocizna z marszrut).
+
+    Bez `product_ids` liczy wszystko od nowa; z listą przelicza tylko te produkty i ich wyroby nadrzędne.
+    """
+    try:
+        if product_ids:
+            return await run_in_threadpool(costing.ROLLUP.update, product_ids, False, apply)
+        return await run_in_threadpool(costing.ROLLUP.full, apply)
+    except BomCycleError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/costs", summary="Current rolled-up costs")
+async def get_costs(product_id: Optional[str] = None, _ok: bool = Depends(_readonly_dep)):
+    """Aktualny koszt (najnowsza wersja) per produkt (read-only)."""
+    try:
+        return await run_in_threadpool(costing.current_costs, product_id)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/costs/{product_id}/history", summary="Cost versions of a product")
+async def get_cost_history(
+    product_id: str,
+    limit: int = Query(50, ge=1, le=1000),
+    _ok: bool = Depends(_readonly_dep),
+):
+    try:
+        return await run_in_threadpool(costing.cost_history, product_id, limit)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
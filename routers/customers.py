@@ -3,15 +3,22 @@ from __future__ import annotations
 from typing import List, Optional
 
 from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Header
-from fastapi.responses import StreamingResponse
 from psycopg.errors import UniqueViolation
 
-from db import fetch_all, fetch_one, execute
+from db import fetch_all, fetch_one, execute, execute_many, next_customer_id, unit_of_work
+from csv_export import stream_csv
+from csv_import import LineErrors, iter_batches
 from schemas import Customer, CustomerCreate, CustomerUpdate
 from security import check_api_key
 from queries import SQL_CUSTOMERS
 
 
+SQL_INSERT_CUSTOMER_IMPORT = (
+    "INSERT INTO customers (customer_id, name, nip, address, email, contact_person) VALUES (%s,%s,%s,%s,%s,%s)"
+)
+# rows per duplicate lookup; each binds id + email, so 800 variables per query
+IMPORT_LOOKUP_CHUNK = 400
+
 router = APIRouter(tags=["Customers"])
 
 
@@ -46,6 +53,14 @@ def customers_list(
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@router.get("/api/customers/next-id", summary="Get a suggested next customer ID")
+def get_next_customer_id_hint(_ok: bool = Depends(_readonly_dep)):
+    try:
+        return {"customer_id": next_customer_id(peek=True)}
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
 @router.get(
     "/api/customers/{customer_id}",
     response_model=Optional[Customer],
@@ -67,11 +82,16 @@ def customer_get(customer_id: str):
     status_code=201,
     summary="Create customer",
 )
-def create_customer(payload: CustomerCreate, _ok: bool = Depends(check_api_key)):
+def create_customer(
+    payload: CustomerCreate,
+    _ok: bool = Depends(check_api_key),
+    conn=Depends(unit_of_work),
+):
     try:
         existing = fetch_one(
             "SELECT 1 FROM customers WHERE customer_id = %s OR LOWER(email) = LOWER(%s)",
             (payload.customer_id, payload.email),
+            conn=conn,
         )
         if existing:
             raise HTTPException(status_code=409, detail="Customer already exists")
@@ -88,6 +108,7 @@ def create_customer(payload: CustomerCreate, _ok: bool = Depends(check_api_key))
                 payload.contact_person,
             ),
             returning=True,
+            conn=conn,
         )
         if not rows:
             raise HTTPException(status_code=500, detail="Failed to create customer")
@@ -151,57 +172,102 @@ def delete_customer(customer_id: str, _ok: bool = Depends(check_api_key)):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+def _import_customers_batch(pending: list[tuple[int, tuple]], errors: list[tuple[int, str]]) -> int:
+    """Skip rows whose id or e-mail already exists, insert the rest; returns rows created."""
+    # duplicates by id or e-mail, checked per chunk rather than per line
+    existing_ids: set[str] = set()
+    existing_emails: set[str] = set()
+    for i in range(0, len(pending), IMPORT_LOOKUP_CHUNK):
+        chunk = pending[i : i + IMPORT_LOOKUP_CHUNK]
+        placeholders = ", ".join("%s" for _ in chunk)
+        rows = fetch_all(
+            "SELECT customer_id, LOWER(email) AS email FROM customers "
+            f"WHERE customer_id IN ({placeholders}) OR LOWER(email) IN ({placeholders})",
+            tuple(v[0] for _, v in chunk) + tuple(v[4].lower() for _, v in chunk),
+        )
+        existing_ids.update(r["customer_id"] for r in rows)
+        existing_emails.update(r["email"] for r in rows if r.get("email"))
+
+    to_insert = []
+    for idx, values in pending:
+        if values[0] in existing_ids or values[4].lower() in existing_emails:
+            errors.append((idx, f"customer {values[0]} already exists, skipped"))
+        else:
+            to_insert.append((idx, values))
+
+    try:
+        return execute_many(SQL_INSERT_CUSTOMER_IMPORT, [values for _, values in to_insert])
+    except Exception:
+        # fall back to single inserts so each failing line gets its own error
+        created = 0
+        for idx, values in to_insert:
+            try:
+                execute(SQL_INSERT_CUSTOMER_IMPORT, values)
+                created += 1
+            except Exception as exc:
+                errors.append((idx, f"failed to insert {values[0]}: {exc}"))
+        return created
+
+
 @router.post("/api/customers/import", summary="Import customers from CSV")
 def import_customers_csv(
     file: UploadFile = File(...), _ok: bool = Depends(check_api_key)
 ):
-    import csv, io
+    created = 0
+    rows = 0
+    errors = LineErrors()
 
     try:
-        content = file.file.read().decode("utf-8-sig")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"Cannot read file: {exc}") from exc
+        for rows_batch in iter_batches(file.file):
+            pending: list[tuple[int, tuple]] = []
+            batch_errors: list[tuple[int, str]] = []
+            # duplicates within a batch; earlier batches are committed, so the lookup finds those
+            seen_ids: set[str] = set()
+            seen_emails: set[str] = set()
+            for idx, row in rows_batch:
+                customer_id = (row.get("customer_id") or "").strip()
+                email = (row.get("email") or "").strip()
+                if not customer_id or not email:
+                    batch_errors.append((idx, "missing customer_id or email"))
+                    continue
 
-    reader = csv.DictReader(io.StringIO(content))
-    created = 0
-    skipped = 0
-    errors: list[str] = []
-
-    for idx, row in enumerate(reader, start=2):
-        customer_id = (row.get("customer_id") or "").strip()
-        email = (row.get("email") or "").strip()
-        if not customer_id or not email:
-            skipped += 1
-            errors.append(f"Line {idx}: missing customer_id or email")
-            continue
-
-        exists = fetch_one(
-            "SELECT 1 FROM customers WHERE customer_id = %s OR LOWER(email) = LOWER(%s)",
-            (customer_id, email),
-        )
-        if exists:
-            skipped += 1
-            errors.append(f"Line {idx}: customer {customer_id} already exists, skipped")
-            continue
-
-        try:
-            execute(
-                "INSERT INTO customers (customer_id, name, nip, address, email, contact_person) VALUES (%s,%s,%s,%s,%s,%s)",
-                (
-                    customer_id,
-                    (row.get("name") or "").strip() or None,
-                    (row.get("nip") or "").strip() or None,
-                    (row.get("address") or "").strip() or None,
-                    email,
-                    (row.get("contact_person") or "").strip() or None,
-                ),
-            )
-            created += 1
-        except Exception as exc:
-            skipped += 1
-            errors.append(f"Line {idx}: failed to insert {customer_id}: {exc}")
-
-    return {"created": created, "skipped": skipped, "errors": errors}
+                if customer_id in seen_ids or email.lower() in seen_emails:
+                    batch_errors.append((idx, f"customer {customer_id} already exists, skipped"))
+                    continue
+                seen_ids.add(customer_id)
+                seen_emails.add(email.lower())
+
+                pending.append(
+                    (
+                        idx,
+                        (
+                            customer_id,
+                            (row.get("name") or "").strip() or None,
+                            (row.get("nip") or "").strip() or None,
+                            (row.get("address") or "").strip() or None,
+                            email,
+                            (row.get("contact_person") or "").strip() or None,
+                        ),
+                    )
+                )
+            rows += len(rows_batch)
+            if pending:
+                created += _import_customers_batch(pending, batch_errors)
+            errors.add_batch(batch_errors)
+    except UnicodeDecodeError as exc:
+        # earlier batches are already committed: report them along with the error
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "detail": f"Cannot read file: {exc}",
+                "code": "csv_decode_error",
+                "created": created,
+                "skipped": rows - created,
+                "errors": errors.report(),
+            },
+        ) from exc
+
+    return {"created": created, "skipped": rows - created, "errors": errors.report()}
 
 
 def _readonly_dep(
@@ -218,30 +284,11 @@ def _readonly_dep(
 @router.get("/api/customers/export", summary="Export customers as CSV")
 def export_customers_csv(_ok: bool = Depends(_readonly_dep)):
     try:
-        rows = (
-            fetch_all(
-                "SELECT customer_id, name, nip, address, email, contact_person FROM customers ORDER BY customer_id",
-                None,
-            )
-            or []
-        )
-        import csv, io
-
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        header = ["customer_id", "name", "nip", "address", "email", "contact_person"]
-        writer.writerow(header)
-        for r in rows:
-            writer.writerow(
-                [r.get(col) if r.get(col) is not None else "" for col in header]
-            )
-        csv_bytes = buf.getvalue().encode("utf-8-sig")
-        mem = io.BytesIO(csv_bytes)
-        mem.seek(0)
-        return StreamingResponse(
-            mem,
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": "attachment; filename=customers.csv"},
+        return stream_csv(
+            "SELECT customer_id, name, nip, address, email, contact_person FROM customers ORDER BY customer_id",
+            None,
+            ["customer_id", "name", "nip", "address", "email", "contact_person"],
+            "customers.csv",
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
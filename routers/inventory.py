@@ -5,17 +5,22 @@ from datetime import date
 from decimal import Decimal
 
 from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Header
-from fastapi.responses import StreamingResponse
 from psycopg.errors import UniqueViolation
 
-from db import fetch_all, fetch_one, execute
+from db import fetch_one, execute, insert_new, unit_of_work
+import db_async
+from csv_export import stream_csv
+from csv_import import LineErrors, iter_batches
 from queries import SQL_INSERT_INVENTORY
 from schemas import Inventory, InventoryCreate, InventoryUpdate
 from security import check_api_key
+from logging_utils import logger as app_logger
 
 
 router = APIRouter(tags=["Inventory"])
 
+INVENTORY_COLUMNS = ["txn_id", "txn_date", "product_id", "qty_change", "reason", "lot", "location"]
+
 
 def _readonly_dep(
     authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
@@ -32,38 +37,19 @@ def _readonly_dep(
 def export_inventory_csv(_ok: bool = Depends(_readonly_dep)):
     """Export all inventory transactions as CSV for Excel/import workflows."""
     try:
-        rows = (
-            fetch_all(
-                "SELECT txn_id, txn_date, product_id, qty_change, reason, lot, location FROM inventory ORDER BY txn_date DESC",
-                None,
-            )
-            or []
-        )
-        import io, csv
-
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        header = [
-            "txn_id",
-            "txn_date",
-            "product_id",
-            "qty_change",
-            "reason",
-            "lot",
-            "location",
-        ]
-        writer.writerow(header)
-        for r in rows:
-            writer.writerow(
-                [r.get(col) if r.get(col) is not None else "" for col in header]
-            )
-        csv_bytes = buf.getvalue().encode("utf-8-sig")
-        mem = io.BytesIO(csv_bytes)
-        mem.seek(0)
-        return StreamingResponse(
-            mem,
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": "attachment; filename=inventory.csv"},
+        return stream_csv(
+            "SELECT txn_id, txn_date, product_id, qty_change, reason, lot, location FROM inventory ORDER BY txn_date DESC",
+            None,
+            [
+                "txn_id",
+                "txn_date",
+                "product_id",
+                "qty_change",
+                "reason",
+                "lot",
+                "location",
+            ],
+            "inventory.csv",
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
@@ -74,7 +60,7 @@ def export_inventory_csv(_ok: bool = Depends(_readonly_dep)):
     response_model=List[Inventory],
     summary="List inventory transactions",
 )
-def inventory_list(
+async def inventory_list(
     limit: Optional[int] = Query(None, ge=1, le=5000),
     offset: Optional[int] = Query(None, ge=0),
     _ok: bool = Depends(_readonly_dep),
@@ -91,7 +77,39 @@ def inventory_list(
         if offset is not None:
             sql += " OFFSET %s"
             params.append(offset)
-        return fetch_all(sql, tuple(params) if params else None)
+        return await db_async.fetch_all(sql, tuple(params) if params else None)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/inventory/balance", summary="On-hand quantities from inventory_balance")
+async def inventory_balance_list(
+    product_id: Optional[str] = None,
+    location: Optional[str] = None,
+    detail: bool = Query(False, description="Per location/lot instead of per product"),
+    _ok: bool = Depends(_readonly_dep),
+):
+    try:
+        where: List[str] = []
+        params: List = []
+        if product_id:
+            where.append("product_id = %s")
+            params.append(product_id)
+        if location is not None:
+            where.append("location = %s")
+            params.append(location)
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+        if detail:
+            sql = (
+                "SELECT product_id, NULLIF(location, '') AS location, NULLIF(lot, '') AS lot, qty_on_hand "
+                f"FROM inventory_balance{clause} ORDER BY product_id, location, lot"
+            )
+        else:
+            sql = (
+                "SELECT product_id, SUM(qty_on_hand) AS qty_on_hand "
+                f"FROM inventory_balance{clause} GROUP BY product_id ORDER BY product_id"
+            )
+        return await db_async.fetch_all(sql, tuple(params) if params else None)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -113,10 +131,14 @@ def inventory_get(txn_id: str):
 
 
 @router.post("/api/inventory", status_code=201, summary="Create inventory transaction")
-def create_inventory_txn(payload: InventoryCreate, _ok: bool = Depends(check_api_key)):
+def create_inventory_txn(
+    payload: InventoryCreate,
+    _ok: bool = Depends(check_api_key),
+    conn=Depends(unit_of_work),
+):
     try:
         exists = fetch_one(
-            "SELECT 1 FROM inventory WHERE txn_id = %s", (payload.txn_id,)
+            "SELECT 1 FROM inventory WHERE txn_id = %s", (payload.txn_id,), conn=conn
         )
         if exists:
             raise HTTPException(
@@ -138,6 +160,7 @@ def create_inventory_txn(payload: InventoryCreate, _ok: bool = Depends(check_api
                 payload.location,
             ),
             returning=True,
+            conn=conn,
         )
         if not rows:
             raise HTTPException(
@@ -210,71 +233,96 @@ def delete_inventory(txn_id: str, _ok: bool = Depends(check_api_key)):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+def _parse_inventory_row(row: dict, seen: set[str]) -> tuple | str:
+    """Validated insert values for one CSV row, or the error message for the report."""
+    txn_id = (row.get("txn_id") or "").strip()
+    product_id = (row.get("product_id") or "").strip()
+    if not txn_id or not product_id:
+        return "missing txn_id or product_id"
+    if txn_id in seen:
+        return f"txn {txn_id} already exists, skipped"
+
+    raw_date = (row.get("txn_date") or "").strip()
+    raw_qty = (row.get("qty_change") or "").strip()
+    if not raw_date or not raw_qty:
+        return "missing txn_date or qty_change"
+    try:
+        d = date.fromisoformat(raw_date)
+    except Exception:
+        return f"invalid date '{raw_date}'"
+    try:
+        qty = Decimal(raw_qty)
+    except Exception:
+        return f"invalid qty '{raw_qty}'"
+
+    reason = (row.get("reason") or "PO").strip() or "PO"
+    lot = (row.get("lot") or "").strip() or None
+    location = (row.get("location") or "").strip() or None
+    seen.add(txn_id)
+    return (txn_id, d, product_id, qty, reason, lot, location)
+
+
+def _import_inventory_batch(batch: list[tuple[int, tuple]], errors: list[tuple[int, str]]) -> int:
+    """Stage one batch and insert it with a single INSERT ... SELECT; returns rows created."""
+    try:
+        inserted = set(insert_new("inventory", INVENTORY_COLUMNS, (values for _, values in batch), "txn_id"))
+    except Exception:
+        # the batch is all-or-nothing; retry row by row to report the offending lines
+        app_logger.warning("bulk inventory import failed, retrying per row", exc_info=True)
+        created = 0
+        for idx, values in batch:
+            try:
+                execute(SQL_INSERT_INVENTORY, values)
+                created += 1
+            except UniqueViolation:
+                errors.append((idx, f"txn {values[0]} already exists, skipped"))
+            except Exception as exc:
+                errors.append((idx, f"failed to insert {values[0]}: {exc}"))
+        return created
+    for idx, values in batch:
+        if values[0] not in inserted:
+            errors.append((idx, f"txn {values[0]} already exists, skipped"))
+    return len(inserted)
+
+
 @router.post("/api/inventory/import", summary="Import inventory from CSV")
 def import_inventory_csv(
     file: UploadFile = File(...), _ok: bool = Depends(check_api_key)
 ):
     """Import inventory transactions from CSV: txn_id, txn_date, product_id, qty_change, reason, lot, location"""
-    import csv, io
+    created = 0
+    rows = 0
+    errors = LineErrors()
 
+    # the upload is parsed batch by batch; each batch commits on its own, so a large
+    # upload never holds the whole file in memory or one long transaction
     try:
-        content = file.file.read().decode("utf-8-sig")
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"Cannot read file: {exc}") from exc
+        for rows_batch in iter_batches(file.file):
+            batch: list[tuple[int, tuple]] = []
+            batch_errors: list[tuple[int, str]] = []
+            # duplicates within a batch; ones across batches are skipped by insert_new
+            seen: set[str] = set()
+            for idx, row in rows_batch:
+                parsed = _parse_inventory_row(row, seen)
+                if isinstance(parsed, str):
+                    batch_errors.append((idx, parsed))
+                else:
+                    batch.append((idx, parsed))
+            rows += len(rows_batch)
+            if batch:
+                created += _import_inventory_batch(batch, batch_errors)
+            errors.add_batch(batch_errors)
+    except UnicodeDecodeError as exc:
+        # earlier batches are already committed: report them along with the error
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "detail": f"Cannot read file: {exc}",
+                "code": "csv_decode_error",
+                "created": created,
+                "skipped": rows - created,
+                "errors": errors.report(),
+            },
+        ) from exc
 
-    reader = csv.DictReader(io.StringIO(content))
-    created = 0
-    skipped = 0
-    errors: list[str] = []
-
-    for idx, row in enumerate(reader, start=2):
-        txn_id = (row.get("txn_id") or "").strip()
-        product_id = (row.get("product_id") or "").strip()
-        if not txn_id or not product_id:
-            skipped += 1
-            errors.append(f"Line {idx}: missing txn_id or product_id")
-            continue
-
-        existing = fetch_one("SELECT 1 FROM inventory WHERE txn_id = %s", (txn_id,))
-        if existing:
-            skipped += 1
-            errors.append(f"Line {idx}: txn {txn_id} already exists, skipped")
-            continue
-
-        raw_date = (row.get("txn_date") or "").strip()
-        raw_qty = (row.get("qty_change") or "").strip()
-        if not raw_date or not raw_qty:
-            skipped += 1
-            errors.append(f"Line {idx}: missing txn_date or qty_change")
-            continue
-        try:
-            d = date.fromisoformat(raw_date)
-        except Exception:
-            skipped += 1
-            errors.append(f"Line {idx}: invalid date '{raw_date}'")
-            continue
-        try:
-            qty = Decimal(raw_qty)
-        except Exception:
-            skipped += 1
-            errors.append(f"Line {idx}: invalid qty '{raw_qty}'")
-            continue
-
-        reason = (row.get("reason") or "PO").strip() or "PO"
-        lot = (row.get("lot") or "").strip() or None
-        location = (row.get("location") or "").strip() or None
-
-        try:
-            execute(
-                SQL_INSERT_INVENTORY,
-                (txn_id, d, product_id, qty, reason, lot, location),
-            )
-            created += 1
-        except UniqueViolation:
-            skipped += 1
-            errors.append(f"Line {idx}: txn {txn_id} already exists, skipped")
-        except Exception as exc:
-            skipped += 1
-            errors.append(f"Line {idx}: failed to insert {txn_id}: {exc}")
-
-    return {"created": created, "skipped": skipped, "errors": errors}
+    return {"created": created, "skipped": rows - created, "errors": errors.report()}
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+import atp
+import mrp
+from security import check_api_key
+
+
+router = APIRouter(tags=["MRP"])
+
+
+def _readonly_dep(
+    authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
+):
+    return check_api_key(
+        authorization=authorization,
+        x_api_key=x_api_key,
+        api_key=api_key,
+        allow_readonly=True,
+    )
+
+
+@router.post("/api/mrp/run", summary="Run MRP regeneration")
+async def run_mrp(_ok: bool = Depends(check_api_key)):
+    """Pełne przeliczenie MRP: rozwinięcie BOM otwartych zleceń i netting ze stanem magazynowym."""
+    try:
+        return await run_in_threadpool(mrp.run)
+    except mrp.BomCycleError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/mrp/requirements", summary="MRP requirements from the last run")
+async def mrp_requirements(
+    product_id: Optional[str] = None,
+    only_net: bool = Query(False, description="only components with a net requirement"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    offset: Optional[int] = Query(None, ge=0),
+    _ok: bool = Depends(_readonly_dep),
+):
+    """Zapotrzebowanie brutto/netto per produkt z ostatniego przebiegu MRP (read-only)."""
+    try:
+        return await run_in_threadpool(mrp.requirements, product_id, only_net, limit, offset)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/atp", summary="Available-to-promise check")
+async def atp_check(
+    product_id: str = Query(..., min_length=1),
+    qty: float = Query(..., gt=0),
+    date: Optional[date] = Query(None, description="requested date (default: today)"),
+    _ok: bool = Depends(_readonly_dep),
+):
+    """Czy można obiecać `qty` sztuk produktu na dany dzień (stan + dostawy - otwarte zlecenia)."""
+    try:
+        return await run_in_threadpool(atp.check, product_id, qty, date)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/atp/{product_id}/buckets", summary="Time-phased ATP buckets of a product")
+async def atp_buckets(product_id: str, _ok: bool = Depends(_readonly_dep)):
+    """Dni z dostawą lub zapotrzebowaniem oraz ATP na każdy z tych dni."""
+    try:
+        return await run_in_threadpool(atp.ATP.buckets, product_id)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
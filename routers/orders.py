@@ -3,14 +3,18 @@ from __future__ import annotations
 from typing import List, Optional
 from datetime import date
 
-from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Header
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, UploadFile, File, Header
 from psycopg.errors import UniqueViolation
 
-from db import fetch_all, fetch_one, execute, next_order_id
-from schemas import Order, OrderCreate, OrderUpdate, OrderLineCreate
+from db import fetch_one, execute, next_order_id, transaction, unit_of_work
+import db_async
+import scheduler
+from csv_export import stream_csv
+from schemas import Order, OrderCreate, OrderUpdate, OrderLineCreate, OrderScheduleResult
 from queries import (
     SQL_ORDERS,
+    SQL_ORDERS_SELECT,
+    SQL_ORDERS_ORDER_BY,
     SQL_INSERT_ORDER,
     SQL_INSERT_ORDER_LINE,
     SQL_FIND_ORDER,
@@ -21,6 +25,9 @@ from security import check_api_key
 
 router = APIRouter(tags=["Orders"])
 
+# generated IDs skipped because an explicit insert already took them
+ORDER_ID_ATTEMPTS = 5
+
 
 def _readonly_dep(
     authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
@@ -37,31 +44,18 @@ def _readonly_dep(
 def export_orders_csv(_ok: bool = Depends(_readonly_dep)):
     """Export all orders as a CSV for Excel/import workflows."""
     try:
-        rows = fetch_all(SQL_ORDERS, None) or []
-        import io, csv
-
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        header = [
-            "order_id",
-            "customer_id",
-            "status",
-            "order_date",
-            "due_date",
-            "contact_person",
-        ]
-        writer.writerow(header)
-        for r in rows:
-            writer.writerow(
-                [r.get(col) if r.get(col) is not None else "" for col in header]
-            )
-        csv_bytes = buf.getvalue().encode("utf-8-sig")
-        mem = io.BytesIO(csv_bytes)
-        mem.seek(0)
-        return StreamingResponse(
-            mem,
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": "attachment; filename=orders.csv"},
+        return stream_csv(
+            SQL_ORDERS,
+            None,
+            [
+                "order_id",
+                "customer_id",
+                "status",
+                "order_date",
+                "due_date",
+                "contact_person",
+            ],
+            "orders.csv",
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
@@ -82,7 +76,7 @@ def _normalize_status(value: Optional[str]) -> Optional[str]:
 
 
 @router.get("/api/orders", response_model=List[Order], summary="List orders")
-def orders_list(
+async def orders_list(
     limit: Optional[int] = Query(None, ge=1, le=1000),
     offset: Optional[int] = Query(None, ge=0),
     from_date: Optional[date] = Query(None, alias="from"),
@@ -90,7 +84,7 @@ def orders_list(
     _ok: bool = Depends(_readonly_dep),
 ):
     try:
-        sql = SQL_ORDERS
+        sql = SQL_ORDERS_SELECT
         params: List = []
         where = []
         if from_date is not None:
@@ -101,13 +95,14 @@ def orders_list(
             params.append(to_date)
         if where:
             sql += " WHERE " + " AND ".join(where)
+        sql += " " + SQL_ORDERS_ORDER_BY
         if limit is not None:
             sql += " LIMIT %s"
             params.append(limit)
         if offset is not None:
             sql += " OFFSET %s"
             params.append(offset)
-        rows = fetch_all(sql, tuple(params) if params else None)
+        rows = await db_async.fetch_all(sql, tuple(params) if params else None)
         for r in rows or []:
             if "status" in r:
                 r["status"] = _normalize_status(r.get("status"))
@@ -116,6 +111,40 @@ def orders_list(
         raise HTTPException(status_code=500, detail="Failed to fetch orders") from exc
 
 
+@router.get("/api/orders/next-id", summary="Get a suggested next order ID")
+def get_next_order_id_hint(_ok: bool = Depends(_readonly_dep)):
+    try:
+        return {"order_id": next_order_id(peek=True)}
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/orders/validate", summary="Validate an order ID before submit")
+def validate_order(
+    order_id: str = Query(..., min_length=1),
+    customer_id: Optional[str] = None,
+    _ok: bool = Depends(_readonly_dep),
+):
+    try:
+        exists = fetch_one(SQL_FIND_ORDER, (order_id.strip(),))
+        if exists:
+            raise HTTPException(status_code=409, detail="Order already exists")
+        if customer_id:
+            cust = fetch_one(SQL_FIND_CUSTOMER, (customer_id.strip(),))
+            if not cust:
+                raise HTTPException(status_code=404, detail="Customer not found")
+        suggested = next_order_id(peek=True)
+        return {
+            "order_id": order_id,
+            "available": True,
+            "suggested_next": suggested,
+        }
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
 @router.get(
     "/api/orders/{order_id}",
     response_model=Optional[Order],
@@ -141,35 +170,56 @@ def order_get(order_id: str):
     status_code=201,
     summary="Create order",
 )
-def create_order(payload: OrderCreate, _ok: bool = Depends(check_api_key)):
+def create_order(
+    payload: OrderCreate,
+    _ok: bool = Depends(check_api_key),
+    conn=Depends(unit_of_work),
+):
     try:
         order_id = (payload.order_id or "").strip() if payload.order_id else None
-        if not order_id:
-            order_id = next_order_id()
-        existing = fetch_one(SQL_FIND_ORDER, (order_id,))
-        if existing:
-            raise HTTPException(status_code=409, detail="Order already exists")
-        customer = fetch_one(SQL_FIND_CUSTOMER, (payload.customer_id,))
-        if not customer:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        rows = execute(
-            SQL_INSERT_ORDER,
-            (
-                order_id,
-                payload.customer_id,
-                (
-                    payload.status.value
-                    if hasattr(payload.status, "value")
-                    else payload.status
-                ),
-                payload.due_date,
-                payload.contact_person,
-            ),
-            returning=True,
-        )
-        if not rows:
-            raise HTTPException(status_code=500, detail="Failed to create order")
-        return rows[0]
+        generated = not order_id
+        for _ in range(ORDER_ID_ATTEMPTS):
+            if generated:
+                order_id = next_order_id(conn=conn)
+            existing = fetch_one(SQL_FIND_ORDER, (order_id,), conn=conn)
+            if existing:
+                if generated:
+                    # taken by an explicitly inserted order: draw the next ID
+                    continue
+                raise HTTPException(status_code=409, detail="Order already exists")
+            customer = fetch_one(SQL_FIND_CUSTOMER, (payload.customer_id,), conn=conn)
+            if not customer:
+                raise HTTPException(status_code=404, detail="Customer not found")
+            # savepoint so a concurrent insert of the same ID can be retried
+            # without aborting the request transaction
+            execute("SAVEPOINT create_order", conn=conn)
+            try:
+                rows = execute(
+                    SQL_INSERT_ORDER,
+                    (
+                        order_id,
+                        payload.customer_id,
+                        (
+                            payload.status.value
+                            if hasattr(payload.status, "value")
+                            else payload.status
+                        ),
+                        payload.due_date,
+                        payload.contact_person,
+                    ),
+                    returning=True,
+                    conn=conn,
+                )
+            except UniqueViolation:
+                execute("ROLLBACK TO SAVEPOINT create_order", conn=conn)
+                if generated:
+                    continue
+                raise
+            execute("RELEASE SAVEPOINT create_order", conn=conn)
+            if not rows:
+                raise HTTPException(status_code=500, detail="Failed to create order")
+            return rows[0]
+        raise HTTPException(status_code=409, detail="Could not allocate a free order ID")
     except HTTPException:
         raise
     except UniqueViolation:
@@ -183,7 +233,11 @@ def create_order(payload: OrderCreate, _ok: bool = Depends(check_api_key)):
     status_code=201,
     summary="Create order line",
 )
-def create_order_line(payload: OrderLineCreate, _ok: bool = Depends(check_api_key)):
+def create_order_line(
+    payload: OrderLineCreate,
+    _ok: bool = Depends(check_api_key),
+    conn=Depends(unit_of_work),
+):
     try:
         rows = execute(
             SQL_INSERT_ORDER_LINE,
@@ -197,6 +251,7 @@ def create_order_line(payload: OrderLineCreate, _ok: bool = Depends(check_api_ke
                 payload.graphic_id,
             ),
             returning=True,
+            conn=conn,
         )
         if not rows:
             raise HTTPException(status_code=409, detail="Order line already exists")
@@ -285,48 +340,15 @@ def migrate_contact_person(_ok: bool = Depends(check_api_key)):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
-@router.get("/api/orders/next-id", summary="Get a suggested next order ID")
-def get_next_order_id_hint(_ok: bool = Depends(_readonly_dep)):
-    try:
-        return {"order_id": next_order_id()}
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
-
-
-@router.get("/api/orders/validate", summary="Validate an order ID before submit")
-def validate_order(
-    order_id: str = Query(..., min_length=1),
-    customer_id: Optional[str] = None,
-    _ok: bool = Depends(_readonly_dep),
-):
-    try:
-        exists = fetch_one(SQL_FIND_ORDER, (order_id.strip(),))
-        if exists:
-            raise HTTPException(status_code=409, detail="Order already exists")
-        if customer_id:
-            cust = fetch_one(SQL_FIND_CUSTOMER, (customer_id.strip(),))
-            if not cust:
-                raise HTTPException(status_code=404, detail="Customer not found")
-        suggested = next_order_id()
-        return {
-            "order_id": order_id,
-            "available": True,
-            "suggested_next": suggested,
-        }
-    except HTTPException:
-        raise
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
-
-
 @router.patch(
     "/api/orders/{order_id}/schedule",
-    response_model=Order,
+    response_model=OrderScheduleResult,
     summary="Update order schedule (start/due dates)",
 )
 def update_order_schedule(
     order_id: str,
     payload: dict,
+    background_tasks: BackgroundTasks,
     _ok: bool = Depends(check_api_key)
 ):
     try:
@@ -348,10 +370,27 @@ def update_order_schedule(
             "WHERE order_id = %s "
             "RETURNING order_id, customer_id, status, order_date, due_date, contact_person"
         )
-        rows = execute(sql, params, returning=True)
-        if not rows:
-            raise HTTPException(status_code=404, detail="Order not found")
-        return rows[0]
+        try:
+            # new dates and the re-planned slots commit (or roll back) together
+            with transaction() as conn:
+                rows = execute(sql, params, returning=True, conn=conn)
+                if not rows:
+                    raise HTTPException(status_code=404, detail="Order not found")
+                # re-plan only the affected part of the loaded schedule
+                changes = scheduler.reschedule_order(order_id, order_date=start, due_date=due, conn=conn)
+        except HTTPException:
+            raise
+        except Exception:
+            # the in-memory plan may already include dates that were rolled back
+            scheduler.discard_plan()
+            raise
+        if changes is not None:
+            scheduler.publish_plan()
+        elif scheduler.has_published_schedule():
+            # no plan loaded in this process, or it went stale: re-plan everything after the response
+            background_tasks.add_task(scheduler.replan_after_commit)
+            changes = {"replanned": "pending"}
+        return {**rows[0], "schedule": changes}
     except HTTPException:
         raise
     except Exception as exc:
@@ -2,9 +2,12 @@ from __future__ import annotations
 
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Header
 
-from db import fetch_all, fetch_one, execute
+from bom_cache import BOM_CACHE, impacted_orders
+import costing
+from db import fetch_all, fetch_one, execute, table_versions
+from mrp import BomCycleError
 from schemas import Product, ProductCreate, ProductUpdate
 from security import check_api_key
 from queries import SQL_PRODUCTS
@@ -59,6 +62,32 @@ def product_get(product_id: str):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@router.get("/api/products/{product_id}/where-used", summary="Assemblies using a product")
+def product_where_used(product_id: str, _ok: bool = Depends(_readonly_dep)):
+    """Wszystkie wyroby nadrzędne (każdy poziom BOM) zawierające produkt."""
+    try:
+        used_in = BOM_CACHE.where_used_levels(product_id)
+        return [
+            {"product_id": parent, "level": info["level"], "qty_per_unit": info["qty"]}
+            for parent, info in sorted(used_in.items(), key=lambda kv: (kv[1]["level"], kv[0]))
+        ]
+    except BomCycleError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/products/{product_id}/impacted-orders", summary="Open orders affected by a product")
+def product_impacted_orders(product_id: str, _ok: bool = Depends(_readonly_dep)):
+    """Otwarte zlecenia potrzebujące produktu bezpośrednio lub przez złożenia nadrzędne."""
+    try:
+        return impacted_orders(product_id)
+    except BomCycleError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
 @router.post(
     "/api/products", response_model=Product, status_code=201, summary="Create product"
 )
@@ -91,7 +120,10 @@ def create_product(payload: ProductCreate, _ok: bool = Depends(check_api_key)):
     "/api/products/{product_id}", response_model=Product, summary="Update product"
 )
 def update_product(
-    product_id: str, payload: ProductUpdate, _ok: bool = Depends(check_api_key)
+    product_id: str,
+    payload: ProductUpdate,
+    background_tasks: BackgroundTasks,
+    _ok: bool = Depends(check_api_key),
 ):
     try:
         updates = []
@@ -119,9 +151,14 @@ def update_product(
             "WHERE product_id = %s "
             "RETURNING product_id, name, unit, std_cost, price, vat_rate"
         )
+        # the roll-up must tell this write from ones made elsewhere
+        seen = table_versions(*costing.VERSION_TABLES) if payload.std_cost is not None else None
         rows = execute(sql, params, returning=True)
         if not rows:
             raise HTTPException(status_code=404, detail="Product not found")
+        if payload.std_cost is not None:
+            # roll the new cost up into the assemblies that use this product, after the response
+            background_tasks.add_task(costing.notify_changed, [product_id], seen=seen)
         return rows[0]
     except HTTPException:
         raise
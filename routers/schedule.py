@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+import scheduler
+from security import check_api_key
+
+
+router = APIRouter(tags=["Scheduling"])
+
+
+def _readonly_dep(
+    authorization=Header(None), x_api_key=Header(None), api_key: Optional[str] = None
+):
+    return check_api_key(
+        authorization=authorization,
+        x_api_key=x_api_key,
+        api_key=api_key,
+        allow_readonly=True,
+    )
+
+
+@router.post("/api/schedule/run", summary="Reschedule all open orders")
+async def run_schedule(_ok: bool = Depends(check_api_key)):
+    """Harmonogram z ograniczoną zdolnością: operacje z marszrut na gniazdach wg terminu."""
+    try:
+        return await run_in_threadpool(scheduler.run)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/schedule", summary="Scheduled operations (Gantt)")
+async def get_schedule(
+    order_id: Optional[str] = None,
+    work_center: Optional[str] = None,
+    date_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    date_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    limit: Optional[int] = Query(None, ge=1, le=50000),
+    offset: Optional[int] = Query(None, ge=0),
+    _ok: bool = Depends(_readonly_dep),
+):
+    """Operacje z ostatniego harmonogramu do wykresu Gantta (read-only)."""
+    try:
+        return await run_in_threadpool(
+            scheduler.gantt, order_id, work_center, date_from, date_to, limit, offset
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/api/work-centers/{work_center}/load", summary="Work center load per day")
+async def work_center_load(
+    work_center: str,
+    date_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    date_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    _ok: bool = Depends(_readonly_dep),
+):
+    """Obciążenie gniazda w minutach na dzień wg harmonogramu (read-only)."""
+    try:
+        return await run_in_threadpool(scheduler.work_center_load, work_center, date_from, date_to)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
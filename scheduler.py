@@ -0,0 +1,565 @@
+"""
+Finite-capacity scheduling of open orders over `routings`.
+
+Every open order line becomes a job whose operations are the routing steps of
+its product, in operation_no order. An operation takes
+
+    std_setup_min + qty * std_run_min_per_unit   minutes
+
+on its work center. Each work center runs one operation at a time on a
+continuous (24/7) timeline that starts at the schedule's `start`. A job is
+released at its order_date and every operation waits for the previous one.
+
+Dispatching is an event-driven list scheduler:
+
+* an event heap holds operation completions and job releases, by time;
+* each work center has a ready queue (heap) ordered by job priority
+  (due date, no due date last, then order date, order id, line no);
+* after all events at time t are processed, every idle work center that was
+  touched starts the most urgent operation in its queue.
+
+The whole run is O(ops log ops) with integer heap keys, so 5k orders x 10
+operations schedule in well under a second; the result replaces the
+`schedule` table.
+"""
+
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db import copy_rows, execute, fetch_all, fetch_one, table_versions, transaction, upsert_many
+from logging_utils import logger
+from netting import CLOSED_STATUSES, NO_DUE_DATE
+
+# the scheduler's inputs; a plan is only reused while their counters are unchanged
+VERSION_TABLES = ("orders", "order_lines", "routings")
+
+SQL_OPEN_OPERATIONS = f"""
+SELECT ol.order_id, ol.line_no, ol.product_id, ol.qty, o.due_date, o.order_date,
+       r.operation_no, r.work_center, r.std_setup_min, r.std_run_min_per_unit
+FROM order_lines ol
+JOIN orders o ON o.order_id = ol.order_id
+JOIN routings r ON r.product_id = ol.product_id
+WHERE o.status NOT IN ({", ".join(f"'{s}'" for s in CLOSED_STATUSES)})
+ORDER BY ol.order_id, ol.line_no, r.operation_no
+"""
+
+SCHEDULE_COLUMNS = [
+    "order_id",
+    "line_no",
+    "operation_no",
+    "product_id",
+    "work_center",
+    "qty",
+    "setup_min",
+    "run_min",
+    "start_ts",
+    "end_ts",
+    "due_date",
+    "late",
+]
+
+_FINISH, _RELEASE = 0, 1
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _as_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    parsed = datetime.fromisoformat(str(value))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _iso(ts: datetime) -> str:
+    return ts.isoformat(timespec="seconds")
+
+
+class Schedule:
+    """Jobs and operations as parallel lists; `dispatch()` fills start/end minutes."""
+
+    def __init__(self, start: datetime):
+        self.start = start
+        # table_versions(*VERSION_TABLES) read before the inputs were loaded
+        self.version_key: Optional[Tuple[int, ...]] = None
+        self.work_centers: List[str] = []
+        self._wc_index: Dict[str, int] = {}
+        self.jobs: List[Dict[str, Any]] = []
+        self._order_jobs: Dict[str, List[int]] = defaultdict(list)
+        # per operation
+        self.op_job: List[int] = []
+        self.op_no: List[int] = []
+        self.op_wc: List[int] = []
+        self.op_setup: List[float] = []
+        self.op_run: List[float] = []
+        self.op_next: List[int] = []
+        self.op_start: List[float] = []
+        self.op_end: List[float] = []
+
+    # ------------------------------------------------------------- building
+    def minutes(self, value: Any) -> Optional[float]:
+        day = _as_date(value)
+        if day is None:
+            return None
+        ts = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        return (ts - self.start).total_seconds() / 60.0
+
+    def add_job(
+        self,
+        order_id: str,
+        line_no: int,
+        product_id: str,
+        qty: float,
+        due_date: Any,
+        order_date: Any,
+        operations: Iterable[Tuple[int, str, float, float]],
+    ) -> int:
+        job = len(self.jobs)
+        release = self.minutes(order_date)
+        due = self.minutes(due_date)
+        self.jobs.append(
+            {
+                "order_id": order_id,
+                "line_no": int(line_no),
+                "product_id": product_id,
+                "qty": float(qty or 0),
+                "due_date": _as_date(due_date),
+                "order_date": _as_date(order_date),
+                "release": max(release or 0.0, 0.0),
+                # due dates are inclusive: late means finishing after the end of that day
+                "due_min": None if due is None else due + 1440.0,
+                "first_op": -1,
+            }
+        )
+        self._order_jobs[order_id].append(job)
+        prev = -1
+        for operation_no, work_center, setup_min, run_min_per_unit in operations:
+            op = len(self.op_job)
+            wc = self._wc_index.get(work_center)
+            if wc is None:
+                wc = self._wc_index[work_center] = len(self.work_centers)
+                self.work_centers.append(work_center)
+            self.op_job.append(job)
+            self.op_no.append(int(operation_no))
+            self.op_wc.append(wc)
+            self.op_setup.append(float(setup_min or 0))
+            self.op_run.append(float(run_min_per_unit or 0) * float(qty or 0))
+            self.op_next.append(-1)
+            self.op_start.append(0.0)
+            self.op_end.append(0.0)
+            if prev < 0:
+                self.jobs[job]["first_op"] = op
+            else:
+                self.op_next[prev] = op
+            prev = op
+        return job
+
+    def _priority_key(self, j: int) -> Tuple[str, str, str, int]:
+        job = self.jobs[j]
+        return (
+            str(job["due_date"] or NO_DUE_DATE),
+            str(job["order_date"] or NO_DUE_DATE),
+            job["order_id"],
+            job["line_no"],
+        )
+
+    def priorities(self) -> List[int]:
+        """Job rank by dispatch priority (0 = most urgent)."""
+        keys = sorted(range(len(self.jobs)), key=self._priority_key)
+        rank = [0] * len(self.jobs)
+        for position, j in enumerate(keys):
+            rank[j] = position
+        return rank
+
+    # ----------------------------------------------------------- dispatching
+    def dispatch(self, from_time: Optional[float] = None) -> List[int]:
+        """Assign start/end minutes; returns the operations whose slot changed.
+
+        With `from_time`, operations that started before it keep their slots
+        (the dispatcher is deterministic, so replaying from there reproduces
+        them) and only the rest of the timeline is simulated again.
+        """
+        rank = self.priorities()
+        op_job, op_wc, op_next = self.op_job, self.op_wc, self.op_next
+        duration = [s + r for s, r in zip(self.op_setup, self.op_run)]
+        start, end = self.op_start, self.op_end
+        old_start, old_end = start[:], end[:]
+        queues: List[List[Tuple[int, int]]] = [[] for _ in self.work_centers]
+        busy = [False] * len(self.work_centers)
+        cutoff = float("-inf") if from_time is None else from_time
+
+        events: List[Tuple[float, int, int]] = []
+        for job in self.jobs:
+            op, prev = job["first_op"], -1
+            while op >= 0 and start[op] < cutoff:
+                prev, op = op, op_next[op]
+            if prev >= 0 and end[prev] > cutoff:
+                # still running at the cutoff: its completion releases the next operation
+                busy[op_wc[prev]] = True
+                events.append((end[prev], _FINISH, prev))
+            elif op >= 0:
+                ready = job["release"] if prev < 0 else end[prev]
+                events.append((max(ready, cutoff), _RELEASE, op))
+        heapq.heapify(events)
+
+        push, pop = heapq.heappush, heapq.heappop
+        while events:
+            t = events[0][0]
+            touched = set()
+            while events and events[0][0] == t:
+                _, kind, op = pop(events)
+                if kind == _FINISH:
+                    busy[op_wc[op]] = False
+                    touched.add(op_wc[op])
+                    op = op_next[op]
+                    if op < 0:
+                        continue
+                wc = op_wc[op]
+                push(queues[wc], (rank[op_job[op]], op))
+                touched.add(wc)
+            for wc in touched:
+                if not busy[wc] and queues[wc]:
+                    _, op = pop(queues[wc])
+                    start[op] = t
+                    end[op] = t + duration[op]
+                    busy[wc] = True
+                    push(events, (end[op], _FINISH, op))
+
+        if from_time is None:
+            return list(range(len(op_job)))
+        return [
+            op for op in range(len(op_job))
+            if abs(start[op] - old_start[op]) > 1e-9 or abs(end[op] - old_end[op]) > 1e-9
+        ]
+
+    def move_order(self, order_id: str, order_date: Any = None, due_date: Any = None) -> Optional[float]:
+        """Apply new dates to the order's jobs; returns the time to replay from.
+
+        Before that time the order never won a dispatch decision in the old
+        plan and cannot win one in the new plan, so earlier slots stay valid.
+        """
+        jobs = self._order_jobs.get(order_id)
+        if not jobs:
+            return None
+        cutoff = float("inf")
+        for j in jobs:
+            job = self.jobs[j]
+            old_key, old_release = self._priority_key(j), job["release"]
+            if order_date is not None:
+                job["order_date"] = _as_date(order_date)
+                job["release"] = max(self.minutes(order_date) or 0.0, 0.0)
+            if due_date is not None:
+                due = self.minutes(due_date)
+                job["due_date"] = _as_date(due_date)
+                job["due_min"] = None if due is None else due + 1440.0
+            first = job["first_op"]
+            if first < 0:
+                continue
+            if self._priority_key(j) < old_key:
+                # more urgent: it may now beat operations picked while it was queued
+                earliest = min(old_release, job["release"])
+            elif job["release"] < old_release:
+                # ready earlier: it may win a work center that was free before
+                earliest = job["release"]
+            else:
+                # less urgent and released no earlier: it first wins where it did before
+                earliest = self.op_start[first]
+            cutoff = min(cutoff, earliest)
+        return None if cutoff == float("inf") else cutoff
+
+    def order_ops(self, order_id: str) -> List[int]:
+        return [
+            op for j in self._order_jobs.get(order_id, ())
+            for op in self._job_ops(j)
+        ]
+
+    def _job_ops(self, job: int) -> Iterable[int]:
+        op = self.jobs[job]["first_op"]
+        while op >= 0:
+            yield op
+            op = self.op_next[op]
+
+    # --------------------------------------------------------------- output
+    def timestamp(self, minutes: float) -> datetime:
+        return self.start + timedelta(minutes=minutes)
+
+    def rows(self, ops: Optional[Iterable[int]] = None) -> List[Tuple]:
+        if ops is None:
+            ops = range(len(self.op_job))
+        return [self._row(op, self.jobs[self.op_job[op]]) for op in ops]
+
+    def _row(self, op: int, job: Dict[str, Any]) -> Tuple:
+        late = job["due_min"] is not None and self.op_end[op] > job["due_min"]
+        return (
+            job["order_id"],
+            job["line_no"],
+            self.op_no[op],
+            job["product_id"],
+            self.work_centers[self.op_wc[op]],
+            job["qty"],
+            round(self.op_setup[op], 4),
+            round(self.op_run[op], 4),
+            _iso(self.timestamp(self.op_start[op])),
+            _iso(self.timestamp(self.op_end[op])),
+            None if job["due_date"] is None else job["due_date"].isoformat(),
+            1 if late else 0,
+        )
+
+    def late_orders(self) -> List[str]:
+        finish: Dict[str, float] = defaultdict(float)
+        due: Dict[str, Optional[float]] = {}
+        for op, j in enumerate(self.op_job):
+            job = self.jobs[j]
+            finish[job["order_id"]] = max(finish[job["order_id"]], self.op_end[op])
+            due[job["order_id"]] = job["due_min"]
+        return sorted(o for o, end in finish.items() if due[o] is not None and end > due[o])
+
+
+def build(rows: Iterable[Dict[str, Any]], start: datetime) -> Schedule:
+    """Group joined order-line/routing rows (ordered by order, line, operation) into jobs."""
+    schedule = Schedule(start)
+    current: Optional[Tuple[str, int]] = None
+    head: Dict[str, Any] = {}
+    operations: List[Tuple[int, str, float, float]] = []
+
+    def _flush():
+        if current is not None:
+            schedule.add_job(
+                head["order_id"], head["line_no"], head["product_id"], head["qty"],
+                head["due_date"], head["order_date"], operations,
+            )
+
+    for r in rows:
+        key = (r["order_id"], int(r["line_no"]))
+        if key != current:
+            _flush()
+            current, head, operations = key, r, []
+        operations.append(
+            (r["operation_no"], r["work_center"], r["std_setup_min"], r["std_run_min_per_unit"])
+        )
+    _flush()
+    return schedule
+
+
+def _default_start() -> datetime:
+    return datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+
+# one full reschedule at a time; later edits build on the last one (see LAST_SCHEDULE).
+# _PLAN_LOCK guards LAST_SCHEDULE and the schedule table and is always taken
+# inside the writer's transaction, never the other way round.
+_RUN_LOCK = threading.Lock()
+_PLAN_LOCK = threading.Lock()
+LAST_SCHEDULE: Optional[Schedule] = None
+# moved by reschedule_order(), published by publish_plan() once the caller has committed
+_STAGED: Optional[Schedule] = None
+
+
+def run(start: Optional[datetime] = None) -> Dict[str, Any]:
+    """Schedule all open orders and replace the contents of `schedule`."""
+    global LAST_SCHEDULE
+    with _RUN_LOCK:
+        t0 = time.perf_counter()
+        key = table_versions(*VERSION_TABLES)
+        schedule = build(fetch_all(SQL_OPEN_OPERATIONS) or [], start or _default_start())
+        schedule.version_key = key
+        schedule.dispatch()
+        dispatch_seconds = time.perf_counter() - t0
+        rows = schedule.rows()
+        with transaction() as conn, _PLAN_LOCK:
+            execute("DELETE FROM schedule", conn=conn)
+            copy_rows("schedule", SCHEDULE_COLUMNS, rows, conn=conn)
+            LAST_SCHEDULE = schedule
+        makespan = max(schedule.op_end, default=0.0)
+        return {
+            "start": _iso(schedule.start),
+            "orders": len({job["order_id"] for job in schedule.jobs}),
+            "operations": len(schedule.op_job),
+            "work_centers": len(schedule.work_centers),
+            "makespan_hours": round(makespan / 60.0, 2),
+            "late_orders": schedule.late_orders(),
+            "dispatch_seconds": round(dispatch_seconds, 4),
+            "seconds": round(time.perf_counter() - t0, 4),
+        }
+
+
+def reschedule_order(
+    order_id: str, order_date: Any = None, due_date: Any = None, conn: Any = None
+) -> Optional[Dict[str, Any]]:
+    """Incrementally re-plan after an order's dates moved; returns the changed slots.
+
+    Call it on `conn`, the transaction that has just updated the order's
+    dates: the changed slots are written in that same transaction. Works on
+    LAST_SCHEDULE: only the part of the timeline from the earliest point the
+    order could have influenced is re-dispatched, and only rows whose slot (or
+    lateness) changed are written back.
+
+    The moved plan is staged: after committing, the caller calls
+    `publish_plan()` (or `discard_plan()` if the transaction failed).
+
+    Returns None when no schedule is loaded in this process or its inputs
+    changed since it was built (table_versions); the caller then falls back
+    to `replan_after_commit()`.
+    """
+    global LAST_SCHEDULE, _STAGED
+    with _PLAN_LOCK:
+        schedule = LAST_SCHEDULE
+        if schedule is None or schedule.version_key is None:
+            return None
+        # read outside `conn`: the caller's own uncommitted UPDATE is not counted yet
+        key = table_versions(*VERSION_TABLES)
+        if key != schedule.version_key:
+            return None
+        t0 = time.perf_counter()
+        # the plan is ahead of the database until the caller commits
+        LAST_SCHEDULE = None
+        moved = schedule.order_ops(order_id)
+        before = dict(zip(moved, schedule.rows(moved)))
+        cutoff = schedule.move_order(order_id, order_date=order_date, due_date=due_date)
+        rows: List[Tuple] = []
+        if cutoff is not None:
+            changed = set(schedule.dispatch(from_time=cutoff))
+            # a due-date move can change the order's own rows without moving any slot
+            changed.update(op for op, row in zip(moved, schedule.rows(moved)) if row != before[op])
+            rows = schedule.rows(sorted(changed))
+        if rows:
+            upsert_many("schedule", SCHEDULE_COLUMNS, rows, ["order_id", "line_no", "operation_no"], conn=conn)
+        schedule.version_key = None
+        _STAGED = schedule
+        return {
+            "replanned": "incremental",
+            # None: the order is not on the plan (closed, or nothing routed)
+            "replayed_from": None if cutoff is None else _iso(schedule.timestamp(cutoff)),
+            "changed": [dict(zip(SCHEDULE_COLUMNS, row)) for row in rows],
+            "late_orders": schedule.late_orders(),
+            "seconds": round(time.perf_counter() - t0, 4),
+        }
+
+
+def publish_plan() -> None:
+    """Make the plan staged by reschedule_order() current, after its transaction committed.
+
+    The key is read after the commit, so it already counts the caller's own
+    write. A write from elsewhere that lands between the commit and the read
+    is counted as well without being on the plan; any later input change
+    (or the next full run) replaces the plan.
+    """
+    global LAST_SCHEDULE, _STAGED
+    with _PLAN_LOCK:
+        schedule, _STAGED = _STAGED, None
+        # a full run() that published in the meantime is newer than the staged plan
+        if schedule is not None and LAST_SCHEDULE is None:
+            schedule.version_key = table_versions(*VERSION_TABLES)
+            LAST_SCHEDULE = schedule
+
+
+def discard_plan() -> None:
+    """Forget LAST_SCHEDULE (e.g. the transaction that moved an order rolled back)."""
+    global LAST_SCHEDULE, _STAGED
+    with _PLAN_LOCK:
+        LAST_SCHEDULE = None
+        _STAGED = None
+
+
+def has_published_schedule() -> bool:
+    return fetch_one("SELECT 1 AS x FROM schedule LIMIT 1") is not None
+
+
+def replan_after_commit() -> Optional[Dict[str, Any]]:
+    """Fallback when reschedule_order() could not work incrementally.
+
+    Runs a full re-plan if a schedule has been published (the process may
+    have restarted, or the loaded plan went stale); returns None when there is
+    no schedule to keep current. Meant to run as a background task after the
+    response; failures are logged, not raised: the order change itself is
+    already committed.
+    """
+    try:
+        if not has_published_schedule():
+            return None
+        return {"replanned": "full", **run()}
+    except Exception as exc:
+        logger.error(f"Full re-plan after an order date change failed: {exc}")
+        return None
+
+
+def gantt(
+    order_id: Optional[str] = None,
+    work_center: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    sql = f"SELECT {', '.join(SCHEDULE_COLUMNS)} FROM schedule"
+    where: List[str] = []
+    params: List[Any] = []
+    if order_id:
+        where.append("order_id = %s")
+        params.append(order_id)
+    if work_center:
+        where.append("work_center = %s")
+        params.append(work_center)
+    if date_to:
+        where.append("start_ts < %s")
+        params.append(_iso(_day_start(date_to) + timedelta(days=1)))
+    if date_from:
+        where.append("end_ts > %s")
+        params.append(_iso(_day_start(date_from)))
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY start_ts, work_center, order_id, line_no, operation_no"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    if offset is not None:
+        sql += " OFFSET %s"
+        params.append(offset)
+    return fetch_all(sql, tuple(params) if params else None) or []
+
+
+def _day_start(value: Any) -> datetime:
+    day = _as_date(value)
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def work_center_load(
+    work_center: str, date_from: Optional[str] = None, date_to: Optional[str] = None
+) -> Dict[str, Any]:
+    """Scheduled minutes per calendar day (UTC) on `work_center`, split at midnight."""
+    busy: Dict[date, float] = defaultdict(float)
+    operations = 0
+    for r in gantt(work_center=work_center, date_from=date_from, date_to=date_to):
+        operations += 1
+        begin, finish = _as_datetime(r["start_ts"]), _as_datetime(r["end_ts"])
+        while begin < finish:
+            midnight = datetime(begin.year, begin.month, begin.day, tzinfo=timezone.utc) + timedelta(days=1)
+            chunk_end = min(finish, midnight)
+            busy[begin.date()] += (chunk_end - begin).total_seconds() / 60.0
+            begin = chunk_end
+    low = _as_date(date_from)
+    high = _as_date(date_to)
+    days = [
+        {"date": day.isoformat(), "busy_min": round(minutes, 2), "utilization": round(minutes / 1440.0, 4)}
+        for day, minutes in sorted(busy.items())
+        if (low is None or day >= low) and (high is None or day <= high)
+    ]
+    return {
+        "work_center": work_center,
+        "operations": operations,
+        "busy_min": round(sum(d["busy_min"] for d in days), 2),
+        "days": days,
+    }
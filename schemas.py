@@ -1,7 +1,7 @@
 """Pydantic models (schemas) for data validation and serialization."""
 
 from pydantic import BaseModel, Field, condecimal, field_validator, ConfigDict
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import date
 from decimal import Decimal, InvalidOperation
 from enum import Enum
@@ -51,6 +51,12 @@ class Order(BaseModel):
         return value.strip() if isinstance(value, str) else value
 
 
+class OrderScheduleResult(Order):
+    """Order after a schedule change, with the re-planned operation slots."""
+
+    schedule: Optional[Dict[str, Any]] = None
+
+
 class Finance(BaseModel):
     """Read model for financial data related to an order."""
 
@@ -289,6 +295,23 @@ class ProductUpdate(BaseModel):
     vat_rate: Optional[Decimal] = None
 
 
+class BomLine(BaseModel):
+    """One BOM edge: `qty_per` units of `component_id` per unit of the parent."""
+
+    model_config = ConfigDict(from_attributes=True)
+    parent_product_id: str
+    component_id: str
+    qty_per: Decimal
+    scrap_pct: Decimal = Decimal("0")
+
+
+class BomLineUpsert(BaseModel):
+    """Write model for creating or replacing a BOM edge."""
+
+    qty_per: condecimal(max_digits=18, decimal_places=6) = Field(..., gt=0)
+    scrap_pct: condecimal(max_digits=6, decimal_places=4) = Field(Decimal("0"), ge=0, lt=1)
+
+
 class Customer(BaseModel):
     """Read model for a customer."""
 
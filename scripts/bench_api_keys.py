@@ -0,0 +1,92 @@
+"""Benchmark API-key authentication latency as the number of stored keys grows.
+
+Compares legacy unprefixed keys (scan + PBKDF2 per row) with prefixed keys
+(indexed lookup + one PBKDF2, then the verified-key cache).
+
+Usage:
+    python scripts/bench_api_keys.py [--counts 1,10,25,50] [--requests 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import pathlib
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ["FORCE_SQLITE"] = "1"
+os.environ.setdefault("JWT_SECRET", "bench-" + "x" * 64)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import auth  # noqa: E402
+import db  # noqa: E402
+import main  # noqa: E402
+
+
+def _fresh_db():
+    tmp = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+    tmp.close()
+    db.SQLITE_DB_PATH = tmp.name
+    db.reset_sqlite_init()
+    db.POOL = None
+    auth.ensure_table()
+    auth.KEY_CACHE.clear()
+    return tmp.name
+
+
+def _insert_legacy_key(label: str) -> str:
+    plaintext = f"legacy-{label}-{os.urandom(8).hex()}"
+    key_hash, salt = auth._hash_key(plaintext)
+    db.execute(
+        "INSERT INTO api_keys (key_text, key_hash, salt, label, active) VALUES (%s, %s, %s, %s, 1)",
+        (None, key_hash, salt, label),
+    )
+    return plaintext
+
+
+def _time_requests(client: TestClient, key: str, n: int, clear_cache: bool) -> float:
+    samples = []
+    for _ in range(n):
+        if clear_cache:
+            auth.KEY_CACHE.clear()
+        start = time.perf_counter()
+        resp = client.get("/api/orders", headers={"x-api-key": key})
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.text
+    return statistics.median(samples)
+
+
+def main_bench(counts, n_requests):
+    client = TestClient(main.app)
+    print(f"PBKDF2 iterations: {auth.PBKDF2_ITERATIONS}")
+    print(f"{'keys':>6} {'legacy ms':>10} {'prefixed ms':>12} {'cached ms':>10}")
+    for count in counts:
+        path = _fresh_db()
+        try:
+            legacy = [_insert_legacy_key(f"l{i}") for i in range(count)]
+            legacy_ms = _time_requests(client, legacy[-1], max(1, n_requests // 5), True)
+
+            path2 = _fresh_db()
+            try:
+                keys = [auth.create_api_key(label=f"p{i}")["api_key"] for i in range(count)]
+                prefixed_ms = _time_requests(client, keys[-1], n_requests, True)
+                cached_ms = _time_requests(client, keys[-1], n_requests, False)
+            finally:
+                os.remove(path2)
+        finally:
+            os.remove(path)
+        print(f"{count:>6} {legacy_ms:>10.1f} {prefixed_ms:>12.1f} {cached_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", default="1,10,25,50")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    main_bench([int(c) for c in args.counts.split(",")], args.requests)
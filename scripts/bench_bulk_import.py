@@ -0,0 +1,73 @@
+"""Row-at-a-time execute() vs db.copy_rows / db.upsert_many for an inventory import.
+
+Usage:
+    python scripts/bench_bulk_import.py [--rows 100000] [--per-row 5000]
+
+The per-row baseline is measured on --per-row rows and extrapolated, since the
+full run would take minutes.
+"""
+
+import argparse
+import os
+import sys
+import pathlib
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ["FORCE_SQLITE"] = "1"
+os.environ.setdefault("JWT_SECRET", "bench-" + "x" * 64)
+
+import db  # noqa: E402
+
+COLUMNS = ["txn_id", "txn_date", "product_id", "qty_change", "reason", "lot", "location"]
+INSERT = (
+    "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason, lot, location) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def _fresh_db() -> None:
+    tmp = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+    tmp.close()
+    db.SQLITE_DB_PATH = tmp.name
+    db.reset_sqlite_init()
+    db.POOL = None
+
+
+def _rows(n: int, prefix: str):
+    for i in range(n):
+        yield (f"{prefix}-{i:07d}", "2026-01-01", "P-100", 1, "PO", None, "A1")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--per-row", type=int, default=5_000)
+    args = parser.parse_args()
+
+    _fresh_db()
+    start = time.perf_counter()
+    for row in _rows(args.per_row, "ROW"):
+        db.execute(INSERT, row)
+    per_row = time.perf_counter() - start
+    print(
+        f"execute() per row : {args.per_row:>7} rows in {per_row:6.2f}s "
+        f"-> ~{per_row / args.per_row * args.rows:7.1f}s for {args.rows}"
+    )
+
+    _fresh_db()
+    start = time.perf_counter()
+    db.copy_rows("inventory", COLUMNS, _rows(args.rows, "CPY"))
+    print(f"copy_rows()       : {args.rows:>7} rows in {time.perf_counter() - start:6.2f}s")
+
+    start = time.perf_counter()
+    db.upsert_many("inventory", COLUMNS, _rows(args.rows, "CPY"), ["txn_id"], update_columns=[])
+    print(f"upsert_many()     : {args.rows:>7} rows in {time.perf_counter() - start:6.2f}s (all conflicts)")
+
+
+if __name__ == "__main__":
+    main()
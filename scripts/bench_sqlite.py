@@ -0,0 +1,101 @@
+"""Before/after throughput of the SQLite backend on the orders and inventory endpoints.
+
+"before" = connect-per-call with default journal (SQLITE_PERSISTENT=0-equivalent),
+"after"  = pooled long-lived WAL connections with a serialized writer.
+
+Usage:
+    python scripts/bench_sqlite.py [--rows 2000] [--requests 400] [--threads 8]
+"""
+
+import argparse
+import os
+import sys
+import pathlib
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ["FORCE_SQLITE"] = "1"
+os.environ.setdefault("JWT_SECRET", "bench-" + "x" * 64)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+from sqlite_pool import SQLiteConnectionManager  # noqa: E402
+
+
+def _setup(manager: SQLiteConnectionManager, rows: int) -> str:
+    tmp = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+    tmp.close()
+    db.SQLITE_MANAGER = manager
+    db.SQLITE_DB_PATH = tmp.name
+    db.reset_sqlite_init()
+    db.POOL = None
+    for i in range(rows):
+        db.execute(
+            "INSERT INTO orders (order_id, order_date, customer_id, status) VALUES (%s, %s, %s, %s)",
+            (f"B-{i:06d}", "2026-01-01", "CUST-ALFA", "Planned"),
+        )
+        db.execute(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, %s)",
+            (f"BT-{i:06d}", "2026-01-01", "P-100", 1, "PO"),
+        )
+    return tmp.name
+
+
+def _run(client: TestClient, requests: int, threads: int, writes: bool):
+    errors = 0
+
+    def one(i):
+        if writes and i % 4 == 0:
+            return client.post(
+                "/api/inventory",
+                json={"txn_id": f"W-{time.perf_counter_ns()}-{i}", "product_id": "P-100",
+                      "qty_change": 1, "reason": "PO"},
+                headers={"x-api-key": "bench-key"},
+            ).status_code
+        path = "/api/orders" if i % 2 else "/api/inventory?limit=100"
+        return client.get(path).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for status in pool.map(one, range(requests)):
+            if status >= 400:
+                errors += 1
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, errors
+
+
+def bench(rows: int, requests: int, threads: int):
+    os.environ["API_KEYS"] = "bench-key"
+    client = TestClient(main.app)
+    variants = {
+        "before": SQLiteConnectionManager(journal_mode="DELETE", synchronous="FULL", persistent=False),
+        "after": SQLiteConnectionManager(),
+    }
+    print(f"{'variant':>8} {'read req/s':>11} {'mixed req/s':>12} {'errors':>7}")
+    for name, manager in variants.items():
+        path = _setup(manager, rows)
+        try:
+            read_rps, read_err = _run(client, requests, threads, writes=False)
+            mixed_rps, mixed_err = _run(client, requests, threads, writes=True)
+        finally:
+            manager.close_all()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        print(f"{name:>8} {read_rps:>11.1f} {mixed_rps:>12.1f} {read_err + mixed_err:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    bench(args.rows, args.requests, args.threads)
@@ -0,0 +1,116 @@
+"""Concurrent read load against the async read endpoints.
+
+Fires `--clients` concurrent httpx.AsyncClient workers at each endpoint and
+reports requests/second and latency percentiles. Without --base-url the app is
+driven in-process over ASGI against a seeded temporary SQLite database.
+
+Usage:
+    python scripts/load_test.py [--clients 200] [--requests 2000] [--rows 2000]
+    python scripts/load_test.py --base-url http://localhost:8000 --api-key KEY
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import pathlib
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+ENDPOINTS = [
+    "/api/orders?limit=100",
+    "/api/inventory?limit=100",
+    "/api/shortages",
+    "/api/analytics/summary",
+    "/api/analytics/top-customers",
+]
+
+
+def _seed_local(rows: int) -> None:
+    os.environ["FORCE_SQLITE"] = "1"
+    os.environ.setdefault("JWT_SECRET", "load-" + "x" * 64)
+    import db
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+    tmp.close()
+    db.SQLITE_DB_PATH = tmp.name
+    db.reset_sqlite_init()
+    db.POOL = None
+    for i in range(rows):
+        db.execute(
+            "INSERT INTO orders (order_id, order_date, customer_id, status) VALUES (%s, %s, %s, %s)",
+            (f"L-{i:06d}", "2026-01-01", "CUST-ALFA", "Planned"),
+        )
+        db.execute(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, %s)",
+            (f"LT-{i:06d}", "2026-01-01", "P-100", 1, "PO"),
+        )
+
+
+async def _run_endpoint(client, path: str, clients: int, total: int, headers: dict):
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            resp = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(
+        f"{path:<32} {len(latencies) / elapsed:9.1f} req/s  "
+        f"p50={pct(0.50):7.1f}ms  p99={pct(0.99):7.1f}ms  errors={errors}"
+    )
+
+
+async def main_async(args) -> None:
+    import httpx
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    headers = {"x-api-key": args.api_key}
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        _seed_local(args.rows)
+        os.environ["API_KEYS"] = args.api_key
+        import main
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://loadtest",
+            timeout=60,
+        )
+    limits_note = "in-process" if not args.base_url else args.base_url
+    print(f"{args.clients} clients, {args.requests} requests per endpoint ({limits_note})")
+    async with client:
+        for path in ENDPOINTS:
+            await _run_endpoint(client, path, args.clients, args.requests, headers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--api-key", default="load-test-key")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from fastapi import Depends, Header, HTTPException
 
 from config import settings
 import auth
+from api_key_usage import record_api_key_use
 
 logger = logging.getLogger(__name__)
 
@@ -64,10 +65,8 @@ def check_api_key(
         if row:
             try:
                 if row.get("id"):
-                    from auth import mark_last_used, log_api_key_event
-
-                    mark_last_used(row.get("id"))
-                    log_api_key_event(row.get("id"), "used", "api")
+                    # write-behind: last_used + "used" audit are flushed in batches
+                    record_api_key_use(row.get("id"), "api")
             except Exception as e:
                 logger.warning(f"Failed to log API key event: {e}")
             return True
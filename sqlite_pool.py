@@ -0,0 +1,253 @@
+"""
+Pooled SQLite connection manager for the dev / small-site backend.
+
+- Long-lived connections are kept in a LIFO pool instead of connecting per call.
+- Each connection is tuned once: WAL journal, configurable synchronous,
+  cache_size and mmap_size pragmas, busy timeout.
+- Writers are serialized through a single in-process lock, so concurrent writes
+  queue up instead of failing with "database is locked" (WAL readers never
+  block the writer).
+- `stats()` exposes pool counters for /metrics and debugging.
+"""
+
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class SQLiteConnectionManager:
+    def __init__(
+        self,
+        max_size: int = 8,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        cache_size: int = -20000,
+        mmap_size: int = 268435456,
+        busy_timeout: float = 5.0,
+        persistent: bool = True,
+    ):
+        self.max_size = max(1, max_size)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.persistent = persistent
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._path: Optional[str] = None
+        self._generation = 0
+        self._open = 0
+        self._in_use = 0
+
+        self.opened = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.write_locks = 0
+        self.write_lock_wait_seconds = 0.0
+
+    # ---- connections ----
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            path, timeout=self.busy_timeout, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        if self.journal_mode:
+            cur.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        if self.synchronous:
+            cur.execute(f"PRAGMA synchronous={self.synchronous}")
+        cur.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        cur.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        cur.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+        self.opened += 1
+        return conn
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.closed += 1
+
+    def _switch_path(self, path: str) -> None:
+        """Called with self._lock held: a new DB file invalidates every pooled connection."""
+        self._path = path
+        self._generation += 1
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._open -= 1
+            self._close(conn)
+
+    def _acquire(self, path: str):
+        start = None
+        while True:
+            with self._lock:
+                if path != self._path:
+                    self._switch_path(path)
+                generation = self._generation
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = None
+                    if self._open < self.max_size or not self.persistent:
+                        self._open += 1
+                        create = True
+                    else:
+                        create = False
+                if conn is not None or create:
+                    self._in_use += 1
+                    self.checkouts += 1
+                    if start is not None:
+                        self.wait_seconds += time.perf_counter() - start
+            if conn is not None:
+                return conn, generation
+            if create:
+                try:
+                    return self._connect(path), generation
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                        self._in_use -= 1
+                    raise
+            # pool exhausted: wait for a connection to come back
+            if start is None:
+                start = time.perf_counter()
+                self.waits += 1
+            if time.perf_counter() - start > self.busy_timeout:
+                raise sqlite3.OperationalError("sqlite connection pool exhausted")
+            try:
+                conn = self._idle.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            with self._lock:
+                if generation != self._generation or path != self._path:
+                    self._open -= 1
+                    self._close(conn)
+                    continue
+                self._in_use += 1
+                self.checkouts += 1
+                self.wait_seconds += time.perf_counter() - start
+            return conn, generation
+
+    def _release(self, conn: sqlite3.Connection, generation: int, broken: bool) -> None:
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        with self._lock:
+            self._in_use -= 1
+            if (
+                broken
+                or not self.persistent
+                or generation != self._generation
+                or self._open > self.max_size  # pool was shrunk while this was out
+            ):
+                self._open -= 1
+                self._close(conn)
+                return
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, path: str) -> Iterator[sqlite3.Connection]:
+        """Check out a connection to `path`; it goes back to the pool on exit."""
+        conn, generation = self._acquire(path)
+        broken = False
+        try:
+            yield conn
+        except (sqlite3.ProgrammingError, sqlite3.InterfaceError):
+            # e.g. closed connection / unusable cursor state: don't pool it again
+            broken = True
+            raise
+        finally:
+            self._release(conn, generation, broken)
+
+    # ---- single writer ----
+
+    @contextmanager
+    def write_lock(self) -> Iterator[None]:
+        """Serialize writers in this process; times out like a busy database."""
+        start = time.perf_counter()
+        if not self._write_lock.acquire(timeout=self.busy_timeout):
+            raise sqlite3.OperationalError("database is locked")
+        self.write_locks += 1
+        self.write_lock_wait_seconds += time.perf_counter() - start
+        try:
+            yield
+        finally:
+            self._write_lock.release()
+
+    # ---- sizing ----
+
+    def resize(self, max_size: int) -> None:
+        """Change the pool cap; surplus idle connections are closed right away."""
+        with self._lock:
+            self.max_size = max(1, max_size)
+            while self._open > self.max_size:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break  # the rest are checked out and get closed on release
+                self._open -= 1
+                self._close(conn)
+
+    def warm(self, path: str, count: int) -> int:
+        """Open up to `count` pooled connections ahead of the first requests."""
+        held = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                held.append(self._acquire(path))
+        finally:
+            for conn, generation in held:
+                self._release(conn, generation, False)
+        return len(held)
+
+    # ---- housekeeping ----
+
+    def close_all(self) -> None:
+        """Close idle connections and retire checked-out ones when they come back."""
+        with self._lock:
+            self._generation += 1
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._open -= 1
+                self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self._path,
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "opened_total": self.opened,
+                "closed_total": self.closed,
+                "checkouts_total": self.checkouts,
+                "waits_total": self.waits,
+                "wait_seconds_total": round(self.wait_seconds, 6),
+                "write_locks_total": self.write_locks,
+                "write_lock_wait_seconds_total": round(self.write_lock_wait_seconds, 6),
+                "persistent": self.persistent,
+                "journal_mode": self.journal_mode,
+                "synchronous": self.synchronous,
+            }
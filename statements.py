@@ -0,0 +1,130 @@
+"""
+Registry of named, prepared SQL statements.
+
+`register()` returns a `Statement`, a str subclass, so a registered constant can
+be passed to fetch_one/fetch_all/execute exactly like plain SQL text. The db
+helpers recognise it and:
+  - on psycopg 3 execute it with prepare=True, so Postgres parses/plans it once
+    per connection instead of on every request;
+  - on sqlite use the `?` form translated once here instead of per call;
+  - check the parameter count before hitting the database;
+  - count calls, errors and time per statement (exported on /metrics).
+
+Placeholder counts are validated at import time: a constant whose declared
+arity does not match its `%s` markers fails when its module is imported.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from metrics import register_collector
+
+# %s markers, ignoring escaped %%s
+_PLACEHOLDER_RE = re.compile(r"(?<!%)%s")
+
+_REGISTRY: Dict[str, "Statement"] = {}
+_LOCK = threading.Lock()
+
+
+class Statement(str):
+    """SQL text plus the metadata needed to run it as a prepared statement."""
+
+    name: str
+    sqlite_sql: str
+    arity: int
+    prepare: bool
+
+    def __new__(cls, name: str, sql: str, arity: Optional[int] = None, prepare: bool = True):
+        obj = super().__new__(cls, sql)
+        found = len(_PLACEHOLDER_RE.findall(sql))
+        if arity is not None and arity != found:
+            raise ValueError(
+                f"Statement {name!r} declares {arity} parameters but has {found} placeholders"
+            )
+        obj.name = name
+        obj.arity = found
+        obj.prepare = prepare
+        obj.sqlite_sql = _PLACEHOLDER_RE.sub("?", sql).replace("%%", "%")
+        obj.calls = 0
+        obj.errors = 0
+        obj.total_seconds = 0.0
+        return obj
+
+    def check_params(self, params: Optional[Sequence]) -> None:
+        given = len(params) if params else 0
+        if given != self.arity:
+            raise ValueError(
+                f"Statement {self.name!r} expects {self.arity} parameters, got {given}"
+            )
+
+    def record(self, seconds: float, failed: bool = False) -> None:
+        with _LOCK:
+            self.calls += 1
+            self.total_seconds += seconds
+            if failed:
+                self.errors += 1
+
+    def reset_stats(self) -> None:
+        with _LOCK:
+            self.calls = 0
+            self.errors = 0
+            self.total_seconds = 0.0
+
+
+def register(name: str, sql: str, arity: Optional[int] = None, prepare: bool = True) -> Statement:
+    """Register `sql` under `name`; re-registering identical text returns the existing entry."""
+    with _LOCK:
+        existing = _REGISTRY.get(name)
+        if existing is not None:
+            if str(existing) != sql:
+                raise ValueError(f"Statement {name!r} is already registered with different SQL")
+            return existing
+    stmt = Statement(name, sql, arity=arity, prepare=prepare)
+    with _LOCK:
+        return _REGISTRY.setdefault(name, stmt)
+
+
+def get(name: str) -> Statement:
+    return _REGISTRY[name]
+
+
+def all_statements() -> List[Statement]:
+    with _LOCK:
+        return list(_REGISTRY.values())
+
+
+def stats() -> List[dict]:
+    with _LOCK:
+        return [
+            {
+                "name": s.name,
+                "calls": s.calls,
+                "errors": s.errors,
+                "total_seconds": round(s.total_seconds, 6),
+                "avg_ms": round(s.total_seconds / s.calls * 1000, 3) if s.calls else None,
+                "prepared": s.prepare,
+            }
+            for s in _REGISTRY.values()
+        ]
+
+
+_METRICS = (
+    ("db_statement_calls_total", "Executions per registered statement", "calls"),
+    ("db_statement_errors_total", "Failed executions per registered statement", "errors"),
+    ("db_statement_seconds_total", "Time spent in each registered statement", "total_seconds"),
+)
+
+
+@register_collector
+def _statement_metrics() -> List[str]:
+    rows = stats()
+    if not rows:
+        return []
+    lines: List[str] = []
+    for metric, help_text, field in _METRICS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{statement="{r["name"]}"}} {r[field]}' for r in rows]
+    return lines
@@ -0,0 +1,143 @@
+"""
+Per-process table write counters for Postgres, fed by LISTEN/NOTIFY.
+
+The version triggers (alembic 018) call pg_notify('table_versions', <table>)
+instead of updating a shared counter row, so concurrent writers no longer
+queue behind each other on that row until commit. Postgres delivers a
+notification only after the writing transaction has committed, so a write
+made by another process reaches this one's counters a little later:
+until the notification arrives, caches keyed on them may still answer
+from the old data. That lag is the staleness bound across processes.
+
+Writes committed by this process do not wait for their notification: db.py
+records the tables a Postgres transaction wrote to and calls `committed()`
+right after the commit, so the writer's next request already sees a new
+key (read-your-writes). The notification that follows carries the backend
+pid of the same connection and is taken as the echo of that commit, so a
+counter read right after a commit stays valid until somebody else writes.
+(If the echo overtakes `committed()` the table is bumped twice: one extra
+recompute.) Writes that bypass db.py's helpers are only seen through their
+notification.
+
+While the listener is not connected nobody can tell which notifications
+were missed: `versions()` then returns values that never repeat (nothing
+gets cached) and every (re)connect bumps all counters.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from logging_utils import logger
+
+CHANNEL = "table_versions"
+
+
+class TableVersionListener:
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        channel: str = CHANNEL,
+        retry_interval: float = 5.0,
+        poll_timeout: float = 1.0,
+    ):
+        # connect() must return an autocommit psycopg 3 connection
+        self.connect = connect
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self.poll_timeout = poll_timeout
+        self._counts: Dict[str, int] = {}
+        # (backend pid, table) -> notifications still expected for commits already counted
+        self._echoes: Dict[Tuple[int, str], int] = {}
+        self._generation = 0
+        self._connected = False
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.notifications = 0
+        self.local_commits = 0
+        self.connects = 0
+
+    def versions(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            if not self._connected:
+                # every call gets fresh values, so no cache entry is ever reused
+                self._generation += 1
+            base = self._generation
+            return tuple(base + self._counts.get(t, 0) for t in tables)
+
+    def notified(self, table: str, pid: Optional[int] = None) -> None:
+        with self._lock:
+            self.notifications += 1
+            echo = self._echoes.get((pid, table), 0)
+            if echo:
+                # our own commit, counted by committed() already
+                if echo == 1:
+                    del self._echoes[(pid, table)]
+                else:
+                    self._echoes[(pid, table)] = echo - 1
+                return
+            self._counts[table] = self._counts.get(table, 0) + 1
+
+    def committed(self, tables: Iterable[str], pid: Optional[int] = None) -> None:
+        """Tables this process has just committed writes to on backend `pid`; their NOTIFY follows later."""
+        with self._lock:
+            for table in tables:
+                self._counts[table] = self._counts.get(table, 0) + 1
+                if pid is not None and self._connected:
+                    self._echoes[(pid, table)] = self._echoes.get((pid, table), 0) + 1
+            self.local_commits += 1
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="table-version-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_timeout * 2 + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        failing = False
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                conn.execute(f"LISTEN {self.channel}")
+                with self._lock:
+                    # whatever was committed while we were not listening is unknown
+                    self._generation += 1
+                    self._echoes.clear()
+                    self._connected = True
+                    self.connects += 1
+                failing = False
+                while not self._stopping.is_set():
+                    for note in conn.notifies(timeout=self.poll_timeout):
+                        self.notified(note.payload, getattr(note, "pid", None))
+            except Exception as exc:
+                if not failing and not self._stopping.is_set():
+                    logger.warning(f"table version listener disconnected, caches bypassed: {exc}")
+                failing = True
+            finally:
+                with self._lock:
+                    self._connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stopping.wait(self.retry_interval)
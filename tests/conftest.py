@@ -40,3 +40,22 @@ def app_client():
         pass
     finally:
         os.environ.pop("FORCE_SQLITE", None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(app_client):
+    # process-wide caches would otherwise carry rows of the previous test's database
+    import atp
+    import costing
+    from bom_cache import BOM_CACHE
+    from netting import NETTING_CACHE
+    from planned_time import PLANNED_TIME_CACHE
+
+    caches = (BOM_CACHE, PLANNED_TIME_CACHE, NETTING_CACHE, atp.ATP)
+    for cache in caches:
+        cache.invalidate()
+    costing.ROLLUP = costing.CostRollup()
+    yield
+    for cache in caches:
+        cache.invalidate()
+    costing.ROLLUP = costing.CostRollup()
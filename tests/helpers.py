@@ -0,0 +1,23 @@
+"""Row builders shared by the tests; conftest.py only holds fixtures."""
+
+import db
+
+
+def add_bom(parent, component, qty_per, scrap_pct=0):
+    db.execute(
+        "INSERT INTO bom (parent_product_id, component_id, qty_per, scrap_pct) VALUES (%s, %s, %s, %s)",
+        (parent, component, qty_per, scrap_pct),
+    )
+
+
+def add_order(order_id, lines, status="Planned", order_date="2026-01-01", due_date="2026-03-01"):
+    """An order for CUST-ALFA with one line per (product_id, qty)."""
+    db.execute(
+        "INSERT INTO orders (order_id, order_date, customer_id, status, due_date) VALUES (%s, %s, 'CUST-ALFA', %s, %s)",
+        (order_id, order_date, status, due_date),
+    )
+    for line_no, (product_id, qty) in enumerate(lines, start=1):
+        db.execute(
+            "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) VALUES (%s, %s, %s, %s, 1)",
+            (order_id, line_no, product_id, qty),
+        )
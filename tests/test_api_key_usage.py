@@ -0,0 +1,139 @@
+import auth
+import db
+import api_key_usage
+from api_key_usage import ApiKeyUsageBuffer
+
+
+def _audit_rows(key_id):
+    return db.fetch_all(
+        "SELECT * FROM api_key_audit WHERE api_key_id = ? AND event_type = 'used'",
+        (key_id,),
+    )
+
+
+def test_record_is_deferred_until_flush(app_client):
+    auth.ensure_table()
+    key = auth.create_api_key(label="usage-buffer")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=100)
+
+    buf.record(key["id"])
+    buf.record(key["id"])
+    assert buf.depth() == {"events": 2, "keys": 1}
+    assert _audit_rows(key["id"]) == []
+
+    assert buf.flush() == 2
+    assert buf.depth() == {"events": 0, "keys": 0}
+    assert len(_audit_rows(key["id"])) == 2
+    row = db.fetch_one("SELECT last_used FROM api_keys WHERE id = ?", (key["id"],))
+    assert row["last_used"] is not None
+    assert buf.flush_seconds.count == 1
+
+
+def test_buffer_flushes_when_full(app_client):
+    auth.ensure_table()
+    key = auth.create_api_key(label="usage-full")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=3)
+
+    for _ in range(3):
+        buf.record(key["id"])
+
+    assert buf.depth()["events"] == 0
+    assert len(_audit_rows(key["id"])) == 3
+
+
+def test_stop_flushes_pending_events(app_client):
+    auth.ensure_table()
+    key = auth.create_api_key(label="usage-stop")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=100)
+    buf.start()
+    buf.record(key["id"])
+
+    buf.stop()
+    assert not buf.running
+    assert len(_audit_rows(key["id"])) == 1
+
+
+def test_failed_flush_writes_nothing_and_retries_cleanly(app_client, monkeypatch):
+    auth.ensure_table()
+    key = auth.create_api_key(label="usage-partial")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=100)
+    monkeypatch.setattr(api_key_usage, "INSERT_CHUNK", 2)
+    real_execute = api_key_usage.execute
+    inserts = []
+
+    def flaky_execute(sql, params=None, **kwargs):
+        if sql.startswith("INSERT INTO api_key_audit"):
+            inserts.append(1)
+            if len(inserts) == 2:
+                raise RuntimeError("connection lost")
+        return real_execute(sql, params, **kwargs)
+
+    monkeypatch.setattr(api_key_usage, "execute", flaky_execute)
+    for _ in range(3):
+        buf.record(key["id"])
+
+    assert buf.flush() == 0
+    assert buf.failed_flushes == 1
+    assert _audit_rows(key["id"]) == []
+    assert buf.depth()["events"] == 3
+
+    assert buf.flush() == 3
+    assert len(_audit_rows(key["id"])) == 3
+
+
+def test_authenticated_request_is_buffered(app_client, monkeypatch):
+    auth.ensure_table()
+    key = auth.create_api_key(label="usage-request")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=100)
+    monkeypatch.setattr(api_key_usage, "USAGE_BUFFER", buf)
+
+    resp = app_client.get("/api/orders", headers={"x-api-key": key["api_key"]})
+    assert resp.status_code == 200
+    assert buf.depth()["events"] == 1
+    assert _audit_rows(key["id"]) == []
+
+
+def test_metrics_expose_buffer_depth(app_client):
+    resp = app_client.get("/metrics")
+    assert resp.status_code == 200
+    assert "api_key_usage_buffer_events" in resp.text
+    assert "api_key_usage_flush_seconds_count" in resp.text
+
+
+def test_events_of_deleted_keys_do_not_block_the_batch(app_client):
+    auth.ensure_table()
+    live = auth.create_api_key(label="usage-live")
+    gone = auth.create_api_key(label="usage-gone")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=100)
+    buf.record(gone["id"])
+    buf.record(live["id"])
+    auth.delete_api_key_by_id(gone["id"])
+
+    buf.flush()
+    assert buf.failed_flushes == 0 and buf.depth()["events"] == 0
+    assert len(_audit_rows(live["id"])) == 1
+    assert _audit_rows(gone["id"]) == []
+
+
+def test_integrity_errors_are_not_requeued(app_client, monkeypatch):
+    import sqlite3
+
+    auth.ensure_table()
+    key = auth.create_api_key(label="usage-integrity")
+    buf = ApiKeyUsageBuffer(flush_interval=60, max_pending=100)
+    real_execute = api_key_usage.execute
+
+    def rejecting_execute(sql, params=None, **kwargs):
+        if "INSERT INTO api_key_audit" in sql:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        return real_execute(sql, params, **kwargs)
+
+    monkeypatch.setattr(api_key_usage, "execute", rejecting_execute)
+    buf.record(key["id"])
+    assert buf.flush() == 0
+    assert buf.dropped_events == 1
+    # last_used is still retried; the rejected events are gone
+    assert buf.depth() == {"events": 0, "keys": 1}
+    monkeypatch.undo()
+    buf.flush()
+    assert db.fetch_one("SELECT last_used FROM api_keys WHERE id = ?", (key["id"],))["last_used"] is not None
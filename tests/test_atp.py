@@ -0,0 +1,170 @@
+import os
+from datetime import date, timedelta
+
+import pytest
+
+import atp
+import db
+from helpers import add_order
+
+
+@pytest.fixture
+def engine():
+    _receipt("TXN-ATP-S1", "P-100", 200, 0)
+    _receipt("TXN-ATP-S2", "P-101", 50, -2)
+    # an open order without a due date: its demand is due today
+    _order("ORD-ATP-0", "P-100", 20, None)
+    db.execute(
+        "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) VALUES ('ORD-ATP-0', 2, 'P-101', 10, 1)"
+    )
+    return atp.ATP
+
+
+def _today():
+    return date.fromisoformat(str(db.fetch_one("SELECT CURRENT_DATE AS today")["today"])[:10])
+
+
+def _day(offset):
+    return (_today() + timedelta(days=offset)).isoformat()
+
+
+def _receipt(txn_id, product_id, qty, offset):
+    db.execute(
+        "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, 'PO')",
+        (txn_id, _day(offset), product_id, qty),
+    )
+
+
+def _order(order_id, product_id, qty, offset, status="Planned"):
+    add_order(order_id, [(product_id, qty)], status, _day(0), None if offset is None else _day(offset))
+
+
+def test_seeded_stock_minus_open_lines(engine):
+    result = engine.check("P-100", 150)
+    assert result["on_hand"] == 200
+    assert result["available"] == 180
+    assert result["can_promise"] and result["earliest_date"] == _day(0)
+    assert not engine.check("P-100", 181)["can_promise"]
+    unknown = engine.check("P-NOPE", 1)
+    assert unknown["available"] == 0 and unknown["earliest_date"] is None
+
+
+def test_future_receipts_and_commitments_are_time_phased(engine):
+    _receipt("TXN-ATP-1", "P-101", 100, 5)
+    _order("ORD-ATP-1", "P-101", 60, 10)
+    # 50 on hand, ORD-ATP-0 takes 10 today; the receipt is not in stock yet
+    today = engine.check("P-101", 1)
+    assert today["on_hand"] == 50
+    assert today["available"] == 40
+    # day 5: 40 + 100, but 60 of it is committed on day 10
+    assert engine.check("P-101", 1, _today() + timedelta(days=5))["available"] == 80
+    assert engine.check("P-101", 1, _today() + timedelta(days=10))["available"] == 80
+
+    # a later commitment protects stock promised earlier
+    _order("ORD-ATP-2", "P-101", 70, 20)
+    engine.sync(force=True)
+    assert engine.check("P-101", 1)["available"] == 10
+    result = engine.check("P-101", 30, _today() + timedelta(days=2))
+    assert not result["can_promise"]
+    assert result["earliest_date"] is None
+
+    _receipt("TXN-ATP-2", "P-101", 25, 25)
+    engine.sync(force=True)
+    result = engine.check("P-101", 30, _today() + timedelta(days=2))
+    assert result["available"] == 10
+    assert result["earliest_date"] == _day(25)
+
+
+def test_incremental_reload_only_touches_changed_products(engine):
+    engine.check("P-100", 1)
+    full = engine.full_reloads
+    _order("ORD-ATP-3", "P-100", 30, 3)
+    engine.sync(force=True)
+    assert engine.full_reloads == full
+    assert engine.check("P-100", 1)["available"] == 150
+
+    # closing the order releases its demand; the order trigger logs its products
+    reloads = engine.product_reloads
+    db.execute("UPDATE orders SET status = 'Done' WHERE order_id = 'ORD-ATP-3'")
+    engine.sync(force=True)
+    assert engine.product_reloads == reloads + 1
+    assert engine.check("P-100", 1)["available"] == 180
+
+    db.execute("DELETE FROM inventory WHERE txn_id = 'TXN-ATP-S1'")
+    engine.sync(force=True)
+    assert engine.check("P-100", 1)["available"] == 0
+    assert engine.full_reloads == full
+
+
+def test_incremental_matches_full_reload(engine):
+    import random
+
+    rng = random.Random(22)
+    engine.check("P-100", 1)
+    for i in range(40):
+        product_id = rng.choice(["P-100", "P-101"])
+        if rng.random() < 0.5:
+            _receipt(f"TXN-R{i}", product_id, rng.randint(1, 50), rng.randint(-3, 30))
+        else:
+            _order(f"ORD-R{i}", product_id, rng.randint(1, 50), rng.choice([None, rng.randint(-3, 400)]))
+        if rng.random() < 0.3:
+            engine.sync(force=True)
+    engine.sync(force=True)
+    fresh = atp.AtpEngine()
+    for product_id in ("P-100", "P-101"):
+        for offset in (0, 1, 7, 29, 500):
+            on = _today() + timedelta(days=offset)
+            assert engine.check(product_id, 5, on) == fresh.check(product_id, 5, on)
+
+
+def test_pruned_log_forces_full_reload(engine):
+    engine.check("P-100", 1)
+    full = engine.full_reloads
+    _order("ORD-ATP-4", "P-100", 5, 1)
+    _order("ORD-ATP-5", "P-100", 5, 1)
+    atp.prune_changes(retain=0)
+    engine.sync(force=True)
+    assert engine.full_reloads == full + 1
+    assert engine.check("P-100", 1)["available"] == 170
+
+
+def test_late_commit_behind_a_newer_change_is_applied(engine):
+    engine.check("P-100", 1)
+    _receipt("TXN-ATP-LATE", "P-100", 40, 0)
+    late = db.fetch_one("SELECT MAX(change_id) AS id FROM atp_changes")["id"]
+    _receipt("TXN-ATP-NEXT", "P-101", 5, 0)
+    # the P-100 writer took the lower id but commits after the P-101 one
+    db.execute("DELETE FROM atp_changes WHERE change_id = %s", (late,))
+    engine.sync(force=True)
+    assert engine.check("P-100", 1)["available"] == 180
+
+    db.execute("INSERT INTO atp_changes (change_id, product_id) VALUES (%s, 'P-100')", (late,))
+    engine.sync(force=True)
+    assert engine.check("P-100", 1)["available"] == 220
+
+
+def test_atp_endpoints(app_client, engine):
+    os.environ["API_KEYS"] = "x"
+    try:
+        _receipt("TXN-ATP-E", "P-100", 50, 7)
+        resp = app_client.get(
+            "/api/atp",
+            params={"product_id": "P-100", "qty": 200, "date": _day(1)},
+            headers={"x-api-key": "x"},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["available"] == 180 and body["can_promise"] is False
+        assert body["earliest_date"] == _day(7)
+
+        resp = app_client.get("/api/atp", params={"product_id": "P-100", "qty": 0}, headers={"x-api-key": "x"})
+        assert resp.status_code == 422
+
+        resp = app_client.get("/api/atp/P-100/buckets", headers={"x-api-key": "x"})
+        assert resp.status_code == 200
+        assert [(b["date"], b["receipts"], b["allocated"]) for b in resp.json()] == [
+            (_day(0), 0.0, 20.0),
+            (_day(7), 50.0, 0.0),
+        ]
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -248,3 +248,88 @@ class TestEnsureTable:
 
         keys = auth.list_api_keys()
         assert isinstance(keys, list)
+
+
+class TestApiKeyLookup:
+    """Test prefixed key lookup and the verified-key cache."""
+
+    def test_new_keys_carry_lookup_prefix(self, app_client):
+        auth.ensure_table()
+        row = auth.create_api_key(label="prefix-test")
+
+        plaintext = row["api_key"]
+        assert plaintext.startswith(auth.KEY_SCHEME + "_")
+        assert auth._parse_key_prefix(plaintext) == row["key_prefix"]
+
+    def test_parse_key_prefix_rejects_legacy_keys(self):
+        assert auth._parse_key_prefix("changeme123") is None
+        assert auth._parse_key_prefix("sk_nothex_secret") is None
+
+    def test_single_verification_regardless_of_key_count(self, app_client, monkeypatch):
+        auth.ensure_table()
+        auth.KEY_CACHE.clear()
+        rows = [auth.create_api_key(label=f"many-{i}") for i in range(5)]
+
+        calls = []
+        original = auth._verify_key
+
+        def counting_verify(*args):
+            calls.append(1)
+            return original(*args)
+
+        monkeypatch.setattr(auth, "_verify_key", counting_verify)
+
+        found = auth.get_api_key(rows[-1]["api_key"])
+        assert found["id"] == rows[-1]["id"]
+        assert len(calls) == 1
+
+        # second lookup is served from the cache without any PBKDF2 run
+        assert auth.get_api_key(rows[-1]["api_key"])["id"] == rows[-1]["id"]
+        assert len(calls) == 1
+
+    def test_wrong_secret_with_valid_prefix_rejected(self, app_client):
+        auth.ensure_table()
+        row = auth.create_api_key(label="wrong-secret")
+        tampered = row["api_key"][:-4] + "abcd"
+
+        assert auth.get_api_key(tampered) is None
+
+    def test_cache_invalidated_on_delete(self, app_client):
+        auth.ensure_table()
+        row = auth.create_api_key(label="cache-delete")
+        assert auth.get_api_key(row["api_key"]) is not None
+
+        auth.delete_api_key_by_id(row["id"])
+        assert auth.get_api_key(row["api_key"]) is None
+
+    def test_sqlite_init_adds_prefix_to_old_api_keys_table(self):
+        import sqlite3
+
+        conn = sqlite3.connect(":memory:")
+        conn.execute(
+            "CREATE TABLE api_keys (id INTEGER PRIMARY KEY AUTOINCREMENT, key_text TEXT, "
+            "key_hash TEXT, salt TEXT, label TEXT, created_at TEXT, active INTEGER, last_used TEXT)"
+        )
+        db._init_sqlite_schema(conn)
+        db._init_sqlite_schema(conn)
+
+        assert "key_prefix" in {r[1] for r in conn.execute("PRAGMA table_info(api_keys)")}
+        assert conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_api_keys_key_prefix'"
+        ).fetchone()
+
+    def test_cache_entries_expire(self):
+        cache = auth.VerifiedKeyCache(max_size=2, ttl=0)
+        cache.put("k1", {"id": 1})
+        assert cache.get("k1") is None
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = auth.VerifiedKeyCache(max_size=2, ttl=60)
+        cache.put("k1", {"id": 1})
+        cache.put("k2", {"id": 2})
+        cache.get("k1")
+        cache.put("k3", {"id": 3})
+
+        assert cache.get("k2") is None
+        assert cache.get("k1")["id"] == 1
+        assert cache.get("k3")["id"] == 3
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import db
+from bom_cache import BOM_CACHE, BomExplosionCache
+from helpers import add_bom
+
+
+@pytest.fixture
+def cache():
+    return BOM_CACHE
+
+
+def test_explosion_is_flattened_with_scrap_and_scaled(cache):
+    add_bom("ASM", "SUB", 2, 0.1)
+    add_bom("SUB", "RAW", 3)
+    add_bom("ASM", "RAW", 1)
+    out = cache.explode("ASM", 10)
+    assert out["SUB"] == pytest.approx(22)
+    assert out["RAW"] == pytest.approx(10 + 22 * 3)
+    # seeded BOM: 2 x P-101 per P-100 with 5% scrap
+    assert cache.explode("P-100", 50) == {"P-101": pytest.approx(105)}
+    assert cache.explode("NO-BOM") == {}
+
+
+def test_change_invalidates_only_ancestors(cache):
+    add_bom("TOP", "MID", 1)
+    add_bom("MID", "LEAF", 2)
+    add_bom("OTHER", "X", 1)
+    for product_id in ("TOP", "MID", "OTHER"):
+        cache.explode(product_id)
+    assert cache.where_used("LEAF") == {"MID", "TOP"}
+
+    db.execute("UPDATE bom SET qty_per = 5 WHERE parent_product_id = 'MID'")
+    invalidations = cache.invalidations
+    cache.sync(force=True)
+    assert cache.invalidations - invalidations == 2
+    assert "OTHER" in cache._flat and "TOP" not in cache._flat
+    assert cache.explode("TOP")["LEAF"] == pytest.approx(5)
+
+
+def test_repeated_explosions_are_served_from_cache(cache):
+    add_bom("Q", "R", 4)
+    cache.explode("Q")
+    hits, misses, reloads = cache.hits, cache.misses, cache.full_reloads
+    for _ in range(1_000):
+        assert cache.explode("Q", 50) == {"R": pytest.approx(200)}
+    assert cache.hits - hits == 1_000
+    assert cache.misses == misses and cache.full_reloads == reloads
+
+
+def test_pruned_log_forces_full_reload(cache):
+    add_bom("A1", "B1", 1)
+    cache.explode("A1")
+    reloads = cache.full_reloads
+    add_bom("A1", "C1", 1)
+    add_bom("A2", "C1", 1)
+    db.execute("DELETE FROM bom_changes WHERE change_id < (SELECT MAX(change_id) FROM bom_changes)")
+    cache.sync(force=True)
+    assert cache.full_reloads == reloads + 1
+    assert cache.explode("A1") == {"B1": 1.0, "C1": 1.0}
+
+
+def test_bom_endpoints_refresh_cache_and_reject_cycles(app_client, cache):
+    os.environ["API_KEYS"] = "bom-key"
+    headers = {"x-api-key": "bom-key"}
+    try:
+        assert app_client.get("/api/bom/P-100/explode?qty=10", headers=headers).json()["components"] == [
+            {"component_id": "P-101", "qty": pytest.approx(21)}
+        ]
+        resp = app_client.put("/api/bom/P-100/P-101", json={"qty_per": 3}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        exploded = app_client.get("/api/bom/P-100/explode?qty=10", headers=headers).json()
+        assert exploded["components"][0]["qty"] == pytest.approx(30)
+
+        cyclic = app_client.put("/api/bom/P-101/P-100", json={"qty_per": 1}, headers=headers)
+        assert cyclic.status_code == 409
+
+        assert app_client.delete("/api/bom/P-100/P-101", headers=headers).status_code == 200
+        assert app_client.get("/api/bom/P-100", headers=headers).json() == []
+        assert app_client.get("/api/bom/P-100/explode", headers=headers).json()["components"] == []
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_cycles_raise():
+    cache = BomExplosionCache()
+    cache._loaded, cache._next_sync = True, float("inf")
+    cache._edges = {"A": {"B": 1.0}, "B": {"A": 1.0}}
+    with pytest.raises(ValueError):
+        cache.explode("A")
+
+
+def test_late_commit_behind_a_newer_change_is_not_skipped(cache):
+    add_bom("LT", "LM", 1)
+    add_bom("LM", "LL", 1)
+    add_bom("LO", "LX", 1)
+    cache.explode("LT")
+    db.execute("UPDATE bom SET qty_per = 4 WHERE parent_product_id = 'LM'")
+    db.execute("UPDATE bom SET qty_per = 2 WHERE parent_product_id = 'LO'")
+    late = db.fetch_one("SELECT MAX(change_id) AS id FROM bom_changes WHERE parent_product_id = 'LM'")["id"]
+    # the LM writer took the lower id but has not committed yet
+    db.execute("DELETE FROM bom_changes WHERE change_id = %s", (late,))
+    cache.sync(force=True)
+    assert cache.explode("LO") == {"LX": 2.0}
+    assert cache._changes.gaps == [late]
+
+    db.execute("INSERT INTO bom_changes (change_id, parent_product_id) VALUES (%s, 'LM')", (late,))
+    cache.sync(force=True)
+    assert cache.explode("LT")["LL"] == pytest.approx(4)
+    assert cache._changes.gaps == []
@@ -0,0 +1,149 @@
+import os
+
+import pytest
+
+import db
+from routers.admin import _do_import
+
+
+def _seed_txn(txn_id, qty=500):
+    db.execute(
+        "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, %s)",
+        (txn_id, "2026-01-01", "P-101", qty, "PO"),
+    )
+
+
+def _count(table, where="1=1", params=None):
+    return db.fetch_one(f"SELECT COUNT(*) AS n FROM {table} WHERE {where}", params)["n"]
+
+
+def test_execute_many_inserts_all_rows(app_client):
+    rows = [(f"BK-{i:04d}", "2026-01-01", "P-100", i, "PO") for i in range(250)]
+    n = db.execute_many(
+        "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, %s)",
+        rows,
+        batch_size=100,
+    )
+    assert n == 250
+    assert _count("inventory", "txn_id LIKE %s", ("BK-%",)) == 250
+
+
+def test_execute_many_is_atomic_without_conn(app_client):
+    rows = [("BK-DUP", "2026-01-01", "P-100", 1, "PO"), ("BK-DUP", "2026-01-01", "P-100", 2, "PO")]
+    with pytest.raises(Exception):
+        db.execute_many(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+    assert _count("inventory", "txn_id = %s", ("BK-DUP",)) == 0
+
+
+def test_copy_rows_accepts_generator(app_client):
+    gen = ((f"CP-{i:04d}", "2026-01-02", "P-101", 1, "PO", None, "A1") for i in range(1200))
+    n = db.copy_rows(
+        "inventory",
+        ["txn_id", "txn_date", "product_id", "qty_change", "reason", "lot", "location"],
+        gen,
+    )
+    assert n == 1200
+    assert _count("inventory", "txn_id LIKE %s", ("CP-%",)) == 1200
+
+
+def test_copy_rows_rejects_bad_identifiers(app_client):
+    with pytest.raises(ValueError):
+        db.copy_rows("inventory; DROP TABLE orders", ["txn_id"], [("x",)])
+
+
+def test_upsert_many_updates_and_inserts(app_client):
+    n = db.upsert_many(
+        "products",
+        ["product_id", "name", "price"],
+        [("P-100", "Gadzet A v2", 31), ("P-900", "Nowy", 7), ("P-900", "Nowy v2", 8)],
+        ["product_id"],
+    )
+    assert n >= 2
+    assert db.fetch_one("SELECT name FROM products WHERE product_id = %s", ("P-100",))["name"] == "Gadzet A v2"
+    assert db.fetch_one("SELECT name, price FROM products WHERE product_id = %s", ("P-900",)) == {
+        "name": "Nowy v2",
+        "price": 8,
+    }
+
+
+def test_upsert_many_do_nothing_keeps_existing(app_client):
+    db.upsert_many(
+        "customers",
+        ["customer_id", "name"],
+        [("CUST-ALFA", "Overwritten"), ("CUST-NEW", "Nowy klient")],
+        ["customer_id"],
+        update_columns=[],
+    )
+    assert db.fetch_one("SELECT name FROM customers WHERE customer_id = %s", ("CUST-ALFA",))["name"] == "Alfa Sp. z o.o."
+    assert _count("customers", "customer_id = %s", ("CUST-NEW",)) == 1
+    # staging tables are dropped again
+    assert not db.fetch_all("SELECT name FROM sqlite_temp_master WHERE name LIKE '_stage_%'")
+
+
+def test_do_import_skips_existing_keys(app_client):
+    _seed_txn("TXN-EXISTING")
+    imported = _do_import(
+        "inventory",
+        [
+            {"txn_id": "TXN-EXISTING", "txn_date": "2026-01-01", "product_id": "P-101", "qty_change": 999, "reason": "PO"},
+            {"txn_id": "IMP-1", "txn_date": "2026-01-01", "product_id": "P-101", "qty_change": 5, "reason": "PO"},
+        ],
+    )
+    assert imported == 2
+    assert db.fetch_one("SELECT qty_change FROM inventory WHERE txn_id = %s", ("TXN-EXISTING",))["qty_change"] == 500
+    assert _count("inventory", "txn_id = %s", ("IMP-1",)) == 1
+
+
+def test_inventory_csv_import_reports_lines(app_client):
+    _seed_txn("TXN-EXISTING")
+    os.environ["API_KEYS"] = "bulk-key"
+    try:
+        body = (
+            "txn_id,txn_date,product_id,qty_change,reason,lot,location\n"
+            "TXN-EXISTING,2026-01-01,P-101,1,PO,,\n"
+            "CSV-1,2026-01-01,P-100,3,PO,L1,A\n"
+            "CSV-1,2026-01-01,P-100,3,PO,L1,A\n"
+            "CSV-2,not-a-date,P-100,3,PO,,\n"
+            "CSV-3,2026-01-02,P-100,-2,WO,,\n"
+        )
+        resp = app_client.post(
+            "/api/inventory/import",
+            files={"file": ("inv.csv", body.encode(), "text/csv")},
+            headers={"x-api-key": "bulk-key"},
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["created"] == 2
+        assert data["skipped"] == 3
+        assert any(e.startswith("Line 2:") for e in data["errors"])
+        assert any(e.startswith("Line 4:") for e in data["errors"])
+        assert any(e.startswith("Line 5:") and "invalid date" in e for e in data["errors"])
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_customers_csv_import_detects_duplicates(app_client):
+    os.environ["API_KEYS"] = "bulk-key"
+    try:
+        body = (
+            "customer_id,name,email\n"
+            "CUST-B1,Beta,beta@example.com\n"
+            "CUST-B2,Beta dup,BETA@example.com\n"
+            "CUST-B3,Alfa dup,biuro@alfa.pl\n"
+            "CUST-B4,,\n"
+        )
+        resp = app_client.post(
+            "/api/customers/import",
+            files={"file": ("c.csv", body.encode(), "text/csv")},
+            headers={"x-api-key": "bulk-key"},
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["created"] == 1
+        assert data["skipped"] == 3
+        assert _count("customers", "customer_id = %s", ("CUST-B1",)) == 1
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -0,0 +1,66 @@
+import time
+from types import SimpleNamespace
+
+import change_log
+import db
+from change_log import ChangeLogCursor
+
+
+def _log(change_id, product_id="P-1"):
+    db.execute("INSERT INTO atp_changes (change_id, product_id) VALUES (%s, %s)", (change_id, product_id))
+
+
+def _ids(rows):
+    return [int(r["change_id"]) for r in rows]
+
+
+def test_gaps_are_reread_until_they_expire(app_client, monkeypatch):
+    db.execute("DELETE FROM atp_changes")
+    _log(1)
+    cursor = ChangeLogCursor("atp_changes", "product_id", grace=60)
+    cursor.reset()
+    assert cursor.position == 1
+
+    _log(3)
+    _log(5)
+    assert _ids(cursor.poll()) == [3, 5]
+    assert cursor.gaps == [2, 4]
+
+    _log(4, "P-late")
+    assert _ids(cursor.poll()) == [4]
+    assert cursor.gaps == [2] and cursor.gaps_filled == 1
+    assert cursor.poll() == []
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr(change_log, "time", SimpleNamespace(monotonic=lambda: later))
+    _log(6)
+    assert _ids(cursor.poll()) == [6]
+    # id 2 never committed (rolled back): dropped once the grace period is over
+    assert cursor.gaps == [] and cursor.gaps_expired == 1
+
+
+def test_reset_marks_ids_missing_below_the_end(app_client):
+    db.execute("DELETE FROM atp_changes")
+    for change_id in (10, 12):
+        _log(change_id)
+    cursor = ChangeLogCursor("atp_changes", "product_id", grace=60)
+    cursor.reset()
+    assert cursor.position == 12 and cursor.gaps == [11]
+    _log(11)
+    assert _ids(cursor.poll()) == [11]
+
+
+def test_pruned_gap_or_too_many_gaps_need_a_reload(app_client):
+    db.execute("DELETE FROM atp_changes")
+    _log(1)
+    cursor = ChangeLogCursor("atp_changes", "product_id", grace=60, max_gaps=5)
+    cursor.reset()
+    _log(3)
+    assert _ids(cursor.poll()) == [3]
+    db.execute("DELETE FROM atp_changes WHERE change_id < 3")
+    _log(4)
+    assert cursor.poll() is None
+
+    cursor.reset()
+    _log(20)
+    assert cursor.poll() is None
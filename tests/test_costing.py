@@ -0,0 +1,182 @@
+import os
+
+import numpy as np
+import pytest
+
+import costing
+import db
+from helpers import add_bom
+from costing import CostRollup
+from mrp import BomGraph
+
+
+@pytest.fixture
+def rollup():
+    return costing.ROLLUP
+
+
+def _product(product_id, std_cost):
+    db.execute(
+        "INSERT INTO products (product_id, name, unit, std_cost, price, vat_rate) VALUES (%s, %s, 'pcs', %s, 0, 23)",
+        (product_id, product_id, std_cost),
+    )
+
+
+def _structure():
+    for product_id, cost in (("C-ASM", 999), ("C-SUB", 999), ("C-RAW", 4), ("C-OTHER", 7)):
+        _product(product_id, cost)
+    add_bom("C-ASM", "C-SUB", 2, 0.1)
+    add_bom("C-SUB", "C-RAW", 3)
+    add_bom("C-ASM", "C-RAW", 1)
+    # Montaż is seeded at 60/h: 30 min setup over lot size 1 + 6 min/unit = 36 min = 36.0
+    db.execute(
+        "INSERT INTO routings (product_id, operation_no, work_center, std_setup_min, std_run_min_per_unit) "
+        "VALUES ('C-SUB', 10, 'Montaż', 30, 6)"
+    )
+
+
+def _current():
+    return {r["product_id"]: r for r in costing.current_costs()}
+
+
+def test_full_rollup_material_and_labor(rollup):
+    _structure()
+    summary = rollup.full()
+    assert summary["kind"] == "full" and summary["max_llc"] >= 2
+    costs = _current()
+    # assemblies ignore their hand-entered std_cost
+    assert costs["C-SUB"]["material_cost"] == pytest.approx(12)
+    assert costs["C-SUB"]["labor_cost"] == pytest.approx(36)
+    assert costs["C-ASM"]["material_cost"] == pytest.approx(2.2 * 12 + 4)
+    assert costs["C-ASM"]["labor_cost"] == pytest.approx(2.2 * 36)
+    assert costs["C-ASM"]["total_cost"] == pytest.approx(2.2 * 48 + 4)
+    assert costs["C-RAW"]["llc"] == 2
+
+
+def test_component_change_recomputes_only_ancestors(rollup, app_client):
+    _structure()
+    first = rollup.full()["version"]
+    os.environ["API_KEYS"] = "cost-key"
+    try:
+        resp = app_client.put("/api/products/C-RAW", json={"std_cost": 5}, headers={"x-api-key": "cost-key"})
+        assert resp.status_code == 200
+    finally:
+        os.environ.pop("API_KEYS", None)
+    costs = _current()
+    latest = max(r["version"] for r in costs.values())
+    assert latest > first
+    assert {p for p, r in costs.items() if r["version"] == latest} == {"C-RAW", "C-SUB", "C-ASM"}
+    assert costs["C-OTHER"]["version"] == first
+    assert costs["C-ASM"]["material_cost"] == pytest.approx(2.2 * 15 + 5)
+    history = costing.cost_history("C-ASM")
+    assert [h["kind"] for h in history] == ["incremental", "full"]
+
+
+def test_own_std_cost_write_reads_only_that_product(rollup, app_client, monkeypatch):
+    _structure()
+    rollup.full(apply=True)
+
+    def everything(*args, **kwargs):
+        raise AssertionError("re-read all base costs")
+
+    monkeypatch.setattr(rollup, "_reload_base", everything)
+    os.environ["API_KEYS"] = "cost-key"
+    try:
+        resp = app_client.put("/api/products/C-RAW", json={"std_cost": 5}, headers={"x-api-key": "cost-key"})
+        assert resp.status_code == 200
+    finally:
+        os.environ.pop("API_KEYS", None)
+    history = costing.cost_history("C-ASM")
+    assert [h["kind"] for h in history] == ["incremental", "full"]
+    assert history[0]["material_cost"] == pytest.approx(2.2 * 15 + 5)
+    assert rollup._key == db.table_versions(*costing.VERSION_TABLES)
+
+
+def test_bom_change_rebuilds_structure(rollup):
+    _structure()
+    rollup.full()
+    add_bom("C-OTHER", "C-RAW", 2)
+    summary = rollup.update(["C-OTHER"], structure_changed=True)
+    assert summary["products"] == 1
+    assert _current()["C-OTHER"]["material_cost"] == pytest.approx(8)
+
+
+def test_rollup_endpoint_apply_writes_assembly_std_cost(rollup, app_client):
+    _structure()
+    os.environ["API_KEYS"] = "cost-key"
+    try:
+        resp = app_client.post("/api/costs/rollup?apply=true", json={}, headers={"x-api-key": "cost-key"})
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["applied"] >= 2
+        row = db.fetch_one("SELECT std_cost FROM products WHERE product_id = 'C-SUB'")
+        assert float(row["std_cost"]) == pytest.approx(48)
+        got = app_client.get("/api/costs?product_id=C-ASM", headers={"x-api-key": "cost-key"}).json()
+        assert got[0]["total_cost"] == pytest.approx(2.2 * 48 + 4)
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_incremental_roll_touches_only_ancestors():
+    rng = np.random.default_rng(5)
+    n = 5000
+    level_of = np.sort(rng.integers(0, 8, n))
+    edges = []
+    for parent in range(n):
+        deeper = np.flatnonzero(level_of > level_of[parent])
+        for child in rng.choice(deeper, size=min(4, len(deeper)), replace=False) if len(deeper) else ():
+            edges.append((f"P{parent}", f"P{child}", 1.5, 0.02))
+    r = CostRollup()
+    r.graph = BomGraph(edges, [f"P{i}" for i in range(n)])
+    r.base_material = np.where(r.graph.indptr[1:] == r.graph.indptr[:-1], 1.0, 0.0)
+    r.own_labor = np.full(n, 0.5)
+    r._roll()
+    full = r.material + r.labor
+    r.base_material[r.graph.index["P4999"]] = 2.0
+    affected = r.graph.ancestors([r.graph.index["P4999"]])
+    assert 1 < affected.sum() < n
+    r._roll(affected)
+    expected = CostRollup()
+    expected.graph, expected.base_material, expected.own_labor = r.graph, r.base_material, r.own_labor
+    expected._roll()
+    assert np.allclose(r.material, expected.material) and not np.allclose(full, r.material + r.labor)
+
+
+def test_failed_rollup_does_not_fail_the_write(rollup, app_client, monkeypatch):
+    _structure()
+    rollup.full()
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("roll-up down")
+
+    monkeypatch.setattr(rollup, "_persist", broken)
+    os.environ["API_KEYS"] = "cost-key"
+    try:
+        resp = app_client.put("/api/products/C-RAW", json={"std_cost": 5}, headers={"x-api-key": "cost-key"})
+    finally:
+        os.environ.pop("API_KEYS", None)
+    assert resp.status_code == 200
+    assert float(db.fetch_one("SELECT std_cost FROM products WHERE product_id = 'C-RAW'")["std_cost"]) == 5
+
+    # the failed version never landed: the next update rewrites everything
+    monkeypatch.undo()
+    summary = rollup.update(["C-OTHER"])
+    assert summary["products"] == len(rollup.graph.products)
+    assert _current()["C-ASM"]["material_cost"] == pytest.approx(2.2 * 15 + 5)
+
+
+def test_out_of_band_changes_are_picked_up(rollup):
+    _structure()
+    rollup.full()
+    # written straight to the database, nobody called notify_changed
+    db.execute("UPDATE products SET std_cost = 5 WHERE product_id = 'C-RAW'")
+    summary = rollup.update(["C-OTHER"])
+    assert summary["kind"] == "incremental"
+    costs = _current()
+    assert costs["C-ASM"]["material_cost"] == pytest.approx(2.2 * 15 + 5)
+    assert {p for p, r in costs.items() if r["version"] == summary["version"]} == {"C-RAW", "C-SUB", "C-ASM", "C-OTHER"}
+
+    db.execute("UPDATE work_centers SET hourly_rate = 120 WHERE work_center = 'Montaż'")
+    rollup.update([])
+    costs = _current()
+    assert costs["C-SUB"]["labor_cost"] == pytest.approx(72)
+    assert costs["C-ASM"]["labor_cost"] == pytest.approx(2.2 * 72)
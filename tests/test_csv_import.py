@@ -0,0 +1,140 @@
+import io
+import os
+
+import pytest
+
+from csv_import import iter_batches, iter_text
+
+
+class CountingReader(io.BytesIO):
+    """Records the largest read so tests can check the upload is never slurped."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.max_read = 0
+
+    def read(self, size=-1):
+        self.max_read = max(self.max_read, size if size is not None and size >= 0 else len(self.getvalue()))
+        return super().read(size)
+
+
+def test_decodes_bom_and_multibyte_characters_across_chunks():
+    data = "\ufeffnazwa\nZażółć gęślą jaźń\n".encode("utf-8")
+    # 1-byte reads split the BOM and every multi-byte character
+    assert "".join(iter_text(io.BytesIO(data), chunk_size=1)) == "nazwa\nZażółć gęślą jaźń\n"
+
+
+def test_invalid_utf8_raises_or_is_replaced():
+    data = b"a,b\n1,\xff\n"
+    with pytest.raises(UnicodeDecodeError):
+        list(iter_text(io.BytesIO(data)))
+    assert "".join(iter_text(io.BytesIO(data), errors="replace")) == "a,b\n1,\ufffd\n"
+
+
+def test_batches_keep_line_numbers_and_quoted_newlines():
+    body = 'id,note\r\n1,"multi\nline"\r\n2,plain\r\n3,"a,b"\r\n4,last'
+    reader = CountingReader(body.encode("utf-8"))
+    batches = list(iter_batches(reader, batch_size=3, chunk_size=4))
+    assert [len(b) for b in batches] == [3, 1]
+    rows = [r for b in batches for r in b]
+    assert rows[0] == (2, {"id": "1", "note": "multi\nline"})
+    assert rows[2] == (4, {"id": "3", "note": "a,b"})
+    assert rows[3] == (5, {"id": "4", "note": "last"})
+    assert reader.max_read == 4
+
+
+def test_uploads_are_read_in_chunks(app_client, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "UPLOAD_READ_CHUNK_SIZE", 16)
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    body = "\ufeffcustomer_id,name,email\n" + "".join(
+        f"CUST-S{i},Klient {i},s{i}@example.com\n" for i in range(5)
+    )
+    os.environ["API_KEYS"] = "csv-key"
+    try:
+        resp = app_client.post(
+            "/api/customers/import",
+            files={"file": ("c.csv", body.encode("utf-8"), "text/csv")},
+            headers={"x-api-key": "csv-key"},
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {"created": 5, "skipped": 0, "errors": []}
+
+        resp = app_client.post(
+            "/api/inventory/import",
+            files={"file": ("i.csv", b"txn_id,txn_date,product_id,qty_change\nT1,2026-01-01,P-100,\xff\n", "text/csv")},
+            headers={"x-api-key": "csv-key"},
+        )
+        assert resp.status_code == 400
+        assert resp.json()["detail"]["detail"].startswith("Cannot read file")
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_decode_error_reports_batches_already_committed(app_client, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "UPLOAD_READ_CHUNK_SIZE", 16)
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    body = b"txn_id,txn_date,product_id,qty_change\n" + b"".join(
+        f"DEC-{i},2026-01-01,P-100,1\n".encode() for i in range(4)
+    ) + b"DEC-X,2026-01-01,P-100,\xff\n"
+    os.environ["API_KEYS"] = "csv-key"
+    try:
+        resp = app_client.post(
+            "/api/inventory/import",
+            files={"file": ("i.csv", body, "text/csv")},
+            headers={"x-api-key": "csv-key"},
+        )
+    finally:
+        os.environ.pop("API_KEYS", None)
+    assert resp.status_code == 400
+    detail = resp.json()["detail"]
+    assert detail["code"] == "csv_decode_error"
+    assert detail["created"] == 4 and detail["skipped"] == 0 and detail["errors"] == []
+
+
+def test_errors_are_capped_and_duplicates_across_batches_skipped(app_client, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "IMPORT_MAX_ERRORS", 2)
+    body = "customer_id,name,email\n" + "".join(
+        f"CUST-CAP{i},Klient,cap{i}@example.com\n" for i in range(2)
+    ) + "CUST-CAP0,Klient,cap0@example.com\n" * 3 + ",,\n"
+    os.environ["API_KEYS"] = "csv-key"
+    try:
+        resp = app_client.post(
+            "/api/customers/import",
+            files={"file": ("c.csv", body.encode("utf-8"), "text/csv")},
+            headers={"x-api-key": "csv-key"},
+        )
+    finally:
+        os.environ.pop("API_KEYS", None)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "created": 2,
+        "skipped": 4,
+        "errors": [
+            "Line 4: customer CUST-CAP0 already exists, skipped",
+            "Line 5: customer CUST-CAP0 already exists, skipped",
+            "... and 2 more errors",
+        ],
+    }
+
+
+def test_admin_import_streams_batches(app_client, monkeypatch):
+    import db
+    from config import settings
+    from fastapi import HTTPException
+    from routers.admin import _import_csv_stream
+
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    body = "txn_id,txn_date,product_id,qty_change,reason\n" + "".join(
+        f"ADM-{i},2026-01-01,P-101,{i},PO\n" for i in range(5)
+    )
+    assert _import_csv_stream("inventory", io.BytesIO(body.encode("utf-8"))) == 5
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM inventory WHERE txn_id LIKE 'ADM-%'")["n"] == 5
+    with pytest.raises(HTTPException):
+        _import_csv_stream("nope", io.BytesIO(body.encode("utf-8")))
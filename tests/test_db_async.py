@@ -0,0 +1,69 @@
+import asyncio
+import os
+
+import pytest
+
+import db
+import db_async
+
+
+def test_async_helpers_match_sync(app_client):
+    async def run():
+        rows = await db_async.fetch_all("SELECT customer_id FROM customers ORDER BY customer_id")
+        one = await db_async.fetch_one(
+            "SELECT customer_id FROM customers WHERE customer_id = %s", ("CUST-ALFA",)
+        )
+        return rows, one
+
+    rows, one = asyncio.run(run())
+    assert rows == db.fetch_all("SELECT customer_id FROM customers ORDER BY customer_id")
+    assert one == {"customer_id": "CUST-ALFA"}
+
+
+def test_async_transaction_commits_and_rolls_back(app_client):
+    async def commit():
+        async with db_async.transaction() as conn:
+            await db_async.execute(
+                "INSERT INTO customers (customer_id, name) VALUES (%s, %s)",
+                ("CUST-ASYNC", "Async"),
+                conn=conn,
+            )
+
+    async def rollback():
+        async with db_async.transaction() as conn:
+            await db_async.execute(
+                "INSERT INTO customers (customer_id, name) VALUES (%s, %s)",
+                ("CUST-ASYNC-RB", "Rollback"),
+                conn=conn,
+            )
+            raise RuntimeError("handler failed")
+
+    asyncio.run(commit())
+    with pytest.raises(RuntimeError):
+        asyncio.run(rollback())
+
+    assert db.fetch_one("SELECT 1 AS x FROM customers WHERE customer_id = %s", ("CUST-ASYNC",))
+    assert db.fetch_one("SELECT 1 AS x FROM customers WHERE customer_id = %s", ("CUST-ASYNC-RB",)) is None
+
+
+def test_concurrent_async_reads(app_client):
+    async def run():
+        return await asyncio.gather(
+            *(db_async.fetch_one("SELECT COUNT(*) AS n FROM orders") for _ in range(20))
+        )
+
+    results = asyncio.run(run())
+    assert len({r["n"] for r in results}) == 1
+
+
+def test_orders_list_with_limit_and_offset(app_client):
+    os.environ["API_KEYS"] = "async-key"
+    try:
+        headers = {"x-api-key": "async-key"}
+        full = app_client.get("/api/orders", headers=headers)
+        assert full.status_code == 200
+        page = app_client.get("/api/orders?limit=1&offset=0", headers=headers)
+        assert page.status_code == 200
+        assert page.json() == full.json()[:1]
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -0,0 +1,58 @@
+import csv
+import io
+
+import db
+
+
+def _seed_inventory(n):
+    for i in range(n):
+        db.execute(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) VALUES (%s, %s, %s, %s, %s)",
+            (f"S-{i:05d}", "2026-01-01", "P-100", 1, "PO"),
+        )
+
+
+def test_stream_yields_bounded_batches(app_client):
+    _seed_inventory(25)
+    total = db.fetch_one("SELECT COUNT(*) AS n FROM inventory")["n"]
+
+    batches = list(db.stream("SELECT txn_id FROM inventory ORDER BY txn_id", chunk_size=10))
+
+    assert all(1 <= len(b) <= 10 for b in batches)
+    assert sum(len(b) for b in batches) == total
+    assert [r["txn_id"] for b in batches for r in b] == [
+        r["txn_id"] for r in db.fetch_all("SELECT txn_id FROM inventory ORDER BY txn_id")
+    ]
+
+
+def test_stream_with_params(app_client):
+    _seed_inventory(5)
+    rows = [
+        r
+        for b in db.stream("SELECT txn_id FROM inventory WHERE txn_id LIKE %s", ("S-%",), chunk_size=2)
+        for r in b
+    ]
+    assert len(rows) == 5
+
+
+def test_stream_releases_connection_when_closed_early(app_client):
+    _seed_inventory(20)
+    gen = db.stream("SELECT txn_id FROM inventory", chunk_size=5)
+    next(gen)
+    assert db.sqlite_pool_stats()["in_use"] == 1
+    gen.close()
+    assert db.sqlite_pool_stats()["in_use"] == 0
+
+
+def test_inventory_export_streams_all_rows(app_client):
+    _seed_inventory(30)
+    total = db.fetch_one("SELECT COUNT(*) AS n FROM inventory")["n"]
+
+    r = app_client.get("/api/inventory/export")
+
+    assert r.status_code == 200
+    assert r.content.startswith(b"\xef\xbb\xbf")
+    rows = list(csv.reader(io.StringIO(r.content.decode("utf-8-sig"))))
+    assert rows[0] == ["txn_id", "txn_date", "product_id", "qty_change", "reason", "lot", "location"]
+    assert len(rows) - 1 == total
+    assert db.sqlite_pool_stats()["in_use"] == 0
@@ -0,0 +1,102 @@
+import os
+import threading
+
+import db
+from id_allocator import IdAllocator
+
+
+def _seq(prefix):
+    row = db.fetch_one("SELECT last_suffix FROM order_id_seq WHERE prefix = %s", (prefix,))
+    return row["last_suffix"] if row else None
+
+
+def test_block_is_reserved_once_and_served_from_memory(app_client):
+    alloc = IdAllocator("TST", block_size=5)
+    ids = [alloc.next() for _ in range(7)]
+    assert ids == [f"TST-{n:04d}" for n in range(1, 8)]
+    assert alloc.blocks_reserved == 2
+    assert _seq("TST") == 10
+
+
+def test_peek_does_not_consume(app_client):
+    alloc = IdAllocator("PK", block_size=3)
+    assert alloc.peek() == "PK-0001"
+    assert _seq("PK") is None
+    assert alloc.next() == "PK-0001"
+    assert alloc.peek() == "PK-0002"
+    assert alloc.next() == "PK-0002"
+
+
+def test_concurrent_allocators_never_collide(app_client):
+    # two "processes" sharing one counter row
+    allocs = [IdAllocator("CC", block_size=4), IdAllocator("CC", block_size=4)]
+    seen = []
+    lock = threading.Lock()
+
+    def worker(alloc):
+        got = [alloc.next() for _ in range(25)]
+        with lock:
+            seen.extend(got)
+
+    threads = [threading.Thread(target=worker, args=(allocs[i % 2],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(seen) == 100
+    assert len(set(seen)) == 100
+
+
+def test_hint_endpoints_do_not_consume_ids(app_client):
+    os.environ["API_KEYS"] = "id-key"
+    try:
+        before = _seq("ORD")
+        headers = {"x-api-key": "id-key"}
+        hint = app_client.get("/api/orders/next-id", headers=headers).json()["order_id"]
+        app_client.get("/api/orders/validate?order_id=ORD-NOPE", headers=headers)
+        assert _seq("ORD") == before
+        assert hint == f"ORD-{before + 1:04d}"
+
+        resp = app_client.get("/api/customers/next-id", headers=headers)
+        assert resp.status_code == 200
+        assert resp.json()["customer_id"].startswith("CUST-")
+        assert db.next_customer_id() == resp.json()["customer_id"]
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_sync_moves_counter_past_explicit_ids(app_client):
+    from id_allocator import allocator
+
+    db.execute(
+        "INSERT INTO orders (order_id, customer_id, status) VALUES (%s, %s, %s)",
+        ("ORD-0500", "CUST-ALFA", "Planned"),
+    )
+    alloc = allocator("ORD")
+    assert alloc.sync() == 500
+    assert _seq("ORD") == 500
+    # never moves the counter backwards
+    db.execute("UPDATE order_id_seq SET last_suffix = 900 WHERE prefix = 'ORD'")
+    assert alloc.sync() == 900
+
+
+def test_create_order_skips_explicitly_taken_ids(app_client):
+    os.environ["API_KEYS"] = "id-key"
+    try:
+        taken = _seq("ORD") + 1
+        db.execute(
+            "INSERT INTO orders (order_id, customer_id, status) VALUES (%s, %s, %s)",
+            (f"ORD-{taken:04d}", "CUST-ALFA", "Planned"),
+        )
+        resp = app_client.post("/api/orders", json={"customer_id": "CUST-ALFA"}, headers={"x-api-key": "id-key"})
+        assert resp.status_code == 201
+        assert resp.json()["order_id"] == f"ORD-{taken + 1:04d}"
+
+        resp = app_client.post(
+            "/api/orders",
+            json={"customer_id": "CUST-ALFA", "order_id": f"ORD-{taken:04d}"},
+            headers={"x-api-key": "id-key"},
+        )
+        assert resp.status_code == 409
+    finally:
+        os.environ.pop("API_KEYS", None)
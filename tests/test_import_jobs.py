@@ -0,0 +1,160 @@
+import os
+
+import pytest
+
+import db
+import import_jobs
+import main
+from config import settings
+from user_mgmt import require_admin
+
+HEADER = "txn_id,txn_date,product_id,qty_change,reason\n"
+
+
+@pytest.fixture
+def jobs(app_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_SPOOL_DIR", str(tmp_path / "spool"))
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    main.app.dependency_overrides[require_admin] = lambda: {"email": "admin@example.com", "is_admin": True}
+    yield app_client
+    main.app.dependency_overrides.pop(require_admin, None)
+
+
+def _csv(n, prefix="JOB"):
+    return (HEADER + "".join(f"{prefix}-{i},2026-01-01,P-101,{i + 1},PO\n" for i in range(n))).encode()
+
+
+def _start(client, body, entity_type="inventory"):
+    resp = client.post(
+        "/api/import/jobs",
+        data={"entity_type": entity_type},
+        files={"file": ("inv.csv", body, "text/csv")},
+    )
+    assert resp.status_code == 202, resp.text
+    return resp.json()
+
+
+def _count(prefix):
+    return db.fetch_one("SELECT COUNT(*) AS n FROM inventory WHERE txn_id LIKE %s", (f"{prefix}-%",))["n"]
+
+
+def test_job_is_queued_then_processed_in_batches(jobs):
+    job = _start(jobs, _csv(5))
+    assert job["status"] == "queued" and job["rows_processed"] == 0
+    spool = db.fetch_one("SELECT spool_path FROM import_jobs WHERE job_id = %s", (job["job_id"],))["spool_path"]
+    assert os.path.exists(spool)
+
+    assert import_jobs.ImportJobRunner().run_once() == job["job_id"]
+    done = jobs.get(f"/api/import/jobs/{job['job_id']}").json()
+    assert done["status"] == "done"
+    assert done["batches_done"] == 3
+    assert done["rows_processed"] == 5 and done["rows_imported"] == 5
+    assert done["error_count"] == 0
+    assert done["rows_per_second"] is not None and done["finished_at"] is not None
+    assert _count("JOB") == 5
+    assert not os.path.exists(spool)
+    assert import_jobs.ImportJobRunner().run_once() is None
+
+
+def test_bad_rows_are_reported_per_line(jobs):
+    body = HEADER + "BAD-1,2026-01-01,P-101,1,PO\nBAD-2,2026-01-01\nBAD-3,2026-01-01,P-101,3,PO\n"
+    job = _start(jobs, body.encode())
+    import_jobs.ImportJobRunner().run_once()
+    done = import_jobs.get_job(job["job_id"])
+    assert done["status"] == "done"
+    assert done["rows_processed"] == 3 and done["rows_imported"] == 2
+    assert done["error_count"] == 1
+    assert done["errors"][0].startswith("Line 3:")
+    assert _count("BAD") == 2
+
+
+def test_unknown_entity_and_missing_job(jobs):
+    resp = jobs.post(
+        "/api/import/jobs",
+        data={"entity_type": "nope"},
+        files={"file": ("x.csv", _csv(1), "text/csv")},
+    )
+    assert resp.status_code == 400
+    assert jobs.get("/api/import/jobs/missing").status_code == 404
+    assert jobs.post("/api/import/jobs/missing/cancel").status_code == 404
+
+
+def test_cancel_queued_and_running_jobs(jobs, monkeypatch):
+    queued = _start(jobs, _csv(3, "CQ"))
+    resp = jobs.post(f"/api/import/jobs/{queued['job_id']}/cancel")
+    assert resp.json()["status"] == "cancelled"
+    assert import_jobs.ImportJobRunner().run_once() is None
+    assert _count("CQ") == 0
+
+    running = _start(jobs, _csv(6, "CR"))
+    real = import_jobs._IMPORTER
+
+    def cancel_during_first_batch(entity_type, rows, conn=None):
+        # what POST .../cancel does, on the worker's own connection
+        db.execute("UPDATE import_jobs SET cancel_requested = 1 WHERE job_id = %s", (running["job_id"],), conn=conn)
+        return real(entity_type, rows, conn=conn)
+
+    monkeypatch.setattr(import_jobs, "_IMPORTER", cancel_during_first_batch)
+    import_jobs.ImportJobRunner().run_once()
+    job = import_jobs.get_job(running["job_id"])
+    assert job["status"] == "cancelled"
+    assert job["batches_done"] == 1 and _count("CR") == 2
+    listed = jobs.get("/api/import/jobs", params={"status": "cancelled"}).json()
+    assert {j["job_id"] for j in listed} == {queued["job_id"], running["job_id"]}
+
+
+def test_cancel_does_not_overwrite_a_job_claimed_in_the_meantime(jobs, monkeypatch):
+    job = _start(jobs, _csv(3, "CC"))
+    spool = db.fetch_one("SELECT spool_path FROM import_jobs WHERE job_id = %s", (job["job_id"],))["spool_path"]
+    real = import_jobs.execute
+
+    def claimed_first(sql, params=None, **kwargs):
+        if "status = 'cancelled'" in sql:
+            # a worker claims the job just before the cancel's write lands
+            real("UPDATE import_jobs SET status = 'running' WHERE job_id = %s", (job["job_id"],), conn=kwargs.get("conn"))
+        return real(sql, params, **kwargs)
+
+    monkeypatch.setattr(import_jobs, "execute", claimed_first)
+    state = import_jobs.cancel_job(job["job_id"])
+    assert state["status"] == "running" and state["cancel_requested"]
+    assert os.path.exists(spool)
+    assert import_jobs.cancel_job("no-such-job") is None
+
+
+def test_interrupted_job_resumes_after_last_committed_batch(jobs, monkeypatch):
+    job = _start(jobs, _csv(5, "RES"))
+    real = import_jobs._IMPORTER
+    calls = []
+    first = import_jobs.ImportJobRunner()
+
+    def importer(entity_type, rows, conn=None):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            # the worker is told to shut down while the second batch is in flight
+            first._stopping.set()
+        return real(entity_type, rows, conn=conn)
+
+    monkeypatch.setattr(import_jobs, "_IMPORTER", importer)
+    first.run_once("worker-a")
+    state = import_jobs.get_job(job["job_id"])
+    assert state["status"] == "running" and state["batches_done"] == 2
+    assert _count("RES") == 4
+
+    # still heartbeating as far as anyone can tell: not reclaimed yet
+    assert import_jobs.ImportJobRunner().run_once("worker-b") is None
+
+    monkeypatch.setattr(settings, "IMPORT_JOB_STALE_SECONDS", -1)
+    calls.clear()
+    assert import_jobs.ImportJobRunner().run_once("worker-b") == job["job_id"]
+    assert calls == [1]
+    done = import_jobs.get_job(job["job_id"])
+    assert done["status"] == "done"
+    assert done["rows_processed"] == 5 and _count("RES") == 5
+
+
+def test_relative_spool_dir_is_resolved_against_the_app_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "IMPORT_SPOOL_DIR", "spool/imports")
+    assert import_jobs.spool_dir() == os.path.join(os.path.dirname(os.path.abspath(import_jobs.__file__)), "spool", "imports")
+    monkeypatch.setattr(settings, "IMPORT_SPOOL_DIR", str(tmp_path / "shared"))
+    assert import_jobs.spool_dir() == str(tmp_path / "shared")
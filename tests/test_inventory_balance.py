@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import db
+import inventory_balance
+
+ADMIN = {"x-admin-key": "inv-admin"}
+
+
+def _txn(txn_id, product_id, qty, location=None, lot=None):
+    db.execute(
+        "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason, lot, location) "
+        "VALUES (%s, '2026-01-01', %s, %s, 'PO', %s, %s)",
+        (txn_id, product_id, qty, lot, location),
+    )
+
+
+def _balance(product_id, location="", lot=""):
+    row = db.fetch_one(
+        "SELECT qty_on_hand FROM inventory_balance WHERE product_id = %s AND location = %s AND lot = %s",
+        (product_id, location, lot),
+    )
+    return row["qty_on_hand"] if row else None
+
+
+def test_ledger_writes_keep_balance_current(app_client):
+    _txn("T-1", "P-101", 100, location="A1", lot="L1")
+    _txn("T-2", "P-101", -30, location="A1", lot="L1")
+    _txn("T-3", "P-101", 5)
+    assert _balance("P-101", "A1", "L1") == pytest.approx(70)
+    assert _balance("P-101") == pytest.approx(5)
+
+    db.execute("UPDATE inventory SET location = 'B2' WHERE txn_id = 'T-1'")
+    assert _balance("P-101", "A1", "L1") == pytest.approx(-30)
+    assert _balance("P-101", "B2", "L1") == pytest.approx(100)
+
+    db.execute("DELETE FROM inventory WHERE txn_id = 'T-2'")
+    assert _balance("P-101", "A1", "L1") == pytest.approx(0)
+    assert inventory_balance.verify()["ok"]
+
+
+def test_shortages_read_balance(app_client):
+    db.execute(
+        "INSERT INTO orders (order_id, order_date, customer_id) VALUES ('ORD-SH', '2026-01-01', 'CUST-ALFA')"
+    )
+    db.execute(
+        "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) VALUES ('ORD-SH', 1, 'P-100', 40, 1)"
+    )
+    _txn("T-SH-1", "P-100", 15, location="A1")
+    _txn("T-SH-2", "P-100", 10, location="B1")
+    row = db.fetch_one("SELECT qty_on_hand, shortage_qty FROM v_shortages WHERE order_id = 'ORD-SH'")
+    assert row["qty_on_hand"] == pytest.approx(25)
+    assert row["shortage_qty"] == pytest.approx(15)
+
+
+def test_verify_detects_and_rebuild_repairs(app_client):
+    _txn("T-V-1", "P-100", 12, lot="X")
+    db.execute("UPDATE inventory_balance SET qty_on_hand = 99 WHERE product_id = 'P-100' AND lot = 'X'")
+    result = inventory_balance.verify()
+    assert not result["ok"]
+    assert result["mismatches"][0]["ledger_qty"] == pytest.approx(12)
+    assert result["mismatches"][0]["lot"] == "X"
+
+    assert inventory_balance.rebuild()["rows"] >= 1
+    assert _balance("P-100", "", "X") == pytest.approx(12)
+    assert inventory_balance.verify()["ok"]
+
+
+def test_import_updates_balance(app_client):
+    os.environ["API_KEYS"] = "inv-key"
+    try:
+        csv_body = (
+            "txn_id,txn_date,product_id,qty_change,reason,lot,location\n"
+            "T-IMP-1,2026-01-02,P-101,8,PO,,W1\n"
+            "T-IMP-2,2026-01-02,P-101,2,PO,,W1\n"
+        )
+        resp = app_client.post(
+            "/api/inventory/import",
+            files={"file": ("inv.csv", csv_body, "text/csv")},
+            headers={"x-api-key": "inv-key"},
+        )
+        assert resp.status_code == 200, resp.text
+        assert _balance("P-101", "W1") == pytest.approx(10)
+
+        resp = app_client.get("/api/inventory/balance?product_id=P-101&detail=true", headers={"x-api-key": "inv-key"})
+        assert resp.status_code == 200
+        assert {"product_id": "P-101", "location": "W1", "lot": None, "qty_on_hand": 10} in resp.json()
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_admin_endpoints(app_client):
+    os.environ["ADMIN_KEY"] = "inv-admin"
+    try:
+        assert app_client.get("/api/admin/inventory-balance/verify").status_code == 401
+        resp = app_client.post("/api/admin/inventory-balance/rebuild", headers=ADMIN)
+        assert resp.status_code == 200
+        resp = app_client.get("/api/admin/inventory-balance/verify", headers=ADMIN)
+        assert resp.status_code == 200
+        assert resp.json()["ok"] is True
+    finally:
+        os.environ.pop("ADMIN_KEY", None)
@@ -0,0 +1,88 @@
+import os
+
+import db
+from config import settings
+
+
+def _csv(rows):
+    lines = ["txn_id,txn_date,product_id,qty_change,reason,lot,location"]
+    lines += [",".join(r) for r in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _post(app_client, body):
+    os.environ["API_KEYS"] = "imp-key"
+    try:
+        return app_client.post(
+            "/api/inventory/import",
+            files={"file": ("inv.csv", body, "text/csv")},
+            headers={"x-api-key": "imp-key"},
+        )
+    finally:
+        os.environ.pop("API_KEYS", None)
+
+
+def test_insert_new_returns_inserted_keys(app_client):
+    db.execute(
+        "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) "
+        "VALUES ('TXN-OLD', '2026-01-01', 'P-100', 5, 'PO')"
+    )
+    inserted = db.insert_new(
+        "inventory",
+        ["txn_id", "txn_date", "product_id", "qty_change", "reason"],
+        [
+            ("TXN-OLD", "2026-01-02", "P-100", 99, "PO"),
+            ("TXN-NEW", "2026-01-02", "P-100", 7, "PO"),
+        ],
+        "txn_id",
+    )
+    assert inserted == ["TXN-NEW"]
+    assert db.fetch_one("SELECT qty_change FROM inventory WHERE txn_id = 'TXN-OLD'")["qty_change"] == 5
+    assert not db.fetch_all("SELECT name FROM sqlite_temp_master WHERE name LIKE '_stage_%'")
+
+
+def test_import_runs_in_batches_and_reports_lines_in_order(app_client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 3)
+    db.execute(
+        "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) "
+        "VALUES ('TXN-B5', '2026-01-01', 'P-100', 1, 'PO')"
+    )
+    rows = [[f"TXN-B{i}", "2026-02-01", "P-101", str(i), "PO", "", ""] for i in range(10)]
+    rows[2][3] = "abc"
+    rows.append(["TXN-B1", "2026-02-01", "P-101", "1", "PO", "", ""])
+    resp = _post(app_client, _csv(rows))
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["created"] == 8
+    assert data["skipped"] == 3
+    assert data["errors"] == [
+        "Line 4: invalid qty 'abc'",
+        "Line 7: txn TXN-B5 already exists, skipped",
+        "Line 12: txn TXN-B1 already exists, skipped",
+    ]
+    total = db.fetch_one("SELECT SUM(qty_change) AS q FROM inventory WHERE txn_id LIKE 'TXN-B%'")["q"]
+    # TXN-B5 keeps its original qty; TXN-B2 was rejected
+    assert total == sum(range(10)) - 2 - 5 + 1
+    balance = db.fetch_one("SELECT SUM(qty_on_hand) AS q FROM inventory_balance WHERE product_id = 'P-101'")["q"]
+    assert balance == sum(range(10)) - 2 - 5
+
+
+def test_failed_batch_falls_back_to_rows(app_client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("staging unavailable")
+
+    monkeypatch.setattr("routers.inventory.insert_new", broken)
+    resp = _post(
+        app_client,
+        _csv(
+            [
+                ["TXN-F1", "2026-03-01", "P-100", "1", "PO", "", ""],
+                ["TXN-F2", "2026-03-01", "P-100", "2", "PO", "", ""],
+                ["TXN-F3", "2026-03-01", "P-100", "3", "PO", "", ""],
+            ]
+        ),
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"created": 3, "skipped": 0, "errors": []}
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+import db
+from mrp import BomCycleError, BomGraph
+
+
+def _explode(graph, demand, stock=None):
+    result = graph.explode(graph.vector(demand), graph.vector(stock or {}))
+    return {key: dict(zip(graph.products, values.tolist())) for key, values in result.items()}
+
+
+def test_low_level_codes_use_deepest_occurrence():
+    # C is used directly by A (level 1) and via B (level 2): its LLC must be 2
+    graph = BomGraph([("A", "B", 1, 0), ("B", "C", 1, 0), ("A", "C", 1, 0), ("D", "C", 1, 0)])
+    llc = dict(zip(graph.products, graph.llc.tolist()))
+    assert llc == {"A": 0, "B": 1, "C": 2, "D": 0}
+    assert graph.max_llc == 2
+
+
+def test_multi_level_explosion_applies_scrap_and_nets_each_level():
+    graph = BomGraph([("A", "B", 2, 0.1), ("B", "C", 3, 0), ("A", "C", 1, 0)])
+    out = _explode(graph, {"A": 10}, {"A": 4, "B": 2, "C": 5})
+    assert out["net"]["A"] == pytest.approx(6)
+    # 6 A need 6 * 2 * 1.1 B, minus 2 on hand
+    assert out["gross"]["B"] == pytest.approx(13.2)
+    assert out["net"]["B"] == pytest.approx(11.2)
+    # C: 6 directly from A plus 11.2 * 3 via B, minus 5 on hand
+    assert out["gross"]["C"] == pytest.approx(6 + 33.6)
+    assert out["dependent"]["C"] == pytest.approx(39.6)
+    assert out["net"]["C"] == pytest.approx(34.6)
+
+
+def test_independent_demand_on_components_is_added():
+    graph = BomGraph([("A", "B", 1, 0)])
+    out = _explode(graph, {"A": 5, "B": 3}, {"B": -7})
+    assert out["independent"]["B"] == 3
+    assert out["gross"]["B"] == 8
+    # negative balances count as nothing on hand
+    assert out["net"]["B"] == 8
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(BomCycleError):
+        BomGraph([("A", "B", 1, 0), ("B", "C", 1, 0), ("C", "A", 1, 0)])
+
+
+def test_large_structure_explodes_level_by_level():
+    rng = np.random.default_rng(3)
+    n, levels = 5000, 8
+    level_of = np.sort(rng.integers(0, levels, n))
+    edges = []
+    for parent in range(n):
+        deeper = np.flatnonzero(level_of > level_of[parent])
+        if len(deeper):
+            for child in rng.choice(deeper, size=min(4, len(deeper)), replace=False):
+                edges.append((f"P{parent}", f"P{child}", 1.5, 0.02))
+    graph = BomGraph(edges, [f"P{i}" for i in range(n)])
+    demand = {f"P{i}": 10 for i in range(0, n, 7)}
+    out = graph.explode(graph.vector(demand), np.zeros(len(graph.products)))
+    # every component sits below all of its parents, and with no stock each one
+    # needs exactly what its parents pass down
+    expected = graph.vector(demand).astype(np.float64)
+    for level in range(graph.max_llc + 1):
+        parent, child, factor = graph.level_edges(level)
+        assert (graph.llc[child] > level).all()
+        np.add.at(expected, child, factor * out["gross"][parent])
+    assert np.allclose(out["gross"], expected) and np.allclose(out["net"], out["gross"])
+
+
+def test_run_and_requirements_endpoints(app_client):
+    os.environ["API_KEYS"] = "mrp-key"
+    headers = {"x-api-key": "mrp-key"}
+    try:
+        db.execute(
+            "INSERT INTO orders (order_id, order_date, customer_id, due_date) "
+            "VALUES ('ORD-M1', '2026-01-01', 'CUST-ALFA', '2026-02-01')"
+        )
+        db.execute(
+            "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) "
+            "VALUES ('ORD-M1', 1, 'P-100', 10, 1)"
+        )
+        db.execute(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) "
+            "VALUES ('T-M1', '2026-01-01', 'P-100', 4, 'PO'), ('T-M2', '2026-01-01', 'P-101', 5, 'PO')"
+        )
+        resp = app_client.post("/api/mrp/run", headers=headers)
+        assert resp.status_code == 200, resp.text
+        summary = resp.json()
+        assert summary["max_llc"] >= 1 and summary["net_requirements"] == 2
+
+        rows = app_client.get("/api/mrp/requirements?only_net=true", headers=headers).json()
+        by_product = {r["product_id"]: r for r in rows}
+        assert by_product["P-100"]["net_qty"] == pytest.approx(6)
+        # seeded BOM: P-100 uses 2 x P-101 with 5% scrap
+        assert by_product["P-101"]["gross_qty"] == pytest.approx(12.6)
+        assert by_product["P-101"]["net_qty"] == pytest.approx(7.6)
+        assert {r["run_id"] for r in rows} == {summary["run_id"]}
+
+        one = app_client.get("/api/mrp/requirements?product_id=P-101", headers=headers).json()
+        assert [r["product_id"] for r in one] == ["P-101"]
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -0,0 +1,105 @@
+import os
+import time
+
+import pytest
+
+import db
+from netting import NETTING_CACHE, net_shortages
+
+
+@pytest.fixture
+def fresh_cache():
+    return NETTING_CACHE
+
+
+def _line(order_id, product_id, qty, due, line_no=1, order_date="2026-01-01"):
+    return {"order_id": order_id, "line_no": line_no, "product_id": product_id, "qty": qty,
+            "due_date": due, "order_date": order_date}
+
+
+def test_stock_goes_to_earliest_due_date_first():
+    lines = [
+        _line("O-3", "A", 10, "2026-03-01"),
+        _line("O-1", "A", 10, "2026-01-01"),
+        _line("O-2", "A", 10, "2026-02-01"),
+        _line("O-4", "B", 5, None),
+    ]
+    rows = {r["order_id"]: r for r in net_shortages(lines, {"A": 15, "B": 2})}
+    assert rows["O-1"]["shortage_qty"] == 0
+    assert rows["O-2"]["allocated_qty"] == 5 and rows["O-2"]["shortage_qty"] == 5
+    assert rows["O-3"]["shortage_qty"] == 10
+    assert rows["O-4"]["shortage_qty"] == 3
+
+
+def test_missing_due_dates_sort_last_and_negative_stock_is_zero():
+    lines = [_line("O-NULL", "A", 4, None), _line("O-DUE", "A", 4, "2026-05-01")]
+    rows = {r["order_id"]: r for r in net_shortages(lines, {"A": 4})}
+    assert rows["O-DUE"]["shortage_qty"] == 0
+    assert rows["O-NULL"]["shortage_qty"] == 4
+    assert all(r["shortage_qty"] == 4 for r in net_shortages(lines, {"A": -10}))
+
+
+def test_matches_naive_allocation_on_random_data():
+    import random
+
+    rng = random.Random(7)
+    lines = [
+        _line(f"O-{i:05d}", f"P{rng.randrange(40)}", rng.randrange(1, 50),
+              f"2026-{rng.randrange(1, 13):02d}-{rng.randrange(1, 28):02d}")
+        for i in range(2000)
+    ]
+    stock = {f"P{i}": rng.randrange(0, 800) for i in range(40)}
+    got = {r["order_id"]: r["shortage_qty"] for r in net_shortages(lines, stock)}
+
+    remaining = dict(stock)
+    for line in sorted(lines, key=lambda r: (r["due_date"], r["order_date"], r["order_id"])):
+        take = min(remaining.get(line["product_id"], 0), line["qty"])
+        remaining[line["product_id"]] -= take
+        assert got[line["order_id"]] == line["qty"] - take
+
+
+def test_large_input_is_fast():
+    lines = [_line(f"O-{i}", f"P{i % 500}", 3, f"2026-01-{i % 28 + 1:02d}") for i in range(100_000)]
+    start = time.perf_counter()
+    net_shortages(lines, {f"P{i}": 100 for i in range(500)})
+    assert time.perf_counter() - start < 5
+
+
+def test_endpoint_and_cache_invalidation(app_client, fresh_cache):
+    os.environ["API_KEYS"] = "net-key"
+    headers = {"x-api-key": "net-key"}
+    try:
+        for order_id, due in (("ORD-N1", "2026-02-01"), ("ORD-N2", "2026-03-01")):
+            db.execute(
+                "INSERT INTO orders (order_id, order_date, customer_id, due_date) "
+                "VALUES (%s, '2026-01-01', 'CUST-ALFA', %s)",
+                (order_id, due),
+            )
+            db.execute(
+                "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) "
+                "VALUES (%s, 1, 'P-100', 10, 1)",
+                (order_id,),
+            )
+        db.execute(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) "
+            "VALUES ('T-N1', '2026-01-01', 'P-100', 12, 'PO')"
+        )
+        resp = app_client.get("/api/shortages?mode=netted", headers=headers)
+        assert resp.status_code == 200
+        assert [(r["order_id"], r["shortage_qty"]) for r in resp.json()] == [("ORD-N2", 8.0)]
+
+        misses = fresh_cache.misses
+        app_client.get("/api/shortages?mode=netted", headers=headers)
+        assert fresh_cache.misses == misses
+
+        db.execute(
+            "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) "
+            "VALUES ('T-N2', '2026-01-01', 'P-100', 8, 'PO')"
+        )
+        assert app_client.get("/api/shortages?mode=netted", headers=headers).json() == []
+        assert fresh_cache.misses == misses + 1
+
+        legacy = app_client.get("/api/shortages", headers=headers).json()
+        assert {r["order_id"] for r in legacy} >= {"ORD-N1", "ORD-N2"}
+    finally:
+        os.environ.pop("API_KEYS", None)
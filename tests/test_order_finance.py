@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import db
+import order_finance
+
+
+def _finance(order_id):
+    return db.fetch_one(
+        "SELECT revenue, material_cost, labor_cost, gross_margin FROM order_finance WHERE order_id = %s",
+        (order_id,),
+    )
+
+
+@pytest.fixture
+def order(app_client):
+    db.execute(
+        "INSERT INTO orders (order_id, order_date, customer_id) VALUES (%s, %s, %s)",
+        ("ORD-FIN", "2026-01-10", "CUST-ALFA"),
+    )
+    return "ORD-FIN"
+
+
+def test_order_insert_creates_zero_row(order):
+    assert _finance(order) == {"revenue": 0, "material_cost": 0, "labor_cost": 0, "gross_margin": 0}
+
+
+def test_lines_and_timesheets_apply_deltas(order):
+    db.execute(
+        "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price, discount_pct) "
+        "VALUES (%s, 1, 'P-100', 10, 30, 0.1)",
+        (order,),
+    )
+    db.execute("INSERT INTO timesheets (emp_id, order_id, hours) VALUES ('E-01', %s, 2)", (order,))
+    row = _finance(order)
+    assert row["revenue"] == pytest.approx(270)
+    assert row["material_cost"] == pytest.approx(100)
+    assert row["labor_cost"] == pytest.approx(90)
+    assert row["gross_margin"] == pytest.approx(80)
+
+    db.execute("UPDATE order_lines SET qty = 5 WHERE order_id = %s AND line_no = 1", (order,))
+    db.execute("UPDATE timesheets SET hours = 1 WHERE order_id = %s", (order,))
+    row = _finance(order)
+    assert row["revenue"] == pytest.approx(135)
+    assert row["material_cost"] == pytest.approx(50)
+    assert row["labor_cost"] == pytest.approx(45)
+
+    db.execute("DELETE FROM order_lines WHERE order_id = %s", (order,))
+    assert _finance(order)["revenue"] == pytest.approx(0)
+
+
+def test_cost_and_rate_changes_fan_out(order):
+    db.execute(
+        "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price, discount_pct) "
+        "VALUES (%s, 1, 'P-101', 4, 5, 0)",
+        (order,),
+    )
+    db.execute("INSERT INTO timesheets (emp_id, order_id, hours) VALUES ('E-01', %s, 3)", (order,))
+    db.execute("UPDATE products SET std_cost = 3 WHERE product_id = 'P-101'")
+    db.execute("UPDATE employees SET hourly_rate = 50 WHERE emp_id = 'E-01'")
+    row = _finance(order)
+    assert row["material_cost"] == pytest.approx(12)
+    assert row["labor_cost"] == pytest.approx(150)
+    assert order_finance.reconcile()["drift_count"] == 0
+
+
+def test_shim_view_and_order_delete(order):
+    view = db.fetch_one("SELECT customer_id, revenue FROM v_order_finance WHERE order_id = %s", (order,))
+    assert view["customer_id"] == "CUST-ALFA"
+    db.execute("DELETE FROM orders WHERE order_id = %s", (order,))
+    assert _finance(order) is None
+
+
+def test_reconcile_detects_and_fixes_drift(order):
+    db.execute("UPDATE order_finance SET revenue = 999 WHERE order_id = %s", (order,))
+    db.execute("INSERT INTO order_finance (order_id) VALUES ('ORD-GHOST')")
+    result = order_finance.reconcile()
+    assert result["drift_count"] == 1
+    assert result["drift"][0]["stored_revenue"] == 999
+    assert result["orphans"] == ["ORD-GHOST"]
+
+    result = order_finance.reconcile(fix=True)
+    assert result["fixed"] == 2
+    assert _finance(order)["revenue"] == 0
+    after = order_finance.reconcile()
+    assert after["drift_count"] == 0 and after["orphan_count"] == 0
+
+
+def test_admin_reconcile_endpoint(app_client, order):
+    os.environ["ADMIN_KEY"] = "fin-admin"
+    try:
+        assert app_client.post("/api/admin/order-finance/reconcile").status_code == 401
+        resp = app_client.post(
+            "/api/admin/order-finance/reconcile", headers={"x-admin-key": "fin-admin"}
+        )
+        assert resp.status_code == 200
+        assert resp.json()["checked"] >= 1
+    finally:
+        os.environ.pop("ADMIN_KEY", None)
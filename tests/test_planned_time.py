@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import db
+from helpers import add_order
+from planned_time import PLANNED_TIME_CACHE, planned_times
+
+
+@pytest.fixture
+def cache():
+    return PLANNED_TIME_CACHE
+
+
+def test_hours_come_from_routings(cache):
+    db.execute(
+        "INSERT INTO routings (product_id, operation_no, work_center, std_setup_min, std_run_min_per_unit) "
+        "VALUES ('P-100', 20, 'Testy', 10, 0.5)"
+    )
+    add_order("ORD-PT1", [("P-100", 12), ("P-101", 3)])
+    add_order("ORD-PT2", [])
+    rows = {r["order_id"]: r for r in planned_times(["ORD-PT1", "ORD-PT2", "ORD-MISSING"])}
+    assert set(rows) == {"ORD-PT1", "ORD-PT2"}
+    # seeded op 10: 15 + 12 * 2.5 min, plus op 20: 10 + 12 * 0.5 min
+    pt1 = rows["ORD-PT1"]
+    assert pt1["setup_hours"] == pytest.approx(25 / 60, abs=1e-4)
+    assert pt1["planned_hours"] == pytest.approx((15 + 30 + 10 + 6) / 60, abs=1e-4)
+    assert pt1["operations"] == 2 and pt1["unrouted_lines"] == 1
+    assert rows["ORD-PT2"]["planned_hours"] == 0
+
+
+def test_cache_hits_and_invalidation_on_lines_and_routings(cache):
+    add_order("ORD-PT3", [("P-100", 4)])
+    first = planned_times(["ORD-PT3"])[0]["planned_hours"]
+    misses = cache.misses
+    assert planned_times(["ORD-PT3"])[0]["planned_hours"] == first
+    assert cache.misses == misses
+
+    db.execute("UPDATE order_lines SET qty = 8 WHERE order_id = 'ORD-PT3'")
+    assert planned_times(["ORD-PT3"])[0]["planned_hours"] == pytest.approx((15 + 20) / 60, abs=1e-4)
+    db.execute("UPDATE routings SET std_setup_min = 75 WHERE product_id = 'P-100'")
+    assert planned_times(["ORD-PT3"])[0]["planned_hours"] == pytest.approx((75 + 20) / 60, abs=1e-4)
+    assert cache.misses == misses + 2
+
+
+def test_bulk_and_single_endpoints(app_client, cache):
+    os.environ["API_KEYS"] = "pt-key"
+    headers = {"x-api-key": "pt-key"}
+    try:
+        add_order("ORD-PT4", [("P-100", 2)])
+        add_order("ORD-PT5", [("P-100", 4)])
+        resp = app_client.get("/api/planned-time?order_ids=ORD-PT5, ORD-PT4,NOPE", headers=headers)
+        assert resp.status_code == 200
+        assert [r["order_id"] for r in resp.json()] == ["ORD-PT5", "ORD-PT4"]
+
+        one = app_client.get("/api/planned-time/ORD-PT4", headers=headers).json()
+        assert one["planned_hours"] == pytest.approx(20 / 60, abs=1e-4)
+        assert app_client.get("/api/planned-time/NOPE", headers=headers).status_code == 404
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -0,0 +1,94 @@
+import threading
+
+import db
+import metrics
+from pool_monitor import PoolMonitor, PoolSizer
+
+
+def test_monitor_tracks_checkouts_and_waits():
+    monitor = PoolMonitor(wait_threshold=0.0)
+    start = monitor.begin()
+    assert monitor.waiting == 1
+    monitor.acquired(start)
+    assert (monitor.waiting, monitor.in_use, monitor.checkouts) == (0, 1, 1)
+    monitor.failed(monitor.begin())
+    monitor.released()
+    assert monitor.in_use == 0
+    assert monitor.failures == 1
+    waits, peak = monitor.take_interval()
+    assert waits == 2 and peak == 1
+    assert monitor.take_interval() == (0, 0)
+
+
+def test_sizer_grows_on_waits_and_shrinks_when_idle():
+    monitor = PoolMonitor(wait_threshold=0.0)
+    applied = []
+    sizer = PoolSizer(monitor, lambda n: applied.append(n) or True, min_size=2, max_size=6,
+                      grow_step=3, initial=2)
+    monitor.acquired(monitor.begin())  # threshold 0: every checkout counts as a wait
+    assert sizer.step() == 5
+    monitor.released()
+    assert sizer.step() == 4
+    assert applied == [5, 4]
+
+
+def test_sizer_respects_bounds_and_unresizable_pools():
+    monitor = PoolMonitor(wait_threshold=0.0)
+    sizer = PoolSizer(monitor, lambda n: False, min_size=1, max_size=4, initial=4)
+    monitor.acquired(monitor.begin())
+    assert sizer.step() == 4  # already at the cap
+    monitor.released()
+    assert sizer.step() == 4  # apply_size refused
+    assert sizer.resizes == 0
+
+
+def test_sqlite_checkouts_are_monitored(app_client):
+    before = db.POOL_MONITOR.checkouts
+    db.fetch_one("SELECT 1 AS x")
+    assert db.POOL_MONITOR.checkouts > before
+    assert db.POOL_MONITOR.in_use == 0
+
+
+def test_sqlite_warm_and_resize(app_client):
+    old = db.SQLITE_MANAGER.max_size
+    try:
+        db.SQLITE_MANAGER.resize(3)
+        assert db.SQLITE_MANAGER.warm(db.SQLITE_DB_PATH, 5) == 3
+        assert db.pool_stats()["size"] == 3
+        assert db._apply_pool_size(1)
+        stats = db.pool_stats()
+        assert stats["size"] == 1 and stats["max"] == 1
+    finally:
+        db.SQLITE_MANAGER.resize(old)
+
+
+def test_shrink_closes_connections_returned_over_cap(app_client):
+    old = db.SQLITE_MANAGER.max_size
+    try:
+        db.SQLITE_MANAGER.resize(2)
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with db.get_conn():
+                held.set()
+                release.wait(5)
+
+        t = threading.Thread(target=hold)
+        t.start()
+        held.wait(5)
+        with db.get_conn():
+            db.SQLITE_MANAGER.resize(1)
+        release.set()
+        t.join(5)
+        assert db.SQLITE_MANAGER.stats()["open"] <= 1
+    finally:
+        db.SQLITE_MANAGER.resize(old)
+
+
+def test_pool_gauges_exported(app_client):
+    db.warm_pool()
+    lines = metrics.collect()
+    assert any(line.startswith('db_pool_size{backend="sqlite"}') for line in lines)
+    assert any(line.startswith('db_pool_waiting{backend="sqlite"}') for line in lines)
+    assert any(line.startswith("db_pool_checkout_wait_seconds_bucket") for line in lines)
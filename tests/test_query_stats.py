@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import db
+import metrics
+from query_stats import QUERY_STATS, QueryStats, fingerprint, explain_sql
+
+
+@pytest.fixture
+def slow_everything():
+    old = (QUERY_STATS.slow_ms, QUERY_STATS.explain_interval)
+    QUERY_STATS.reset()
+    QUERY_STATS.slow_ms, QUERY_STATS.explain_interval = 0.0, 0.0
+    yield QUERY_STATS
+    QUERY_STATS.slow_ms, QUERY_STATS.explain_interval = old
+    QUERY_STATS.reset()
+
+
+def test_fingerprint_normalizes_literals_and_params():
+    a = fingerprint("SELECT *  FROM orders\n WHERE order_id = 'ORD-1' AND qty > 10;")
+    b = fingerprint("SELECT * FROM orders WHERE order_id = %s AND qty > %s")
+    assert a == b == "SELECT * FROM orders WHERE order_id = ? AND qty > ?"
+    assert fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s)") == fingerprint(
+        "SELECT 1 FROM t WHERE id IN (?,?)"
+    )
+    assert fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)") == fingerprint(
+        "INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)"
+    )
+
+
+def test_explain_only_for_dml():
+    assert explain_sql("SELECT 1", sqlite=True) == "EXPLAIN QUERY PLAN SELECT 1"
+    assert explain_sql(" select 1; ", sqlite=False) == "EXPLAIN select 1"
+    assert explain_sql("CREATE TABLE x (a int)", sqlite=True) is None
+
+
+def test_top_orders_by_total_time():
+    stats = QueryStats(slow_ms=10_000)
+    for _ in range(3):
+        stats.record("SELECT a FROM t WHERE id = 1", 0.01)
+    stats.record("SELECT b FROM u", 0.5)
+    top = stats.top()
+    assert top[0]["fingerprint"] == "SELECT b FROM u"
+    assert top[1]["calls"] == 3
+    assert stats.top(order_by="calls")[0]["calls"] == 3
+
+
+def test_fingerprint_cap_uses_overflow_bucket():
+    stats = QueryStats(slow_ms=10_000, max_fingerprints=2)
+    for table in ("a", "b", "c", "d"):
+        stats.record(f"SELECT * FROM {table}", 0.001)
+    fps = {row["fingerprint"] for row in stats.top()}
+    assert "<other>" in fps
+    assert len(fps) == 3
+
+
+def test_slow_query_logged_with_sqlite_plan(app_client, slow_everything):
+    db.fetch_all("SELECT order_id FROM orders WHERE customer_id = %s", ("CUST-ALFA",))
+    slow = slow_everything.slow_queries()
+    entry = next(s for s in slow if s["fingerprint"].startswith("SELECT order_id FROM orders"))
+    assert entry["plan"]
+    assert "orders" in entry["plan"]
+
+
+def test_statement_histograms_exported(app_client, slow_everything):
+    db.fetch_one("SELECT COUNT(*) AS n FROM customers")
+    lines = metrics.collect()
+    assert any(line.startswith("db_query_duration_seconds_count{fingerprint=") for line in lines)
+
+
+def test_admin_query_stats_endpoint(app_client, slow_everything):
+    os.environ["ADMIN_KEY"] = "qs-admin"
+    try:
+        db.fetch_all("SELECT * FROM products")
+        assert app_client.get("/api/admin/query-stats").status_code == 401
+        resp = app_client.get(
+            "/api/admin/query-stats?limit=5", headers={"x-admin-key": "qs-admin"}
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert any(s["fingerprint"] == "SELECT * FROM products" for s in body["statements"])
+        assert body["slow"]
+
+        resp = app_client.delete("/api/admin/query-stats", headers={"x-admin-key": "qs-admin"})
+        assert resp.status_code == 200
+        assert QUERY_STATS.top() == []
+    finally:
+        os.environ.pop("ADMIN_KEY", None)
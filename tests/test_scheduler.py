@@ -0,0 +1,248 @@
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import db
+import scheduler
+from scheduler import Schedule
+
+START = datetime(2026, 3, 2, tzinfo=timezone.utc)
+
+
+def _by_key(schedule):
+    return {
+        (schedule.jobs[j]["order_id"], schedule.op_no[op]): (schedule.op_start[op], schedule.op_end[op])
+        for op, j in enumerate(schedule.op_job)
+    }
+
+
+def test_due_date_priority_and_operation_precedence():
+    s = Schedule(START)
+    s.add_job("LATE", 1, "A", 10, "2026-03-20", "2026-03-01", [(10, "SAW", 0, 6), (20, "PAINT", 0, 1)])
+    s.add_job("URGENT", 1, "A", 5, "2026-03-05", "2026-03-01", [(10, "SAW", 30, 2), (20, "PAINT", 0, 4)])
+    s.dispatch()
+    got = _by_key(s)
+    # the urgent order gets the saw first; the other one waits for it
+    assert got[("URGENT", 10)] == (0, 40)
+    assert got[("LATE", 10)] == (40, 100)
+    assert got[("URGENT", 20)] == (40, 60)
+    assert got[("LATE", 20)] == (100, 110)
+
+
+def test_release_date_and_idle_work_center_backfill():
+    s = Schedule(START)
+    s.add_job("FUTURE", 1, "A", 1, "2026-03-03", "2026-03-03", [(10, "SAW", 60, 0)])
+    s.add_job("NOW", 1, "A", 1, "2026-03-31", "2026-03-01", [(10, "SAW", 60, 0)])
+    s.dispatch()
+    got = _by_key(s)
+    # not released until its order date, so the less urgent order runs meanwhile
+    assert got[("NOW", 10)] == (0, 60)
+    assert got[("FUTURE", 10)] == (1440, 1500)
+    assert s.late_orders() == []
+
+
+def test_work_centers_never_overlap_on_large_random_plan():
+    rng = random.Random(11)
+    s = Schedule(START)
+    centers = [f"WC-{i}" for i in range(20)]
+    for i in range(5000):
+        ops = [(10 * (k + 1), rng.choice(centers), rng.randrange(0, 30), rng.random()) for k in range(10)]
+        s.add_job(f"O-{i:05d}", 1, "A", rng.randrange(1, 20), f"2026-{rng.randrange(3, 13):02d}-01", None, ops)
+    t0 = time.perf_counter()
+    s.dispatch()
+    assert time.perf_counter() - t0 < 5
+
+    per_wc = {}
+    for op in range(len(s.op_job)):
+        per_wc.setdefault(s.op_wc[op], []).append((s.op_start[op], s.op_end[op]))
+        nxt = s.op_next[op]
+        if nxt >= 0:
+            assert s.op_start[nxt] >= s.op_end[op] - 1e-9
+    for intervals in per_wc.values():
+        intervals.sort()
+        for (_, end), (start, _) in zip(intervals, intervals[1:]):
+            assert start >= end - 1e-9
+
+
+def test_run_and_endpoints(app_client):
+    os.environ["API_KEYS"] = "sched-key"
+    headers = {"x-api-key": "sched-key"}
+    try:
+        db.execute(
+            "INSERT INTO orders (order_id, order_date, customer_id, due_date) "
+            "VALUES ('ORD-S1', '2026-03-02', 'CUST-ALFA', '2026-03-02')"
+        )
+        db.execute(
+            "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) "
+            "VALUES ('ORD-S1', 1, 'P-100', 10, 1)"
+        )
+        summary = scheduler.run(start=START)
+        assert summary["operations"] >= 1 and summary["late_orders"] == []
+
+        gantt = app_client.get("/api/schedule?order_id=ORD-S1", headers=headers).json()
+        # seeded routing: P-100 op 10 on 'Montaż', 15 min setup + 2.5 min/unit
+        assert len(gantt) == 1
+        assert gantt[0]["work_center"] == "Montaż"
+        assert gantt[0]["start_ts"].startswith("2026-03-02T00:00:00")
+        assert gantt[0]["end_ts"].startswith("2026-03-02T00:40:00")
+
+        load = app_client.get("/api/work-centers/Montaż/load?date_from=2026-03-02", headers=headers).json()
+        day = next(d for d in load["days"] if d["date"] == "2026-03-02")
+        assert day["busy_min"] >= 40
+
+        resp = app_client.post("/api/schedule/run", headers=headers)
+        assert resp.status_code == 200, resp.text
+    finally:
+        os.environ.pop("API_KEYS", None)
+        scheduler.LAST_SCHEDULE = None
+
+
+def _random_plan(seed, orders=400, centers=8):
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(orders):
+        ops = [(10 * (k + 1), f"WC-{rng.randrange(centers)}", rng.randrange(0, 30), rng.random() * 3)
+               for k in range(rng.randrange(1, 6))]
+        jobs.append([f"O-{i:04d}", 1, "A", rng.randrange(1, 20),
+                     f"2026-{rng.randrange(3, 7):02d}-{rng.randrange(1, 28):02d}",
+                     f"2026-03-{rng.randrange(2, 20):02d}", ops])
+    return jobs
+
+
+def _full(jobs):
+    s = Schedule(START)
+    for job in jobs:
+        s.add_job(*job)
+    s.dispatch()
+    return s
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_incremental_reschedule_matches_full_replan(seed):
+    jobs = _random_plan(seed)
+    s = _full(jobs)
+    rng = random.Random(100 + seed)
+    for _ in range(5):
+        victim = rng.randrange(len(jobs))
+        new_due = f"2026-{rng.randrange(3, 7):02d}-{rng.randrange(1, 28):02d}"
+        new_start = f"2026-03-{rng.randrange(2, 28):02d}"
+        jobs[victim][4], jobs[victim][5] = new_due, new_start
+        cutoff = s.move_order(jobs[victim][0], order_date=new_start, due_date=new_due)
+        changed = set(s.dispatch(from_time=cutoff))
+        expected = _full(jobs)
+        assert s.op_start == expected.op_start and s.op_end == expected.op_end
+        assert all(s.op_start[op] >= cutoff for op in changed)
+
+
+def test_patch_schedule_returns_changed_slots(app_client):
+    os.environ["API_KEYS"] = "sched-key"
+    headers = {"x-api-key": "sched-key"}
+    try:
+        for order_id, due in (("ORD-R1", "2026-03-10"), ("ORD-R2", "2026-03-20")):
+            db.execute(
+                "INSERT INTO orders (order_id, order_date, customer_id, due_date) "
+                "VALUES (%s, '2026-03-02', 'CUST-ALFA', %s)",
+                (order_id, due),
+            )
+            db.execute(
+                "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) "
+                "VALUES (%s, 1, 'P-100', 10, 1)",
+                (order_id,),
+            )
+        scheduler.run(start=START)
+        before = {r["order_id"]: r for r in app_client.get("/api/schedule", headers=headers).json()}
+        assert before["ORD-R1"]["start_ts"] < before["ORD-R2"]["start_ts"]
+
+        resp = app_client.patch(
+            "/api/orders/ORD-R2/schedule", json={"due_date": "2026-03-05"}, headers=headers
+        )
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        assert body["due_date"] == "2026-03-05"
+        changed = {r["order_id"]: r for r in body["schedule"]["changed"]}
+        # ORD-R2 is now more urgent and takes the work center first
+        assert set(changed) >= {"ORD-R1", "ORD-R2"}
+        assert changed["ORD-R2"]["start_ts"] < changed["ORD-R1"]["start_ts"]
+
+        after = {r["order_id"]: r for r in app_client.get("/api/schedule", headers=headers).json()}
+        assert after["ORD-R2"]["start_ts"] == changed["ORD-R2"]["start_ts"]
+        assert after["ORD-R1"]["end_ts"] == changed["ORD-R1"]["end_ts"]
+    finally:
+        os.environ.pop("API_KEYS", None)
+        scheduler.LAST_SCHEDULE = None
+
+
+def _two_orders():
+    for order_id, due in (("ORD-V1", "2026-03-10"), ("ORD-V2", "2026-03-20")):
+        db.execute(
+            "INSERT INTO orders (order_id, order_date, customer_id, due_date) "
+            "VALUES (%s, '2026-03-02', 'CUST-ALFA', %s)",
+            (order_id, due),
+        )
+        db.execute(
+            "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) "
+            "VALUES (%s, 1, 'P-100', 10, 1)",
+            (order_id,),
+        )
+
+
+def test_patch_falls_back_to_full_replan_when_plan_is_stale_or_missing(app_client):
+    os.environ["API_KEYS"] = "sched-key"
+    headers = {"x-api-key": "sched-key"}
+
+    def patch(due):
+        resp = app_client.patch("/api/orders/ORD-V2/schedule", json={"due_date": due}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        return resp.json()["schedule"]
+
+    try:
+        _two_orders()
+        # nothing has been scheduled yet: nothing to keep current
+        assert patch("2026-03-19") is None
+
+        scheduler.run(start=START)
+        assert patch("2026-03-18")["replanned"] == "incremental"
+        # the plan's own date change is accounted for
+        assert patch("2026-03-05")["replanned"] == "incremental"
+
+        # a write the plan has not seen: the full re-plan runs after the response
+        db.execute(
+            "INSERT INTO order_lines (order_id, line_no, product_id, qty, unit_price) "
+            "VALUES ('ORD-V1', 2, 'P-100', 5, 1)"
+        )
+        assert patch("2026-03-06") == {"replanned": "pending"}
+        rows = app_client.get("/api/schedule", params={"order_id": "ORD-V1"}, headers=headers).json()
+        assert {r["line_no"] for r in rows} == {1, 2}
+        assert patch("2026-03-07")["replanned"] == "incremental"
+
+        # a restarted process has no plan in memory but a published schedule
+        scheduler.LAST_SCHEDULE = None
+        assert patch("2026-03-08") == {"replanned": "pending"}
+        assert patch("2026-03-09")["replanned"] == "incremental"
+    finally:
+        os.environ.pop("API_KEYS", None)
+        scheduler.LAST_SCHEDULE = None
+
+
+def test_failed_slot_write_rolls_back_the_date_change(app_client, monkeypatch):
+    os.environ["API_KEYS"] = "sched-key"
+    headers = {"x-api-key": "sched-key"}
+    try:
+        _two_orders()
+        scheduler.run(start=START)
+
+        def broken(*args, **kwargs):
+            raise RuntimeError("schedule table locked")
+
+        monkeypatch.setattr(scheduler, "upsert_many", broken)
+        resp = app_client.patch("/api/orders/ORD-V2/schedule", json={"due_date": "2026-03-05"}, headers=headers)
+        assert resp.status_code == 500
+        due = db.fetch_one("SELECT due_date FROM orders WHERE order_id = 'ORD-V2'")["due_date"]
+        assert str(due)[:10] == "2026-03-20"
+        assert scheduler.LAST_SCHEDULE is None
+    finally:
+        os.environ.pop("API_KEYS", None)
+        scheduler.LAST_SCHEDULE = None
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+import db
+from sqlite_pool import SQLiteConnectionManager
+
+
+def _tmp_path():
+    tmp = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+    tmp.close()
+    return tmp.name
+
+
+def test_connections_are_reused_and_tuned():
+    path = _tmp_path()
+    mgr = SQLiteConnectionManager(max_size=2)
+    try:
+        for _ in range(5):
+            with mgr.connection(path) as conn:
+                mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode.lower() == "wal"
+        stats = mgr.stats()
+        assert stats["opened_total"] == 1
+        assert stats["checkouts_total"] == 5
+        assert stats["in_use"] == 0 and stats["idle"] == 1
+    finally:
+        mgr.close_all()
+        os.remove(path)
+
+
+def test_switching_path_retires_old_connections():
+    path1, path2 = _tmp_path(), _tmp_path()
+    mgr = SQLiteConnectionManager(max_size=2)
+    try:
+        with mgr.connection(path1):
+            pass
+        with mgr.connection(path2) as conn:
+            assert conn.execute("PRAGMA database_list").fetchone()[2] == path2
+        assert mgr.stats()["closed_total"] == 1
+    finally:
+        mgr.close_all()
+        os.remove(path1)
+        os.remove(path2)
+
+
+def test_non_persistent_mode_closes_after_use():
+    path = _tmp_path()
+    mgr = SQLiteConnectionManager(persistent=False)
+    try:
+        with mgr.connection(path):
+            pass
+        with mgr.connection(path):
+            pass
+        stats = mgr.stats()
+        assert stats["opened_total"] == 2 and stats["open"] == 0
+    finally:
+        os.remove(path)
+
+
+def test_write_lock_times_out_like_busy_database():
+    mgr = SQLiteConnectionManager(busy_timeout=0.05)
+    with mgr.write_lock():
+        try:
+            with mgr.write_lock():
+                raise AssertionError("second writer should not get the lock")
+        except sqlite3.OperationalError as exc:
+            assert "locked" in str(exc)
+
+
+def test_concurrent_writes_do_not_fail(app_client):
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                db.execute(
+                    "INSERT INTO inventory (txn_id, txn_date, product_id, qty_change, reason) "
+                    "VALUES (%s, %s, %s, %s, %s)",
+                    (f"T-{n}-{i}", "2026-01-01", "P-100", 1, "PO"),
+                )
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    row = db.fetch_one("SELECT COUNT(*) AS n FROM inventory WHERE txn_id LIKE 'T-%'")
+    assert row["n"] == 160
+    assert db.sqlite_pool_stats()["in_use"] == 0
@@ -0,0 +1,56 @@
+import pytest
+
+import db
+import metrics
+import statements
+from queries import SQL_FIND_ORDER, SQL_INSERT_INVENTORY
+from statements import Statement, register
+
+
+def test_arity_is_checked_at_registration():
+    with pytest.raises(ValueError):
+        Statement("bad_arity", "SELECT * FROM orders WHERE order_id = %s AND status = %s", arity=1)
+
+
+def test_sqlite_form_is_translated_once():
+    stmt = Statement("like_pct", "SELECT 1 FROM orders WHERE order_id LIKE 'ORD%%' AND status = %s")
+    assert stmt.arity == 1
+    assert stmt.sqlite_sql == "SELECT 1 FROM orders WHERE order_id LIKE 'ORD%' AND status = ?"
+    assert SQL_INSERT_INVENTORY.arity == 7
+    assert "%s" not in SQL_INSERT_INVENTORY.sqlite_sql
+
+
+def test_register_is_idempotent_but_rejects_conflicts():
+    assert register("find_order", str(SQL_FIND_ORDER)) is SQL_FIND_ORDER
+    with pytest.raises(ValueError):
+        register("find_order", "SELECT 2 FROM orders WHERE order_id = %s")
+
+
+def test_statement_is_plain_sql_text():
+    assert isinstance(SQL_FIND_ORDER, str)
+    assert SQL_FIND_ORDER == "SELECT 1 FROM orders WHERE order_id = %s"
+    assert db._pg_exec_kwargs(SQL_FIND_ORDER) == {"prepare": True}
+    assert db._pg_exec_kwargs("SELECT 1") == {}
+
+
+def test_execution_counters(app_client):
+    db.execute(
+        "INSERT INTO orders (order_id, order_date, customer_id) VALUES (%s, %s, %s)",
+        ("ORD-STMT", "2026-01-01", "CUST-ALFA"),
+    )
+    SQL_FIND_ORDER.reset_stats()
+    assert db.fetch_one(SQL_FIND_ORDER, ("ORD-STMT",))
+    assert db.fetch_one(SQL_FIND_ORDER, ("ORD-MISSING",)) is None
+    assert SQL_FIND_ORDER.calls == 2
+    assert SQL_FIND_ORDER.errors == 0
+
+    row = next(r for r in statements.stats() if r["name"] == "find_order")
+    assert row["calls"] == 2
+    assert 'db_statement_calls_total{statement="find_order"} 2' in metrics.collect()
+
+
+def test_wrong_parameter_count_fails_fast(app_client):
+    SQL_FIND_ORDER.reset_stats()
+    with pytest.raises(ValueError):
+        db.fetch_one(SQL_FIND_ORDER, ("ORD-0001", "extra"))
+    assert SQL_FIND_ORDER.calls == 0
@@ -0,0 +1,126 @@
+import queue
+import time
+from types import SimpleNamespace
+
+from table_version_listener import TableVersionListener
+
+
+class FakeListenConn:
+    def __init__(self):
+        self.executed = []
+        self.pending = queue.Queue()
+        self.closed = False
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def notifies(self, timeout=None):
+        try:
+            note = self.pending.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if isinstance(note, Exception):
+            raise note
+        payload, pid = note if isinstance(note, tuple) else (note, None)
+        yield SimpleNamespace(payload=payload, pid=pid)
+
+    def close(self):
+        self.closed = True
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_versions_never_repeat_while_disconnected():
+    listener = TableVersionListener(lambda: None)
+    first = listener.versions(["orders", "inventory"])
+    second = listener.versions(["orders", "inventory"])
+    assert first != second
+
+
+def test_notifications_bump_only_their_table_and_reconnect_bumps_all():
+    conns = []
+
+    def connect():
+        conns.append(FakeListenConn())
+        return conns[-1]
+
+    listener = TableVersionListener(connect, retry_interval=0.01, poll_timeout=0.01)
+    listener.start()
+    try:
+        assert _wait_for(lambda: listener.connected)
+        assert conns[0].executed == ["LISTEN table_versions"]
+        before = listener.versions(["orders", "inventory"])
+        assert listener.versions(["orders", "inventory"]) == before
+
+        conns[0].pending.put("orders")
+        assert _wait_for(lambda: listener.notifications == 1)
+        after = listener.versions(["orders", "inventory"])
+        assert after[0] == before[0] + 1 and after[1] == before[1]
+
+        # a dropped connection may have lost notifications: everything changes
+        conns[0].pending.put(RuntimeError("server closed the connection"))
+        assert _wait_for(lambda: len(conns) == 2 and listener.connected)
+        assert conns[0].closed
+        again = listener.versions(["orders", "inventory"])
+        assert again[0] > after[0] and again[1] > after[1]
+    finally:
+        listener.stop()
+    assert not listener.running
+
+
+def test_local_commits_bump_the_written_tables_at_once(monkeypatch):
+    import db
+
+    listener = TableVersionListener(FakeListenConn, retry_interval=0.01, poll_timeout=0.01)
+    monkeypatch.setattr(db, "TABLE_VERSIONS", listener)
+    listener.start()
+    try:
+        assert _wait_for(lambda: listener.connected)
+        before = listener.versions(["orders", "order_lines", "inventory"])
+        conn = object()
+        db._note_write(conn, "SELECT * FROM inventory")
+        db._note_write(conn, "INSERT INTO orders (order_id) VALUES (%s)")
+        db._note_write(conn, "  update order_lines SET qty = %s")
+        # nothing moves before the commit
+        assert listener.versions(["orders", "order_lines", "inventory"]) == before
+        db._committed_writes(conn)
+        after = listener.versions(["orders", "order_lines", "inventory"])
+        assert after == (before[0] + 1, before[1] + 1, before[2])
+        assert listener.notifications == 0
+
+        db._note_write(conn, "DELETE FROM inventory WHERE txn_id = %s")
+        db._written_tables(conn)  # rolled back
+        db._committed_writes(conn)
+        assert listener.versions(["orders", "order_lines", "inventory"]) == after
+    finally:
+        listener.stop()
+
+
+def test_notification_of_an_own_commit_is_not_counted_twice():
+    listener = TableVersionListener(FakeListenConn, retry_interval=0.01, poll_timeout=0.01)
+    conns = []
+    listener.connect = lambda: conns.append(FakeListenConn()) or conns[-1]
+    listener.start()
+    try:
+        assert _wait_for(lambda: listener.connected)
+        before = listener.versions(["orders"])
+        listener.committed(["orders"], pid=7)
+        committed = listener.versions(["orders"])
+        assert committed[0] == before[0] + 1
+
+        conns[0].pending.put(("orders", 7))
+        assert _wait_for(lambda: listener.notifications == 1)
+        assert listener.versions(["orders"]) == committed
+
+        # the same backend's next notification is somebody's write we have not counted
+        conns[0].pending.put(("orders", 7))
+        conns[0].pending.put(("orders", 8))
+        assert _wait_for(lambda: listener.notifications == 3)
+        assert listener.versions(["orders"])[0] == committed[0] + 2
+    finally:
+        listener.stop()
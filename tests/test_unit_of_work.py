@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import db
+
+
+def _seq(prefix="ORD"):
+    row = db.fetch_one("SELECT last_suffix FROM order_id_seq WHERE prefix = %s", (prefix,))
+    return row["last_suffix"] if row else None
+
+
+def test_unit_of_work_commits_on_success(app_client):
+    gen = db.unit_of_work()
+    conn = next(gen)
+    db.execute(
+        "INSERT INTO customers (customer_id, name) VALUES (%s, %s)",
+        ("CUST-UOW", "UoW"),
+        conn=conn,
+    )
+    assert db.fetch_one("SELECT 1 AS x FROM customers WHERE customer_id = %s", ("CUST-UOW",), conn=conn)
+    with pytest.raises(StopIteration):
+        next(gen)
+
+    assert db.fetch_one("SELECT 1 AS x FROM customers WHERE customer_id = %s", ("CUST-UOW",))
+
+
+def test_unit_of_work_rolls_back_on_error(app_client):
+    gen = db.unit_of_work()
+    conn = next(gen)
+    db.execute(
+        "INSERT INTO customers (customer_id, name) VALUES (%s, %s)",
+        ("CUST-ROLLBACK", "Rollback"),
+        conn=conn,
+    )
+    with pytest.raises(RuntimeError):
+        gen.throw(RuntimeError("handler failed"))
+
+    assert db.fetch_one("SELECT 1 AS x FROM customers WHERE customer_id = %s", ("CUST-ROLLBACK",)) is None
+
+
+def test_failed_create_order_does_not_consume_order_id(app_client):
+    os.environ["API_KEYS"] = "uow-key"
+    try:
+        before = _seq()
+        resp = app_client.post(
+            "/api/orders",
+            json={"customer_id": "CUST-MISSING"},
+            headers={"x-api-key": "uow-key"},
+        )
+        assert resp.status_code == 404
+        assert _seq() == before
+
+        resp = app_client.post(
+            "/api/orders",
+            json={"customer_id": "CUST-ALFA"},
+            headers={"x-api-key": "uow-key"},
+        )
+        assert resp.status_code == 201
+        assert _seq() == before + 1
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from bom_cache import BOM_CACHE, impacted_orders
+from helpers import add_bom, add_order
+
+
+@pytest.fixture
+def cache():
+    return BOM_CACHE
+
+
+def test_where_used_levels_and_refresh(cache):
+    add_bom("TOP", "MID", 2)
+    add_bom("MID", "BOLT", 4)
+    add_bom("TOP", "BOLT", 1)
+    used = cache.where_used_levels("BOLT")
+    assert used == {"MID": {"level": 1, "qty": 4.0}, "TOP": {"level": 1, "qty": 9.0}}
+    assert cache.where_used_levels("BOLT") is used
+
+    add_bom("KIT", "TOP", 1)
+    cache.sync(force=True)
+    assert cache.where_used("BOLT") == {"MID", "TOP", "KIT"}
+    assert cache.where_used_levels("BOLT")["KIT"]["level"] == 2
+
+
+def test_impacted_orders_cover_direct_and_indirect_use(cache):
+    add_bom("FRAME", "TUBE", 3, 0.1)
+    add_order("ORD-W1", [("FRAME", 10)])
+    add_order("ORD-W2", [("TUBE", 5)])
+    add_order("ORD-W3", [("FRAME", 7)], status="Done")
+    rows = {r["order_id"]: r for r in impacted_orders("TUBE")}
+    assert set(rows) == {"ORD-W1", "ORD-W2"}
+    assert rows["ORD-W1"]["level"] == 1
+    assert rows["ORD-W1"]["component_qty"] == pytest.approx(33)
+    assert rows["ORD-W2"]["level"] == 0 and rows["ORD-W2"]["component_qty"] == 5
+
+
+def test_endpoints(app_client, cache):
+    os.environ["API_KEYS"] = "wu-key"
+    headers = {"x-api-key": "wu-key"}
+    try:
+        add_order("ORD-W4", [("P-100", 10)])
+        used = app_client.get("/api/products/P-101/where-used", headers=headers)
+        assert used.status_code == 200
+        assert used.json() == [{"product_id": "P-100", "level": 1, "qty_per_unit": pytest.approx(2.1)}]
+
+        impacted = app_client.get("/api/products/P-101/impacted-orders", headers=headers).json()
+        ids = {r["order_id"]: r for r in impacted}
+        assert ids["ORD-W4"]["component_qty"] == pytest.approx(21)
+        assert app_client.get("/api/products/NOPE/where-used", headers=headers).json() == []
+    finally:
+        os.environ.pop("API_KEYS", None)
@@ -8,6 +8,7 @@ from jose import jwt, JWTError
 from passlib.hash import pbkdf2_sha256 as hasher
 
 from db import fetch_one, fetch_all, execute
+from statements import register
 from config import settings
 
 # JWT settings
@@ -49,7 +50,7 @@ CREATE TABLE IF NOT EXISTS subscription_plans (
 
 # --- Queries ---
 
-SQL_GET_USER_BY_EMAIL = """
+SQL_GET_USER_BY_EMAIL = register("get_user_by_email", """
 SELECT user_id,
        email,
        company_id,
@@ -62,9 +63,9 @@ SELECT user_id,
 FROM users
 WHERE email = %s
 LIMIT 1;
-"""
+""", arity=1)
 
-SQL_GET_USER_BY_ID = """
+SQL_GET_USER_BY_ID = register("get_user_by_id", """
 SELECT user_id,
        email,
        company_id,
@@ -77,7 +78,7 @@ SELECT user_id,
 FROM users
 WHERE user_id = %s
 LIMIT 1;
-"""
+""", arity=1)
 
 SQL_INSERT_USER = """
 INSERT INTO users (